@@ -0,0 +1,362 @@
+"""
+CHAIR (Caption Hallucination Assessment with Image Relevance) 评估
+    - CHAIR-i: 所有提到的物体中，不在图像真值物体集合中的比例
+    - CHAIR-s: 至少提到一个幻觉物体的描述所占比例
+图像的真值物体集合来自COCO instance标注的类别以及COCO caption中提到的物体，预先计算后保存为JSON索引。
+物体匹配使用80个COCO类别的同义词表（包括复数形式和多词同义词），所有词形编译成一个基于前缀树的正则，
+对整个run的所有描述只做一次扫描，同一位置优先匹配最长的词形（例如"hot dog"优先于"dog"）。
+
+用法:
+    python -m deephallu.analytics.chair --annotations_dir data/coco/annotations --split val2014 --index data/coco/chair_index.json \
+        --captions results/captions.csv
+"""
+
+import argparse
+import json
+import os
+import os.path as osp
+import re
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+HERE = osp.dirname(osp.abspath(__file__))
+COCO_DIR = osp.join(HERE, "..", "..", "..", "data", "coco")
+
+# COCO类别 -> 同义词（单数形式，类别名本身总是包含在内）
+COCO_SYNONYMS = {
+    "person": ["girl", "boy", "man", "woman", "kid", "child", "chef", "baker", "people", "adult", "rider", "children", "baby", "worker", "passenger", "sister", "biker", "policeman", "cop", "officer", "lady", "cowboy", "bride", "groom", "male", "female", "guy", "traveler", "mother", "father", "gentleman", "pitcher", "player", "skier", "snowboarder", "skater", "skateboarder", "foreigner", "caller", "offender", "coworker", "trespasser", "patient", "politician", "soldier", "grandchild", "serviceman", "walker", "drinker", "doctor", "bicyclist", "thief", "buyer", "teenager", "student", "camper", "driver", "solider", "hunter", "shopper", "villager", "pedestrian", "surfer", "catcher", "batter", "umpire", "toddler", "teen", "youngster", "friend", "spectator", "fan", "customer", "tourist", "audience", "crowd"],
+    "bicycle": ["bike", "bicycle", "cycle", "tandem", "unicycle"],
+    "car": ["car", "automobile", "van", "minivan", "sedan", "suv", "hatchback", "cab", "jeep", "coupe", "taxicab", "limo", "taxi"],
+    "motorcycle": ["motorcycle", "scooter", "motor bike", "motor cycle", "motorbike", "moped"],
+    "airplane": ["airplane", "jetliner", "plane", "air plane", "monoplane", "aircraft", "jet", "airbus", "biplane", "seaplane", "airliner"],
+    "bus": ["bus", "minibus", "trolley"],
+    "train": ["train", "locomotive", "tramway", "caboose"],
+    "truck": ["truck", "pickup", "lorry", "hauler", "firetruck"],
+    "boat": ["boat", "ship", "liner", "sailboat", "motorboat", "dinghy", "powerboat", "speedboat", "canoe", "skiff", "yacht", "kayak", "catamaran", "pontoon", "houseboat", "vessel", "rowboat", "trawler", "ferryboat", "watercraft", "tugboat", "schooner", "barge", "ferry", "sailboard", "paddleboat", "lifeboat", "freighter", "steamboat", "riverboat", "battleship", "steamship"],
+    "traffic light": ["traffic light", "traffic signal", "stop light", "streetlight", "traffic lamp"],
+    "fire hydrant": ["fire hydrant", "hydrant"],
+    "stop sign": ["stop sign"],
+    "parking meter": ["parking meter", "meter"],
+    "bench": ["bench", "pew"],
+    "bird": ["bird", "ostrich", "owl", "seagull", "goose", "duck", "parakeet", "falcon", "robin", "pelican", "waterfowl", "heron", "hummingbird", "mallard", "finch", "pigeon", "sparrow", "seabird", "osprey", "blackbird", "fowl", "shorebird", "woodpecker", "egret", "chickadee", "quail", "bluebird", "kingfisher", "buzzard", "willet", "gull", "swan", "bluejay", "flamingo", "cormorant", "parrot", "loon", "gosling", "waterbird", "pheasant", "rooster", "sandpiper", "crow", "raven", "turkey", "oriole", "cowbird", "warbler", "magpie", "peacock", "cockatiel", "lorikeet", "puffin", "vulture", "condor", "macaw", "peafowl", "cockatoo", "songbird"],
+    "cat": ["cat", "kitten", "feline", "tabby"],
+    "dog": ["dog", "puppy", "beagle", "pup", "chihuahua", "schnauzer", "dachshund", "rottweiler", "canine", "pitbull", "collie", "pug", "terrier", "poodle", "labrador", "doggie", "doberman", "mutt", "doggy", "spaniel", "bulldog", "sheepdog", "weimaraner", "corgi", "cocker", "greyhound", "retriever", "brindle", "hound", "whippet", "husky"],
+    "horse": ["horse", "colt", "pony", "racehorse", "stallion", "equine", "mare", "foal", "palomino", "mustang", "clydesdale", "bronc", "bronco"],
+    "sheep": ["sheep", "lamb", "ram", "goat", "ewe"],
+    "cow": ["cow", "cattle", "oxen", "ox", "calf", "holstein", "heifer", "buffalo", "bull", "zebu", "bison"],
+    "elephant": ["elephant"],
+    "bear": ["bear", "grizzly"],
+    "zebra": ["zebra"],
+    "giraffe": ["giraffe"],
+    "backpack": ["backpack", "knapsack"],
+    "umbrella": ["umbrella"],
+    "handbag": ["handbag", "wallet", "purse", "briefcase"],
+    "tie": ["tie", "bow", "bow tie"],
+    "suitcase": ["suitcase", "suit case", "luggage"],
+    "frisbee": ["frisbee"],
+    "skis": ["ski", "skis"],
+    "snowboard": ["snowboard"],
+    "sports ball": ["sports ball", "ball"],
+    "kite": ["kite"],
+    "baseball bat": ["baseball bat"],
+    "baseball glove": ["baseball glove"],
+    "skateboard": ["skateboard"],
+    "surfboard": ["surfboard", "longboard", "skimboard", "shortboard", "wakeboard"],
+    "tennis racket": ["tennis racket", "racket"],
+    "bottle": ["bottle"],
+    "wine glass": ["wine glass"],
+    "cup": ["cup"],
+    "fork": ["fork"],
+    "knife": ["knife", "pocketknife", "knives"],
+    "spoon": ["spoon"],
+    "bowl": ["bowl", "container"],
+    "banana": ["banana"],
+    "apple": ["apple"],
+    "sandwich": ["sandwich", "burger", "sub", "cheeseburger", "hamburger"],
+    "orange": ["orange"],
+    "broccoli": ["broccoli"],
+    "carrot": ["carrot"],
+    "hot dog": ["hot dog"],
+    "pizza": ["pizza"],
+    "donut": ["donut", "doughnut"],
+    "cake": ["cake", "cheesecake", "cupcake", "shortcake", "coffeecake", "pancake"],
+    "chair": ["chair", "seat", "stool"],
+    "couch": ["couch", "sofa", "recliner", "futon", "loveseat", "settee", "chesterfield"],
+    "potted plant": ["potted plant", "houseplant"],
+    "bed": ["bed"],
+    "dining table": ["dining table", "table", "desk"],
+    "toilet": ["toilet", "urinal", "commode", "lavatory", "potty"],
+    "tv": ["tv", "monitor", "televison", "television"],
+    "laptop": ["laptop", "computer", "notebook", "netbook", "lenovo", "macbook", "laptop computer"],
+    "mouse": ["mouse"],
+    "remote": ["remote"],
+    "keyboard": ["keyboard"],
+    "cell phone": ["cell phone", "mobile phone", "phone", "cellphone", "telephone", "phon", "smartphone", "iphone"],
+    "microwave": ["microwave"],
+    "oven": ["oven", "stovetop", "stove", "stove top oven"],
+    "toaster": ["toaster"],
+    "sink": ["sink"],
+    "refrigerator": ["refrigerator", "fridge", "freezer"],
+    "book": ["book", "novel"],
+    "clock": ["clock"],
+    "vase": ["vase"],
+    "scissors": ["scissors"],
+    "teddy bear": ["teddy bear", "teddybear"],
+    "hair drier": ["hair drier", "hairdryer", "hair dryer", "blow dryer", "blowdryer", "blow drier", "dryer", "drier"],
+    "toothbrush": ["toothbrush"],
+}
+
+# 不规则复数
+IRREGULAR_PLURALS = {
+    "man": "men", "woman": "women", "child": "children", "person": "people", "mouse": "mice", "knife": "knives",
+    "policeman": "policemen", "gentleman": "gentlemen", "serviceman": "servicemen", "goose": "geese", "ox": "oxen",
+    "calf": "calves", "sheep": "sheep", "bison": "bison", "scissors": "scissors", "skis": "skis", "people": "people",
+    "children": "children", "oxen": "oxen", "knives": "knives", "bus": "buses", "cattle": "cattle", "luggage": "luggage",
+    "broccoli": "broccoli", "loveseat": "loveseats", "shelf": "shelves", "audience": "audiences", "crowd": "crowds",
+}
+# 需要整体解释的短语：优先于其中的单词匹配，例如"baby bird"是鸟而不是人，None表示不是物体
+PHRASE_OVERRIDES = {
+    "baby bird": "bird", "adult bird": "bird", "baby cow": "cow", "adult cow": "cow", "baby elephant": "elephant",
+    "adult elephant": "elephant", "baby zebra": "zebra", "adult zebra": "zebra", "baby giraffe": "giraffe",
+    "adult giraffe": "giraffe", "baby bear": "bear", "adult bear": "bear", "bow and arrow": None, "hot dog stand": None,
+}
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def pluralize(word: str) -> str:
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if re.search(r"(s|x|z|ch|sh)$", word):
+        return word + "es"
+    if re.search(r"[^aeiou]y$", word):
+        return word[:-1] + "ies"
+    return word + "s"
+
+
+def normalize_caption(text: str) -> str:
+    """小写并把标点和连字符替换为空格，多词同义词之间只有一个空格"""
+    return _NON_WORD.sub(" ", str(text).lower()).strip()
+
+
+def build_vocabulary(synonyms: Dict[str, Sequence[str]] = COCO_SYNONYMS) -> Dict[str, Optional[str]]:
+    """
+    所有词形（单数、复数；多词同义词只变化最后一个词）到COCO类别的映射，PHRASE_OVERRIDES中不是物体的短语映射为None
+    """
+    vocabulary: Dict[str, Optional[str]] = {}
+    for category, words in synonyms.items():
+        for word in set(words) | {category}:
+            tokens = normalize_caption(word).split()
+            for form in (" ".join(tokens), " ".join(tokens[:-1] + [pluralize(tokens[-1])])):
+                vocabulary[form] = category
+    for phrase, category in PHRASE_OVERRIDES.items():
+        tokens = phrase.split()
+        for form in (phrase, " ".join(tokens[:-1] + [pluralize(tokens[-1])])):
+            vocabulary[form] = category
+    return vocabulary
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """把词表编译成前缀树形式的正则：每个节点先尝试更长的后续，再尝试在该节点结束，因此总是最长匹配"""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def to_pattern(node: dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + to_pattern(child) for char, child in sorted(node.items()) if char != ""]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            # 需要整体可选时加分组
+            body = ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+        return body
+    return to_pattern(trie)
+
+
+class ObjectMatcher:
+    """
+    在文本中查找COCO物体，所有词形编译成一个正则
+    Args:
+        synonyms: COCO类别到同义词的映射
+    """
+    def __init__(self, synonyms: Dict[str, Sequence[str]] = COCO_SYNONYMS):
+        self.vocabulary = build_vocabulary(synonyms)
+        self.pattern = re.compile(r"\b(" + _trie_pattern(self.vocabulary) + r")\b")
+
+    def find(self, text: str) -> List[Tuple[str, str]]:
+        """返回文本中按出现顺序的(词形, COCO类别)"""
+        return [(match.group(1), self.vocabulary[match.group(1)])
+                for match in self.pattern.finditer(normalize_caption(text)) if self.vocabulary[match.group(1)] is not None]
+
+    def objects(self, text: str) -> FrozenSet[str]:
+        return frozenset(category for _, category in self.find(text))
+
+    def find_all(self, texts: Sequence[str]) -> pd.DataFrame:
+        """
+        批量匹配：把所有文本用换行连接后只扫描一次，按匹配位置映射回文本编号
+        Returns:
+            pd.DataFrame: 列为text_idx、word、category，每个匹配一行
+        """
+        normalized = [normalize_caption(text) for text in texts]
+        lengths = np.fromiter((len(text) + 1 for text in normalized), dtype=np.int64, count=len(normalized))
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        matches = [(match.start(), match.group(1)) for match in self.pattern.finditer("\n".join(normalized))]
+        positions = np.fromiter((position for position, _ in matches), dtype=np.int64, count=len(matches))
+        words = [word for _, word in matches]
+        table = pd.DataFrame({
+            "text_idx": np.searchsorted(starts, positions, side="right") - 1,
+            "word": words,
+            "category": [self.vocabulary[word] for word in words],
+        })
+        return table.dropna(subset=["category"]).reset_index(drop=True)
+
+
+class ChairIndex:
+    """
+    每张图像的真值物体集合
+    Args:
+        objects: image_id到COCO类别集合的映射
+    """
+    def __init__(self, objects: Dict[int, FrozenSet[str]]):
+        self.objects = objects
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __contains__(self, image_id):
+        return int(image_id) in self.objects
+
+    def get(self, image_id) -> FrozenSet[str]:
+        return self.objects.get(int(image_id), frozenset())
+
+    @classmethod
+    def from_coco(cls, instances_path: str, captions_path: Optional[str] = None, matcher: Optional[ObjectMatcher] = None) -> "ChairIndex":
+        """
+        由COCO标注构建
+        Args:
+            instances_path: instances_<split>.json
+            captions_path: captions_<split>.json，其中提到的物体也计入真值
+        """
+        with open(instances_path, "r") as f:
+            instances = json.load(f)
+        category_names = {category["id"]: category["name"] for category in instances["categories"]}
+        annotations = pd.DataFrame(instances["annotations"], columns=["image_id", "category_id"])
+        annotations["category"] = annotations["category_id"].map(category_names)
+        image_ids = [image["id"] for image in instances["images"]]
+        frames = [annotations[["image_id", "category"]]]
+        if captions_path is not None:
+            with open(captions_path, "r") as f:
+                captions = pd.DataFrame(json.load(f)["annotations"], columns=["image_id", "caption"])
+            matcher = matcher or ObjectMatcher()
+            found = matcher.find_all(captions["caption"].tolist())
+            found["image_id"] = captions["image_id"].to_numpy()[found["text_idx"].to_numpy()]
+            frames.append(found[["image_id", "category"]])
+            image_ids.extend(captions["image_id"].tolist())
+        objects = pd.concat(frames, ignore_index=True).dropna().drop_duplicates()
+        grouped = objects.groupby("image_id")["category"].agg(frozenset)
+        index = {int(image_id): frozenset() for image_id in image_ids}
+        index.update({int(image_id): categories for image_id, categories in grouped.items()})
+        return cls(index)
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({str(image_id): sorted(categories) for image_id, categories in self.objects.items()}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ChairIndex":
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls({int(image_id): frozenset(categories) for image_id, categories in data.items()})
+
+    @classmethod
+    def load_or_build(cls, index_path: str, instances_path: str, captions_path: Optional[str] = None) -> "ChairIndex":
+        """索引文件存在且比标注文件新时直接读取，否则重新构建并保存"""
+        sources = [path for path in (instances_path, captions_path) if path is not None]
+        if osp.exists(index_path) and all(osp.getmtime(index_path) >= osp.getmtime(path) for path in sources):
+            return cls.load(index_path)
+        index = cls.from_coco(instances_path, captions_path)
+        index.save(index_path)
+        return index
+
+
+def compute_chair(captions: pd.DataFrame, index: ChairIndex, matcher: Optional[ObjectMatcher] = None,
+                  image_col: str = "image_id", caption_col: str = "caption") -> Tuple[Dict[str, float], pd.DataFrame]:
+    """
+    计算CHAIR-i和CHAIR-s
+    每条描述中同一物体只计一次（与原始实现一致）
+    Returns:
+        (summary, per_caption): 汇总指标以及每条描述的提及物体、幻觉物体
+    """
+    matcher = matcher or ObjectMatcher()
+    captions = captions.reset_index(drop=True)
+    found = matcher.find_all(captions[caption_col].tolist())
+    found = found.drop_duplicates(["text_idx", "category"])
+    image_ids = captions[image_col].to_numpy()
+    found["image_id"] = image_ids[found["text_idx"].to_numpy()]
+    found["hallucinated"] = np.array([category not in index.get(image_id) for image_id, category in zip(found["image_id"], found["category"])],
+                                     dtype=bool)
+
+    grouped = found.groupby("text_idx")
+    num_mentioned = grouped.size().reindex(captions.index, fill_value=0)
+    num_hallucinated = grouped["hallucinated"].sum().reindex(captions.index, fill_value=0)
+    per_caption = captions.assign(
+        mentioned=grouped["category"].agg(sorted).reindex(captions.index),
+        hallucinated=found.loc[found["hallucinated"]].groupby("text_idx")["category"].agg(sorted).reindex(captions.index),
+        num_mentioned=num_mentioned.to_numpy(),
+        num_hallucinated=num_hallucinated.to_numpy(),
+    )
+    for column in ["mentioned", "hallucinated"]:
+        per_caption[column] = per_caption[column].apply(lambda value: value if isinstance(value, list) else [])
+
+    # 召回率：描述中提到的真值物体占全部真值物体的比例
+    num_gt = np.fromiter((len(index.get(image_id)) for image_id in image_ids), dtype=np.int64, count=len(image_ids))
+    total_mentioned = int(num_mentioned.sum())
+    summary = {
+        "num_captions": len(captions),
+        "num_mentioned": total_mentioned,
+        "num_hallucinated": int(num_hallucinated.sum()),
+        "chair_i": float(num_hallucinated.sum() / total_mentioned) if total_mentioned else 0.0,
+        "chair_s": float((num_hallucinated > 0).mean()) if len(captions) else 0.0,
+        "recall": float((num_mentioned - num_hallucinated).sum() / num_gt.sum()) if num_gt.sum() else 0.0,
+        "missing_images": int(sum(image_id not in index for image_id in image_ids)),
+    }
+    return summary, per_caption
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--annotations_dir", type=str, default=osp.join(COCO_DIR, "annotations"))
+    parser.add_argument("--split", type=str, default="val2014")
+    parser.add_argument("--index", type=str, default=osp.join(COCO_DIR, "chair_index.json"), help="Precomputed ground-truth object index")
+    parser.add_argument("--captions", type=str, required=True, help="CSV/JSON(L) file with generated captions")
+    parser.add_argument("--image_col", type=str, default="image_id")
+    parser.add_argument("--caption_col", type=str, default="caption")
+    parser.add_argument("--output", type=str, default=None, help="Save per-caption results to this CSV file")
+    args = parser.parse_args()
+
+    index = ChairIndex.load_or_build(
+        args.index,
+        osp.join(args.annotations_dir, f"instances_{args.split}.json"),
+        osp.join(args.annotations_dir, f"captions_{args.split}.json"),
+    )
+    if args.captions.endswith(".csv"):
+        captions = pd.read_csv(args.captions)
+    else:
+        captions = pd.read_json(args.captions, lines=args.captions.endswith(".jsonl"))
+    start_time = time.perf_counter()
+    summary, per_caption = compute_chair(captions, index, image_col=args.image_col, caption_col=args.caption_col)
+    elapsed = time.perf_counter() - start_time
+    print(f"CHAIR-i: {summary['chair_i']:.4f}  CHAIR-s: {summary['chair_s']:.4f}  Recall: {summary['recall']:.4f}")
+    print(f"{summary['num_captions']} captions, {summary['num_mentioned']} object mentions, "
+          f"{summary['num_hallucinated']} hallucinated, {summary['missing_images']} images not in index ({elapsed:.2f}s)")
+    if args.output:
+        per_caption.to_csv(args.output, index=False)
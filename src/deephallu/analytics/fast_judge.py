@@ -0,0 +1,207 @@
+"""
+基于规则的快速答案分类
+MME的问题都是yes/no问题，大部分生成答案以明确的"Yes,"或"No,"开头，无需请求LLM Judge。
+这里用预编译的正则对归一化后的答案开头做匹配并给出置信度，只有不明确的答案才交给llm_judge。
+
+用法（与之前LLM评估过的results.csv对比一致性）:
+    python -m deephallu.analytics.fast_judge --results_dir results
+"""
+
+import argparse
+import os.path as osp
+import re
+import unicodedata
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+HERE = osp.dirname(osp.abspath(__file__))
+RESULTS_DIR = osp.join(HERE, "..", "..", "..", "results")
+
+# 去掉开头的markdown/引号/空白等修饰
+_LEADING_NOISE = r"^[\s\"'`*_>#\-\(\[]*"
+# 答案开头是yes/no且紧跟标点或结束
+STRONG_PATTERN = re.compile(_LEADING_NOISE + r"(yes|no)(?:[\s\"'`*_\)\]]*)(?:[,.!;:]|$)", re.IGNORECASE)
+# 答案开头是yes/no后面直接跟其他单词
+WEAK_PATTERN = re.compile(_LEADING_NOISE + r"(yes|no)\b", re.IGNORECASE)
+# 同时出现yes和no或明确表示无法判断的答案交给LLM
+AMBIGUOUS_PATTERN = re.compile(
+    r"\byes\b[^.]{0,20}\bno\b|\bno\b[^.]{0,20}\byes\b|\b(?:not sure|unclear|cannot (?:be )?determine|can't (?:be )?determine|unable to|impossible to (?:tell|determine))\b",
+    re.IGNORECASE,
+)
+# 问题询问的实体（作者、导演、收藏地、标题、地标、人名）
+ENTITY_QUESTION_PATTERN = re.compile(
+    r"^\s*is (?:this (?:artwork|movie) (?:created by|directed by|displayed in|titled)"
+    r"|this (?:a|an) (?:picture|photo|image) of"
+    r"|the (?:actor|person) inside the red bounding box named)\s+(.+?)\s*\?",
+    re.IGNORECASE,
+)
+# 问题询问的具体值：引号中的文字或问号前的数字（取最后一个）
+VALUE_QUESTION_PATTERN = re.compile(r"\"([^\"]+)\"|“([^”]+)”|'([^']+)'|(\d+(?:\.\d+)?)\s*\?")
+# "Yes, this is X, also known as Y"：把询问的实体认作另一个实体
+RENAMED_PATTERN = re.compile(r"\balso (?:known|called) as\b", re.IGNORECASE)
+NEGATION_PATTERN = re.compile(r"\b(?:not|never|neither|nor|instead|rather than|but|however)\b|n't", re.IGNORECASE)
+
+# 置信度用作排序标签和fast_judge的阈值，数值取各类答案与LLM Judge一致率的保守估计：
+# calibrate(results, by="category")按类别分组后，至少有5个样本的类别中最低的一致率（向下取整）。
+# HEDGED和矛盾答案的规则本身就是根据results/results.csv上的不一致样本写出来的，
+# 整体一致率（STRONG 98.7%、HEDGED 69.4%）是样本内的数字，按类别取最低值也不是真正的held-out估计，
+# 用于新模型的结果前应在其他数据上重新运行calibrate()；WEAK在该数据上没有样本，只是排在阈值之下的标签
+STRONG_CONFIDENCE = 0.96
+# Yes开头，但后文没有提到问题询问的实体，或把它说成另一个实体（"Yes, ... by X" 回答 "created by Y?"）
+HEDGED_CONFIDENCE = 0.65
+WEAK_CONFIDENCE = 0.5
+
+
+def _words(text: str) -> set:
+    """去掉重音符号后长度不少于3的小写单词"""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return {word for word in re.findall(r"[a-z0-9]+", text.lower()) if len(word) >= 3}
+
+
+def _mentions_entity(question: str, head: str) -> bool:
+    """答案开头是否提到了问题询问的实体（问题不是这类问题时为True）"""
+    match = ENTITY_QUESTION_PATTERN.search(question)
+    return match is None or _words(match.group(1)) <= _words(head)
+
+
+def _restates_value(question: str, first_sentence: str) -> bool:
+    """"No, the answer is 36." 回答 "Is the answer 36?"：否定后又不加否定地复述了询问的值"""
+    matches = list(VALUE_QUESTION_PATTERN.finditer(question))
+    if not matches:
+        return False
+    value = next(group for group in matches[-1].groups() if group)
+    body = WEAK_PATTERN.sub("", first_sentence, count=1)
+    pattern = r"(?<!\w)" + re.escape(value) + r"(?!\w)"
+    return re.search(pattern, body, re.IGNORECASE) is not None and NEGATION_PATTERN.search(body) is None
+
+
+def classify_answers(generated_texts: pd.Series, questions: Optional[pd.Series] = None) -> pd.DataFrame:
+    """
+    对生成答案做yes/no分类
+    Args:
+        generated_texts: 生成答案
+        questions: 对应的问题，给出时检查答案后文是否与开头的yes/no矛盾
+    Returns:
+        pd.DataFrame: 与输入同索引，包含
+            - label: 1表示yes，0表示no，-1表示不明确
+            - confidence: 置信度，不明确时为0
+    """
+    texts = generated_texts.fillna("").astype(str)
+    strong = texts.str.extract(STRONG_PATTERN, expand=False).str.lower()
+    weak = texts.str.extract(WEAK_PATTERN, expand=False).str.lower()
+    # 只看开头的一句话判断是否自相矛盾
+    first_sentence = texts.str.slice(0, 120)
+    ambiguous = first_sentence.str.contains(AMBIGUOUS_PATTERN, na=False).to_numpy()
+
+    word = strong.fillna(weak)
+    label = np.select([word == "yes", word == "no"], [1, 0], default=-1)
+    confidence = np.where(strong.notna(), STRONG_CONFIDENCE, np.where(weak.notna(), WEAK_CONFIDENCE, 0.0))
+    if questions is not None:
+        questions = questions.fillna("").astype(str).to_numpy()
+        head = texts.str.slice(0, 240)
+        hedged = (label == 1) & (head.str.contains(RENAMED_PATTERN, na=False).to_numpy() | np.array(
+            [not _mentions_entity(question, text) for question, text in zip(questions, head)], dtype=bool))
+        confidence = np.where(hedged, np.minimum(confidence, HEDGED_CONFIDENCE), confidence)
+        sentence = texts.str.extract(r"^([^.!?]*)", expand=False).fillna("")
+        contradicted = (label == 0) & np.array(
+            [_restates_value(question, text) for question, text in zip(questions, sentence)], dtype=bool)
+        ambiguous = ambiguous | contradicted
+    label = np.where(ambiguous, -1, label)
+    confidence = np.where(label == -1, 0.0, confidence)
+    return pd.DataFrame({"label": label, "confidence": confidence}, index=generated_texts.index)
+
+
+def fast_judge(results: pd.DataFrame, min_confidence: float = STRONG_CONFIDENCE) -> pd.DataFrame:
+    """
+    对置信度不低于min_confidence的样本直接给出判断
+    Returns:
+        pd.DataFrame: 与results同索引，包含label、confidence、judgment（1/0，未判断为-1）和decided（是否已判断）
+    """
+    questions = results["question"] if "question" in results.columns else None
+    classified = classify_answers(results["generated_text"], questions)
+    answer_code = (results["answer"].astype(str).str.strip().str.lower() == "yes").astype(int)
+    decided = (classified["label"] != -1) & (classified["confidence"] >= min_confidence)
+    classified["judgment"] = np.where(decided, (classified["label"] == answer_code).astype(int), -1)
+    classified["decided"] = decided
+    return classified
+
+
+def agreement_report(results: pd.DataFrame, min_confidence: float = STRONG_CONFIDENCE) -> Dict[str, object]:
+    """
+    与之前LLM评估的结果（generated_text_code列）比较一致性
+    Returns:
+        Dict: 覆盖率、一致率、混淆表以及各类别的一致率
+    """
+    judged = fast_judge(results, min_confidence)
+    previous = results["generated_text_code"]
+    comparable = judged["decided"] & previous.isin([0, 1])
+    agree = judged.loc[comparable, "label"] == previous[comparable]
+    per_category = agree.groupby(results.loc[comparable, "category"]).mean()
+    return {
+        "total": len(results),
+        "decided": int(judged["decided"].sum()),
+        "coverage": float(judged["decided"].mean()) if len(results) else 0.0,
+        "compared": int(comparable.sum()),
+        "agreement": float(agree.mean()) if comparable.any() else float("nan"),
+        "confusion": pd.crosstab(judged.loc[comparable, "label"], previous[comparable], rownames=["fast"], colnames=["llm"]),
+        "per_category": per_category,
+        "disagreements": results.loc[agree[~agree].index, ["sample_id", "category", "generated_text", "generated_text_code"]],
+    }
+
+
+def calibrate(results: pd.DataFrame, by: Optional[str] = None) -> pd.DataFrame:
+    """
+    按置信度分组统计与之前LLM评估结果的一致率，用于设定STRONG/HEDGED/WEAK_CONFIDENCE
+    Args:
+        by: 额外的分组列（如category），给出时每个(置信度, 分组)一行
+    Returns:
+        pd.DataFrame: 每个置信度（或置信度和分组）一行，包含samples和agreement
+    """
+    questions = results["question"] if "question" in results.columns else None
+    classified = classify_answers(results["generated_text"], questions)
+    previous = results["generated_text_code"]
+    comparable = (classified["label"] != -1) & previous.isin([0, 1])
+    agree = (classified.loc[comparable, "label"] == previous[comparable]).rename("agree")
+    keys = [classified.loc[comparable, "confidence"]]
+    if by is not None:
+        keys.append(results.loc[comparable, by])
+    grouped = agree.groupby(keys)
+    return pd.DataFrame({"samples": grouped.size(), "agreement": grouped.mean()}).sort_index(ascending=[False] + [True] * (len(keys) - 1))
+
+
+def worst_group_agreement(table: pd.DataFrame, min_samples: int = 5) -> pd.DataFrame:
+    """
+    calibrate(results, by=...)的结果中，每个置信度下样本数不少于min_samples的分组里最低的一致率，
+    作为换一种题型（类别）时一致率的保守估计
+    Returns:
+        pd.DataFrame: 每个置信度一行，包含group、samples和agreement
+    """
+    table = table[table["samples"] >= min_samples].reset_index()
+    confidence, group = table.columns[:2]
+    worst = table.loc[table.groupby(confidence)["agreement"].idxmin()]
+    return worst.rename(columns={group: "group"}).set_index(confidence).sort_index(ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results_dir", type=str, default=RESULTS_DIR)
+    parser.add_argument("--min_confidence", type=float, default=STRONG_CONFIDENCE)
+    args = parser.parse_args()
+    results = pd.read_csv(osp.join(args.results_dir, "results.csv"))
+    report = agreement_report(results, args.min_confidence)
+    print(f"Decided locally: {report['decided']}/{report['total']} ({report['coverage']:.1%}), "
+          f"remote judge calls avoided: {report['decided']}")
+    print(f"Agreement with previous judgments: {report['agreement']:.4f} on {report['compared']} samples")
+    print("\nConfusion (fast vs. llm generated_text_code):")
+    print(report["confusion"])
+    print("\nAgreement by confidence (in-sample, the rules were written from these results):")
+    print(calibrate(results).to_string())
+    print("\nLowest agreement over categories (basis of the *_CONFIDENCE constants):")
+    print(worst_group_agreement(calibrate(results, by="category")).to_string())
+    print("\nAgreement by category:")
+    print(report["per_category"].to_string())
+    if len(report["disagreements"]):
+        print("\nDisagreements:")
+        print(report["disagreements"].to_string(max_colwidth=80))
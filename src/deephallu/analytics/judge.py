@@ -0,0 +1,181 @@
+"""
+异步LLM Judge客户端
+通过连接池复用HTTP连接，限制同时在途的请求数量，每个请求带超时，
+失败时按指数退避加随机抖动重试，并输出进度与吞吐量
+"""
+
+import asyncio
+import hashlib
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_JUDGE_URL = "http://ollama.warhol.informatik.rwth-aachen.de/api/chat"
+DEFAULT_JUDGE_MODEL = "gpt-oss:120b"
+
+JUDGE_PROMPT_TEMPLATE = """Please evaluate if the generated answer is correct.
+
+    Question: {question}
+    Ground Truth: {answer}
+    Generated Answer: {generated_text}
+
+    Please output in the following format:
+    - Judgment: <judgment>Correct/Incorrect/Unknown</judgment>
+    - Reasoning: <reasoning>Your analysis</reasoning>
+    - Suggestions: <suggestions>How to improve, optional</suggestions>
+    """
+# prompt模板的版本号，模板修改后缓存中的旧结果自动失效
+JUDGE_PROMPT_VERSION = hashlib.sha1(JUDGE_PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+
+# 这些状态码视为临时错误，可以重试
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def build_judge_payload(question: str, answer: str, generated_text: str, model: str = DEFAULT_JUDGE_MODEL) -> dict:
+    """构造Ollama兼容的/api/chat请求体"""
+    judge_prompt = JUDGE_PROMPT_TEMPLATE.format(question=question, answer=answer, generated_text=generated_text)
+    return {
+        "model": model,
+        "messages": [
+            { "role": "user", "content": judge_prompt }
+        ],
+        "stream": False
+    }
+
+
+class JudgeProgress:
+    """统计已完成的请求数量和吞吐量，每隔report_every个打印一次"""
+    def __init__(self, total: int, report_every: int = 20):
+        self.total = total
+        self.report_every = report_every
+        self.completed = 0
+        self.failed = 0
+        self.start_time = time.perf_counter()
+
+    def update(self, success: bool):
+        self.completed += 1
+        if not success:
+            self.failed += 1
+        if self.completed % self.report_every == 0 or self.completed == self.total:
+            print(self.summary())
+
+    @property
+    def throughput(self) -> float:
+        elapsed = time.perf_counter() - self.start_time
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        throughput = self.throughput
+        eta = (self.total - self.completed) / throughput if throughput > 0 else float("inf")
+        return (f"Judged {self.completed}/{self.total} samples "
+                f"({self.failed} failed, {throughput:.2f} samples/s, ETA {eta:.0f}s)")
+
+
+class AsyncJudgeClient:
+    """
+    异步LLM Judge客户端
+    Args:
+        url: Ollama兼容的chat接口地址
+        model: Judge模型
+        max_concurrency: 最多同时在途的请求数量（同时也是连接池大小）
+        timeout: 单个请求的超时时间（秒）
+        max_retries: 最多重试次数
+        backoff_base: 指数退避的基数（秒）
+        backoff_max: 单次退避等待的上限（秒）
+    """
+    def __init__(self, url: str = DEFAULT_JUDGE_URL, model: str = DEFAULT_JUDGE_MODEL, max_concurrency: int = 8,
+                 timeout: float = 120.0, max_retries: int = 5, backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.url = url
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="judge")
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _post(self, payload: dict) -> str:
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise requests.exceptions.HTTPError(f"Retryable status {response.status_code}", response=response)
+        response.raise_for_status()
+        return response.json()["message"]["content"]
+
+    def _backoff(self, attempt: int) -> float:
+        # 指数退避 + 随机抖动，避免大量请求同时重试
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    async def judge(self, question: str, answer: str, generated_text: str) -> Optional[str]:
+        """
+        评估单个样本，返回Judge模型的原始回答；重试用尽后返回None
+        """
+        payload = build_judge_payload(question, answer, generated_text, self.model)
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await loop.run_in_executor(self._executor, self._post, payload)
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                # HTTPError中4xx（除408/429）属于请求本身的问题，不再重试
+                response = getattr(e, "response", None)
+                if response is not None and response.status_code not in RETRYABLE_STATUS_CODES:
+                    print(f"Judge request failed: {e}")
+                    return None
+                if attempt == self.max_retries:
+                    print(f"Judge request failed after {self.max_retries + 1} attempts: {e}")
+                    return None
+                await asyncio.sleep(self._backoff(attempt))
+        return None
+
+    async def judge_many(self, samples: Sequence[Dict[str, str]], on_result: Optional[Callable[[int, Optional[str]], None]] = None,
+                         report_every: int = 20) -> List[Optional[str]]:
+        """
+        并发评估多个样本
+        Args:
+            samples: 每个元素包含question、answer、generated_text
+            on_result: 每完成一个样本时的回调(index, response)，按完成顺序调用
+            report_every: 每完成多少个样本打印一次进度
+        Returns:
+            List[Optional[str]]: 与samples顺序一致的Judge回答
+        """
+        responses: List[Optional[str]] = [None] * len(samples)
+        progress = JudgeProgress(len(samples), report_every)
+        # 信号量限制同时处理（包括等待重试）的样本数量
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_one(index: int, sample: Dict[str, str]):
+            async with semaphore:
+                response = await self.judge(sample["question"], sample["answer"], sample["generated_text"])
+            responses[index] = response
+            progress.update(response is not None)
+            if on_result is not None:
+                on_result(index, response)
+
+        await asyncio.gather(*(run_one(index, sample) for index, sample in enumerate(samples)))
+        return responses
+
+
+def judge_samples(samples: Sequence[Dict[str, str]], on_result: Optional[Callable[[int, Optional[str]], None]] = None, **client_kwargs) -> List[Optional[str]]:
+    """同步接口：用AsyncJudgeClient并发评估所有样本"""
+    async def run():
+        with AsyncJudgeClient(**client_kwargs) as client:
+            return await client.judge_many(samples, on_result=on_result)
+    return asyncio.run(run())
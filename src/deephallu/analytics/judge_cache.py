@@ -0,0 +1,174 @@
+"""
+LLM Judge结果的持久化缓存
+使用SQLite保存Judge回答，key由Judge模型、prompt模板版本以及归一化后的
+(question, answer, generated_text)哈希组成，只有未命中的样本才需要请求LLM。
+数据库使用WAL模式并设置busy_timeout，多个评估进程可以同时读写同一个缓存文件。
+
+用法:
+    python -m deephallu.analytics.judge_cache --db results/judge_cache.sqlite --stats
+    python -m deephallu.analytics.judge_cache --db results/judge_cache.sqlite --invalidate --model gpt-oss:120b
+"""
+
+import argparse
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Sequence
+
+from deephallu.analytics.judge import DEFAULT_JUDGE_MODEL, JUDGE_PROMPT_VERSION
+
+_WHITESPACE = re.compile(r"\s+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS judge_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    template_version TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_judge_cache_model ON judge_cache (model, template_version);
+"""
+
+
+def normalize_text(text) -> str:
+    """Unicode归一化、去除首尾空白、合并连续空白并忽略大小写"""
+    text = unicodedata.normalize("NFKC", str(text))
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def make_cache_key(question: str, answer: str, generated_text: str, model: str, template_version: str) -> str:
+    payload = "\x1f".join([model, template_version, normalize_text(question), normalize_text(answer), normalize_text(generated_text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class JudgeCache:
+    """
+    SQLite缓存
+    Args:
+        db_path: 数据库文件路径
+        model: Judge模型，作为key的一部分
+        template_version: prompt模板版本，模板修改后旧结果自动失效
+        timeout: 等待其他进程释放写锁的最长时间（秒）
+    """
+    def __init__(self, db_path: str, model: str = DEFAULT_JUDGE_MODEL, template_version: str = JUDGE_PROMPT_VERSION, timeout: float = 30.0):
+        self.db_path = db_path
+        self.model = model
+        self.template_version = template_version
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def key(self, question: str, answer: str, generated_text: str) -> str:
+        return make_cache_key(question, answer, generated_text, self.model, self.template_version)
+
+    def get(self, question: str, answer: str, generated_text: str) -> Optional[str]:
+        return self.get_many([{"question": question, "answer": answer, "generated_text": generated_text}])[0]
+
+    def get_many(self, samples: Sequence[Dict[str, str]], chunk_size: int = 500) -> List[Optional[str]]:
+        """批量查询，返回与samples顺序一致的缓存回答（未命中为None）"""
+        keys = [self.key(s["question"], s["answer"], s["generated_text"]) for s in samples]
+        found = {}
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), chunk_size):
+                chunk = unique_keys[start:start + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT key, response FROM judge_cache WHERE key IN ({placeholders})", chunk)
+                found.update(rows.fetchall())
+            responses = [found.get(key) for key in keys]
+            hits = sum(response is not None for response in responses)
+            # 计数器在锁内更新，多线程并发查询时不会丢失计数
+            self.hits += hits
+            self.misses += len(responses) - hits
+        return responses
+
+    def put(self, question: str, answer: str, generated_text: str, response: str):
+        self.put_many([{"question": question, "answer": answer, "generated_text": generated_text}], [response])
+
+    def put_many(self, samples: Sequence[Dict[str, str]], responses: Sequence[Optional[str]]):
+        """批量写入，response为None的样本（请求失败）不缓存"""
+        now = time.time()
+        rows = [
+            (self.key(s["question"], s["answer"], s["generated_text"]), self.model, self.template_version, response, now)
+            for s, response in zip(samples, responses) if response is not None
+        ]
+        if not rows:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO judge_cache VALUES (?, ?, ?, ?, ?)", rows)
+
+    def invalidate(self, model: Optional[str] = None, template_version: Optional[str] = None) -> int:
+        """删除指定模型和/或模板版本的缓存（都为None时清空全部），返回删除的条数"""
+        conditions, params = [], []
+        if model is not None:
+            conditions.append("model = ?")
+            params.append(model)
+        if template_version is not None:
+            conditions.append("template_version = ?")
+            params.append(template_version)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(f"DELETE FROM judge_cache{where}", params)
+        return cursor.rowcount
+
+    @property
+    def hit_rate(self) -> float:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return hits / total if total > 0 else 0.0
+
+    def stats(self) -> Dict[str, object]:
+        """本次会话的命中统计以及数据库中各模型/模板版本的条目数"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT model, template_version, COUNT(*) FROM judge_cache GROUP BY model, template_version"
+            ).fetchall()
+            hits, misses = self.hits, self.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses > 0 else 0.0,
+            "entries": {f"{model}@{version}": count for model, version, count in rows},
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", type=str, required=True, help="Path of the judge cache database")
+    parser.add_argument("--stats", action="store_true", help="Print the number of cached verdicts per model and template version")
+    parser.add_argument("--invalidate", action="store_true", help="Delete cached verdicts matching --model/--template_version")
+    parser.add_argument("--model", type=str, default=None)
+    parser.add_argument("--template_version", type=str, default=None)
+    parser.add_argument("--all", action="store_true", help="Allow --invalidate without --model/--template_version")
+    args = parser.parse_args()
+    with JudgeCache(args.db) as cache:
+        if args.invalidate:
+            if args.model is None and args.template_version is None and not args.all:
+                parser.error("--invalidate needs --model and/or --template_version (or --all)")
+            deleted = cache.invalidate(args.model, args.template_version)
+            print(f"Deleted {deleted} cached verdicts")
+        if args.stats or not args.invalidate:
+            for name, count in cache.stats()["entries"].items():
+                print(f"{name}: {count}")
@@ -0,0 +1,224 @@
+"""
+评估指标计算
+把一个或多个results.csv（可以来自不同的run/模型）一次分组聚合成一张指标表，每行对应一个(run, category)，
+category为"overall"的行是该run的整体指标。表中包含：
+    - 混淆计数 tp/fp/fn/tn、预测与真实标签分布，以及accuracy/precision/recall/F1
+    - 按判断结果（correct: judgment=1，hallucinated: judgment=0）统计的avg_entropy摘要（均值、标准差、四分位数、箱线图须，
+      以及须以外的离群点，JSON列表）
+plot.py中的所有图都基于这张表绘制。
+
+用法:
+    python -m deephallu.analytics.metrics --results results/results.csv other_run/results.csv --output metrics.csv
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import os.path as osp
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+HERE = osp.dirname(osp.abspath(__file__))
+RESULTS_DIR = osp.join(HERE, "..", "..", "..", "results")
+
+# 整体指标行的category取值
+OVERALL = "overall"
+# 单个结果文件没有run列时使用的run名称
+DEFAULT_RUN = "default"
+# 熵统计按judgment分组
+ENTROPY_STATES = {1: "correct", 0: "hallucinated"}
+# 指标表的版本号，修改计算方式后缓存自动失效
+METRICS_VERSION = 2
+
+COUNT_COLUMNS = ["n", "tp", "fp", "fn", "tn", "correct", "pred_0", "pred_1", "actual_0", "actual_1"]
+RATE_COLUMNS = ["accuracy", "precision", "recall", "f1"]
+ENTROPY_STATS = ["count", "mean", "std", "median", "q1", "q3", "whislo", "whishi", "fliers"]
+# 每组最多保存的离群点数量，超过时在排序后的离群点中均匀抽取（保留两端的最值）
+MAX_FLIERS = 1000
+
+
+def _stack_overall(results: pd.DataFrame) -> pd.DataFrame:
+    """在每个run的样本前再复制一份category为overall的样本，使整体指标和分类别指标在同一次分组中算出"""
+    return pd.concat([results.assign(category=OVERALL), results], ignore_index=True)
+
+
+def _confusion_counts(stacked: pd.DataFrame, run_col: str) -> pd.DataFrame:
+    pred = stacked["generated_text_code"]
+    actual = stacked["answer_code"]
+    indicators = pd.DataFrame({
+        "n": np.ones(len(stacked), dtype=np.int64),
+        "tp": (pred == 1) & (actual == 1),
+        "fp": (pred == 1) & (actual == 0),
+        "fn": (pred == 0) & (actual == 1),
+        "tn": (pred == 0) & (actual == 0),
+        "correct": pred == actual,
+        "pred_0": pred == 0,
+        "pred_1": pred == 1,
+        "actual_0": actual == 0,
+        "actual_1": actual == 1,
+    }).astype(np.int64)
+    return indicators.groupby([stacked[run_col], stacked["category"]], sort=False).sum()
+
+
+def _rates(counts: pd.DataFrame) -> pd.DataFrame:
+    """由混淆计数计算accuracy/precision/recall/F1，分母为0时记为0"""
+    def safe_div(num, den):
+        return (num / den.where(den > 0)).fillna(0.0)
+    precision = safe_div(counts["tp"], counts["tp"] + counts["fp"])
+    recall = safe_div(counts["tp"], counts["tp"] + counts["fn"])
+    return pd.DataFrame({
+        "accuracy": safe_div(counts["correct"], counts["n"]),
+        "precision": precision,
+        "recall": recall,
+        "f1": safe_div(2 * precision * recall, precision + recall),
+    })
+
+
+def _entropy_summary(stacked: pd.DataFrame, run_col: str) -> pd.DataFrame:
+    """按(run, category, judgment)统计avg_entropy，箱线图须的计算方式与matplotlib一致（1.5倍IQR内的最值）"""
+    valid = stacked["judgment"].isin(list(ENTROPY_STATES)) & stacked["avg_entropy"].notna()
+    sub = stacked.loc[valid, [run_col, "category", "avg_entropy"]].assign(state=stacked.loc[valid, "judgment"].map(ENTROPY_STATES))
+    keys = [run_col, "category", "state"]
+    grouped = sub.groupby(keys, sort=False)["avg_entropy"]
+    summary = grouped.agg(["count", "mean", "std", "median"])
+    summary["q1"] = grouped.quantile(0.25)
+    summary["q3"] = grouped.quantile(0.75)
+    # 把四分位数广播回每个样本，筛出1.5倍IQR以内的值再取最值
+    q1 = grouped.transform("quantile", 0.25)
+    q3 = grouped.transform("quantile", 0.75)
+    entropy = sub["avg_entropy"]
+    by = [sub[k] for k in keys]
+    summary["whislo"] = entropy.where(entropy >= q1 - 1.5 * (q3 - q1)).groupby(by, sort=False).min()
+    summary["whishi"] = entropy.where(entropy <= q3 + 1.5 * (q3 - q1)).groupby(by, sort=False).max()
+    # 须以外的离群点（plt.boxplot默认绘制的点），以JSON列表保存，指标表缓存为CSV时不变
+    outside = (entropy < q1 - 1.5 * (q3 - q1)) | (entropy > q3 + 1.5 * (q3 - q1))
+    fliers = entropy[outside].groupby([key[outside] for key in by], sort=False).agg(_fliers_json)
+    summary["fliers"] = fliers.reindex(summary.index).fillna("[]")
+    # 宽表：每个state一组列，例如entropy_correct_mean
+    summary = summary.unstack("state")
+    summary.columns = [f"entropy_{state}_{stat}" for stat, state in summary.columns]
+    columns = [f"entropy_{state}_{stat}" for state in ENTROPY_STATES.values() for stat in ENTROPY_STATS]
+    return summary.reindex(columns=columns)
+
+
+def _fliers_json(values: pd.Series) -> str:
+    values = np.sort(values.to_numpy(dtype=np.float64))
+    if len(values) > MAX_FLIERS:
+        values = values[np.unique(np.linspace(0, len(values) - 1, MAX_FLIERS).round().astype(np.int64))]
+    return json.dumps(values.tolist())
+
+
+def compute_metrics(results: pd.DataFrame, run_col: str = "run") -> pd.DataFrame:
+    """
+    计算指标表
+    Args:
+        results: 包含category、answer_code、generated_text_code、judgment、avg_entropy列的结果，
+            可以包含run_col列以同时计算多个run
+        run_col: 区分不同run/模型的列名，不存在时所有样本属于DEFAULT_RUN
+    Returns:
+        pd.DataFrame: 每行一个(run, category)，列为run_col、category、COUNT_COLUMNS、RATE_COLUMNS以及熵统计
+    """
+    if run_col not in results.columns:
+        results = results.assign(**{run_col: DEFAULT_RUN})
+    stacked = _stack_overall(results)
+    counts = _confusion_counts(stacked, run_col)
+    metrics = pd.concat([counts, _rates(counts), _entropy_summary(stacked, run_col)], axis=1)
+    metrics.index.names = [run_col, "category"]
+    metrics = metrics.reset_index()
+    metrics[COUNT_COLUMNS] = metrics[COUNT_COLUMNS].fillna(0).astype(np.int64)
+    # 保持run的出现顺序，每个run内overall在前，其余类别按出现顺序
+    run_order = {run: i for i, run in enumerate(pd.unique(results[run_col]))}
+    return metrics.sort_values(run_col, key=lambda s: s.map(run_order), kind="stable", ignore_index=True)
+
+
+def default_run_names(paths: Sequence[str]) -> List[str]:
+    """默认用results.csv所在目录名作为run名称，重名时使用完整路径"""
+    names = [osp.basename(osp.dirname(osp.abspath(path))) or path for path in paths]
+    if len(set(names)) < len(names):
+        names = [osp.abspath(path) for path in paths]
+    return names
+
+
+def _cache_key(paths: Sequence[str], runs: Sequence[str]) -> str:
+    signature = [METRICS_VERSION]
+    for path, run in zip(paths, runs):
+        stat = os.stat(path)
+        signature.append([osp.abspath(path), run, stat.st_mtime_ns, stat.st_size])
+    return hashlib.sha1(json.dumps(signature).encode("utf-8")).hexdigest()[:16]
+
+
+def load_results(paths: Sequence[str], runs: Optional[Sequence[str]] = None, run_col: str = "run") -> pd.DataFrame:
+    """读取多个results.csv并用run_col列区分"""
+    runs = list(runs) if runs is not None else default_run_names(paths)
+    if len(runs) != len(paths):
+        raise ValueError(f"Got {len(runs)} run names for {len(paths)} result files")
+    frames = [pd.read_csv(path).assign(**{run_col: run}) for path, run in zip(paths, runs)]
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_metrics(paths: Sequence[str], runs: Optional[Sequence[str]] = None, cache_dir: Optional[str] = None, run_col: str = "run") -> pd.DataFrame:
+    """
+    读取多个results.csv并计算指标表
+    Args:
+        paths: results.csv路径
+        runs: 每个文件对应的run名称，默认使用所在目录名
+        cache_dir: 指标表缓存目录，结果文件未修改时直接读取缓存
+    """
+    runs = list(runs) if runs is not None else default_run_names(paths)
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = osp.join(cache_dir, f"metrics_{_cache_key(paths, runs)}.csv")
+        if osp.exists(cache_path):
+            return pd.read_csv(cache_path, dtype={run_col: str, "category": str})
+    metrics = compute_metrics(load_results(paths, runs, run_col), run_col)
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        metrics.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    return metrics
+
+
+def confusion_matrix(row: pd.Series) -> pd.DataFrame:
+    """由指标表的一行得到2x2混淆矩阵，行为预测标签（generated_text_code），列为真实标签（answer_code）"""
+    return pd.DataFrame(
+        [[row["tn"], row["fn"]], [row["fp"], row["tp"]]],
+        index=pd.Index([0, 1], name="generated_text_code"),
+        columns=pd.Index([0, 1], name="answer_code"),
+    ).astype(np.int64)
+
+
+def entropy_box_stats(row: pd.Series, labels: Optional[Dict[str, str]] = None) -> List[dict]:
+    """由指标表的一行得到matplotlib Axes.bxp所需的箱线图统计（离群点来自fliers列）"""
+    labels = labels or {}
+    stats = []
+    for state in ENTROPY_STATES.values():
+        prefix = f"entropy_{state}_"
+        stats.append({
+            "label": labels.get(state, state),
+            "med": row[prefix + "median"],
+            "q1": row[prefix + "q1"],
+            "q3": row[prefix + "q3"],
+            "whislo": row[prefix + "whislo"],
+            "whishi": row[prefix + "whishi"],
+            "mean": row[prefix + "mean"],
+            "fliers": json.loads(row[prefix + "fliers"]) if isinstance(row.get(prefix + "fliers"), str) else [],
+        })
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", type=str, nargs="+", default=[osp.join(RESULTS_DIR, "results.csv")], help="One or more results.csv files")
+    parser.add_argument("--runs", type=str, nargs="+", default=None, help="Run names for the result files (default: directory names)")
+    parser.add_argument("--cache_dir", type=str, default=None)
+    parser.add_argument("--output", type=str, default=None, help="Save the metrics table to this CSV file")
+    args = parser.parse_args()
+    metrics = load_metrics(args.results, args.runs, args.cache_dir)
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(metrics[["run", "category"] + COUNT_COLUMNS[:5] + RATE_COLUMNS].to_string(index=False, float_format="%.4f"))
+    if args.output:
+        metrics.to_csv(args.output, index=False)
@@ -0,0 +1,181 @@
+"""
+MME官方评分
+MME每张图像有两个问题（一个答案为yes，一个为no）：
+    - acc: 问题级准确率
+    - acc+: 两个问题都回答正确的图像比例
+    - 类别得分 = (acc + acc+) * 100，满分200
+    - perception为10个感知类别得分之和（满分2000），cognition为4个认知类别得分之和（满分800）
+支持同时对多个results.csv评分，并通过按图像重采样的bootstrap给出得分的置信区间。
+
+用法:
+    python -m deephallu.analytics.mme_score --results results/results.csv other_run/results.csv --n_bootstrap 1000
+"""
+
+import argparse
+import json
+import os.path as osp
+import warnings
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from deephallu.analytics.metrics import DEFAULT_RUN, load_results
+
+HERE = osp.dirname(osp.abspath(__file__))
+RESULTS_DIR = osp.join(HERE, "..", "..", "..", "results")
+PREPROCESSED_PATH = osp.join(HERE, "..", "..", "..", "data", "mme", "MME_Benchmark_release_version", "MME_Benchmark", "preprocessed.json")
+
+PERCEPTION_CATEGORIES = ["existence", "count", "position", "color", "posters", "celebrity", "scene", "landmark", "artwork", "OCR"]
+COGNITION_CATEGORIES = ["commonsense_reasoning", "numerical_calculation", "text_translation", "code_reasoning"]
+TASKS = {"perception": PERCEPTION_CATEGORIES, "cognition": COGNITION_CATEGORIES}
+CATEGORY_TASK = {category: task for task, categories in TASKS.items() for category in categories}
+
+
+def attach_image_names(results: pd.DataFrame, preprocessed_path: Optional[str] = PREPROCESSED_PATH, run_col: str = "run") -> pd.DataFrame:
+    """
+    为缺少image_name列的结果（旧版infer.py的输出）补充图像名称
+    优先按sample_id与preprocessed.json中的id关联；找不到时按MME的数据顺序（同一图像的两个问题相邻）
+    在每个类别内两两配对。这种配对只在sample_id按图像排列时正确，因此会发出警告，
+    并统计答案不是一个yes一个no的配对数（MME每张图像恰好各有一个）
+    """
+    if "image_name" in results.columns and results["image_name"].notna().all():
+        return results
+    results = results.reset_index(drop=True)
+    if preprocessed_path is not None and osp.exists(preprocessed_path):
+        with open(preprocessed_path, "r") as f:
+            preprocessed = pd.DataFrame(json.load(f))
+        image_names = preprocessed.drop_duplicates("id").set_index("id")["image_name"]
+        results["image_name"] = results["sample_id"].map(image_names).astype(object)
+    else:
+        results["image_name"] = pd.Series(None, index=results.index, dtype=object)
+    missing = results["image_name"].isna()
+    if missing.any():
+        keys = [col for col in [run_col, "category"] if col in results.columns]
+        order = results.sort_values("sample_id", kind="stable").groupby(keys, sort=False).cumcount()
+        pair = (order.reindex(results.index) // 2).astype(str)
+        results.loc[missing, "image_name"] = "pair_" + pair[missing]
+        source = preprocessed_path if preprocessed_path is not None and osp.exists(preprocessed_path) else "preprocessed.json (not found)"
+        message = (f"{int(missing.sum())} samples have no image name in {source}; "
+                   "pairing questions by sample_id order, which assumes the two questions of an image are adjacent")
+        if "answer" in results.columns:
+            paired = results[missing]
+            answers = paired["answer"].astype(str).str.strip().str.lower()
+            pair_keys = [col for col in [run_col, "category"] if col in results.columns] + ["image_name"]
+            grouped = answers.groupby([paired[key] for key in pair_keys])
+            mismatched = int(((grouped.size() != 2) | (grouped.agg(lambda a: set(a) != {"yes", "no"}))).sum())
+            if mismatched:
+                message += f"; {mismatched} pairs do not have one yes and one no answer, the pairing is likely wrong"
+        warnings.warn(message, stacklevel=2)
+    return results
+
+
+def image_table(results: pd.DataFrame, run_col: str = "run") -> pd.DataFrame:
+    """
+    按(run, category, image_name)聚合每张图像的问题数、正确数以及是否全部正确
+    """
+    correct = (results["generated_text_code"] == results["answer_code"]).astype(np.int64)
+    grouped = correct.groupby([results[run_col], results["category"], results["image_name"]], sort=False)
+    images = pd.DataFrame({"n_questions": grouped.size(), "n_correct": grouped.sum()})
+    images["all_correct"] = (images["n_correct"] == images["n_questions"]).astype(np.int64)
+    return images.reset_index()
+
+
+def _bootstrap_scores(images: pd.DataFrame, group_keys: list, n_bootstrap: int, seed: int) -> np.ndarray:
+    """
+    对每个(run, category)按图像重采样，返回(num_groups, n_bootstrap)的得分
+    所有分组一次性采样：每个分组在其图像区间[offset, offset + size)内均匀抽取size个下标，再用reduceat分段求和
+    """
+    images = images.sort_values(group_keys, kind="stable")
+    sizes = images.groupby(group_keys, sort=False).size().to_numpy()
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rng = np.random.default_rng(seed)
+    # (n_bootstrap, total_images)的采样下标，第j列属于第group_of[j]个分组
+    group_of = np.repeat(np.arange(len(sizes)), sizes)
+    draws = offsets[group_of] + (rng.random((n_bootstrap, len(group_of))) * sizes[group_of]).astype(np.int64)
+    n_questions = images["n_questions"].to_numpy()[draws]
+    n_correct = images["n_correct"].to_numpy()[draws]
+    all_correct = images["all_correct"].to_numpy()[draws]
+    acc = np.add.reduceat(n_correct, offsets, axis=1) / np.add.reduceat(n_questions, offsets, axis=1)
+    acc_plus = np.add.reduceat(all_correct, offsets, axis=1) / sizes
+    return ((acc + acc_plus) * 100).T
+
+
+def mme_scores(results: pd.DataFrame, n_bootstrap: int = 1000, confidence: float = 0.95, seed: int = 0,
+               run_col: str = "run", preprocessed_path: Optional[str] = PREPROCESSED_PATH) -> pd.DataFrame:
+    """
+    计算MME得分
+    Args:
+        results: 一个或多个run的结果（多个run时需要run_col列）
+        n_bootstrap: bootstrap重采样次数，0表示不计算置信区间
+        confidence: 置信水平
+    Returns:
+        pd.DataFrame: 每行一个(run, category)以及每个run的perception/cognition/total汇总行，
+            列为run、task、category、n_images、n_questions、acc、acc_plus、score、score_low、score_high
+    """
+    if run_col not in results.columns:
+        results = results.assign(**{run_col: DEFAULT_RUN})
+    results = attach_image_names(results[results["category"].isin(CATEGORY_TASK)], preprocessed_path, run_col)
+    images = image_table(results, run_col)
+
+    group_keys = [run_col, "category"]
+    grouped = images.groupby(group_keys, sort=True)
+    scores = pd.DataFrame({
+        "n_images": grouped.size(),
+        "n_questions": grouped["n_questions"].sum(),
+        "acc": grouped["n_correct"].sum() / grouped["n_questions"].sum() * 100,
+        "acc_plus": grouped["all_correct"].mean() * 100,
+    }).reset_index()
+    scores["score"] = scores["acc"] + scores["acc_plus"]
+    scores.insert(1, "task", scores["category"].map(CATEGORY_TASK))
+
+    alpha = (1 - confidence) / 2
+    if n_bootstrap > 0:
+        samples = _bootstrap_scores(images, group_keys, n_bootstrap, seed)
+        scores["score_low"], scores["score_high"] = np.quantile(samples, [alpha, 1 - alpha], axis=1)
+    else:
+        samples = None
+        scores["score_low"] = scores["score_high"] = np.nan
+
+    # perception/cognition/total：同一次bootstrap中各类别得分求和
+    summaries = []
+    for run, run_scores in scores.groupby(run_col, sort=False):
+        for task, categories in list(TASKS.items()) + [("total", list(CATEGORY_TASK))]:
+            mask = run_scores["category"].isin(categories)
+            row = {run_col: run, "task": task, "category": task,
+                   "n_images": run_scores.loc[mask, "n_images"].sum(),
+                   "n_questions": run_scores.loc[mask, "n_questions"].sum(),
+                   "acc": np.nan, "acc_plus": np.nan,
+                   "score": run_scores.loc[mask, "score"].sum()}
+            if samples is not None:
+                row["score_low"], row["score_high"] = np.quantile(samples[run_scores.index[mask]].sum(axis=0), [alpha, 1 - alpha])
+            summaries.append(row)
+    return pd.concat([scores, pd.DataFrame(summaries)], ignore_index=True)
+
+
+def score_files(paths: Sequence[str], runs: Optional[Sequence[str]] = None, **kwargs) -> pd.DataFrame:
+    """对多个results.csv评分"""
+    return mme_scores(load_results(paths, runs), **kwargs)
+
+
+def score_table(scores: pd.DataFrame, run_col: str = "run") -> pd.DataFrame:
+    """转换为每行一个run、每列一个类别/汇总得分的宽表"""
+    return scores.pivot(index=run_col, columns="category", values="score")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", type=str, nargs="+", default=[osp.join(RESULTS_DIR, "results.csv")], help="One or more results.csv files")
+    parser.add_argument("--runs", type=str, nargs="+", default=None, help="Run names for the result files (default: directory names)")
+    parser.add_argument("--preprocessed", type=str, default=PREPROCESSED_PATH, help="MME preprocessed.json used to recover image names")
+    parser.add_argument("--n_bootstrap", type=int, default=1000)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="Save the score table to this CSV file")
+    args = parser.parse_args()
+    scores = score_files(args.results, args.runs, n_bootstrap=args.n_bootstrap, confidence=args.confidence,
+                         seed=args.seed, preprocessed_path=args.preprocessed)
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(scores.to_string(index=False, float_format="%.2f"))
+    if args.output:
+        scores.to_csv(args.output, index=False)
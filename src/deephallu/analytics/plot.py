@@ -1,46 +1,118 @@
+import functools
 import os
 import os.path as osp
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib import rcParams
 import pandas as pd
 
+from deephallu.analytics.metrics import OVERALL, compute_metrics, entropy_box_stats, load_metrics
+from deephallu.analytics.metrics import confusion_matrix as _confusion_from_row
+
 HERE = os.path.dirname(os.path.abspath(__file__))
 RESULTS_DIR = osp.join(HERE, '..', '..', '..', 'results')
 
-# 设置中文字体支持
-rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
-rcParams['axes.unicode_minus'] = False
+# 中文字体支持，只在绘图时通过rc_context生效，不修改全局配置
+FONT_RC = {
+    'font.sans-serif': ['SimHei', 'DejaVu Sans'],
+    'axes.unicode_minus': False,
+}
+
+
+def _pyplot():
+    """延迟导入matplotlib，导入deephallu.analytics时不加载matplotlib"""
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _figure(filename):
+    """
+    绘图函数的装饰器：在字体配置下绘图并保存为filename.<format>
+    被装饰的函数额外接受以下关键字参数：
+        output_dir: 输出目录，默认RESULTS_DIR
+        formats: 输出格式，例如('png', 'pdf')
+        show: 是否调用plt.show()，批量渲染时设为False
+    Returns:
+        List[str]: 保存的文件路径
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, output_dir=None, formats=('png',), show=True, **kwargs):
+            plt = _pyplot()
+            paths = []
+            with plt.rc_context(FONT_RC):
+                func(*args, **kwargs)
+                for fmt in formats:
+                    path = osp.join(output_dir or RESULTS_DIR, f'{filename}.{fmt}')
+                    plt.savefig(path, dpi=300, bbox_inches='tight')
+                    paths.append(path)
+                if show:
+                    plt.show()
+            plt.close('all')
+            return paths
+        wrapper.filename = filename
+        return wrapper
+    return decorator
+
+
+def _as_metrics(table):
+    """绘图函数接受metrics.compute_metrics得到的指标表，也兼容直接传入results表"""
+    if 'accuracy' in table.columns:
+        return table
+    return compute_metrics(table)
+
+
+def _select_run(metrics, run=None):
+    """取出某个run的指标，默认第一个run"""
+    runs = metrics['run'].unique()
+    run = runs[0] if run is None else run
+    if run not in runs:
+        raise ValueError(f"Run {run} not in metrics table, available runs: {list(runs)}")
+    return metrics[metrics['run'] == run]
+
+
+def _overall_row(metrics, run=None):
+    run_metrics = _select_run(metrics, run)
+    return run_metrics[run_metrics['category'] == OVERALL].iloc[0]
+
+
+def _category_rows(metrics, run=None):
+    run_metrics = _select_run(metrics, run)
+    return run_metrics[run_metrics['category'] != OVERALL]
+
 
 # ============================================================================
 # 整体性能指标
 # ============================================================================
-def plot_overall_metrics(result_df):
-    """绘制整体性能指标柱状图"""
-    # 计算整体性能指标
-    tp = sum((result_df['generated_text_code'] == 1) & (result_df['answer_code'] == 1))
-    pred_positive = sum(result_df['generated_text_code'] == 1)
-    actual_positive = sum(result_df['answer_code'] == 1)
-
-    accuracy = sum(result_df['generated_text_code'] == result_df['answer_code']) / len(result_df)
-    precision = tp / pred_positive if pred_positive > 0 else 0.0
-    recall = tp / actual_positive if actual_positive > 0 else 0.0
-    f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0.0
+@_figure('1_metrics_overall')
+def plot_overall_metrics(metrics):
+    """绘制整体性能指标柱状图，指标表中包含多个run时按run分组对比"""
+    plt = _pyplot()
+    metrics = _as_metrics(metrics)
+    overall = metrics[metrics['category'] == OVERALL]
+    runs = overall['run'].tolist()
 
     # 绘制柱状图
-    metrics = ['Accuracy', 'Precision', 'Recall', 'F1 Score']
-    values = [accuracy, precision, recall, f1]
+    metric_names = ['Accuracy', 'Precision', 'Recall', 'F1 Score']
+    columns = ['accuracy', 'precision', 'recall', 'f1']
     colors = ['#3498db', '#e74c3c', '#2ecc71', '#f39c12']
 
-    plt.figure(figsize=(10, 6))
-    bars = plt.bar(metrics, values, color=colors, alpha=0.8, edgecolor='black', linewidth=1.5)
+    plt.figure(figsize=(max(10, 2.5 * len(runs) + 6), 6))
+    x = np.arange(len(metric_names))
+    width = 0.8 / len(runs)
+    for i, (_, row) in enumerate(overall.iterrows()):
+        values = row[columns].astype(float).values
+        offset = (i - (len(runs) - 1) / 2) * width
+        bars = plt.bar(x + offset, values, width, color=colors if len(runs) == 1 else None,
+                       label=row['run'] if len(runs) > 1 else None, alpha=0.8, edgecolor='black', linewidth=1.5)
 
-    # 添加数值标签
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height,
-                f'{height:.4f}', ha='center', va='bottom', fontsize=12, fontweight='bold')
+        # 添加数值标签
+        for bar in bars:
+            height = bar.get_height()
+            plt.text(bar.get_x() + bar.get_width()/2., height,
+                    f'{height:.4f}', ha='center', va='bottom', fontsize=12 if len(runs) == 1 else 8, fontweight='bold')
 
+    plt.xticks(x, metric_names)
+    if len(runs) > 1:
+        plt.legend(fontsize=11)
     plt.ylim(0, 1.1)
     plt.ylabel('Score', fontsize=14, fontweight='bold')
     plt.title('Overall Model Performance Metrics', fontsize=16, fontweight='bold', pad=20)
@@ -48,37 +120,28 @@ def plot_overall_metrics(result_df):
     plt.gca().set_axisbelow(True)
 
     plt.tight_layout()
-    plt.savefig(os.path.join(RESULTS_DIR, '1_metrics_overall.png'), dpi=300, bbox_inches='tight')
-    plt.show()
 
-    print(f"Accuracy: {accuracy:.4f}")
-    print(f"Precision: {precision:.4f}")
-    print(f"Recall: {recall:.4f}")
-    print(f"F1 Score: {f1:.4f}")
+    for _, row in overall.iterrows():
+        if len(runs) > 1:
+            print(f"\n{row['run']}:")
+        print(f"Accuracy: {row['accuracy']:.4f}")
+        print(f"Precision: {row['precision']:.4f}")
+        print(f"Recall: {row['recall']:.4f}")
+        print(f"F1 Score: {row['f1']:.4f}")
 
 
-def plot_category_performance(result_df):
+@_figure('2_performance_category')
+def plot_category_performance(metrics, run=None):
     """绘制各类别的性能指标对比"""
-    # 计算各类别的性能指标
-    categories = result_df['category'].unique()
-    metrics_data = {'Accuracy': [], 'Precision': [], 'Recall': [], 'F1 Score': []}
-
-    for category in categories:
-        cat_df = result_df[result_df['category'] == category]
-        
-        cat_tp = sum((cat_df['generated_text_code'] == 1) & (cat_df['answer_code'] == 1))
-        cat_pred_positive = sum(cat_df['generated_text_code'] == 1)
-        cat_actual_positive = sum(cat_df['answer_code'] == 1)
-        
-        cat_accuracy = sum(cat_df['generated_text_code'] == cat_df['answer_code']) / len(cat_df)
-        cat_precision = cat_tp / cat_pred_positive if cat_pred_positive > 0 else 0.0
-        cat_recall = cat_tp / cat_actual_positive if cat_actual_positive > 0 else 0.0
-        cat_f1 = 2 * (cat_precision * cat_recall) / (cat_precision + cat_recall) if (cat_precision + cat_recall) > 0 else 0.0
-        
-        metrics_data['Accuracy'].append(cat_accuracy)
-        metrics_data['Precision'].append(cat_precision)
-        metrics_data['Recall'].append(cat_recall)
-        metrics_data['F1 Score'].append(cat_f1)
+    plt = _pyplot()
+    category_metrics = _category_rows(_as_metrics(metrics), run)
+    categories = category_metrics['category'].tolist()
+    metrics_data = {
+        'Accuracy': category_metrics['accuracy'].tolist(),
+        'Precision': category_metrics['precision'].tolist(),
+        'Recall': category_metrics['recall'].tolist(),
+        'F1 Score': category_metrics['f1'].tolist(),
+    }
 
     # 绘制分组柱状图
     x = np.arange(len(categories))
@@ -100,8 +163,6 @@ def plot_category_performance(result_df):
     plt.ylim(0, 1.1)
 
     plt.tight_layout()
-    plt.savefig(osp.join(RESULTS_DIR, '2_performance_category.png'), dpi=300, bbox_inches='tight')
-    plt.show()
 
     # 打印详细数据
     print("\nPerformance by Category:")
@@ -116,11 +177,12 @@ def plot_category_performance(result_df):
 # ============================================================================
 # 混淆矩阵
 # ============================================================================
-def plot_confusion_matrix(result_df):
+@_figure('3_confusion_matrix')
+def plot_confusion_matrix(metrics, run=None):
     """绘制整体混淆矩阵"""
-    # 创建混淆矩阵
-    confusion_matrix = pd.crosstab(result_df['generated_text_code'], 
-                                    result_df['answer_code'])
+    plt = _pyplot()
+    # 由混淆计数构造混淆矩阵
+    confusion_matrix = _confusion_from_row(_overall_row(_as_metrics(metrics), run))
 
     plt.figure(figsize=(8, 6))
     im = plt.imshow(confusion_matrix, cmap='YlOrRd', aspect='auto')
@@ -145,15 +207,16 @@ def plot_confusion_matrix(result_df):
     plt.title('Confusion Matrix', fontsize=16, fontweight='bold', pad=20)
 
     plt.tight_layout()
-    plt.savefig(osp.join(RESULTS_DIR, '3_confusion_matrix.png'), dpi=300, bbox_inches='tight')
-    plt.show()
     print("\nConfusion Matrix:")
     print(confusion_matrix)
 
 
-def plot_confusion_matrix_by_category(result_df):
+@_figure('4_confusion_matrix_by_category')
+def plot_confusion_matrix_by_category(metrics, run=None):
     """绘制各类别的混淆矩阵"""
-    categories = sorted(result_df['category'].unique())
+    plt = _pyplot()
+    category_metrics = _category_rows(_as_metrics(metrics), run).sort_values('category')
+    categories = category_metrics['category'].tolist()
     
     # 计算子图布局
     n_categories = len(categories)
@@ -163,20 +226,9 @@ def plot_confusion_matrix_by_category(result_df):
     fig, axes = plt.subplots(n_rows, n_cols, figsize=(15, 5 * n_rows))
     axes = axes.flatten() if n_categories > 1 else [axes]
     
-    for idx, category in enumerate(categories):
-        cat_df = result_df[result_df['category'] == category]
-        
-        # 创建混淆矩阵
-        confusion_matrix = pd.crosstab(cat_df['generated_text_code'], 
-                                        cat_df['answer_code'])
-        
-        # 确保混淆矩阵是2x2的
-        for i in [0, 1]:
-            if i not in confusion_matrix.index:
-                confusion_matrix.loc[i] = [0, 0]
-            if i not in confusion_matrix.columns:
-                confusion_matrix[i] = 0
-        confusion_matrix = confusion_matrix.sort_index().sort_index(axis=1)
+    for idx, (_, row) in enumerate(category_metrics.iterrows()):
+        category = row['category']
+        confusion_matrix = _confusion_from_row(row)
         
         # 绘制混淆矩阵
         ax = axes[idx]
@@ -199,25 +251,13 @@ def plot_confusion_matrix_by_category(result_df):
         ax.set_ylabel('Predicted', fontsize=11, fontweight='bold')
         ax.set_title(f'{category}', fontsize=12, fontweight='bold', pad=10)
         
-        # 计算性能指标
-        tp = confusion_matrix.iloc[1, 1] if 1 in confusion_matrix.index and 1 in confusion_matrix.columns else 0
-        fp = confusion_matrix.iloc[1, 0] if 1 in confusion_matrix.index and 0 in confusion_matrix.columns else 0
-        fn = confusion_matrix.iloc[0, 1] if 0 in confusion_matrix.index and 1 in confusion_matrix.columns else 0
-        tn = confusion_matrix.iloc[0, 0] if 0 in confusion_matrix.index and 0 in confusion_matrix.columns else 0
-        
-        total = tp + fp + fn + tn
-        accuracy = (tp + tn) / total if total > 0 else 0
-        precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-        recall = tp / (tp + fn) if (tp + fn) > 0 else 0
-        f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-        
         # 打印统计信息
         print(f"\n{category} Confusion Matrix:")
         print(confusion_matrix)
-        print(f"  Accuracy:  {accuracy:.4f}")
-        print(f"  Precision: {precision:.4f}")
-        print(f"  Recall:    {recall:.4f}")
-        print(f"  F1 Score:  {f1:.4f}")
+        print(f"  Accuracy:  {row['accuracy']:.4f}")
+        print(f"  Precision: {row['precision']:.4f}")
+        print(f"  Recall:    {row['recall']:.4f}")
+        print(f"  F1 Score:  {row['f1']:.4f}")
     
     # 隐藏多余的子图
     for idx in range(n_categories, len(axes)):
@@ -225,20 +265,21 @@ def plot_confusion_matrix_by_category(result_df):
     
     plt.suptitle('Confusion Matrix by Category', fontsize=16, fontweight='bold', y=0.995)
     plt.tight_layout()
-    plt.savefig(osp.join(RESULTS_DIR, '4_confusion_matrix_by_category.png'), dpi=300, bbox_inches='tight')
-    plt.show()
 
 
 # ============================================================================
 # 分布分析
 # ============================================================================
-def plot_distribution(result_df):
+@_figure('5_distribution')
+def plot_distribution(metrics, run=None):
     """绘制预测与实际标签的分布对比"""
+    plt = _pyplot()
+    overall = _overall_row(_as_metrics(metrics), run)
     # 创建子图
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
 
     # 预测分布
-    pred_counts = result_df['generated_text_code'].value_counts().sort_index()
+    pred_counts = pd.Series([overall['pred_0'], overall['pred_1']], index=[0, 1])
     colors1 = ['#3498db', '#e74c3c']
     labels1 = [f'Predicted 0\n({pred_counts.iloc[0]})', 
             f'Predicted 1\n({pred_counts.iloc[1]})']
@@ -252,7 +293,7 @@ def plot_distribution(result_df):
     ax1.set_title('Prediction Distribution', fontsize=14, fontweight='bold')
 
     # 实际分布
-    actual_counts = result_df['answer_code'].value_counts().sort_index()
+    actual_counts = pd.Series([overall['actual_0'], overall['actual_1']], index=[0, 1])
     colors2 = ['#9b59b6', '#1abc9c']
     labels2 = [f'Actual 0\n({actual_counts.iloc[0]})', 
             f'Actual 1\n({actual_counts.iloc[1]})']
@@ -267,37 +308,37 @@ def plot_distribution(result_df):
 
     plt.suptitle('Prediction vs Actual Distribution', fontsize=16, fontweight='bold', y=0.98)
     plt.tight_layout()
-    plt.savefig(osp.join(RESULTS_DIR, '5_distribution.png'), dpi=300, bbox_inches='tight')
-    plt.show()
 
     # 打印分布信息
     print("\nDistribution Summary:")
     print(f"\nPrediction Distribution:")
-    print(f"  Predicted 0: {pred_counts.iloc[0]} ({pred_counts.iloc[0]/len(result_df)*100:.1f}%)")
-    print(f"  Predicted 1: {pred_counts.iloc[1]} ({pred_counts.iloc[1]/len(result_df)*100:.1f}%)")
+    print(f"  Predicted 0: {pred_counts.iloc[0]} ({pred_counts.iloc[0]/overall['n']*100:.1f}%)")
+    print(f"  Predicted 1: {pred_counts.iloc[1]} ({pred_counts.iloc[1]/overall['n']*100:.1f}%)")
     print(f"\nActual Distribution:")
-    print(f"  Actual 0: {actual_counts.iloc[0]} ({actual_counts.iloc[0]/len(result_df)*100:.1f}%)")
-    print(f"  Actual 1: {actual_counts.iloc[1]} ({actual_counts.iloc[1]/len(result_df)*100:.1f}%)")
+    print(f"  Actual 0: {actual_counts.iloc[0]} ({actual_counts.iloc[0]/overall['n']*100:.1f}%)")
+    print(f"  Actual 1: {actual_counts.iloc[1]} ({actual_counts.iloc[1]/overall['n']*100:.1f}%)")
 
 
 # ============================================================================
 # 熵分析
 # ============================================================================
-def plot_entropy_analysis(result_df):
-    """绘制幻觉与非幻觉答案的熵分布箱线图"""
-    # 准备数据
-    data_to_plot = [
-        result_df[result_df['judgment'] == 1]['avg_entropy'].dropna(),
-        result_df[result_df['judgment'] == 0]['avg_entropy'].dropna()
-    ]
+@_figure('6_entropy')
+def plot_entropy_analysis(metrics, run=None):
+    """绘制幻觉与非幻觉答案的熵分布箱线图（由指标表中的分位数和离群点绘制）"""
+    plt = _pyplot()
+    overall = _overall_row(_as_metrics(metrics), run)
+    box_stats = entropy_box_stats(overall, labels={
+        'correct': 'Non-Hallucinated\n(judgment=1)',
+        'hallucinated': 'Hallucinated\n(judgment=0)',
+    })
 
     plt.figure(figsize=(10, 6))
 
-    bp = plt.boxplot(data_to_plot, 
-                    labels=['Non-Hallucinated\n(judgment=1)', 'Hallucinated\n(judgment=0)'],
-                    patch_artist=True, 
-                    showmeans=True,
-                    meanprops=dict(marker='D', markerfacecolor='red', markersize=8))
+    bp = plt.gca().bxp(box_stats,
+                       patch_artist=True,
+                       showmeans=True,
+                       showfliers=True,
+                       meanprops=dict(marker='D', markerfacecolor='red', markersize=8))
 
     # 设置颜色
     colors = ['#2ecc71', '#e74c3c']
@@ -311,39 +352,30 @@ def plot_entropy_analysis(result_df):
     plt.grid(axis='y', alpha=0.3, linestyle='--')
 
     # 添加均值标注
-    means = [data.mean() for data in data_to_plot]
+    means = [stats['mean'] for stats in box_stats]
     for i, mean in enumerate(means):
         plt.text(i + 1, mean, f'Mean: {mean:.4f}', 
                 ha='center', va='bottom', fontsize=10, fontweight='bold')
 
     plt.tight_layout()
-    plt.savefig(osp.join(RESULTS_DIR, '6_entropy.png'), dpi=300, bbox_inches='tight')
-    plt.show()
 
     # 打印统计信息
     print("\nEntropy Statistics:")
-    print(f"Non-Hallucinated (judgment=1):")
-    print(f"  Mean:   {data_to_plot[0].mean():.4f}")
-    print(f"  Median: {data_to_plot[0].median():.4f}")
-    print(f"  Std:    {data_to_plot[0].std():.4f}")
-    print(f"\nHallucinated (judgment=0):")
-    print(f"  Mean:   {data_to_plot[1].mean():.4f}")
-    print(f"  Median: {data_to_plot[1].median():.4f}")
-    print(f"  Std:    {data_to_plot[1].std():.4f}")
+    for state, title in [('correct', 'Non-Hallucinated (judgment=1)'), ('hallucinated', 'Hallucinated (judgment=0)')]:
+        print(f"{title}:")
+        print(f"  Mean:   {overall[f'entropy_{state}_mean']:.4f}")
+        print(f"  Median: {overall[f'entropy_{state}_median']:.4f}")
+        print(f"  Std:    {overall[f'entropy_{state}_std']:.4f}")
 
 
-def plot_entropy_by_category(result_df):
+@_figure('7_entropy_by_category')
+def plot_entropy_by_category(metrics, run=None):
     """绘制各类别的平均熵对比"""
-    # 计算各类别的熵
-    categories = result_df['category'].unique()
-
-    non_hall_entropy = []
-    hall_entropy = []
-
-    for category in categories:
-        cat_df = result_df[result_df['category'] == category]
-        non_hall_entropy.append(cat_df[cat_df['judgment'] == 1]['avg_entropy'].mean())
-        hall_entropy.append(cat_df[cat_df['judgment'] == 0]['avg_entropy'].mean())
+    plt = _pyplot()
+    category_metrics = _category_rows(_as_metrics(metrics), run)
+    categories = category_metrics['category'].tolist()
+    non_hall_entropy = category_metrics['entropy_correct_mean'].astype(float).tolist()
+    hall_entropy = category_metrics['entropy_hallucinated_mean'].astype(float).tolist()
 
     # 绘制柱状图
     x = np.arange(len(categories))
@@ -373,8 +405,6 @@ def plot_entropy_by_category(result_df):
     plt.gca().set_axisbelow(True)
 
     plt.tight_layout()
-    plt.savefig(osp.join(RESULTS_DIR, '7_entropy_by_category.png'), dpi=300, bbox_inches='tight')
-    plt.show()
 
     # 打印详细数据
     print("\nAverage Entropy by Category:")
@@ -386,23 +416,36 @@ def plot_entropy_by_category(result_df):
             print(f"  Difference:       {abs(non_hall_entropy[i] - hall_entropy[i]):.4f}")
 
 
+# 所有可渲染的图，plot_runner按名称选择
+FIGURES = {
+    'metrics_overall': plot_overall_metrics,
+    'performance_category': plot_category_performance,
+    'confusion_matrix': plot_confusion_matrix,
+    'confusion_matrix_by_category': plot_confusion_matrix_by_category,
+    'distribution': plot_distribution,
+    'entropy': plot_entropy_analysis,
+    'entropy_by_category': plot_entropy_by_category,
+}
+
+
 # ============================================================================
 # 主函数
 # ============================================================================
 if __name__ == "__main__":
-    result_df = pd.read_csv(osp.join(RESULTS_DIR, 'results.csv'))
+    # 所有图都基于同一张指标表，结果文件未修改时直接读取缓存
+    metrics = load_metrics([osp.join(RESULTS_DIR, 'results.csv')], cache_dir=RESULTS_DIR)
     
     # 1. 整体性能指标
-    plot_overall_metrics(result_df)
-    plot_category_performance(result_df)
+    plot_overall_metrics(metrics)
+    plot_category_performance(metrics)
     
     # 2. 混淆矩阵分析
-    plot_confusion_matrix(result_df)
-    plot_confusion_matrix_by_category(result_df)
+    plot_confusion_matrix(metrics)
+    plot_confusion_matrix_by_category(metrics)
     
     # 3. 分布分析
-    plot_distribution(result_df)
+    plot_distribution(metrics)
     
     # 4. 熵分析
-    plot_entropy_analysis(result_df)
-    plot_entropy_by_category(result_df)
\ No newline at end of file
+    plot_entropy_analysis(metrics)
+    plot_entropy_by_category(metrics)
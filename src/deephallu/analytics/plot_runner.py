@@ -0,0 +1,136 @@
+"""
+并行批量渲染plot.py中的图
+    - 每张图在进程池中使用Agg后端渲染，主进程不导入matplotlib
+    - 根据输入数据（指标表）、绘图代码和输出格式计算哈希，与上次渲染时的清单一致且文件存在时跳过
+    - 可以只渲染部分图，并同时输出多种格式
+
+用法:
+    python -m deephallu.analytics.plot_runner --figures entropy confusion_matrix --formats png pdf
+    python -m deephallu.analytics.plot_runner --results run_a/results.csv run_b/results.csv --output_dir figures --force
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import os.path as osp
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from deephallu.analytics import plot
+from deephallu.analytics.metrics import load_metrics
+
+MANIFEST_NAME = ".plot_manifest.json"
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render(name: str, metrics: pd.DataFrame, output_dir: str, formats: Sequence[str], run: Optional[str]) -> List[str]:
+    kwargs = {} if name == "metrics_overall" else {"run": run}
+    return plot.FIGURES[name](metrics, output_dir=output_dir, formats=tuple(formats), show=False, **kwargs)
+
+
+def _code_hash() -> str:
+    with open(plot.__file__, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def figure_hash(name: str, metrics: pd.DataFrame, formats: Sequence[str], run: Optional[str] = None, code_hash: Optional[str] = None) -> str:
+    """图的输入哈希：指标表内容、图名称、run、输出格式以及绘图代码"""
+    digest = hashlib.sha1()
+    # 用固定精度的CSV文本计算哈希，重新计算的指标表与从缓存读取的指标表哈希一致
+    digest.update(metrics.to_csv(index=False, float_format="%.10g").encode("utf-8"))
+    digest.update(json.dumps([name, run, sorted(formats), code_hash or _code_hash()]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _load_manifest(path: str) -> Dict[str, dict]:
+    if not osp.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path: str, manifest: Dict[str, dict]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def render_figures(metrics: pd.DataFrame, figures: Optional[Sequence[str]] = None, formats: Sequence[str] = ("png",),
+                   output_dir: str = plot.RESULTS_DIR, run: Optional[str] = None, num_workers: Optional[int] = None,
+                   force: bool = False) -> Dict[str, List[str]]:
+    """
+    并行渲染指定的图
+    Args:
+        metrics: metrics.compute_metrics/load_metrics得到的指标表
+        figures: 图名称（plot.FIGURES的key），默认全部
+        formats: 输出格式
+        output_dir: 输出目录，渲染清单也保存在该目录
+        run: 按run绘制的图使用哪个run，默认第一个
+        num_workers: 进程数，默认为需要渲染的图的数量与CPU核数中的较小值
+        force: 忽略清单，全部重新渲染
+    Returns:
+        Dict[str, List[str]]: 每张图的输出文件（跳过的图返回上次的文件）
+    """
+    figures = list(figures) if figures else list(plot.FIGURES)
+    unknown = [name for name in figures if name not in plot.FIGURES]
+    if unknown:
+        raise ValueError(f"Unknown figures: {unknown}, available: {list(plot.FIGURES)}")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = osp.join(output_dir, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path)
+
+    code_hash = _code_hash()
+    hashes = {name: figure_hash(name, metrics, formats, run, code_hash) for name in figures}
+    outputs, pending = {}, []
+    for name in figures:
+        entry = manifest.get(name)
+        if not force and entry and entry["hash"] == hashes[name] and all(osp.exists(path) for path in entry["files"]):
+            outputs[name] = entry["files"]
+        else:
+            pending.append(name)
+    print(f"Rendering {len(pending)} figures, {len(figures) - len(pending)} unchanged")
+    if not pending:
+        return outputs
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=num_workers or min(len(pending), os.cpu_count() or 1), initializer=_init_worker) as executor:
+        futures = {executor.submit(_render, name, metrics, output_dir, formats, run): name for name in pending}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                outputs[name] = future.result()
+            except Exception as e:
+                print(f"Error rendering {name}: {e}")
+                manifest.pop(name, None)
+                continue
+            manifest[name] = {"hash": hashes[name], "files": outputs[name]}
+    _save_manifest(manifest_path, manifest)
+    print(f"Rendered {len(pending)} figures in {time.perf_counter() - start_time:.1f}s")
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", type=str, nargs="+", default=[osp.join(plot.RESULTS_DIR, "results.csv")], help="One or more results.csv files")
+    parser.add_argument("--runs", type=str, nargs="+", default=None, help="Run names for the result files (default: directory names)")
+    parser.add_argument("--run", type=str, default=None, help="Run used by the per-run figures (default: the first run)")
+    parser.add_argument("--figures", type=str, nargs="+", default=None, choices=list(plot.FIGURES))
+    parser.add_argument("--formats", type=str, nargs="+", default=["png"])
+    parser.add_argument("--output_dir", type=str, default=plot.RESULTS_DIR)
+    parser.add_argument("--num_workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="Re-render figures even if their inputs are unchanged")
+    args = parser.parse_args()
+    metrics = load_metrics(args.results, args.runs, cache_dir=args.output_dir)
+    render_figures(metrics, args.figures, args.formats, args.output_dir, args.run, args.num_workers, args.force)
@@ -0,0 +1,323 @@
+"""
+基于生成统计量的幻觉风险评分
+从step_details.csv（每个生成token一行）计算token级和答案级特征，所有样本一次性处理：
+按(sample_id, step)排序后每个样本是一段连续区间，用np.*.reduceat等分段运算代替逐样本循环。
+
+token级特征：
+    - entropy: 该步骤的熵
+    - margin: top-1与top-2概率之差
+    - position_z: 相对同一步骤位置上所有样本的熵的z-score（位置归一化熵）
+    - spike: position_z超过阈值
+    - token_risk: sigmoid(position_z) * (1 - margin)，位置上异常高的熵且top-1优势小时风险高
+答案级特征：熵的均值/最大值/标准差、margin的均值/最小值、spike比例、position_z的均值/最大值、
+最高的窗口平均熵（span）以及最长的低margin连续片段。
+在答案级特征上用NumPy实现的逻辑回归（IRLS）拟合judgment=0（幻觉）的概率。
+
+用法:
+    python -m deephallu.analytics.risk --step_details results/step_details.csv --results results/results.csv --save_model results/risk_model.json
+"""
+
+import argparse
+import json
+import os.path as osp
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+HERE = osp.dirname(osp.abspath(__file__))
+RESULTS_DIR = osp.join(HERE, "..", "..", "..", "results")
+
+STEP_COLUMNS = ["sample_id", "step", "entropy", "top1_prob", "top2_prob"]
+ANSWER_FEATURES = [
+    "log_num_tokens", "mean_entropy", "max_entropy", "std_entropy", "mean_margin", "min_margin",
+    "spike_rate", "mean_position_z", "max_position_z", "max_window_entropy", "longest_low_margin_run",
+]
+
+
+def load_steps(path: str, usecols: Sequence[str] = STEP_COLUMNS) -> pd.DataFrame:
+    """只读取评分需要的列"""
+    header = pd.read_csv(path, nrows=0).columns
+    return pd.read_csv(path, usecols=[column for column in usecols if column in header])
+
+
+def segment_offsets(sample_ids: np.ndarray) -> np.ndarray:
+    """已排序的sample_id中每个样本区间的起始位置"""
+    return np.flatnonzero(np.r_[True, sample_ids[1:] != sample_ids[:-1]])
+
+
+def position_baseline(steps: np.ndarray, entropy: np.ndarray, max_step: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """每个步骤位置上熵的均值和标准差，超过max_step的位置合并"""
+    position = np.minimum(steps, max_step)
+    count = np.bincount(position, minlength=max_step + 1)
+    total = np.bincount(position, weights=entropy, minlength=max_step + 1)
+    total_sq = np.bincount(position, weights=entropy ** 2, minlength=max_step + 1)
+    mean = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+    var = np.divide(total_sq, count, out=np.zeros_like(total), where=count > 0) - mean ** 2
+    return mean, np.sqrt(np.maximum(var, 0.0))
+
+
+def token_features(steps: pd.DataFrame, baseline: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                   spike_threshold: float = 2.0, max_step: int = 256) -> pd.DataFrame:
+    """
+    计算token级特征
+    Args:
+        steps: step_details，至少包含sample_id、step、entropy、top1_prob，top2_prob缺失时margin等于top1_prob
+        baseline: 位置基线(mean, std)，默认由steps本身计算；对新数据评分时传入训练时的基线
+    Returns:
+        pd.DataFrame: 按(sample_id, step)排序，包含entropy、margin、position_z、spike、token_risk
+    """
+    steps = steps.sort_values(["sample_id", "step"], kind="stable", ignore_index=True)
+    entropy = steps["entropy"].to_numpy(dtype=np.float64)
+    step = steps["step"].to_numpy(dtype=np.int64)
+    top1 = steps["top1_prob"].to_numpy(dtype=np.float64)
+    top2 = steps["top2_prob"].to_numpy(dtype=np.float64) if "top2_prob" in steps.columns else np.zeros_like(top1)
+    margin = top1 - top2
+
+    mean, std = baseline if baseline is not None else position_baseline(step, entropy, max_step)
+    position = np.minimum(step, len(mean) - 1)
+    position_z = (entropy - mean[position]) / np.maximum(std[position], 1e-6)
+    features = pd.DataFrame({
+        "sample_id": steps["sample_id"].to_numpy(),
+        "step": step,
+        "entropy": entropy,
+        "margin": margin,
+        "position_z": position_z,
+        "spike": position_z > spike_threshold,
+        "token_risk": 1.0 / (1.0 + np.exp(-position_z)) * (1.0 - margin),
+    })
+    return features
+
+
+def answer_features(tokens: pd.DataFrame, window: int = 5, low_margin: float = 0.2) -> pd.DataFrame:
+    """
+    由token级特征计算答案级特征（tokens需按(sample_id, step)排序，即token_features的输出）
+    Args:
+        window: span特征的窗口长度（token数）
+        low_margin: margin低于该值的token视为不确定
+    Returns:
+        pd.DataFrame: 以sample_id为索引，列为ANSWER_FEATURES
+    """
+    sample_ids = tokens["sample_id"].to_numpy()
+    offsets = segment_offsets(sample_ids)
+    lengths = np.diff(np.r_[offsets, len(sample_ids)])
+    entropy = tokens["entropy"].to_numpy()
+    margin = tokens["margin"].to_numpy()
+    position_z = tokens["position_z"].to_numpy()
+
+    mean_entropy = np.add.reduceat(entropy, offsets) / lengths
+    sq = np.add.reduceat(entropy ** 2, offsets) / lengths
+    std_entropy = np.sqrt(np.maximum(sq - mean_entropy ** 2, 0.0))
+
+    # 窗口平均熵：用全局前缀和计算，跨越样本边界的窗口无效
+    index = np.arange(len(entropy))
+    segment_start = np.repeat(offsets, lengths)
+    prefix = np.r_[0.0, np.cumsum(entropy)]
+    window_start = np.maximum(index - window + 1, segment_start)
+    window_mean = (prefix[index + 1] - prefix[window_start]) / (index + 1 - window_start)
+    # 长度不足window的样本使用整段平均
+    full_window = (index - segment_start + 1 >= window) | (index - segment_start + 1 == np.repeat(lengths, lengths))
+    max_window_entropy = np.maximum.reduceat(np.where(full_window, window_mean, -np.inf), offsets)
+
+    # 最长的低margin连续片段：每个位置记录当前片段开始前最后一个"重置点"
+    low = margin < low_margin
+    reset = ~low | (index == segment_start)
+    last_reset = np.maximum.accumulate(np.where(reset, index, 0))
+    run_length = np.where(low, index - last_reset + low[last_reset].astype(np.int64), 0)
+    longest_low_margin_run = np.maximum.reduceat(run_length, offsets)
+
+    return pd.DataFrame({
+        "log_num_tokens": np.log1p(lengths),
+        "mean_entropy": mean_entropy,
+        "max_entropy": np.maximum.reduceat(entropy, offsets),
+        "std_entropy": std_entropy,
+        "mean_margin": np.add.reduceat(margin, offsets) / lengths,
+        "min_margin": np.minimum.reduceat(margin, offsets),
+        "spike_rate": np.add.reduceat(tokens["spike"].to_numpy(dtype=np.float64), offsets) / lengths,
+        "mean_position_z": np.add.reduceat(position_z, offsets) / lengths,
+        "max_position_z": np.maximum.reduceat(position_z, offsets),
+        "max_window_entropy": max_window_entropy,
+        "longest_low_margin_run": longest_low_margin_run.astype(np.float64),
+    }, index=pd.Index(sample_ids[offsets], name="sample_id"))
+
+
+class LogisticRiskModel:
+    """
+    L2正则的逻辑回归（IRLS/牛顿法），特征先标准化
+    Args:
+        feature_names: 使用的特征列
+        l2: L2正则系数（不作用于截距）
+    """
+    def __init__(self, feature_names: Sequence[str] = ANSWER_FEATURES, l2: float = 1.0):
+        self.feature_names = list(feature_names)
+        self.l2 = l2
+        self.mean = None
+        self.std = None
+        self.weights = None
+        self.baseline = None
+
+    def _design(self, features: pd.DataFrame) -> np.ndarray:
+        x = (features[self.feature_names].to_numpy(dtype=np.float64) - self.mean) / self.std
+        return np.hstack([np.ones((len(x), 1)), x])
+
+    def fit(self, features: pd.DataFrame, labels: np.ndarray, max_iter: int = 100, tol: float = 1e-8) -> "LogisticRiskModel":
+        """labels: 1表示幻觉（judgment=0）"""
+        values = features[self.feature_names].to_numpy(dtype=np.float64)
+        self.mean = values.mean(axis=0)
+        self.std = np.where(values.std(axis=0) > 0, values.std(axis=0), 1.0)
+        x = self._design(features)
+        y = np.asarray(labels, dtype=np.float64)
+        penalty = np.full(x.shape[1], self.l2)
+        penalty[0] = 0.0
+        weights = np.zeros(x.shape[1])
+        for _ in range(max_iter):
+            p = 1.0 / (1.0 + np.exp(-(x @ weights)))
+            gradient = x.T @ (p - y) + penalty * weights
+            hessian = (x * (p * (1 - p))[:, None]).T @ x + np.diag(penalty)
+            step = np.linalg.solve(hessian + 1e-9 * np.eye(len(weights)), gradient)
+            weights -= step
+            if np.max(np.abs(step)) < tol:
+                break
+        self.weights = weights
+        return self
+
+    def predict_proba(self, features: pd.DataFrame) -> np.ndarray:
+        if self.weights is None:
+            raise RuntimeError("Model is not fitted")
+        return 1.0 / (1.0 + np.exp(-(self._design(features) @ self.weights)))
+
+    def coefficients(self) -> pd.Series:
+        """标准化特征上的系数（正值表示该特征越大越可能幻觉）"""
+        return pd.Series(self.weights, index=["intercept"] + self.feature_names)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "feature_names": self.feature_names,
+            "l2": self.l2,
+            "mean": self.mean.tolist(),
+            "std": self.std.tolist(),
+            "weights": self.weights.tolist(),
+            "baseline": [values.tolist() for values in self.baseline] if self.baseline is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> "LogisticRiskModel":
+        model = cls(data["feature_names"], data["l2"])
+        model.mean = np.asarray(data["mean"])
+        model.std = np.asarray(data["std"])
+        model.weights = np.asarray(data["weights"])
+        if data.get("baseline") is not None:
+            model.baseline = tuple(np.asarray(values) for values in data["baseline"])
+        return model
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "LogisticRiskModel":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def roc_auc(labels: np.ndarray, scores: np.ndarray) -> float:
+    """基于秩的AUROC（并列取平均秩）"""
+    labels = np.asarray(labels, dtype=bool)
+    num_pos, num_neg = labels.sum(), (~labels).sum()
+    if num_pos == 0 or num_neg == 0:
+        return float("nan")
+    ranks = pd.Series(scores).rank(method="average").to_numpy()
+    return float((ranks[labels].sum() - num_pos * (num_pos + 1) / 2) / (num_pos * num_neg))
+
+
+def hallucination_labels(results: pd.DataFrame, sample_ids: np.ndarray) -> pd.Series:
+    """由results.csv的judgment得到标签：1为幻觉（judgment=0），0为正确，无法判断的样本为NaN"""
+    judgment = results.drop_duplicates("sample_id").set_index("sample_id")["judgment"].reindex(sample_ids)
+    return (judgment == 0).astype(np.float64).where(judgment.isin([0, 1]))
+
+
+def cross_validate(features: pd.DataFrame, labels: np.ndarray, num_folds: int = 5, seed: int = 0, **model_kwargs) -> Dict[str, Any]:
+    """k折交叉验证，返回每折AUROC以及只用mean_entropy（即avg_entropy）的基线AUROC"""
+    rng = np.random.default_rng(seed)
+    folds = rng.permutation(len(labels)) % num_folds
+    scores = np.empty(len(labels))
+    for fold in range(num_folds):
+        test = folds == fold
+        model = LogisticRiskModel(**model_kwargs).fit(features[~test], labels[~test])
+        scores[test] = model.predict_proba(features[test])
+    fold_auc = [roc_auc(labels[folds == fold], scores[folds == fold]) for fold in range(num_folds)]
+    return {
+        "fold_auc": fold_auc,
+        "auc": roc_auc(labels, scores),
+        "baseline_auc": roc_auc(labels, features["mean_entropy"].to_numpy()),
+    }
+
+
+def score_run(steps: pd.DataFrame, model: Optional[LogisticRiskModel] = None, window: int = 5,
+              spike_threshold: float = 2.0, low_margin: float = 0.2) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, float]]:
+    """
+    对一个run的全部样本评分
+    Returns:
+        (tokens, answers, timing): token级特征、答案级特征（有模型时包含risk列）以及吞吐量
+    """
+    start_time = time.perf_counter()
+    baseline = model.baseline if model is not None else None
+    tokens = token_features(steps, baseline, spike_threshold)
+    answers = answer_features(tokens, window, low_margin)
+    if model is not None:
+        answers["risk"] = model.predict_proba(answers)
+    elapsed = time.perf_counter() - start_time
+    timing = {
+        "seconds": elapsed,
+        "tokens_per_second": len(tokens) / elapsed if elapsed > 0 else float("inf"),
+        "samples_per_second": len(answers) / elapsed if elapsed > 0 else float("inf"),
+    }
+    return tokens, answers, timing
+
+
+def fit_risk_model(steps: pd.DataFrame, results: pd.DataFrame, window: int = 5, spike_threshold: float = 2.0,
+                   low_margin: float = 0.2, l2: float = 1.0) -> Tuple[LogisticRiskModel, pd.DataFrame, Dict[str, Any]]:
+    """在一个run上拟合风险模型，返回模型、带标签的答案级特征以及交叉验证结果（cross_validate的返回值）"""
+    _, answers, _ = score_run(steps, None, window, spike_threshold, low_margin)
+    labels = hallucination_labels(results, answers.index.to_numpy())
+    labeled = answers[labels.notna().to_numpy()]
+    y = labels.dropna().to_numpy()
+    evaluation = cross_validate(labeled, y, l2=l2)
+    model = LogisticRiskModel(l2=l2).fit(labeled, y)
+    model.baseline = position_baseline(steps["step"].to_numpy(dtype=np.int64), steps["entropy"].to_numpy(dtype=np.float64))
+    return model, labeled.assign(hallucinated=y), evaluation
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--step_details", type=str, default=osp.join(RESULTS_DIR, "step_details.csv"))
+    parser.add_argument("--results", type=str, default=osp.join(RESULTS_DIR, "results.csv"), help="results.csv with judgment labels used to fit the model")
+    parser.add_argument("--model", type=str, default=None, help="Score with a saved model instead of fitting one")
+    parser.add_argument("--save_model", type=str, default=None)
+    parser.add_argument("--window", type=int, default=5)
+    parser.add_argument("--spike_threshold", type=float, default=2.0)
+    parser.add_argument("--low_margin", type=float, default=0.2)
+    parser.add_argument("--l2", type=float, default=1.0)
+    parser.add_argument("--output", type=str, default=None, help="Save answer-level features and risk scores to this CSV file")
+    parser.add_argument("--token_output", type=str, default=None, help="Save token-level features to this CSV file")
+    args = parser.parse_args()
+
+    steps = load_steps(args.step_details)
+    if args.model:
+        model = LogisticRiskModel.load(args.model)
+    else:
+        model, _, evaluation = fit_risk_model(steps, pd.read_csv(args.results), args.window, args.spike_threshold, args.low_margin, args.l2)
+        print(f"Cross-validated AUROC: {evaluation['auc']:.4f} (folds: {', '.join(f'{auc:.4f}' for auc in evaluation['fold_auc'])})")
+        print(f"avg_entropy baseline AUROC: {evaluation['baseline_auc']:.4f}")
+        print("Coefficients:")
+        print(model.coefficients().to_string(float_format="%.4f"))
+        if args.save_model:
+            model.save(args.save_model)
+    tokens, answers, timing = score_run(steps, model, args.window, args.spike_threshold, args.low_margin)
+    print(f"Scored {len(tokens)} tokens / {len(answers)} samples in {timing['seconds']:.3f}s "
+          f"({timing['tokens_per_second']:.0f} tokens/s, {timing['samples_per_second']:.0f} samples/s)")
+    if args.output:
+        answers.to_csv(args.output)
+    if args.token_output:
+        tokens.to_csv(args.token_output, index=False)
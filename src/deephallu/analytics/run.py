@@ -9,50 +9,43 @@ import os.path as osp
 import argparse
 import json
 import requests
+import numpy as np
 import pandas as pd
 import re
 
+from deephallu.analytics.judge import DEFAULT_JUDGE_URL, DEFAULT_JUDGE_MODEL, build_judge_payload, judge_samples
+from deephallu.analytics.judge_cache import JudgeCache
+from deephallu.analytics.fast_judge import STRONG_CONFIDENCE, fast_judge
+from deephallu.analytics.verdict_log import VerdictLog, load_verdicts
+
 HERE = osp.dirname(osp.abspath(__file__))
 RESULTS_DIR = osp.join(HERE, "..", "..", "..", "results")
 
-def llm_judge(question: str, answer: str, generated_text: str, model: str = "gpt-oss:120b"):
+def llm_judge(question: str, answer: str, generated_text: str, model: str = DEFAULT_JUDGE_MODEL, url: str = DEFAULT_JUDGE_URL, timeout: float = 120.0):
     """
-    使用LLM判断generated_text是否符合answer
+    使用LLM判断generated_text是否符合answer（单个同步请求，批量评估请使用judge.AsyncJudgeClient）
     Args:
         question: 问题
         answer: 答案
         generated_text: 生成文本
         model: 模型
+        url: Ollama兼容的chat接口地址
+        timeout: 请求超时时间（秒）
     Returns:
-        bool: 是否符合
-    """
-    url = "http://ollama.warhol.informatik.rwth-aachen.de/api/chat"
-    judge_prompt = f"""Please evaluate if the generated answer is correct.
-
-    Question: {question}
-    Ground Truth: {answer}
-    Generated Answer: {generated_text}
-
-    Please output in the following format:
-    - Judgment: <judgment>Correct/Incorrect/Unknown</judgment>
-    - Reasoning: <reasoning>Your analysis</reasoning>
-    - Suggestions: <suggestions>How to improve, optional</suggestions>
+        str: Judge模型的回答，失败时为None
     """
-    payload = {
-        "model": model,
-        "messages": [
-            { "role": "user", "content": judge_prompt }
-        ],
-        "stream": False
-    }
+    payload = build_judge_payload(question, answer, generated_text, model)
     try:
-        response = requests.post(url, json=payload)
+        response = requests.post(url, json=payload, timeout=timeout)
         return response.json()["message"]["content"]
     except requests.exceptions.JSONDecodeError as e:
         print(f"JSON解析错误: {e}")
         print("原始响应内容:")
         print(response.text)
         return None
+    except requests.exceptions.RequestException as e:
+        print(f"请求错误: {e}")
+        return None
 
 def extract_judgment(response_text: str) -> int:
     """从LLM的回答中提取判断结果
@@ -74,35 +67,104 @@ def extract_judgment(response_text: str) -> int:
     else:
         return -1
 
+def derive_codes(results: pd.DataFrame, judgments: pd.Series) -> pd.DataFrame:
+    """
+    根据判断结果向量化计算answer_code、generated_text_code和judgment列
+    Args:
+        results: 包含answer列的结果表
+        judgments: 与results同索引的判断结果 (1/0/-1)
+    Returns:
+        pd.DataFrame: 添加了三列的结果表
+    """
+    results = results.copy()
+    answer_code = (results["answer"].astype(str).str.lower() == "yes").astype(int)
+    judgments = judgments.astype(int)
+    # 判断正确时生成答案与标准答案一致，判断错误时相反，未知为-1
+    results["answer_code"] = answer_code
+    results["generated_text_code"] = np.select(
+        [judgments == 1, judgments == 0],
+        [answer_code, 1 - answer_code],
+        default=-1
+    )
+    results["judgment"] = judgments
+    return results
+
 def main(args):
     results_csv_path = osp.join(args.results_dir, "results.csv")
+    verdict_log_path = osp.join(args.results_dir, "judgments.jsonl")
     results = pd.read_csv(results_csv_path)
-    for idx, row in results.iterrows():
-        print(f"Judging sample {idx+1}/{len(results)}")
-        sample_id = row["sample_id"]
-        category = row["category"]
-        question = row["question"]
-        answer = row["answer"]
-        generated_text = row["generated_text"]
-        avg_entropy = row["avg_entropy"]
-        judgment = llm_judge(question, answer, generated_text)
-        if judgment is None:
-            judgment = -1
-        else:
-            judgment = extract_judgment(judgment)
-        results.loc[idx, "answer_code"] = 1 if answer.lower() == "yes" else 0
-        if (judgment == 1 and answer.lower() == "yes") or (judgment == 0 and answer.lower() == "no"):
-            results.loc[idx, "generated_text_code"] = 1
-        elif (judgment == 1 and answer.lower() == "no") or (judgment == 0 and answer.lower() == "yes"):
-            results.loc[idx, "generated_text_code"] = 0
+
+    # ============ 1. 收集判断结果，逐条追加到日志 ============
+    done = load_verdicts(verdict_log_path) if args.resume else {}
+    pending = results[~results["sample_id"].isin(list(done.keys()))]
+    if args.resume:
+        print(f"Resuming from {verdict_log_path}: {len(done)} samples already judged, {len(pending)} remaining")
+    with VerdictLog(verdict_log_path, flush_every=args.flush_every, resume=args.resume) as verdict_log:
+        # 规则快速分类：答案明确以Yes/No开头的样本直接判断，其余交给LLM Judge
+        if args.no_fast_path:
+            remote = pending
         else:
-            results.loc[idx, "generated_text_code"] = -1
-        results.loc[idx, "judgment"] = judgment
-    results.to_csv(results_csv_path, index=False)
+            fast = fast_judge(pending, min_confidence=args.fast_path_min_confidence)
+            decided = fast["decided"]
+            for sample_id, judgment in zip(pending.loc[decided, "sample_id"], fast.loc[decided, "judgment"]):
+                verdict_log.append(sample_id, judgment, "fast")
+            remote = pending[~decided]
+            print(f"Fast path decided {int(decided.sum())}/{len(pending)} samples, remote judge calls avoided: {int(decided.sum())}")
+
+        remote_ids = remote["sample_id"].tolist()
+        samples = remote[["question", "answer", "generated_text"]].astype(str).to_dict("records")
+        cache = None if args.no_cache else JudgeCache(args.judge_cache or osp.join(args.results_dir, "judge_cache.sqlite"), model=args.model)
+        responses = cache.get_many(samples) if cache else [None] * len(samples)
+        # 只有缓存未命中的样本才请求LLM，结果返回后立即写入缓存和日志
+        miss_indices = [idx for idx, response in enumerate(responses) if response is None]
+        for idx, response in enumerate(responses):
+            if response is not None:
+                verdict_log.append(remote_ids[idx], extract_judgment(response), "cache")
+        if cache:
+            print(f"Judge cache: {len(samples) - len(miss_indices)}/{len(samples)} hits ({cache.hit_rate:.1%})")
+
+        def on_result(miss_idx, response):
+            idx = miss_indices[miss_idx]
+            # 请求失败的样本不记录，resume时会重新评估
+            if response is None:
+                return
+            if cache:
+                cache.put_many([samples[idx]], [response])
+            verdict_log.append(remote_ids[idx], extract_judgment(response), "llm")
+
+        judge_samples(
+            [samples[idx] for idx in miss_indices],
+            on_result=on_result,
+            url=args.judge_url,
+            model=args.model,
+            max_concurrency=args.max_concurrency,
+            timeout=args.timeout,
+            max_retries=args.max_retries
+        )
+        if cache:
+            cache.close()
+
+    # ============ 2. 向量化计算各列并原子写回 ============
+    judgments = {sample_id: record["judgment"] for sample_id, record in load_verdicts(verdict_log_path).items()}
+    results = derive_codes(results, results["sample_id"].map(judgments).fillna(-1))
+    tmp_path = f"{results_csv_path}.tmp"
+    results.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, results_csv_path)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--results_dir", type=str, default=RESULTS_DIR)
-    parser.add_argument("--model", type=str, default="gpt-oss:120b")
+    parser.add_argument("--model", type=str, default=DEFAULT_JUDGE_MODEL)
+    parser.add_argument("--judge_url", type=str, default=DEFAULT_JUDGE_URL, help="Ollama-compatible /api/chat endpoint")
+    parser.add_argument("--max_concurrency", type=int, default=8, help="Maximum number of in-flight judge requests")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout of a single judge request in seconds")
+    parser.add_argument("--max_retries", type=int, default=5, help="Maximum number of retries per sample")
+    parser.add_argument("--judge_cache", type=str, default=None, help="Judge cache database (default: <results_dir>/judge_cache.sqlite)")
+    parser.add_argument("--no_cache", action="store_true", help="Do not read or write the judge cache")
+    parser.add_argument("--no_fast_path", action="store_true", help="Send every sample to the LLM judge")
+    parser.add_argument("--fast_path_min_confidence", type=float, default=STRONG_CONFIDENCE,
+                        help="Minimum confidence of the rule-based classifier to skip the LLM judge")
+    parser.add_argument("--resume", action="store_true", help="Skip samples already recorded in <results_dir>/judgments.jsonl")
+    parser.add_argument("--flush_every", type=int, default=50, help="Flush the verdict log every N verdicts")
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -0,0 +1,296 @@
+"""
+step_details.csv的分块流式统计
+step_details.csv每个生成token一行，多个模型/数据集合在一起时无法整体读入内存。
+这里按块读取，每块用分组向量化运算更新可合并的累加器，内存占用只与分组数量有关：
+    - 矩统计（Welford/Chan合并公式）：count、mean、std、min、max
+    - 固定区间直方图：熵的分位数、top-1概率分布
+多个文件可以在进程池中分别统计后合并。
+
+统计结果：
+    - entropy_summary: 按(run, category, correctness)的熵统计和分位数，category包含overall
+    - entropy_by_step: 按(run, step, correctness)的熵统计，超过max_step的步骤合并到max_step
+    - top1_histogram: 按(run, category, correctness)的top-1概率直方图
+
+用法:
+    python -m deephallu.analytics.step_stats --step_details run_a/step_details.csv run_b/step_details.csv --output_dir stats
+"""
+
+import argparse
+import os
+import os.path as osp
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from deephallu.analytics.metrics import DEFAULT_RUN, ENTROPY_STATES, OVERALL, default_run_names
+
+HERE = osp.dirname(osp.abspath(__file__))
+RESULTS_DIR = osp.join(HERE, "..", "..", "..", "results")
+
+# 未能关联到judgment的样本
+UNKNOWN = "unknown"
+# 熵直方图范围（nats），ln(32000)约为10.4，超出范围的值计入边界区间（min/max仍然精确）
+ENTROPY_RANGE = (0.0, 12.0)
+ENTROPY_BINS = 1200
+TOP1_BINS = 100
+PERCENTILES = [5, 25, 50, 75, 95]
+MOMENT_COLUMNS = ["count", "mean", "m2", "min", "max"]
+STEP_DETAILS_COLUMNS = ["sample_id", "category", "step", "entropy", "top1_prob"]
+
+
+def chunk_moments(values: pd.Series, keys: list) -> pd.DataFrame:
+    """一块数据的分组矩统计"""
+    grouped = values.groupby(keys, sort=False)
+    moments = grouped.agg(["count", "mean", "min", "max"])
+    moments["m2"] = grouped.var(ddof=0) * moments["count"]
+    return moments[MOMENT_COLUMNS]
+
+
+def merge_moments(a: Optional[pd.DataFrame], b: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """按Chan等人的并行公式合并两组矩统计（索引为分组key）"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    index = a.index.union(b.index)
+    a = a.reindex(index)
+    b = b.reindex(index)
+    count_a = a["count"].fillna(0)
+    count_b = b["count"].fillna(0)
+    mean_a = a["mean"].fillna(0.0)
+    mean_b = b["mean"].fillna(0.0)
+    count = count_a + count_b
+    delta = mean_b - mean_a
+    return pd.DataFrame({
+        "count": count,
+        "mean": mean_a + delta * count_b / count,
+        "m2": a["m2"].fillna(0.0) + b["m2"].fillna(0.0) + delta ** 2 * count_a * count_b / count,
+        "min": np.fmin(a["min"], b["min"]),
+        "max": np.fmax(a["max"], b["max"]),
+    }, index=index)
+
+
+def collapse_moments(moments: pd.DataFrame, levels: list) -> pd.DataFrame:
+    """把矩统计合并到更粗的分组（只保留levels）"""
+    grouped = moments.groupby(level=levels, sort=False)
+    count = grouped["count"].sum()
+    weighted = (moments["count"] * moments["mean"]).groupby(level=levels, sort=False).sum()
+    mean = weighted / count
+    offset = moments["mean"] - mean.reindex(moments.index.droplevel([name for name in moments.index.names if name not in levels])).to_numpy()
+    m2 = (moments["m2"] + moments["count"] * offset ** 2).groupby(level=levels, sort=False).sum()
+    return pd.DataFrame({"count": count, "mean": mean, "m2": m2, "min": grouped["min"].min(), "max": grouped["max"].max()})
+
+
+def finalize_moments(moments: pd.DataFrame) -> pd.DataFrame:
+    """由count/mean/m2得到样本标准差"""
+    result = moments[["count", "mean", "min", "max"]].copy()
+    result["count"] = result["count"].astype(np.int64)
+    result.insert(2, "std", np.sqrt(moments["m2"] / (moments["count"] - 1).where(moments["count"] > 1)))
+    return result
+
+
+def chunk_histogram(values: pd.Series, keys: list, value_range: tuple, num_bins: int) -> pd.DataFrame:
+    """一块数据的分组固定区间直方图，返回每行一个分组、每列一个区间的计数"""
+    low, high = value_range
+    bins = np.clip(((values.to_numpy(dtype=np.float64) - low) / (high - low) * num_bins).astype(np.int64), 0, num_bins - 1)
+    grouped = values.groupby(keys, sort=False)
+    codes = grouped.ngroup().to_numpy()
+    counts = np.bincount(codes * num_bins + bins, minlength=grouped.ngroups * num_bins).reshape(grouped.ngroups, num_bins)
+    # ngroup的编号顺序与groups的key顺序一致
+    return pd.DataFrame(counts, index=grouped.size().index)
+
+
+def merge_histograms(a: Optional[pd.DataFrame], b: Optional[pd.DataFrame]) -> pd.DataFrame:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a.add(b, fill_value=0).astype(np.int64)
+
+
+def histogram_percentiles(histogram: pd.DataFrame, value_range: tuple, percentiles: Sequence[float] = PERCENTILES) -> pd.DataFrame:
+    """由直方图估计分位数（区间内线性插值），样本足够多时误差在一个区间宽度左右"""
+    low, high = value_range
+    counts = histogram.to_numpy(dtype=np.float64)
+    num_bins = counts.shape[1]
+    width = (high - low) / num_bins
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1:]
+    result = {}
+    for q in percentiles:
+        target = total * q / 100.0
+        # 第一个累计计数达到target的区间
+        bin_index = np.minimum((cumulative < target).sum(axis=1), num_bins - 1)
+        rows = np.arange(len(counts))
+        before = np.where(bin_index > 0, cumulative[rows, bin_index - 1], 0.0)
+        in_bin = counts[rows, bin_index]
+        fraction = np.where(in_bin > 0, (target[:, 0] - before) / np.where(in_bin > 0, in_bin, 1.0), 0.0)
+        result[f"p{q:g}"] = np.where(total[:, 0] > 0, low + (bin_index + fraction) * width, np.nan)
+    return pd.DataFrame(result, index=histogram.index)
+
+
+class StepStatsAccumulator:
+    """
+    step_details的可合并统计量
+    Args:
+        max_step: 按步骤统计时的最大步骤，之后的步骤合并到max_step
+        entropy_range: 熵直方图的范围
+        entropy_bins: 熵直方图的区间数
+        top1_bins: top-1概率直方图的区间数（范围0-1）
+    """
+    def __init__(self, max_step: int = 256, entropy_range: tuple = ENTROPY_RANGE, entropy_bins: int = ENTROPY_BINS, top1_bins: int = TOP1_BINS):
+        self.max_step = max_step
+        self.entropy_range = tuple(entropy_range)
+        self.entropy_bins = entropy_bins
+        self.top1_bins = top1_bins
+        self.num_rows = 0
+        self.entropy_moments = None
+        self.entropy_histogram = None
+        self.step_moments = None
+        self.top1_histogram = None
+
+    def update(self, chunk: pd.DataFrame):
+        """
+        用一块数据更新统计量
+        Args:
+            chunk: 包含run、category、correctness、step、entropy、top1_prob列
+        """
+        if len(chunk) == 0:
+            return
+        self.num_rows += len(chunk)
+        group_keys = [chunk["run"], chunk["category"], chunk["correctness"]]
+        entropy = chunk["entropy"]
+        self.entropy_moments = merge_moments(self.entropy_moments, chunk_moments(entropy, group_keys))
+        self.entropy_histogram = merge_histograms(self.entropy_histogram, chunk_histogram(entropy, group_keys, self.entropy_range, self.entropy_bins))
+        step = chunk["step"].clip(upper=self.max_step)
+        self.step_moments = merge_moments(self.step_moments, chunk_moments(entropy, [chunk["run"], step, chunk["correctness"]]))
+        if "top1_prob" in chunk.columns:
+            self.top1_histogram = merge_histograms(self.top1_histogram, chunk_histogram(chunk["top1_prob"], group_keys, (0.0, 1.0), self.top1_bins))
+
+    def merge(self, other: "StepStatsAccumulator") -> "StepStatsAccumulator":
+        """合并另一个（相同参数的）统计量，返回self"""
+        if (other.max_step, other.entropy_range, other.entropy_bins, other.top1_bins) != (self.max_step, self.entropy_range, self.entropy_bins, self.top1_bins):
+            raise ValueError("Cannot merge step statistics computed with different parameters")
+        self.num_rows += other.num_rows
+        self.entropy_moments = merge_moments(self.entropy_moments, other.entropy_moments)
+        self.entropy_histogram = merge_histograms(self.entropy_histogram, other.entropy_histogram)
+        self.step_moments = merge_moments(self.step_moments, other.step_moments)
+        self.top1_histogram = merge_histograms(self.top1_histogram, other.top1_histogram)
+        return self
+
+    def _with_overall(self, table: pd.DataFrame, collapse) -> pd.DataFrame:
+        """添加category为overall的行"""
+        overall = collapse(table)
+        overall.index = pd.MultiIndex.from_arrays([
+            overall.index.get_level_values(0), [OVERALL] * len(overall), overall.index.get_level_values(1)
+        ], names=table.index.names)
+        return pd.concat([overall, table])
+
+    def entropy_summary(self) -> pd.DataFrame:
+        if self.entropy_moments is None:
+            return pd.DataFrame()
+        moments = self.entropy_moments.rename_axis(["run", "category", "correctness"])
+        histogram = self.entropy_histogram.rename_axis(["run", "category", "correctness"])
+        moments = self._with_overall(moments, lambda m: collapse_moments(m, ["run", "correctness"]))
+        histogram = self._with_overall(histogram, lambda h: h.groupby(level=["run", "correctness"], sort=False).sum())
+        summary = finalize_moments(moments).join(histogram_percentiles(histogram, self.entropy_range))
+        return summary.sort_index(level=["run", "category", "correctness"]).reset_index()
+
+    def entropy_by_step(self) -> pd.DataFrame:
+        if self.step_moments is None:
+            return pd.DataFrame()
+        moments = self.step_moments.rename_axis(["run", "step", "correctness"])
+        return finalize_moments(moments).sort_index().reset_index()
+
+    def top1_distribution(self) -> pd.DataFrame:
+        """长表：每行一个(run, category, correctness, 区间)"""
+        if self.top1_histogram is None:
+            return pd.DataFrame()
+        histogram = self.top1_histogram.rename_axis(["run", "category", "correctness"])
+        histogram = self._with_overall(histogram, lambda h: h.groupby(level=["run", "correctness"], sort=False).sum())
+        edges = np.linspace(0.0, 1.0, self.top1_bins + 1)
+        histogram.columns = pd.Index(range(self.top1_bins), name="bin")
+        table = histogram.stack().rename("count").reset_index()
+        table.insert(4, "bin_left", edges[table["bin"]])
+        table.insert(5, "bin_right", edges[table["bin"] + 1])
+        return table.drop(columns="bin").sort_values(["run", "category", "correctness", "bin_left"], ignore_index=True)
+
+
+def load_correctness(results_path: Optional[str]) -> Dict[object, str]:
+    """从results.csv读取每个样本的judgment，映射为correct/hallucinated"""
+    if results_path is None or not osp.exists(results_path):
+        return {}
+    results = pd.read_csv(results_path, usecols=["sample_id", "judgment"])
+    return results["judgment"].map(ENTROPY_STATES).fillna(UNKNOWN).set_axis(results["sample_id"]).to_dict()
+
+
+def aggregate_file(step_details_path: str, run: str = DEFAULT_RUN, results_path: Optional[str] = None,
+                   chunksize: int = 500_000, **accumulator_kwargs) -> StepStatsAccumulator:
+    """
+    分块统计一个step_details.csv
+    Args:
+        results_path: 对应的results.csv，用于获取judgment，默认为同目录下的results.csv
+        chunksize: 每块的行数
+    """
+    if results_path is None:
+        results_path = osp.join(osp.dirname(step_details_path), "results.csv")
+    correctness = load_correctness(results_path)
+    accumulator = StepStatsAccumulator(**accumulator_kwargs)
+    header = pd.read_csv(step_details_path, nrows=0).columns
+    usecols = [column for column in STEP_DETAILS_COLUMNS if column in header]
+    for chunk in pd.read_csv(step_details_path, usecols=usecols, chunksize=chunksize):
+        chunk = chunk.dropna(subset=["entropy"])
+        chunk["category"] = chunk["category"].fillna(UNKNOWN)
+        chunk["run"] = run
+        chunk["correctness"] = chunk["sample_id"].map(correctness).fillna(UNKNOWN)
+        accumulator.update(chunk)
+    return accumulator
+
+
+def aggregate_files(paths: Sequence[str], runs: Optional[Sequence[str]] = None, results_paths: Optional[Sequence[Optional[str]]] = None,
+                    num_workers: Optional[int] = None, chunksize: int = 500_000, **accumulator_kwargs) -> StepStatsAccumulator:
+    """
+    并行统计多个step_details.csv并合并
+    Args:
+        runs: 每个文件的run名称，默认使用所在目录名
+        results_paths: 每个文件对应的results.csv
+        num_workers: 进程数，1表示在当前进程中依次统计
+    """
+    runs = list(runs) if runs is not None else default_run_names(paths)
+    results_paths = list(results_paths) if results_paths is not None else [None] * len(paths)
+    if not (len(runs) == len(results_paths) == len(paths)):
+        raise ValueError("paths, runs and results_paths must have the same length")
+    num_workers = num_workers or min(len(paths), os.cpu_count() or 1)
+    args = [(path, run, results_path, chunksize) for path, run, results_path in zip(paths, runs, results_paths)]
+    if num_workers == 1:
+        partials = [aggregate_file(*arg, **accumulator_kwargs) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(aggregate_file, *arg, **accumulator_kwargs) for arg in args]
+            partials = [future.result() for future in futures]
+    return reduce(lambda a, b: a.merge(b), partials)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--step_details", type=str, nargs="+", default=[osp.join(RESULTS_DIR, "step_details.csv")])
+    parser.add_argument("--results", type=str, nargs="+", default=None, help="results.csv for each step_details file (default: same directory)")
+    parser.add_argument("--runs", type=str, nargs="+", default=None, help="Run names (default: directory names)")
+    parser.add_argument("--chunksize", type=int, default=500_000)
+    parser.add_argument("--num_workers", type=int, default=None)
+    parser.add_argument("--max_step", type=int, default=256)
+    parser.add_argument("--output_dir", type=str, default=None, help="Save entropy_summary.csv, entropy_by_step.csv and top1_histogram.csv here")
+    args = parser.parse_args()
+    stats = aggregate_files(args.step_details, args.runs, args.results, args.num_workers, args.chunksize, max_step=args.max_step)
+    summary = stats.entropy_summary()
+    print(f"Aggregated {stats.num_rows} steps")
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(summary.to_string(index=False, float_format="%.4f"))
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        summary.to_csv(osp.join(args.output_dir, "entropy_summary.csv"), index=False)
+        stats.entropy_by_step().to_csv(osp.join(args.output_dir, "entropy_by_step.csv"), index=False)
+        stats.top1_distribution().to_csv(osp.join(args.output_dir, "top1_histogram.csv"), index=False)
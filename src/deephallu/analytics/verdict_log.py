@@ -0,0 +1,92 @@
+"""
+Judge结果的追加日志
+评估过程中每得到一个判断结果就追加一行JSON到日志文件，按条数或时间间隔批量flush（并fsync）。
+每次flush用一次write写入完整的若干行，中断时最多丢失最后一批未flush的结果，
+恢复时先截掉可能写了一半的最后一行再继续追加。
+"""
+
+import json
+import os
+import time
+from typing import Dict
+
+
+class VerdictLog:
+    """
+    追加写入的判断结果日志
+    Args:
+        path: 日志文件路径（JSON Lines）
+        flush_every: 累积多少条结果后flush
+        flush_interval: 距上次flush超过多少秒后flush
+        resume: True时保留已有内容继续追加，否则清空
+    """
+    def __init__(self, path: str, flush_every: int = 50, flush_interval: float = 10.0, resume: bool = False):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND | (0 if resume else os.O_TRUNC), 0o644)
+        if resume:
+            self._drop_partial_line()
+
+    def _drop_partial_line(self, chunk_size: int = 65536):
+        """截断到最后一个换行符之后，避免新记录接在写了一半的行后面"""
+        end = os.fstat(self._fd).st_size
+        pos = end
+        while pos > 0:
+            start = max(0, pos - chunk_size)
+            chunk = os.pread(self._fd, pos - start, start)
+            idx = chunk.rfind(b"\n")
+            if idx >= 0:
+                pos = start + idx + 1
+                break
+            pos = start
+        if pos < end:
+            os.ftruncate(self._fd, pos)
+
+    def append(self, sample_id, judgment: int, source: str):
+        """记录一个判断结果，source为fast/cache/llm"""
+        record = {"sample_id": sample_id, "judgment": int(judgment), "source": source}
+        self._buffer.append(json.dumps(record, ensure_ascii=False, default=int) + "\n")
+        if len(self._buffer) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            os.write(self._fd, "".join(self._buffer).encode("utf-8"))
+            os.fsync(self._fd)
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_verdicts(path: str) -> Dict[object, dict]:
+    """
+    读取日志中已有的判断结果
+    Returns:
+        Dict: sample_id到记录的映射，同一个sample_id以最后一条为准
+    """
+    verdicts = {}
+    if not os.path.exists(path):
+        return verdicts
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                # 中断时写了一半的行
+                break
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            verdicts[record["sample_id"]] = record
+    return verdicts
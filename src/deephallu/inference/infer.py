@@ -1,11 +1,11 @@
 import json
 import os
-os.environ["HF_HOME"] = "/DATA2/HuggingFace"
-os.environ["CUDA_VISIBLE_DEVICES"] = "1,2,3"
+os.environ.setdefault("HF_HOME", "/DATA2/HuggingFace")
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "1,2,3")
 import os.path as osp
 import argparse
 import numpy as np
-from typing import List, Dict, Tuple
+from typing import Any, List, Dict, Optional, Tuple
 import torch
 import torch.nn.functional as F
 from PIL import Image
@@ -30,6 +30,35 @@ def calculate_entropy(probs:torch.Tensor, log_base='e'):
         raise ValueError(f"Invalid log base: {log_base}")
     
 
+def analyze_step(logits: torch.Tensor, processor, top_k: int = 5, step_idx: int = 0) -> Dict:
+    """
+    分析单个生成步骤的概率分布熵和top-k tokens，可在生成过程中逐步调用
+    Args:
+        logits: 单个样本该步骤的logits，shape (vocab_size,)，可以在GPU上
+    Returns:
+        Dict: step, entropy, top_k_tokens, top_k_probs, top_k_token_ids
+    """
+    # 计算概率分布
+    probs = F.softmax(logits.float(), dim=-1)
+    # 计算熵 H(p) = -Σ p(x) * log(p(x))
+    # 使用loge计算，单位为nats，使用log2计算，单位为bits
+    entropy = calculate_entropy(probs)
+    # 获取top-k tokens
+    top_k_probs, top_k_indices = torch.topk(probs, k=top_k)
+    # 解码token ids到文本
+    top_k_token_ids = top_k_indices.tolist()
+    top_k_tokens = [
+        processor.decode([token_id], skip_special_tokens=False) 
+        for token_id in top_k_token_ids
+    ]
+    return {
+        'step': step_idx,
+        'entropy': entropy.item(),
+        'top_k_tokens': top_k_tokens,
+        'top_k_probs': top_k_probs.tolist(),
+        'top_k_token_ids': top_k_token_ids
+    }
+
 def analyze_scores_steps(
     scores: Tuple[torch.Tensor, ...],
     processor,
@@ -57,43 +86,145 @@ def analyze_scores_steps(
         logits = logits.detach().cpu()
         # logits shape: (batch_size, vocab_size)
         for i in range(batch_size):
-            logits_single = logits[i]  # shape: (vocab_size,)
-            # 计算概率分布
-            probs = F.softmax(logits_single, dim=-1)
-            # 计算熵 H(p) = -Σ p(x) * log(p(x))
-            # 使用loge计算，单位为nats，使用log2计算，单位为bits
-            entropy = calculate_entropy(probs)
-            # 获取top-k tokens
-            top_k_probs, top_k_indices = torch.topk(probs, k=top_k)
-            # 解码token ids到文本
-            top_k_token_ids = top_k_indices.tolist()
-            top_k_tokens = [
-                processor.decode([token_id], skip_special_tokens=False) 
-                for token_id in top_k_token_ids
-            ]
-            # 保存结果
-            step_result = {
-                'step': step_idx,
-                'entropy': entropy.item(),
-                'top_k_tokens': top_k_tokens,
-                'top_k_probs': top_k_probs.tolist(),
-                'top_k_token_ids': top_k_token_ids
-            }
-            results[i].append(step_result)
+            results[i].append(analyze_step(logits[i], processor, top_k, step_idx))
     return results        
 
-def main(args):
-    if args.model == "llava-next":
-        processor = LlavaNextProcessor.from_pretrained(args.model_name)
+def image_token_attention(attentions: Tuple[Tuple[torch.Tensor, ...], ...], image_positions: torch.Tensor) -> np.ndarray:
+    """
+    每个生成步骤、每一层中，当前生成token对image tokens的attention（对head取平均）
+    Args:
+        attentions: model.generate()的attentions输出，tuple (step, layer, (batch_size, num_heads, query_len, key_len))
+        image_positions: image tokens在输入序列中的位置，顺序与Token2PatchMapper的layout一致
+    Returns:
+        np.ndarray: (num_steps, num_layers, num_image_tokens)，float16
+    """
+    steps = []
+    for step_attentions in attentions:
+        # 第0步的query包含整个prompt，只取最后一个位置（即生成第一个token的位置）
+        layers = [layer_attention[0, :, -1, image_positions].float().mean(dim=0) for layer_attention in step_attentions]
+        steps.append(torch.stack(layers).cpu())
+    return torch.stack(steps).numpy().astype(np.float16)
+
+def load_model(model: str = "llava-next", model_name: str = "llava-hf/llava-v1.6-mistral-7b-hf", device: str = "cuda"):
+    """
+    加载processor和模型（eager attention，以便输出attention）
+    Returns:
+        (processor, model)
+    """
+    if model == "llava-next":
+        processor = LlavaNextProcessor.from_pretrained(model_name)
         model = LlavaNextForConditionalGeneration.from_pretrained(
-            args.model_name, 
+            model_name, 
             attn_implementation="eager"
-        ).to("cuda")
+        ).to(device)
+        model.eval()
         # 确保模型配置启用 attention 输出
         model.config.output_attentions = True
         model.language_model.config.output_attentions = True
     else:
-        raise ValueError(f"Model {args.model} not supported")
+        raise ValueError(f"Model {model} not supported")
+    return processor, model
+
+def infer_sample(
+    model,
+    processor,
+    image: Image.Image,
+    question: str,
+    top_k: int = 5,
+    max_new_tokens: int = 1000,
+    do_sample: bool = False,
+    temperature: float = 1.0,
+    save_attentions: bool = False
+) -> Dict[str, Any]:
+    """
+    对单个样本做生成，并分析每个生成步骤
+    Returns:
+        Dict: 
+            - generated_text: 生成的文本
+            - num_generated_tokens: 生成的token数
+            - avg_entropy: 所有步骤熵的平均值
+            - steps: analyze_scores_steps的结果（单个样本）
+            - attention: save_attentions时为image_token_attention的结果，否则为None
+    """
+    conversation = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": question},
+                {"type": "image"},
+            ],
+        },
+    ]
+
+    prompt = processor.apply_chat_template(conversation, add_generation_prompt=True)
+    inputs = processor(images=image, text=prompt, return_tensors="pt")
+    
+    # 将inputs移动到模型设备
+    inputs = {k: v.to(model.device) for k, v in inputs.items()}
+    
+    generate_kwargs = {"do_sample": do_sample}
+    if do_sample:
+        generate_kwargs["temperature"] = temperature
+    with torch.no_grad():
+        outputs = model.generate(
+            **inputs, 
+            max_new_tokens=max_new_tokens, 
+            output_attentions=save_attentions, 
+            output_scores=True, 
+            return_dict_in_generate=True,
+            **generate_kwargs
+        )
+        generated_ids = outputs.sequences
+        scores = outputs.scores
+
+    scores_results = analyze_scores_steps(scores, processor, top_k)
+    num_prompt_tokens = len(inputs['input_ids'][0])
+    attention = None
+    if save_attentions:
+        # processor把<image>展开为与layout等长的image token序列，按位置取出
+        image_positions = torch.nonzero(inputs['input_ids'][0] == model.config.image_token_index).squeeze(-1)
+        attention = image_token_attention(outputs.attentions, image_positions)
+    result = {
+        "generated_text": processor.decode(generated_ids[0][num_prompt_tokens:], skip_special_tokens=True),
+        "num_generated_tokens": len(generated_ids[0]) - num_prompt_tokens,
+        "avg_entropy": sum(step['entropy'] for step in scores_results[0]) / len(scores_results[0]),
+        "steps": scores_results[0],
+        "attention": attention,
+    }
+
+    # 清理GPU内存
+    del outputs, inputs
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    return result
+
+def flatten_steps(sample_id: str, category: str, steps: List[Dict], top_k: int) -> List[Dict]:
+    """将每个step展开为step_details.csv的一行"""
+    rows = []
+    for step_info in steps:
+        step_row = {
+            "sample_id": sample_id,
+            "category": category,
+            "step": step_info['step'],
+            "entropy": step_info['entropy'],
+        }
+        # 添加top-k tokens和概率
+        for k in range(top_k):
+            step_row[f'top{k+1}_token'] = step_info['top_k_tokens'][k]
+            step_row[f'top{k+1}_prob'] = step_info['top_k_probs'][k]
+            step_row[f'top{k+1}_token_id'] = step_info['top_k_token_ids'][k]
+        rows.append(step_row)
+    return rows
+
+def save_attention(output_dir: str, sample_id: str, attention: np.ndarray) -> str:
+    """保存为未压缩的attentions/<sample_id>.npy，web后端可以按(step, layer)内存映射读取"""
+    attention_path = osp.join(output_dir, "attentions", f"{sample_id}.npy")
+    os.makedirs(osp.dirname(attention_path), exist_ok=True)  # MME的id可能包含子目录
+    np.save(attention_path, attention)
+    return attention_path
+
+def main(args):
+    processor, model = load_model(args.model, args.model_name)
     
     if args.dataset == "mme":
         dataset = MMEDataset()
@@ -110,65 +241,23 @@ def main(args):
     for idx, data in enumerate(tqdm(dataset, desc="Processing")):
         try:
             image, id, image_name, category, question, answer = data
-            print(f"i")
-            conversation = [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": question},
-                        {"type": "image"},
-                    ],
-                },
-            ]
-
-            prompt = processor.apply_chat_template(conversation, add_generation_prompt=True)
-            inputs = processor(images=image, text=prompt, return_tensors="pt")
-            
-            # 将inputs移动到模型设备
-            inputs = {k: v.to(model.device) for k, v in inputs.items()}
-            
-            with torch.no_grad():
-                outputs = model.generate(
-                    **inputs, 
-                    max_new_tokens=1000, 
-                    output_attentions=True, 
-                    output_scores=True, 
-                    return_dict_in_generate=True
-                )
-                generated_ids = outputs.sequences
-                scores = outputs.scores
-
-            scores_results = analyze_scores_steps(scores, processor, args.top_k)
-            generated_text = processor.decode(generated_ids[0][len(inputs['input_ids'][0]):], skip_special_tokens=True)
-            avg_entropy = sum(result['entropy'] for result in scores_results[0]) / len(scores_results[0])
+            output = infer_sample(
+                model, processor, image, question,
+                top_k=args.top_k, max_new_tokens=args.max_new_tokens, save_attentions=args.save_attentions
+            )
+            if args.save_attentions:
+                save_attention(args.output_dir, id, output["attention"])
             results.append({
                 "sample_id": id,
+                "image_name": image_name,
+                "image_path": getattr(image, "filename", None),
                 "category": category,
                 "question": question,
                 "answer": answer,
-                "generated_text": generated_text,
-                "avg_entropy": avg_entropy
+                "generated_text": output["generated_text"],
+                "avg_entropy": output["avg_entropy"]
             })
-
-            # 将每个step展开为一行
-            for step_info in scores_results[0]:
-                step_row = {
-                    "sample_id": id,
-                    "category": category,
-                    "step": step_info['step'],
-                    "entropy": step_info['entropy'],
-                }
-                # 添加top-k tokens和概率
-                for k in range(args.top_k):
-                    step_row[f'top{k+1}_token'] = step_info['top_k_tokens'][k]
-                    step_row[f'top{k+1}_prob'] = step_info['top_k_probs'][k]
-                    step_row[f'top{k+1}_token_id'] = step_info['top_k_token_ids'][k]
-                
-                step_details_flat.append(step_row)
-            
-            # 清理GPU内存
-            del outputs, inputs
-            torch.cuda.empty_cache()
+            step_details_flat.extend(flatten_steps(id, category, output["steps"], args.top_k))
 
             print(f"Processed data {idx} (id: {id if id else 'unknown'})")
         except Exception as e:
@@ -193,8 +282,11 @@ if __name__ == "__main__":
     parser.add_argument("--save_all_scores", action="store_true",
                         help="Save all scores, otherwise save only top k scores")
     parser.add_argument("--top_k", type=int, default=5, help="Top k tokens to save")
+    parser.add_argument("--max_new_tokens", type=int, default=1000, help="Maximum number of generated tokens")
     parser.add_argument("--save_all_attentions", action="store_true",
                         help="Save all attentions, otherwise only the attentions of generation steps")
+    parser.add_argument("--save_attentions", action="store_true",
+                        help="Save the head-averaged attention of each generated token to the image tokens to attentions/<sample_id>.npy")
     args = parser.parse_args()
     main(args)
 
@@ -0,0 +1,167 @@
+import argparse
+import json
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+import torch
+from PIL import Image
+
+from deephallu.inference.infer import analyze_step, load_model
+
+
+class IncrementalDecoder:
+    """
+    逐token解码，只对最近的token重新解码（与transformers.TextStreamer相同的思路），
+    避免每一步都解码整个序列；多字节字符未完整时先不输出
+    """
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.token_cache: List[int] = []
+        self.print_len = 0
+
+    def put(self, token_id: int) -> str:
+        self.token_cache.append(token_id)
+        text = self.tokenizer.decode(self.token_cache, skip_special_tokens=True)
+        if text.endswith("\n"):
+            delta = text[self.print_len:]
+            self.token_cache, self.print_len = [], 0
+        elif text.endswith("�"):
+            delta = ""
+        else:
+            # 只输出到最后一个空格，之后的部分可能随下一个token改变
+            end = text.rfind(" ") + 1
+            if end <= self.print_len:
+                return ""
+            delta = text[self.print_len:end]
+            self.print_len = end
+        return delta
+
+    def flush(self) -> str:
+        text = self.tokenizer.decode(self.token_cache, skip_special_tokens=True)
+        delta = text[self.print_len:]
+        self.token_cache, self.print_len = [], 0
+        return delta
+
+
+def stream_generate(
+    model,
+    processor,
+    image: Image.Image,
+    question: str,
+    max_new_tokens: int = 512,
+    top_k: int = 5,
+    image_attention: bool = False,
+    stop_event: Optional[threading.Event] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    用KV cache逐token贪心生成，每生成一个token就产出该步骤的分析结果
+    每一步只分析新token的logits，不会重新分析整个序列
+    Args:
+        image_attention: 是否计算新token对image tokens的attention质量（对head和层取平均），需要eager attention
+        stop_event: 设置后在当前步骤结束时停止生成（用于客户端取消）
+    Yields:
+        Dict: analyze_step的结果，另加
+            - token_id / token: 选中的token
+            - text: 新增的可显示文本
+            - image_attention: 新token分配给image tokens的attention之和（image_attention为False时为None）
+        最后一个结果的finish_reason为"eos"、"length"或"cancelled"，并包含generated_text和avg_entropy
+    """
+    conversation = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": question},
+                {"type": "image"},
+            ],
+        },
+    ]
+    prompt = processor.apply_chat_template(conversation, add_generation_prompt=True)
+    inputs = processor(images=image, text=prompt, return_tensors="pt")
+    inputs = {k: v.to(model.device) for k, v in inputs.items()}
+    image_positions = torch.nonzero(inputs['input_ids'][0] == model.config.image_token_index).squeeze(-1)
+    eos_token_ids = model.generation_config.eos_token_id
+    eos_token_ids = set(eos_token_ids if isinstance(eos_token_ids, list) else [eos_token_ids])
+    decoder = IncrementalDecoder(processor.tokenizer)
+    attention_mask = inputs['attention_mask']
+    generated_ids: List[int] = []
+    entropy_sum = 0.0
+    outputs = past_key_values = None
+    try:
+        with torch.no_grad():
+            outputs = model(**inputs, use_cache=True, output_attentions=image_attention, return_dict=True)
+            # 图像特征只在第一次前向时需要
+            del inputs
+            for step_idx in range(max_new_tokens):
+                logits = outputs.logits[0, -1]
+                step = analyze_step(logits, processor, top_k, step_idx)
+                token_id = int(torch.argmax(logits))
+                generated_ids.append(token_id)
+                entropy_sum += step['entropy']
+                step['token_id'] = token_id
+                step['token'] = processor.decode([token_id], skip_special_tokens=False)
+                step['image_attention'] = None
+                if image_attention:
+                    # 每层: (batch_size, num_heads, query_len, key_len)，取最后一个query
+                    mass = [layer[0, :, -1, image_positions].float().sum(dim=-1).mean() for layer in outputs.attentions]
+                    step['image_attention'] = torch.stack(mass).mean().item()
+
+                finish_reason = None
+                if token_id in eos_token_ids:
+                    finish_reason = "eos"
+                elif step_idx + 1 == max_new_tokens:
+                    finish_reason = "length"
+                elif stop_event is not None and stop_event.is_set():
+                    finish_reason = "cancelled"
+                step['text'] = decoder.put(token_id) if token_id not in eos_token_ids else ""
+                if finish_reason is not None:
+                    step['text'] += decoder.flush()
+                    step['finish_reason'] = finish_reason
+                    step['generated_text'] = processor.tokenizer.decode(generated_ids, skip_special_tokens=True)
+                    step['avg_entropy'] = entropy_sum / len(generated_ids)
+                    yield step
+                    return
+                yield step
+
+                attention_mask = torch.cat([attention_mask, attention_mask.new_ones((1, 1))], dim=-1)
+                past_key_values = outputs.past_key_values
+                outputs = None
+                outputs = model(
+                    input_ids=torch.tensor([[token_id]], device=model.device),
+                    attention_mask=attention_mask,
+                    past_key_values=past_key_values,
+                    use_cache=True,
+                    output_attentions=image_attention,
+                    return_dict=True
+                )
+                past_key_values = None
+    finally:
+        # 生成结束或被中断（生成器关闭）时立即释放KV cache
+        outputs = past_key_values = None
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+def main(args):
+    processor, model = load_model(args.model, args.model_name, args.device)
+    image = Image.open(args.image).convert("RGB")
+    for step in stream_generate(model, processor, image, args.question, args.max_new_tokens, args.top_k, args.image_attention):
+        if args.jsonl:
+            print(json.dumps(step, ensure_ascii=False), flush=True)
+        else:
+            print(step['text'], end="", flush=True)
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="llava-next", choices=["llava-next"])
+    parser.add_argument("--model_name", type=str, default="llava-hf/llava-v1.6-mistral-7b-hf")
+    parser.add_argument("--device", type=str, default="cuda")
+    parser.add_argument("--image", type=str, required=True)
+    parser.add_argument("--question", type=str, required=True)
+    parser.add_argument("--max_new_tokens", type=int, default=512)
+    parser.add_argument("--top_k", type=int, default=5)
+    parser.add_argument("--image_attention", action="store_true", help="Report the attention mass on image tokens per step")
+    parser.add_argument("--jsonl", action="store_true", help="Print one JSON object per step instead of the text")
+    args = parser.parse_args()
+    main(args)
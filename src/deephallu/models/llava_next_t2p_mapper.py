@@ -3,14 +3,18 @@ Token到Patch位置映射工具
 用于分析LLaVA-Next中每个image token对应原始图像中的具体位置
 """
 import os
-os.environ["HF_HOME"] = "/DATA2/HuggingFace"
 import os.path as osp
+import argparse
+import json
 import math
 from enum import Enum
-from dataclasses import dataclass
-from typing import Tuple, List, Optional
+from dataclasses import dataclass, field, asdict
+from typing import Tuple, List, Optional, Union
+import numpy as np
 from PIL import Image, ImageDraw
-from transformers import LlavaNextProcessor
+from deephallu.models.t2p_layout_cache import LayoutCache, make_geometry_key
+
+DEFAULT_MODEL_NAME = "llava-hf/llava-v1.6-mistral-7b-hf"
 
 class TokenType(Enum):
     BASE_IMAGE_FEATURES = 0
@@ -27,16 +31,117 @@ class TokenPosition:
     patch_col: int  # column index of the patch
     token_type: TokenType
 
+# 结构化layout的dtype，每行对应一个token，字段与TokenPosition一致（bbox展开为x1/y1/x2/y2，token_type为TokenType的值）
+TOKEN_LAYOUT_DTYPE = np.dtype([
+    ('token_idx', np.int64),
+    ('block_id', np.int64),
+    ('x1', np.int64),
+    ('y1', np.int64),
+    ('x2', np.int64),
+    ('y2', np.int64),
+    ('patch_row', np.int64),
+    ('patch_col', np.int64),
+    ('token_type', np.int8),
+])
+
+@dataclass
+class PatchGeometry:
+    """
+    决定token layout的processor几何参数，默认值对应llava-v1.6-mistral-7b-hf
+    可以从processor导出为JSON，之后无需transformers即可构建Token2PatchMapper
+    """
+    patch_size: int = 14
+    block_size: Tuple[int, int] = (336, 336)
+    image_grid_pinpoints: List[List[int]] = field(default_factory=lambda: [[336, 672], [672, 336], [672, 672], [1008, 336], [336, 1008]])
+    vision_feature_select_strategy: str = "default"
+
+    def __post_init__(self):
+        self.block_size = (int(self.block_size[0]), int(self.block_size[1]))
+        self.image_grid_pinpoints = [[int(h), int(w)] for h, w in self.image_grid_pinpoints]
+
+    @classmethod
+    def from_processor(cls, processor) -> "PatchGeometry":
+        """从LlavaNextProcessor实例读取几何参数"""
+        image_processor = processor.image_processor
+        size = getattr(image_processor, 'size', {'shortest_edge': 336})
+        block_size = ((size["shortest_edge"], size["shortest_edge"]) if "shortest_edge" in size else (min(size["height"], size["width"]), min(size["height"], size["width"])))
+        defaults = cls()
+        return cls(
+            patch_size=getattr(processor, 'patch_size', None) or defaults.patch_size,
+            block_size=block_size,
+            image_grid_pinpoints=getattr(image_processor, 'image_grid_pinpoints', defaults.image_grid_pinpoints),
+            vision_feature_select_strategy=getattr(processor, 'vision_feature_select_strategy', None) or defaults.vision_feature_select_strategy,
+        )
+
+    @classmethod
+    def from_pretrained(cls, model_name: str = DEFAULT_MODEL_NAME) -> "PatchGeometry":
+        """加载HuggingFace processor读取几何参数（需要transformers）"""
+        os.environ.setdefault("HF_HOME", "/DATA2/HuggingFace")
+        from transformers import LlavaNextProcessor
+        return cls.from_processor(LlavaNextProcessor.from_pretrained(model_name))
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "PatchGeometry":
+        return cls(**{key: config[key] for key in ('patch_size', 'block_size', 'image_grid_pinpoints', 'vision_feature_select_strategy') if key in config})
+
+    @classmethod
+    def from_json(cls, json_path: str) -> "PatchGeometry":
+        with open(json_path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self) -> dict:
+        config = asdict(self)
+        config['block_size'] = list(self.block_size)
+        return config
+
+    def to_json(self, json_path: str):
+        with open(json_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @property
+    def key(self) -> str:
+        """几何参数的key，layout只取决于该key和图像尺寸"""
+        return make_geometry_key(self.patch_size, self.block_size, self.image_grid_pinpoints, self.vision_feature_select_strategy)
+
+
 class Token2PatchMapper:
-    """Token到patch位置的映射器"""
-    def __init__(self, model_name: str = "llava-hf/llava-v1.6-mistral-7b-hf"):
-        self.processor = LlavaNextProcessor.from_pretrained(model_name)
-        self.image_processor = self.processor.image_processor
-        self.patch_size = getattr(self.processor, 'patch_size', 14)
-        size = getattr(self.image_processor, 'size', {'shortest_edge': 336})
-        self.block_size = ((size["shortest_edge"], size["shortest_edge"]) if "shortest_edge" in size else (min(size["height"], size["width"]), min(size["height"], size["width"])))
-        self.image_grid_pinpoints = getattr(self.image_processor, 'image_grid_pinpoints', [[336, 672], [672, 336], [672, 672], [1008, 336], [336, 1008]])
-        self.vision_feature_select_strategy = getattr(self.processor, 'vision_feature_select_strategy', 'default')
+    """
+    Token到patch位置的映射器
+    Args:
+        model_name: HuggingFace模型名，geometry为None时加载其processor读取几何参数
+        geometry: 几何参数（PatchGeometry、dict或导出的JSON路径），给定时不加载processor，也不导入transformers
+        layout_cache_size: 内存中缓存的layout数量（按图像尺寸）
+        layout_cache_dir: layout磁盘缓存目录，None表示只缓存在内存中
+    """
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, geometry: Union[PatchGeometry, dict, str, None] = None, layout_cache_size: int = 1024, layout_cache_dir: Optional[str] = None):
+        self.processor = None
+        self.image_processor = None
+        if geometry is None:
+            os.environ.setdefault("HF_HOME", "/DATA2/HuggingFace")
+            from transformers import LlavaNextProcessor
+            self.processor = LlavaNextProcessor.from_pretrained(model_name)
+            self.image_processor = self.processor.image_processor
+            geometry = PatchGeometry.from_processor(self.processor)
+        elif isinstance(geometry, str):
+            geometry = PatchGeometry.from_json(geometry)
+        elif isinstance(geometry, dict):
+            geometry = PatchGeometry.from_dict(geometry)
+        self.geometry = geometry
+        self.patch_size = geometry.patch_size
+        self.block_size = geometry.block_size
+        self.image_grid_pinpoints = geometry.image_grid_pinpoints
+        self.vision_feature_select_strategy = geometry.vision_feature_select_strategy
+        self.layout_cache = LayoutCache(self.compute_layout, self.geometry_key, max_entries=layout_cache_size, cache_dir=layout_cache_dir)
+
+    @classmethod
+    def from_geometry(cls, geometry: Union[PatchGeometry, dict, str, None] = None, **kwargs) -> "Token2PatchMapper":
+        """不加载processor，直接从几何参数构建（默认使用llava-v1.6-mistral-7b-hf的参数）"""
+        return cls(geometry=geometry if geometry is not None else PatchGeometry(), **kwargs)
+
+    @property
+    def geometry_key(self) -> str:
+        """几何参数的key，layout只取决于该key和图像尺寸"""
+        return self.geometry.key
 
     def select_best_resolution(self, original_size: tuple, possible_resolutions: list) -> tuple:
         """选择最佳分辨率"""
@@ -125,127 +230,129 @@ class Token2PatchMapper:
             padding = (current_width - new_width) // 2
             return 0, padding, current_height, current_width - padding
     
-    def map_tokens_to_patches(self, original_size: tuple) -> List[TokenPosition]:
-        """将tokens映射到原始图像的patch位置"""
+    def compute_layout(self, original_size: tuple) -> np.ndarray:
+        """
+        向量化计算tokens到原始图像patch位置的映射
+        参数:
+            original_size: 原始图像尺寸（height, width）的tuple
+        返回: TOKEN_LAYOUT_DTYPE结构化数组，每行对应一个image token，顺序与map_tokens_to_patches一致
+        """
         original_height, original_width = original_size
-        positions = []
-        token_idx = 0 if self.vision_feature_select_strategy == "default" else 1
+        token_start = 0 if self.vision_feature_select_strategy == "default" else 1
         # ============ 1. Base image features ============
         num_patches_height_base = self.block_size[0] // self.patch_size
         num_patches_width_base = self.block_size[1] // self.patch_size
         base_num_patches = num_patches_height_base * num_patches_width_base
-        print(f"Base image grid: {num_patches_height_base}x{num_patches_width_base} = {base_num_patches} patches")
-        for patch_id in range(base_num_patches):
-            row = patch_id // num_patches_width_base
-            col = patch_id % num_patches_width_base
-            # 计算在原图中的坐标
-            patch_h = original_height / num_patches_height_base
-            patch_w = original_width / num_patches_width_base
-            x1 = int(col * patch_w)
-            y1 = int(row * patch_h)
-            x2 = int((col + 1) * patch_w)
-            y2 = int((row + 1) * patch_h)
-            positions.append(TokenPosition(
-                token_idx=token_idx,
-                block_id=0,
-                patch_bbox=(x1, y1, x2, y2),
-                patch_row=row,
-                patch_col=col,
-                token_type=TokenType.BASE_IMAGE_FEATURES
-            ))
-            token_idx += 1
-        print(f"Base image patches: {len(positions)}")
+        patch_ids = np.arange(base_num_patches)
+        base_rows = patch_ids // num_patches_width_base
+        base_cols = patch_ids % num_patches_width_base
+        # 计算在原图中的坐标
+        patch_h = original_height / num_patches_height_base
+        patch_w = original_width / num_patches_width_base
 
         # ============ 2. High resolution patches ============
         best_resolution = self.select_best_resolution(original_size, self.image_grid_pinpoints)
-        print(f"Best resolution: {best_resolution[0]}x{best_resolution[1]} (HxW)")
-
         # 计算网格形状（有多少个block）
         num_patch_height = best_resolution[0] // self.block_size[0]
         num_patch_width = best_resolution[1] // self.block_size[1]
-        print(f"High-res grid: {num_patch_height}x{num_patch_width} blocks")
-        
         # 每个block内的patch数量
         patches_per_block_h = self.block_size[0] // self.patch_size
         patches_per_block_w = self.block_size[1] // self.patch_size
-        print(f"Patches per block: {patches_per_block_h}x{patches_per_block_w}")
-        
         # 完整网格的patch数量（unpad之前）
         total_patches_h = num_patch_height * patches_per_block_h
         total_patches_w = num_patch_width * patches_per_block_w
-        print(f"Total patch grid before unpad: {total_patches_h}x{total_patches_w}")
-        
         # 计算unpad信息
         (unpad_top, unpad_left, unpad_bottom, unpad_right) = self.unpad_image_get_valid_region(
-            original_size, 
+            original_size,
             (total_patches_h * self.patch_size, total_patches_w * self.patch_size)
         )
-        
         # 有效区域的patch范围
         valid_patch_top = unpad_top // self.patch_size
         valid_patch_left = unpad_left // self.patch_size
-        valid_patch_bottom = unpad_bottom // self.patch_size
-        valid_patch_right = unpad_right // self.patch_size
-        
-        effective_patches_h = valid_patch_bottom - valid_patch_top
-        effective_patches_w = valid_patch_right - valid_patch_left
-        
-        print(f"Valid patch range after unpad:")
-        print(f"  Rows: [{valid_patch_top}, {valid_patch_bottom}) = {effective_patches_h} patches")
-        print(f"  Cols: [{valid_patch_left}, {valid_patch_right}) = {effective_patches_w} patches")
-        
-        # 计算从处理后的坐标到原图坐标的映射        
+        effective_patches_h = unpad_bottom // self.patch_size - valid_patch_top
+        effective_patches_w = unpad_right // self.patch_size - valid_patch_left
         # 每个patch在原图中的实际大小
         patch_height_in_original = original_height / effective_patches_h
         patch_width_in_original = original_width / effective_patches_w
-        
-        print(f"Each patch in original image: {patch_height_in_original:.2f}x{patch_width_in_original:.2f} pixels")
-        
-        # 遍历有效区域内的所有patches
-        for row_idx in range(effective_patches_h):
-            for col_idx in range(effective_patches_w):
-                # 计算这个patch属于哪个block
-                # 全局patch坐标（在unpad之前的完整网格中）
-                global_patch_row = valid_patch_top + row_idx
-                global_patch_col = valid_patch_left + col_idx
-                # 计算block索引（从1开始，因为0是base image）
-                block_row = global_patch_row // patches_per_block_h
-                block_col = global_patch_col // patches_per_block_w
-                block_id = 1 + block_row * num_patch_width + block_col
-
-                # 在原图中的位置
-                y1 = int(row_idx * patch_height_in_original)
-                y2 = int((row_idx + 1) * patch_height_in_original)
-                x1 = int(col_idx * patch_width_in_original)
-                x2 = int((col_idx + 1) * patch_width_in_original)
-                
-                # 确保不超出边界
-                x1 = max(0, min(x1, original_width))
-                y1 = max(0, min(y1, original_height))
-                x2 = max(0, min(x2, original_width))
-                y2 = max(0, min(y2, original_height))
-                
-                positions.append(TokenPosition(
-                    token_idx=token_idx,
-                    block_id=block_id,
-                    patch_bbox=(x1, y1, x2, y2),
-                    patch_row=row_idx,
-                    patch_col=col_idx,
-                    token_type=TokenType.HIGH_RESOLUTION_FEATURES
-                ))
-                token_idx += 1
-            
-            # 每行末尾添加newline token
-            positions.append(TokenPosition(
+
+        row_idx = np.arange(effective_patches_h)
+        col_idx = np.arange(effective_patches_w)
+        # 计算block索引（从1开始，因为0是base image）
+        block_row = (valid_patch_top + row_idx) // patches_per_block_h
+        block_col = (valid_patch_left + col_idx) // patches_per_block_w
+        block_id = 1 + block_row[:, None] * num_patch_width + block_col[None, :]
+        # 在原图中的位置，确保不超出边界
+        y1 = np.clip((row_idx * patch_height_in_original).astype(np.int64), 0, original_height)
+        y2 = np.clip(((row_idx + 1) * patch_height_in_original).astype(np.int64), 0, original_height)
+        x1 = np.clip((col_idx * patch_width_in_original).astype(np.int64), 0, original_width)
+        x2 = np.clip(((col_idx + 1) * patch_width_in_original).astype(np.int64), 0, original_width)
+
+        # ============ 3. 填充结构化数组 ============
+        high_res_num_tokens = effective_patches_h * (effective_patches_w + 1)
+        layout = np.empty(base_num_patches + high_res_num_tokens, dtype=TOKEN_LAYOUT_DTYPE)
+        layout['token_idx'] = np.arange(token_start, token_start + len(layout))
+
+        base = layout[:base_num_patches]
+        base['block_id'] = 0
+        base['x1'] = (base_cols * patch_w).astype(np.int64)
+        base['y1'] = (base_rows * patch_h).astype(np.int64)
+        base['x2'] = ((base_cols + 1) * patch_w).astype(np.int64)
+        base['y2'] = ((base_rows + 1) * patch_h).astype(np.int64)
+        base['patch_row'] = base_rows
+        base['patch_col'] = base_cols
+        base['token_type'] = TokenType.BASE_IMAGE_FEATURES.value
+
+        # 每行末尾的newline token沿用该行最后一个patch的block_id
+        grid = layout[base_num_patches:].reshape(effective_patches_h, effective_patches_w + 1)
+        patches, newlines = grid[:, :-1], grid[:, -1]
+        patches['block_id'] = block_id
+        patches['x1'] = x1[None, :]
+        patches['y1'] = y1[:, None]
+        patches['x2'] = x2[None, :]
+        patches['y2'] = y2[:, None]
+        patches['patch_row'] = row_idx[:, None]
+        patches['patch_col'] = col_idx[None, :]
+        patches['token_type'] = TokenType.HIGH_RESOLUTION_FEATURES.value
+        newlines['block_id'] = block_id[:, -1]
+        for field in ('x1', 'y1', 'x2', 'y2', 'patch_col'):
+            newlines[field] = -1
+        newlines['patch_row'] = row_idx
+        newlines['token_type'] = TokenType.NEWLINE.value
+        return layout
+
+    def compute_layouts(self, original_sizes: List[tuple]) -> List[np.ndarray]:
+        """
+        批量计算多个图像尺寸的token layout，相同尺寸只计算一次
+        参数:
+            original_sizes: 原始图像尺寸（height, width）的列表
+        返回: 与original_sizes一一对应的layout列表（相同尺寸共享同一个数组）
+        """
+        unique_layouts = {}
+        for size in original_sizes:
+            size = (int(size[0]), int(size[1]))
+            if size not in unique_layouts:
+                unique_layouts[size] = self.compute_layout(size)
+        return [unique_layouts[(int(size[0]), int(size[1]))] for size in original_sizes]
+
+    @staticmethod
+    def layout_to_positions(layout: np.ndarray) -> List[TokenPosition]:
+        """将结构化layout数组转换为TokenPosition列表"""
+        token_types = list(TokenType)
+        return [
+            TokenPosition(
                 token_idx=token_idx,
                 block_id=block_id,
-                patch_bbox=(-1, -1, -1, -1),
-                patch_row=row_idx,
-                patch_col=-1,
-                token_type=TokenType.NEWLINE
-            ))
-            token_idx += 1
-        return positions
+                patch_bbox=(x1, y1, x2, y2),
+                patch_row=patch_row,
+                patch_col=patch_col,
+                token_type=token_types[token_type]
+            )
+            for token_idx, block_id, x1, y1, x2, y2, patch_row, patch_col, token_type in layout.tolist()
+        ]
+
+    def map_tokens_to_patches(self, original_size: tuple) -> List[TokenPosition]:
+        """将tokens映射到原始图像的patch位置"""
+        return self.layout_to_positions(self.compute_layout(original_size))
 
     def visualize_token_patches(self, image: Image.Image, positions: List[TokenPosition], save_path: Optional[str] = None) -> Image.Image:
         """可视化token对应的patches"""
@@ -277,24 +384,45 @@ class Token2PatchMapper:
 
     def get_token_mapping(self, image: Image.Image) -> List[TokenPosition]:
         """获取指定图像的token映射"""
-        return self.map_tokens_to_patches((image.size[1], image.size[0]))
+        return self.layout_to_positions(self.get_token_layout(image))
+
+    def get_token_layout(self, image: Image.Image) -> np.ndarray:
+        """获取指定图像的结构化token layout（经过layout缓存，返回只读数组）"""
+        return self.layout_cache.get((image.size[1], image.size[0]))
+
+    def precompute_layouts(self, image_paths: List[str], num_workers: int = 8) -> dict:
+        """预先计算数据集中所有不同图像尺寸的layout，返回图像路径到（height, width）的映射"""
+        return self.layout_cache.precompute_image_files(image_paths, num_workers=num_workers)
 
 HERE = osp.dirname(osp.abspath(__file__))
 
-def main():    
+def main(args):
     """测试函数"""
+    if args.export_geometry:
+        # 从processor导出几何参数，之后可用Token2PatchMapper.from_geometry离线构建
+        PatchGeometry.from_pretrained(args.model_name).to_json(args.export_geometry)
+        print(f"Geometry exported to {args.export_geometry}")
+        return
     # 加载测试图像
     from deephallu.data.mme import MMEDataset
     dataset = MMEDataset()
     image, _, image_name, _, question, _ = dataset[0]
     print(f"分析图像: {image_name} (尺寸: {image.size})")
     # 初始化映射器
-    mapper = Token2PatchMapper()
-    positions = mapper.get_token_mapping(image)
+    mapper = Token2PatchMapper.from_geometry(args.geometry) if args.geometry else Token2PatchMapper(args.model_name)
+    layout = mapper.get_token_layout(image)
+    for token_type in TokenType:
+        print(f"{token_type.name}: {int((layout['token_type'] == token_type.value).sum())} tokens")
+    positions = mapper.layout_to_positions(layout)
     mapper.visualize_token_patches(image, positions, save_path=HERE)
 
 # 使用示例
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_name", type=str, default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--geometry", type=str, default=None, help="Geometry JSON exported from a processor")
+    parser.add_argument("--export_geometry", type=str, default=None, help="Export the processor geometry to this JSON path and exit")
+    args = parser.parse_args()
+    main(args)
 
 
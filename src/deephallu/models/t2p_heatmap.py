@@ -0,0 +1,156 @@
+"""
+基于token layout的attention热力图渲染
+将每个image token的attention值（一个或多个生成步骤）散射到base / high resolution的patch网格，
+通过预先计算的像素到token映射一次性上采样到图像分辨率，并与原图做alpha混合
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+from deephallu.models.llava_next_t2p_mapper import TokenType
+from deephallu.models.t2p_spatial_index import TokenSpatialIndex
+
+# 颜色映射的锚点（0到1之间线性插值成256级）
+COLORMAP_ANCHORS = {
+    'jet': [(0.0, 0.0, 0.5), (0.0, 0.0, 1.0), (0.0, 1.0, 1.0), (1.0, 1.0, 0.0), (1.0, 0.0, 0.0), (0.5, 0.0, 0.0)],
+    'hot': [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (1.0, 1.0, 0.0), (1.0, 1.0, 1.0)],
+    'viridis': [(0.267, 0.005, 0.329), (0.229, 0.322, 0.546), (0.128, 0.567, 0.551), (0.369, 0.789, 0.383), (0.993, 0.906, 0.144)],
+}
+
+
+def make_colormap(name: str = 'jet', num_levels: int = 256) -> np.ndarray:
+    """生成(num_levels, 3)的颜色查找表，取值范围0-255"""
+    if name not in COLORMAP_ANCHORS:
+        raise ValueError(f"Invalid colormap: {name}")
+    anchors = np.asarray(COLORMAP_ANCHORS[name])
+    positions = np.linspace(0, 1, len(anchors))
+    levels = np.linspace(0, 1, num_levels)
+    lut = np.stack([np.interp(levels, positions, anchors[:, c]) for c in range(3)], axis=1)
+    return (lut * 255).astype(np.float32)
+
+
+class AttentionHeatmapRenderer:
+    """
+    Attention热力图渲染器，同一图像尺寸的像素映射只计算一次，可重复用于多个步骤/层
+    Args:
+        layout: Token2PatchMapper.compute_layout返回的结构化数组
+        image_size: 原始图像尺寸（height, width）
+        token_type: 渲染的token类型（BASE_IMAGE_FEATURES或HIGH_RESOLUTION_FEATURES）
+        output_size: 输出热力图尺寸（height, width），默认与原图一致；较小的尺寸可以加快整段序列的渲染
+        colormap: 颜色映射名称
+    """
+    def __init__(self, layout: np.ndarray, image_size: tuple, token_type: TokenType = TokenType.HIGH_RESOLUTION_FEATURES, output_size: Optional[tuple] = None, colormap: str = 'jet'):
+        self.index = TokenSpatialIndex(layout, token_type)
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.output_size = (int(output_size[0]), int(output_size[1])) if output_size else self.image_size
+        self.lut = make_colormap(colormap)
+        # 输出像素中心对应的原图坐标 -> 所在行/列
+        height, width = self.image_size
+        out_height, out_width = self.output_size
+        ys = (np.arange(out_height) + 0.5) * height / out_height
+        xs = (np.arange(out_width) + 0.5) * width / out_width
+        rows = np.searchsorted(self.index.row_y2, ys, side='right')
+        cols = np.searchsorted(self.index.col_x2, xs, side='right')
+        row_valid = (rows < self.index.num_rows) & (ys >= self.index.row_y1[0])
+        col_valid = (cols < self.index.num_cols) & (xs >= self.index.col_x1[0])
+        rows = np.minimum(rows, self.index.num_rows - 1)
+        cols = np.minimum(cols, self.index.num_cols - 1)
+        # (out_height, out_width)的像素到网格cell（row * num_cols + col）的映射
+        self.pixel_cells = rows[:, None] * self.index.num_cols + cols[None, :]
+        # 网格中没有token的cell（token_grid为-1）与网格外一样不着色
+        self.cell_valid = self.index.token_grid.ravel() >= 0
+        self.pixel_valid = row_valid[:, None] & col_valid[None, :] & self.cell_valid[self.pixel_cells]
+
+    def token_grid_values(self, attention: np.ndarray, token_offset: int = 0) -> np.ndarray:
+        """
+        将attention散射到patch网格
+        Args:
+            attention: (num_tokens,)或(num_steps, num_tokens)，第token_offset + token_idx个元素对应该token
+            token_offset: image token在attention向量中的起始位置
+        Returns:
+            np.ndarray: (num_steps, num_rows, num_cols)，没有token的cell为NaN
+        """
+        attention = np.atleast_2d(np.asarray(attention, dtype=np.float32))
+        values = attention[:, token_offset + np.maximum(self.index.token_grid, 0)]
+        values[:, self.index.token_grid < 0] = np.nan
+        return values
+
+    def heatmaps(self, attention: np.ndarray, token_offset: int = 0, normalize: str = 'step') -> np.ndarray:
+        """
+        计算图像分辨率的热力图
+        Args:
+            normalize: 'step'每步单独min-max归一化，'global'所有步骤共享归一化，'none'不归一化（假设已在0-1之间）
+        Returns:
+            np.ndarray: (num_steps, out_height, out_width)，取值0-1，网格外为0
+        """
+        values = self.token_grid_values(attention, token_offset).reshape(-1, self.index.token_grid.size)
+        values = values[:, self.cell_valid]
+        if normalize == 'step':
+            low = values.min(axis=1, keepdims=True)
+            high = values.max(axis=1, keepdims=True)
+        elif normalize == 'global':
+            low, high = values.min(), values.max()
+        elif normalize == 'none':
+            low, high = 0.0, 1.0
+        else:
+            raise ValueError(f"Invalid normalize mode: {normalize}")
+        scale = np.where(high > low, high - low, 1.0)
+        cell_values = np.zeros((len(values), self.index.token_grid.size), dtype=np.float32)
+        cell_values[:, self.cell_valid] = np.clip((values - low) / scale, 0.0, 1.0)
+        # 通过像素映射一次性上采样到输出分辨率
+        heat = cell_values[:, self.pixel_cells]
+        heat[:, ~self.pixel_valid] = 0.0
+        return heat
+
+    def blend(self, image: Image.Image, heat: np.ndarray, alpha: float = 0.5, alpha_by_value: bool = False) -> np.ndarray:
+        """
+        将热力图与图像做alpha混合
+        Args:
+            heat: (num_steps, out_height, out_width)
+            alpha_by_value: True时混合强度随热力值变化，低attention区域保留原图
+        Returns:
+            np.ndarray: (num_steps, out_height, out_width, 3) uint8
+        """
+        out_height, out_width = self.output_size
+        base = image.convert('RGB')
+        if base.size != (out_width, out_height):
+            base = base.resize((out_width, out_height), Image.BILINEAR)
+        base = np.asarray(base, dtype=np.float32)[None]
+        colors = self.lut[np.rint(heat * (len(self.lut) - 1)).astype(np.int64)]
+        weight = (heat * alpha if alpha_by_value else np.full_like(heat, alpha)) * self.pixel_valid
+        weight = weight[..., None]
+        return (base * (1.0 - weight) + colors * weight).astype(np.uint8)
+
+    def render(self, image: Image.Image, attention: np.ndarray, token_offset: int = 0, normalize: str = 'step', alpha: float = 0.5, alpha_by_value: bool = False) -> List[Image.Image]:
+        """渲染每个生成步骤的attention叠加图"""
+        frames = self.blend(image, self.heatmaps(attention, token_offset, normalize), alpha, alpha_by_value)
+        return [Image.fromarray(frame) for frame in frames]
+
+    def render_strip(self, image: Image.Image, attention: np.ndarray, token_offset: int = 0, normalize: str = 'step', alpha: float = 0.5, alpha_by_value: bool = False, num_cols: Optional[int] = None) -> Image.Image:
+        """将整个生成序列的叠加图拼成一张网格图（默认单行）"""
+        frames = self.blend(image, self.heatmaps(attention, token_offset, normalize), alpha, alpha_by_value)
+        num_steps, out_height, out_width, _ = frames.shape
+        num_cols = num_cols or num_steps
+        num_rows = (num_steps + num_cols - 1) // num_cols
+        canvas = np.full((num_rows * num_cols, out_height, out_width, 3), 255, dtype=np.uint8)
+        canvas[:num_steps] = frames
+        canvas = canvas.reshape(num_rows, num_cols, out_height, out_width, 3).transpose(0, 2, 1, 3, 4)
+        return Image.fromarray(canvas.reshape(num_rows * out_height, num_cols * out_width, 3))
+
+    def render_animation(self, image: Image.Image, attention: np.ndarray, save_path: str, token_offset: int = 0, normalize: str = 'step', alpha: float = 0.5, alpha_by_value: bool = False, duration: int = 200) -> List[Image.Image]:
+        """将整个生成序列的叠加图保存为动图（GIF/WebP等，由save_path后缀决定），duration为每帧毫秒数"""
+        frames = self.render(image, attention, token_offset, normalize, alpha, alpha_by_value)
+        frames[0].save(save_path, save_all=True, append_images=frames[1:], duration=duration, loop=0)
+        return frames
+
+
+def render_attention_overlays(image: Image.Image, layout: np.ndarray, attention: np.ndarray, token_offset: int = 0, output_size: Optional[tuple] = None, **kwargs) -> Tuple[List[Image.Image], List[Image.Image]]:
+    """
+    同时渲染base和high resolution两种网格的attention叠加图
+    Returns:
+        (high_res_overlays, base_overlays): 每个生成步骤一张
+    """
+    image_size = (image.size[1], image.size[0])
+    high_res = AttentionHeatmapRenderer(layout, image_size, TokenType.HIGH_RESOLUTION_FEATURES, output_size)
+    base = AttentionHeatmapRenderer(layout, image_size, TokenType.BASE_IMAGE_FEATURES, output_size)
+    return high_res.render(image, attention, token_offset, **kwargs), base.render(image, attention, token_offset, **kwargs)
@@ -0,0 +1,159 @@
+"""
+Token layout缓存
+Token2PatchMapper的映射只取决于图像尺寸（height, width）和processor的几何参数，
+因此按（几何参数, 尺寸）缓存layout：内存中使用有界LRU，可选持久化到磁盘（.npy文件，
+原子写入，可被多个进程通过mmap共享读取）
+"""
+import os
+import os.path as osp
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+from deephallu.utils.lru import LRUCache
+
+
+def make_geometry_key(patch_size: int, block_size: tuple, image_grid_pinpoints: list, vision_feature_select_strategy: str) -> str:
+    """根据processor几何参数生成稳定的缓存key"""
+    geometry = {
+        "patch_size": int(patch_size),
+        "block_size": [int(v) for v in block_size],
+        "image_grid_pinpoints": [[int(h), int(w)] for h, w in image_grid_pinpoints],
+        "vision_feature_select_strategy": vision_feature_select_strategy,
+    }
+    payload = json.dumps(geometry, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+def read_image_size(image_path: str) -> Tuple[int, int]:
+    """只读取图像头信息，返回（height, width）"""
+    with Image.open(image_path) as image:
+        width, height = image.size
+    return height, width
+
+
+class LayoutCache:
+    """
+    Token layout的LRU缓存
+    Args:
+        compute_fn: 计算单个尺寸layout的函数，(height, width) -> np.ndarray
+        geometry_key: 几何参数的key，见make_geometry_key
+        max_entries: 内存中最多缓存的layout数量
+        cache_dir: 磁盘缓存目录，None表示不持久化
+    """
+    def __init__(self, compute_fn: Callable[[tuple], np.ndarray], geometry_key: str, max_entries: int = 1024, cache_dir: Optional[str] = None):
+        self.compute_fn = compute_fn
+        self.geometry_key = geometry_key
+        self.max_entries = max_entries
+        self.cache_dir = osp.join(cache_dir, geometry_key) if cache_dir else None
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self._layouts: LRUCache[Tuple[int, int], np.ndarray] = LRUCache(max_entries=max_entries)
+        # 保护命中计数
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk_path(self, size: Tuple[int, int]) -> str:
+        return osp.join(self.cache_dir, f"{size[0]}x{size[1]}.npy")
+
+    def _load_from_disk(self, size: Tuple[int, int]) -> Optional[np.ndarray]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(size)
+        if not osp.exists(path):
+            return None
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            # 文件损坏或其他进程写入中途被中断，重新计算
+            return None
+
+    def _save_to_disk(self, size: Tuple[int, int], layout: np.ndarray):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(size)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, layout)
+        os.replace(tmp_path, path)
+
+    def get(self, original_size: tuple) -> np.ndarray:
+        """获取（height, width）对应的layout，返回的数组是只读的"""
+        size = (int(original_size[0]), int(original_size[1]))
+        layout = self._layouts.get(size)
+        if layout is not None:
+            with self._lock:
+                self.hits += 1
+            return layout
+        layout = self._load_from_disk(size)
+        with self._lock:
+            if layout is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        if layout is None:
+            layout = self.compute_fn(size)
+            layout.setflags(write=False)
+            self._save_to_disk(size, layout)
+        self._layouts.put(size, layout)
+        return layout
+
+    def precompute(self, original_sizes: Iterable[tuple]) -> int:
+        """
+        一次性计算所有不同尺寸的layout（已在磁盘上的跳过），返回新计算的数量
+        """
+        sizes = {(int(h), int(w)) for h, w in original_sizes}
+        computed = 0
+        for size in sizes:
+            if self.cache_dir and osp.exists(self._disk_path(size)):
+                continue
+            if size in self._layouts:
+                continue
+            self.get(size)
+            computed += 1
+        return computed
+
+    def precompute_image_files(self, image_paths: Iterable[str], num_workers: int = 8) -> Dict[str, Tuple[int, int]]:
+        """
+        读取数据集中所有图像的尺寸（只读文件头）并预计算layout
+        Returns:
+            Dict[str, Tuple[int, int]]: 图像路径到（height, width）的映射
+        """
+        image_paths = list(dict.fromkeys(image_paths))
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            sizes = list(executor.map(read_image_size, image_paths))
+        self.precompute(sizes)
+        return dict(zip(image_paths, sizes))
+
+    def clear(self, disk: bool = False):
+        """清空内存缓存，disk=True时同时删除磁盘缓存"""
+        self._layouts.clear()
+        if disk and self.cache_dir:
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith(".npy"):
+                    os.remove(osp.join(self.cache_dir, file_name))
+
+    def stats(self) -> Dict[str, float]:
+        """缓存命中统计"""
+        with self._lock:
+            entries, hits, disk_hits, misses = len(self._layouts), self.hits, self.disk_hits, self.misses
+        total = hits + disk_hits + misses
+        return {
+            "entries": entries,
+            "hits": hits,
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "hit_rate": (hits + disk_hits) / total if total > 0 else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._layouts)
+
+    def __contains__(self, original_size: tuple) -> bool:
+        return (int(original_size[0]), int(original_size[1])) in self._layouts
@@ -0,0 +1,146 @@
+"""
+图像区域到image token的空间索引
+Token2PatchMapper的layout在每种token类型（base / high resolution）内都是一个规则的矩形网格，
+每一列共享同一个[x1, x2)，每一行共享同一个[y1, y2)。因此只需保存每行/每列的边界，
+区域查询用二分查找定位行列范围，复杂度为O(log n + k)，k为命中的token数量
+"""
+from typing import Tuple
+import numpy as np
+
+from deephallu.models.llava_next_t2p_mapper import TokenType
+
+
+def _as_xyxy(boxes: np.ndarray, box_format: str) -> np.ndarray:
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if box_format == "xyxy":
+        return boxes
+    elif box_format == "xywh":
+        # COCO格式: (x, y, width, height)
+        return np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+    else:
+        raise ValueError(f"Invalid box format: {box_format}")
+
+
+class TokenSpatialIndex:
+    """
+    单一token类型的网格空间索引
+    Args:
+        layout: Token2PatchMapper.compute_layout返回的结构化数组
+        token_type: 建立索引的token类型（BASE_IMAGE_FEATURES或HIGH_RESOLUTION_FEATURES）
+    """
+    def __init__(self, layout: np.ndarray, token_type: TokenType = TokenType.HIGH_RESOLUTION_FEATURES):
+        if token_type == TokenType.NEWLINE:
+            raise ValueError("Newline tokens have no spatial extent")
+        self.token_type = token_type
+        tokens = layout[layout['token_type'] == token_type.value]
+        if len(tokens) == 0:
+            raise ValueError(f"Layout has no tokens of type {token_type.name}")
+        rows, cols = tokens['patch_row'], tokens['patch_col']
+        self.num_rows = int(rows.max()) + 1
+        self.num_cols = int(cols.max()) + 1
+        # (row, col) -> token_idx
+        self.token_grid = np.full((self.num_rows, self.num_cols), -1, dtype=np.int64)
+        self.token_grid[rows, cols] = tokens['token_idx']
+        # 每列的[x1, x2)和每行的[y1, y2)，均为单调不减
+        self.col_x1 = np.zeros(self.num_cols, dtype=np.int64)
+        self.col_x2 = np.zeros(self.num_cols, dtype=np.int64)
+        self.row_y1 = np.zeros(self.num_rows, dtype=np.int64)
+        self.row_y2 = np.zeros(self.num_rows, dtype=np.int64)
+        self.col_x1[cols], self.col_x2[cols] = tokens['x1'], tokens['x2']
+        self.row_y1[rows], self.row_y2[rows] = tokens['y1'], tokens['y2']
+
+    def _cell_ranges(self, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """每个box覆盖的行范围[row_lo, row_hi)和列范围[col_lo, col_hi)"""
+        col_lo = np.searchsorted(self.col_x2, boxes[:, 0], side='right')
+        col_hi = np.searchsorted(self.col_x1, boxes[:, 2], side='left')
+        row_lo = np.searchsorted(self.row_y2, boxes[:, 1], side='right')
+        row_hi = np.searchsorted(self.row_y1, boxes[:, 3], side='left')
+        col_hi = np.maximum(col_hi, col_lo)
+        row_hi = np.maximum(row_hi, row_lo)
+        return row_lo, row_hi, col_lo, col_hi
+
+    def query_boxes(self, boxes: np.ndarray, box_format: str = "xyxy") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        批量查询多个区域覆盖的tokens
+        Args:
+            boxes: (N, 4)的区域数组，坐标为原图像素
+            box_format: "xyxy"（x1, y1, x2, y2）或"xywh"（COCO格式）
+        Returns:
+            offsets: (N + 1,)，第i个box的结果为[offsets[i], offsets[i + 1])
+            token_indices: 命中的token索引
+            overlap_fractions: 每个命中token的patch被该区域覆盖的比例
+        """
+        boxes = _as_xyxy(boxes, box_format)
+        row_lo, row_hi, col_lo, col_hi = self._cell_ranges(boxes)
+        widths = col_hi - col_lo
+        counts = (row_hi - row_lo) * widths
+        box_ids = np.repeat(np.arange(len(boxes)), counts)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        local = np.arange(int(counts.sum())) - starts
+        cell_widths = np.maximum(widths[box_ids], 1)
+        rows = row_lo[box_ids] + local // cell_widths
+        cols = col_lo[box_ids] + local % cell_widths
+
+        x1, x2 = self.col_x1[cols], self.col_x2[cols]
+        y1, y2 = self.row_y1[rows], self.row_y2[rows]
+        inter_w = np.minimum(x2, boxes[box_ids, 2]) - np.maximum(x1, boxes[box_ids, 0])
+        inter_h = np.minimum(y2, boxes[box_ids, 3]) - np.maximum(y1, boxes[box_ids, 1])
+        inter_area = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+        patch_area = (x2 - x1) * (y2 - y1)
+        # 去掉没有实际重叠的（零面积patch或只接触边界）
+        keep = inter_area > 0
+        box_ids, rows, cols = box_ids[keep], rows[keep], cols[keep]
+        overlap_fractions = inter_area[keep] / patch_area[keep]
+        offsets = np.zeros(len(boxes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(box_ids, minlength=len(boxes)), out=offsets[1:])
+        return offsets, self.token_grid[rows, cols], overlap_fractions
+
+    def query_box(self, box: tuple, box_format: str = "xyxy") -> Tuple[np.ndarray, np.ndarray]:
+        """查询单个区域覆盖的tokens，返回(token_indices, overlap_fractions)"""
+        _, token_indices, overlap_fractions = self.query_boxes(np.asarray(box)[None, :], box_format)
+        return token_indices, overlap_fractions
+
+    def query_points(self, points: np.ndarray) -> np.ndarray:
+        """
+        批量查询像素点(x, y)所在的token
+        Returns:
+            np.ndarray: token索引，落在网格外的点为-1
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        cols = np.searchsorted(self.col_x2, points[:, 0], side='right')
+        rows = np.searchsorted(self.row_y2, points[:, 1], side='right')
+        inside = (cols < self.num_cols) & (rows < self.num_rows)
+        inside &= (points[:, 0] >= self.col_x1[0]) & (points[:, 1] >= self.row_y1[0])
+        token_indices = np.full(len(points), -1, dtype=np.int64)
+        token_indices[inside] = self.token_grid[rows[inside], cols[inside]]
+        return token_indices
+
+    def query_point(self, x: float, y: float) -> int:
+        """查询单个像素点所在的token，不在网格内返回-1"""
+        return int(self.query_points(np.array([[x, y]]))[0])
+
+    def box_scores(self, token_values: np.ndarray, boxes: np.ndarray, box_format: str = "xyxy", normalize: bool = False) -> np.ndarray:
+        """
+        按覆盖比例加权汇总每个区域内的token数值（例如attention），用于计算attention-to-object分数
+        Args:
+            token_values: 按token_idx索引的数值，形状(..., num_tokens)，前面的维度（如生成步骤）会被保留
+            boxes: (N, 4)的区域数组
+            normalize: True时除以覆盖比例之和，得到区域内的加权平均
+        Returns:
+            np.ndarray: (..., N)
+        """
+        token_values = np.asarray(token_values, dtype=np.float64)
+        offsets, token_indices, overlap_fractions = self.query_boxes(boxes, box_format)
+        num_boxes = len(offsets) - 1
+        box_ids = np.repeat(np.arange(num_boxes), np.diff(offsets))
+        weighted = token_values[..., token_indices] * overlap_fractions
+        # 同一个box的结果在token_indices中是连续的，用reduceat分段求和，前导维度展平后一次性计算
+        flat = weighted.reshape(-1, weighted.shape[-1])
+        scores = np.zeros((flat.shape[0], num_boxes))
+        nonempty = np.diff(offsets) > 0
+        if nonempty.any():
+            scores[:, nonempty] = np.add.reduceat(flat, offsets[:-1][nonempty], axis=1)
+        if normalize:
+            weights = np.bincount(box_ids, weights=overlap_fractions, minlength=num_boxes)
+            scores = np.divide(scores, weights, out=np.zeros_like(scores), where=weights > 0)
+        return scores.reshape(token_values.shape[:-1] + (num_boxes,))
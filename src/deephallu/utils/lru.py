@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Thread-safe mapping that evicts the least recently used entries.
+
+    Bounded by the number of entries, by the total weight of the values (e.g. bytes
+    on disk) or both. ``on_evict(key, value)`` is called for every evicted entry,
+    e.g. to delete the file it stands for. An entry heavier than ``max_weight`` on
+    its own is kept until the next insertion, so the newest value is always stored.
+
+    Args:
+        max_entries: Maximum number of entries, None for no limit
+        max_weight: Maximum total weight, None for no limit
+        weigh: Weight of a value, used with ``max_weight``
+        on_evict: Called with (key, value) for entries evicted to stay within the limits
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_weight: Optional[int] = None,
+                 weigh: Callable[[V], int] = lambda value: 1,
+                 on_evict: Optional[Callable[[K, V], None]] = None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[K, V]" = OrderedDict()
+        self._weight = 0
+        self._lock = threading.RLock()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Value of ``key`` (marked as most recently used) or ``default``"""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def peek(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Value of ``key`` without changing the recency order"""
+        with self._lock:
+            return self._entries.get(key, default)
+
+    def put(self, key: K, value: V) -> List[Tuple[K, V]]:
+        """Store ``value`` as most recently used, returns the evicted (key, value) pairs"""
+        with self._lock:
+            if key in self._entries:
+                self._weight -= self.weigh(self._entries.pop(key))
+            self._entries[key] = value
+            self._weight += self.weigh(value)
+            return self._evict()
+
+    def get_or_create(self, key: K, factory: Callable[[], V]) -> V:
+        """Cached value of ``key``, created with ``factory()`` outside the lock on a miss.
+
+        Concurrent misses for the same key may both call the factory; the last one is kept.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = factory()
+        self.put(key, value)
+        return value
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Remove ``key`` without calling ``on_evict``"""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value = self._entries.pop(key)
+            self._weight -= self.weigh(value)
+            return value
+
+    def popitem(self) -> Tuple[K, V]:
+        """Remove and return the least recently used entry without calling ``on_evict``"""
+        with self._lock:
+            key, value = self._entries.popitem(last=False)
+            self._weight -= self.weigh(value)
+            return key, value
+
+    def _evict(self) -> List[Tuple[K, V]]:
+        # Caller holds the lock
+        evicted = []
+        while len(self._entries) > 1 and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_weight is not None and self._weight > self.max_weight)):
+            key, value = self.popitem()
+            evicted.append((key, value))
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._weight = 0
+
+    def keys(self) -> List[K]:
+        """Keys from least to most recently used"""
+        with self._lock:
+            return list(self._entries)
+
+    @property
+    def weight(self) -> int:
+        return self._weight
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self.keys())
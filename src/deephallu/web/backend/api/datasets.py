@@ -1,23 +1,42 @@
-from fastapi import APIRouter, HTTPException, Query, Path
-from fastapi.responses import FileResponse
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Path, Request
+from fastapi.responses import FileResponse, Response
+from PIL import UnidentifiedImageError
+from typing import Literal, Optional
 import os
 
 from deephallu.web.backend.services.dataset_service import DatasetService
+from deephallu.web.backend.services.thumbnail_service import (
+    MAX_DIMENSION, ThumbnailService, guess_media_type, is_not_modified,
+    normalize_format, source_etag, validator_headers
+)
 from deephallu.web.backend.models.dataset_models import (
-    DatasetListResponse, DatasetSamplesResponse, DatasetStatsResponse,
+    DatasetListResponse, DatasetSample, DatasetSamplesResponse, DatasetStatsResponse,
     DatasetBrowseRequest
 )
 
 router = APIRouter(prefix="/api/datasets", tags=["datasets"])
 dataset_service = DatasetService()
+thumbnail_service = ThumbnailService()
+
+IMAGE_MAX_AGE = 3600
+
+
+def _locate_image(dataset_name: str, sample_id: str):
+    """Image path and stat of a sample, or None if it does not exist (runs in the worker pool)"""
+    image_path = dataset_service.get_image(dataset_name, sample_id)
+    if not image_path:
+        return None
+    try:
+        return image_path, os.stat(image_path)
+    except OSError:
+        return None
 
 
 @router.get("/", response_model=DatasetListResponse)
 async def get_datasets():
     """Get list of all available datasets"""
     try:
-        datasets = dataset_service.get_all_datasets()
+        datasets = await dataset_service.call(dataset_service.get_all_datasets)
         return DatasetListResponse(
             datasets=datasets,
             total_count=len(datasets)
@@ -25,22 +44,26 @@ async def get_datasets():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{dataset_name}/image/{image_id}", response_model=DatasetSamplesResponse)
+@router.get("/{dataset_name}/samples", response_model=DatasetSamplesResponse)
 async def browse_dataset_samples(
     dataset_name: str = Path(..., description="Name of the dataset"),
-    image_id: str = Path(..., description="ID of the image"),
-    search_query: Optional[str] = Query(None, description="Search in questions or image names")
+    page: int = Query(1, ge=1, description="Page number"),
+    page_size: int = Query(20, ge=1, le=100, description="Number of samples per page"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    search_query: Optional[str] = Query(None, description="Search in questions, answers or image names"),
+    search_mode: Literal["exact", "prefix", "substring"] = Query("substring", description="How query terms match words")
 ):
-    """Browse dataset samples with pagination and filtering"""
+    """Browse dataset samples with pagination, filtering and ranked search"""
     try:
         request = DatasetBrowseRequest(
             dataset_name=dataset_name,
             page=page,
             page_size=page_size,
             category=category,
-            search_query=search_query
+            search_query=search_query,
+            search_mode=search_mode
         )
-        return dataset_service.browse_dataset(request)
+        return await dataset_service.call(dataset_service.browse_dataset, request)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -53,33 +76,68 @@ async def get_dataset_stats(
 ):
     """Get statistics for a dataset"""
     try:
-        return dataset_service.get_dataset_stats(dataset_name)
+        return await dataset_service.call(dataset_service.get_dataset_stats, dataset_name)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/{dataset_name}/samples/{sample_id}/image")
+@router.get("/{dataset_name}/samples/{sample_id:path}/image")
 async def get_sample_image(
+    request: Request,
     dataset_name: str = Path(..., description="Name of the dataset"),
-    sample_id: str = Path(..., description="ID of the sample")
+    sample_id: str = Path(..., description="ID of the sample"),
+    w: Optional[int] = Query(None, ge=1, le=MAX_DIMENSION, description="Maximum width of the resized image"),
+    h: Optional[int] = Query(None, ge=1, le=MAX_DIMENSION, description="Maximum height of the resized image"),
+    format: Optional[str] = Query(None, description="Output format of the resized image (jpeg, png, webp)")
 ):
-    """Get image file for a specific sample"""
+    """Get the image of a sample, optionally resized; supports ETag/Last-Modified conditional requests"""
+    resize = w is not None or h is not None or format is not None
     try:
-        image_path = dataset_service.get_image(dataset_name, sample_id)
-        if not image_path or not os.path.exists(image_path):
+        located = await dataset_service.call(_locate_image, dataset_name, sample_id)
+        if located is None:
             raise HTTPException(status_code=404, detail="Image not found")
+        image_path, stat = located
 
-        return FileResponse(
-            image_path,
-            media_type="image/jpeg",
-            headers={"Cache-Control": "max-age=3600"}
-        )
+        if resize:
+            image_format = normalize_format(format, image_path)
+            etag = source_etag(stat, w, h, image_format)
+        else:
+            etag = source_etag(stat)
+        headers = validator_headers(stat, etag, IMAGE_MAX_AGE)
+        if is_not_modified(request.headers, etag, stat):
+            return Response(status_code=304, headers=headers)
+
+        if resize:
+            thumbnail_path, media_type = await thumbnail_service.get_thumbnail(image_path, w, h, image_format)
+            return FileResponse(thumbnail_path, media_type=media_type, headers=headers)
+        return FileResponse(image_path, media_type=guess_media_type(image_path), headers=headers)
+    except HTTPException:
+        raise
+    except UnidentifiedImageError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400 if resize else 404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{dataset_name}/samples/{sample_id:path}", response_model=DatasetSample)
+async def get_sample(
+    dataset_name: str = Path(..., description="Name of the dataset"),
+    sample_id: str = Path(..., description="ID of the sample")
+):
+    """Get a single sample by id"""
+    try:
+        sample = await dataset_service.call(dataset_service.get_sample, dataset_name, sample_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if sample is None:
+        raise HTTPException(status_code=404, detail="Sample not found")
+    return sample
 
 
 @router.get("/{dataset_name}/categories")
@@ -88,13 +146,35 @@ async def get_dataset_categories(
 ):
     """Get available categories for a dataset"""
     try:
-        dataset_config = dataset_service.config.get_dataset_config(dataset_name)
-        if not dataset_config:
-            raise HTTPException(status_code=404, detail="Dataset not found")
-
         return {
             "dataset_name": dataset_name,
-            "categories": dataset_config.categories or []
+            "categories": await dataset_service.call(dataset_service.get_categories, dataset_name)
         }
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/reload")
+async def reload_all_datasets():
+    """Rebuild the sample indexes of all datasets"""
+    try:
+        reloaded = await dataset_service.call(dataset_service.reload)
+        return {"reloaded": {name: dataset_service.index_status[name].get("total_samples") for name in reloaded}}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{dataset_name}/reload", response_model=DatasetStatsResponse)
+async def reload_dataset(
+    dataset_name: str = Path(..., description="Name of the dataset")
+):
+    """Rebuild the sample index of a dataset after its files changed"""
+    try:
+        await dataset_service.call(dataset_service.reload, dataset_name)
+        return await dataset_service.call(dataset_service.get_dataset_stats, dataset_name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
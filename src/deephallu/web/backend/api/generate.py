@@ -0,0 +1,62 @@
+import json
+
+from fastapi import APIRouter, HTTPException, Query, Path
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from deephallu.web.backend.api.datasets import dataset_service
+from deephallu.web.backend.services.generation_service import GenerationService
+
+router = APIRouter(prefix="/api/generate", tags=["generate"])
+generation_service = GenerationService()
+
+
+@router.get("/stream")
+async def stream_generation(
+    model: str = Query(..., description="Model key from the config"),
+    dataset: str = Query(..., description="Name of the dataset"),
+    sample_id: str = Query(..., description="ID of the sample whose image is used"),
+    question: Optional[str] = Query(None, description="Question to ask, defaults to the question of the sample"),
+    max_new_tokens: int = Query(512, ge=1, description="Maximum number of generated tokens"),
+    top_k: int = Query(5, ge=1, le=50, description="Number of alternatives reported per token"),
+    image_attention: bool = Query(False, description="Report the attention mass on image tokens per token")
+):
+    """Server-Sent Events: ``start`` (with the stream id), one ``token`` per generated token with its
+    entropy and top-k alternatives, then ``done`` or ``error``. Closing the connection stops generation."""
+    if generation_service.config.get_model_config(model) is None:
+        raise HTTPException(status_code=404, detail=f"Model '{model}' not found")
+    try:
+        sample = await dataset_service.call(dataset_service.get_sample, dataset, sample_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if sample is None:
+        raise HTTPException(status_code=404, detail="Sample not found")
+
+    events = generation_service.stream(
+        model, sample.image_path, question or sample.question,
+        max_new_tokens=max_new_tokens, top_k=top_k, image_attention=image_attention
+    )
+
+    async def event_stream():
+        try:
+            async for event_type, data in events:
+                yield f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.post("/{stream_id}/cancel")
+async def cancel_generation(stream_id: str = Path(..., description="ID from the start event of the stream")):
+    """Stop a running stream from another connection"""
+    if not generation_service.cancel(stream_id):
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return {"stream_id": stream_id, "cancelled": True}
+
+
+@router.get("/models")
+async def loaded_models():
+    """Models loaded for streaming and the active streams"""
+    return {"loaded": generation_service.models.loaded(), "active_streams": generation_service.active_streams()}
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+
+from fastapi import APIRouter, HTTPException, Header, Query, Path, Request
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+
+from deephallu.web.backend.services.job_service import JobService
+from deephallu.web.backend.models.job_models import JobCreateRequest, JobInfo, JobListResponse, JobResultsResponse
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+job_service = JobService()
+
+# Seconds between polls of the event table, and between keep-alive comments of an idle stream
+SSE_POLL_INTERVAL = 0.5
+SSE_KEEPALIVE_INTERVAL = 15.0
+
+
+@router.post("/", response_model=JobInfo, status_code=201)
+async def submit_job(request: JobCreateRequest):
+    """Queue an inference job; a worker process picks it up"""
+    try:
+        return await job_service.call(job_service.submit, request)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/", response_model=JobListResponse)
+async def list_jobs(
+    status: Optional[Literal["queued", "running", "completed", "failed", "cancelled"]] = Query(None, description="Filter by status"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of jobs, newest first")
+):
+    """List jobs with their progress and throughput"""
+    try:
+        jobs = await job_service.call(job_service.list_jobs, status, limit)
+        return JobListResponse(jobs=jobs, total_count=len(jobs))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str = Path(..., description="ID of the job")):
+    """Status, progress and throughput of a job"""
+    job = await job_service.call(job_service.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/{job_id}/cancel", response_model=JobInfo)
+async def cancel_job(job_id: str = Path(..., description="ID of the job")):
+    """Cancel a job; a running job stops after its current sample"""
+    job = await job_service.call(job_service.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}/results", response_model=JobResultsResponse)
+async def get_job_results(
+    job_id: str = Path(..., description="ID of the job"),
+    offset: int = Query(0, ge=0, description="Index of the first result"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of results")
+):
+    """Results written so far, also while the job is running"""
+    try:
+        results = await job_service.call(job_service.get_results, job_id, offset, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if results is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return results
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    request: Request,
+    job_id: str = Path(..., description="ID of the job"),
+    after: int = Query(0, ge=0, description="Only events after this event id"),
+    last_event_id: Optional[str] = Header(None, description="Sent by EventSource when it reconnects")
+):
+    """Server-Sent Events: ``status`` on every state change, ``sample``/``sample_error`` per processed sample,
+    and a final ``end`` once the job has finished"""
+    if await job_service.call(job_service.get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if last_event_id and last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+
+    async def event_stream():
+        last_id = after
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            events = await job_service.call(job_service.events, job_id, last_id)
+            if not events:
+                # Terminal status events are written together with the status, so nothing is missed here
+                if await job_service.call(job_service.is_finished, job_id):
+                    events = await job_service.call(job_service.events, job_id, last_id)
+                    if not events:
+                        yield "event: end\ndata: {}\n\n"
+                        return
+                elif time.monotonic() - last_sent >= SSE_KEEPALIVE_INTERVAL:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+            for event in events:
+                last_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+                last_sent = time.monotonic()
+            if not events:
+                await asyncio.sleep(SSE_POLL_INTERVAL)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,105 @@
+from fastapi import APIRouter, HTTPException, Query, Path
+from typing import Literal, Optional
+
+from deephallu.web.backend.services.results_service import ResultsService
+from deephallu.web.backend.models.results_models import (
+    ResultsRunInfo, ResultsRunListResponse, ResultsQueryRequest, ResultSamplesResponse,
+    SampleStepsResponse, ResultsMetricsResponse
+)
+
+router = APIRouter(prefix="/api/results", tags=["results"])
+results_service = ResultsService()
+
+
+@router.get("/", response_model=ResultsRunListResponse)
+async def get_runs():
+    """Get list of configured result runs"""
+    try:
+        runs = await results_service.call(results_service.get_all_runs)
+        return ResultsRunListResponse(runs=runs, total_count=len(runs))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{run_name}/samples", response_model=ResultSamplesResponse)
+async def query_samples(
+    run_name: str = Path(..., description="Name of the run"),
+    page: int = Query(1, ge=1, description="Page number"),
+    page_size: int = Query(20, ge=1, le=100, description="Number of samples per page"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    correctness: Optional[Literal["correct", "hallucinated", "unknown"]] = Query(None, description="Filter by judgment"),
+    min_entropy: Optional[float] = Query(None, description="Minimum average entropy"),
+    max_entropy: Optional[float] = Query(None, description="Maximum average entropy"),
+    sort: Optional[Literal["avg_entropy", "-avg_entropy"]] = Query(None, description="Sort order (prefix '-' for descending)")
+):
+    """List samples of a run with filtering and pagination"""
+    try:
+        request = ResultsQueryRequest(
+            run_name=run_name, page=page, page_size=page_size, category=category,
+            correctness=correctness, min_entropy=min_entropy, max_entropy=max_entropy, sort=sort
+        )
+        return await results_service.call(results_service.query_samples, request)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{run_name}/metrics", response_model=ResultsMetricsResponse)
+async def get_metrics(
+    run_name: str = Path(..., description="Name of the run")
+):
+    """Aggregate metrics by category"""
+    try:
+        return await results_service.call(results_service.get_metrics, run_name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{run_name}/samples/{sample_id:path}/steps", response_model=SampleStepsResponse)
+async def get_sample_steps(
+    run_name: str = Path(..., description="Name of the run"),
+    sample_id: str = Path(..., description="ID of the sample")
+):
+    """Step-level entropy and top-k tokens of a sample"""
+    try:
+        steps = await results_service.call(results_service.get_sample_steps, run_name, sample_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if steps is None:
+        raise HTTPException(status_code=404, detail="Sample not found")
+    return steps
+
+
+@router.get("/{run_name}/samples/{sample_id:path}")
+async def get_sample(
+    run_name: str = Path(..., description="Name of the run"),
+    sample_id: str = Path(..., description="ID of the sample")
+):
+    """Get a single result row"""
+    try:
+        sample = await results_service.call(results_service.get_sample, run_name, sample_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if sample is None:
+        raise HTTPException(status_code=404, detail="Sample not found")
+    return sample
+
+
+@router.post("/{run_name}/reload", response_model=ResultsRunInfo)
+async def reload_run(
+    run_name: str = Path(..., description="Name of the run")
+):
+    """Re-convert a run after its CSV files changed"""
+    try:
+        return await results_service.call(results_service.reload, run_name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
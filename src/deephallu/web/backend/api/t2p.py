@@ -0,0 +1,145 @@
+from fastapi import APIRouter, HTTPException, Query, Path, Request
+from fastapi.responses import FileResponse, Response
+from typing import Literal, Optional, Tuple
+
+from deephallu.web.backend.api.datasets import dataset_service
+from deephallu.web.backend.api.results import results_service
+from deephallu.web.backend.core.config import config
+from deephallu.web.backend.services.t2p_service import T2PService
+from deephallu.web.backend.services.thumbnail_service import etag_matches
+
+router = APIRouter(prefix="/api/t2p", tags=["t2p"])
+t2p_service = T2PService(geometry=config.t2p.geometry, max_overlay_size=config.t2p.max_overlay_size)
+
+# Layouts and overlays are immutable for a given ETag
+T2P_MAX_AGE = 3600
+
+
+def _run_sample_files(run_name: str, sample_id: str) -> Tuple[str, Optional[str]]:
+    """Image path and attention file of a run sample (runs in the worker pool)"""
+    run = results_service.get_run(run_name)
+    row = run.row_of(sample_id)
+    if row is None:
+        raise ValueError(f"Sample '{sample_id}' not found in run '{run_name}'")
+    try:
+        image_path = run.column("image_path")[row]
+    except KeyError:
+        image_path = None
+    if not image_path:
+        raise ValueError(f"Run '{run_name}' does not record the image path of sample '{sample_id}'")
+    return image_path, t2p_service.attention_file(run.run_dir, sample_id)
+
+
+def _dataset_image(dataset_name: str, sample_id: str) -> str:
+    image_path = dataset_service.get_image(dataset_name, sample_id)
+    if not image_path:
+        raise ValueError(f"Sample '{sample_id}' not found in dataset '{dataset_name}'")
+    return image_path
+
+
+def _cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={T2P_MAX_AGE}"}
+
+
+async def _layout_response(request: Request, image_path: str) -> Response:
+    etag = await t2p_service.call(t2p_service.layout_etag, image_path)
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+    body = await t2p_service.call(t2p_service.layout_json, image_path)
+    return Response(content=body, media_type="application/json", headers=_cache_headers(etag))
+
+
+async def _overlay_response(request: Request, image_path: str, **kwargs) -> Response:
+    digest, path = await t2p_service.call(t2p_service.overlay, image_path, **kwargs)
+    etag = f'"{digest}"'
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+    return FileResponse(path, media_type="image/png", headers=_cache_headers(etag))
+
+
+@router.get("/datasets/{dataset_name}/samples/{sample_id:path}/layout")
+async def get_dataset_layout(
+    request: Request,
+    dataset_name: str = Path(..., description="Name of the dataset"),
+    sample_id: str = Path(..., description="ID of the sample")
+):
+    """Token-to-patch layout of a dataset image, one array per field"""
+    try:
+        image_path = await dataset_service.call(_dataset_image, dataset_name, sample_id)
+        return await _layout_response(request, image_path)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/datasets/{dataset_name}/samples/{sample_id:path}/overlay.png")
+async def get_dataset_overlay(
+    request: Request,
+    dataset_name: str = Path(..., description="Name of the dataset"),
+    sample_id: str = Path(..., description="ID of the sample"),
+    token_type: Literal["high_res", "base"] = Query("high_res", description="Image tokens to draw"),
+    size: int = Query(512, ge=16, le=4096, description="Maximum side of the overlay in pixels")
+):
+    """Dataset image with the patch of every image token outlined"""
+    try:
+        image_path = await dataset_service.call(_dataset_image, dataset_name, sample_id)
+        return await _overlay_response(request, image_path, kind="layout", token_type=token_type, max_size=size)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/runs/{run_name}/samples/{sample_id:path}/layout")
+async def get_run_layout(
+    request: Request,
+    run_name: str = Path(..., description="Name of the run"),
+    sample_id: str = Path(..., description="ID of the sample")
+):
+    """Token-to-patch layout of the image of a run sample"""
+    try:
+        image_path, _ = await results_service.call(_run_sample_files, run_name, sample_id)
+        return await _layout_response(request, image_path)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/runs/{run_name}/samples/{sample_id:path}/overlay.png")
+async def get_run_overlay(
+    request: Request,
+    run_name: str = Path(..., description="Name of the run"),
+    sample_id: str = Path(..., description="ID of the sample"),
+    kind: Literal["attention", "layout"] = Query("attention", description="Attention heatmap or token layout"),
+    step: int = Query(0, description="Generation step (negative counts from the end)"),
+    layer: int = Query(-1, description="Decoder layer (negative counts from the end)"),
+    token_type: Literal["high_res", "base"] = Query("high_res", description="Image tokens to draw"),
+    size: int = Query(512, ge=16, le=4096, description="Maximum side of the overlay in pixels"),
+    alpha: float = Query(0.5, ge=0.0, le=1.0, description="Opacity of the heatmap"),
+    normalize: Literal["step", "none"] = Query("step", description="Min-max normalize the attention or use it as is")
+):
+    """Image of a run sample overlaid with the attention of one generated token, or with its token layout"""
+    try:
+        image_path, attention_path = await results_service.call(_run_sample_files, run_name, sample_id)
+        if kind == "attention" and attention_path is None:
+            raise HTTPException(status_code=404, detail=f"No attentions saved for sample '{sample_id}' (run infer.py with --save_attentions)")
+        return await _overlay_response(
+            request, image_path, kind=kind, token_type=token_type, attention_path=attention_path,
+            step=step, layer=layer, max_size=size, normalize=normalize, alpha=alpha
+        )
+    except IndexError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,15 +1,46 @@
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 
-from .api.datasets import router as datasets_router
+from .api.datasets import router as datasets_router, dataset_service
+from .api.results import router as results_router
+from .api.t2p import router as t2p_router
+from .api.jobs import router as jobs_router
+from .api.generate import router as generate_router
 from .core.config import config
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the sample indexes in the background; the server accepts requests immediately
+    warm_up = dataset_service.start_warm_up()
+    # The inference worker runs in its own process so that model loading and generation never block the API
+    worker = None
+    if config.jobs.start_worker:
+        worker = subprocess.Popen([sys.executable, "-m", "deephallu.web.backend.services.inference_worker",
+                                   "--config", str(config.config_path)])
+    yield
+    warm_up.cancel()
+    if worker is not None:
+        # The worker finishes its current sample and requeues the job
+        worker.terminate()
+        try:
+            worker.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+
+
 app = FastAPI(
     title="DeepHallu Web Interface",
     description="On the Analysis of Hallucination in Vision Language Models",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -22,10 +53,25 @@ app.add_middleware(
 
 # Include routers
 app.include_router(datasets_router)
+app.include_router(results_router)
+app.include_router(t2p_router)
+app.include_router(jobs_router)
+app.include_router(generate_router)
 
 @app.get("/")
 async def root():
     return {"message": "DeepHallu Web Interface", "docs": "/docs"}
 
+@app.get("/api/ready")
+async def ready():
+    """Readiness probe: 200 once every dataset index is built, 503 before"""
+    readiness = dataset_service.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the response cache"""
+    return dataset_service.cache.stats()
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host=config.server.host, port=config.server.port, reload=config.server.reload)
\ No newline at end of file
@@ -0,0 +1,287 @@
+import json
+import re
+import socket
+from abc import ABC, abstractmethod
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from deephallu.utils.lru import LRUCache
+
+from .config import CacheConfig
+
+
+class CacheBackend(ABC):
+    """Key/value store for serialized (JSON text) responses"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Stored value, None if missing or expired"""
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[int] = None):
+        """Store a value; ``ttl`` in seconds, None for the backend default"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a key if present"""
+
+    @abstractmethod
+    def clear(self, prefix: Optional[str] = None):
+        """Remove the keys starting with ``prefix``, all keys if None"""
+
+
+class MemoryCache(CacheBackend):
+    """In-process cache with per-entry TTL and LRU eviction"""
+
+    def __init__(self, max_entries: int = 1024, default_ttl: Optional[int] = 3600):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: LRUCache[str, Tuple[Optional[float], str]] = LRUCache(max_entries=max_entries)
+        # Makes the expiry check and removal in get() atomic
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._entries.pop(key)
+                return None
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries.put(key, (expires_at, value))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key)
+
+    def clear(self, prefix: Optional[str] = None):
+        with self._lock:
+            if prefix is None:
+                self._entries.clear()
+                return
+            for key in self._entries.keys():
+                if key.startswith(prefix):
+                    self._entries.pop(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Characters with a meaning in SCAN MATCH patterns
+_GLOB_SPECIAL = re.compile(r"[\\*?\[\]]")
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisCache(CacheBackend):
+    """Minimal Redis client speaking RESP over a socket (GET/SET EX/DEL/SCAN/FLUSHDB/PING).
+
+    Works against any server implementing the Redis protocol. A command that fails
+    on a reused connection (e.g. closed by the server while idle) is retried once on
+    a new connection; other connection errors are raised as RedisError, which
+    ResponseCache treats as misses.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379", default_ttl: Optional[int] = 3600,
+                 timeout: float = 1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.default_ttl = default_ttl
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        try:
+            if self.password:
+                self._command_locked("AUTH", self.password)
+            if self.db:
+                self._command_locked("SELECT", str(self.db))
+        except RedisError:
+            self._close()
+            raise
+
+    def _close(self):
+        for resource in (self._reader, self._sock):
+            try:
+                if resource is not None:
+                    resource.close()
+            except OSError:
+                pass
+        self._sock, self._reader = None, None
+
+    @staticmethod
+    def _encode(*args: str) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg.encode("utf-8") if isinstance(arg, str) else arg
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionResetError("Connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def _command_locked(self, *args: str):
+        self._sock.sendall(self._encode(*args))
+        return self._read_reply()
+
+    def command(self, *args: str):
+        with self._lock:
+            reused = self._sock is not None
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._command_locked(*args)
+            except (OSError, ValueError) as e:
+                # Drop the connection; the next command reconnects
+                self._close()
+                if not reused:
+                    raise RedisError(str(e)) from e
+            # The commands used here are idempotent, so a stale connection is retried once
+            try:
+                self._connect()
+                return self._command_locked(*args)
+            except (OSError, ValueError) as e:
+                self._close()
+                raise RedisError(str(e)) from e
+
+    def ping(self) -> bool:
+        return self.command("PING") == "PONG"
+
+    def get(self, key: str) -> Optional[str]:
+        return self.command("GET", key)
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        if ttl:
+            self.command("SET", key, value, "EX", str(int(ttl)))
+        else:
+            self.command("SET", key, value)
+
+    def delete(self, key: str):
+        self.command("DEL", key)
+
+    def clear(self, prefix: Optional[str] = None, batch_size: int = 500):
+        """Delete the keys under ``prefix`` with SCAN + DEL; FLUSHDB only without a prefix.
+
+        The database may be shared with other applications, so ResponseCache always
+        clears its own namespace.
+        """
+        if prefix is None:
+            self.command("FLUSHDB")
+            return
+        pattern = _GLOB_SPECIAL.sub(r"\\\g<0>", prefix) + "*"
+        cursor = "0"
+        while True:
+            cursor, keys = self.command("SCAN", cursor, "MATCH", pattern, "COUNT", str(batch_size))
+            if keys:
+                self.command("DEL", *keys)
+            if cursor == "0":
+                break
+
+
+class ResponseCache:
+    """Namespaced JSON cache over a backend, with hit/miss counters"""
+
+    def __init__(self, backend: CacheBackend, namespace: str = "deephallu", default_ttl: Optional[int] = None):
+        self.backend = backend
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self._stats = {"hits": 0, "misses": 0, "sets": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def key(self, *parts: Any) -> str:
+        return ":".join([self.namespace] + [str(part) for part in parts])
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self.backend.get(key)
+        except RedisError:
+            self._count("errors")
+            value = None
+        self._count("hits" if value is not None else "misses")
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        try:
+            self.backend.set(key, json.dumps(value), ttl if ttl is not None else self.default_ttl)
+            self._count("sets")
+        except RedisError:
+            self._count("errors")
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[int] = None) -> Any:
+        """Cached JSON value of ``compute()``"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value, ttl)
+        return value
+
+    def clear(self):
+        """Remove the keys of this namespace only"""
+        try:
+            self.backend.clear(prefix=f"{self.namespace}:")
+        except RedisError:
+            self._count("errors")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["backend"] = type(self.backend).__name__
+        if isinstance(self.backend, MemoryCache):
+            stats["entries"] = len(self.backend)
+        return stats
+
+
+def create_cache(cache_config: CacheConfig) -> ResponseCache:
+    """Response cache for the configured backend ("memory" or "redis")"""
+    if cache_config.backend == "redis":
+        url = cache_config.redis_url or f"redis://{cache_config.host}:{cache_config.port}"
+        backend = RedisCache(url, default_ttl=cache_config.default_ttl)
+    elif cache_config.backend == "memory":
+        backend = MemoryCache(max_entries=cache_config.max_entries, default_ttl=cache_config.default_ttl)
+    else:
+        raise ValueError(f"Unknown cache backend '{cache_config.backend}', expected 'memory' or 'redis'")
+    return ResponseCache(backend, namespace=cache_config.namespace, default_ttl=cache_config.default_ttl)
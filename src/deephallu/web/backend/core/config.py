@@ -12,6 +12,30 @@ class DatasetConfig(BaseModel):
     path: str
     type: str
     description: str
+    categories: Optional[List[str]] = None
+
+class ResultsRunConfig(BaseModel):
+    name: str
+    path: str  # directory with results.csv and optionally step_details.csv
+    description: str = ""
+
+class T2PConfig(BaseModel):
+    geometry: Optional[str] = None  # geometry JSON exported by llava_next_t2p_mapper, None for llava-v1.6 defaults
+    max_overlay_size: int = 1024
+
+class JobsConfig(BaseModel):
+    db_path: str = str(Path(HERE).parent / "cache" / "jobs.sqlite3")
+    output_dir: str = str(Path(HERE).parent / "cache" / "jobs")  # one sub-directory per job
+    device: str = "cuda"
+    max_loaded_models: int = 1  # models kept in memory by the worker
+    poll_interval: float = 1.0  # seconds between queue polls of an idle worker
+    start_worker: bool = False  # spawn a worker process together with the server
+
+class GenerationConfig(BaseModel):
+    device: str = "cuda"
+    max_loaded_models: int = 1  # models kept in memory by the API process for streaming
+    max_concurrent: int = 1  # generations running at once, further requests wait
+    max_new_tokens: int = 1024  # upper bound for a request
 
 class ServerConfig(BaseModel):
     host: str = "localhost"
@@ -19,14 +43,20 @@ class ServerConfig(BaseModel):
     reload: bool = True
 
 class CacheConfig(BaseModel):
+    backend: str = "memory"  # "memory" or "redis"
     host: str = "localhost"
-    port: int = 637
+    port: int = 6379
+    redis_url: Optional[str] = None
+    default_ttl: int = 3600
+    max_entries: int = 1024
+    namespace: str = "deephallu"
 
 class ModelsConfig(BaseModel):
     name: str
     type: str
     description: str
-    model_name: str
+    model_name: str  # hub id or local directory
+    architecture: str = "llava-next"  # model argument of inference.infer.load_model
 
 class HuggingFaceModelConfig(ModelsConfig):
     model_name: str
@@ -43,8 +73,15 @@ class Config:
             key: DatasetConfig(**value)
             for key, value in self._config_data.get("datasets", {}).items()
         }
+        self.results = {
+            key: ResultsRunConfig(**value)
+            for key, value in (self._config_data.get("results") or {}).items()
+        }
         self.server = ServerConfig(**self._config_data.get("server", {}))
         self.cache = CacheConfig(**self._config_data.get("cache", {}))
+        self.t2p = T2PConfig(**(self._config_data.get("t2p") or {}))
+        self.jobs = JobsConfig(**(self._config_data.get("jobs") or {}))
+        self.generation = GenerationConfig(**(self._config_data.get("generation") or {}))
         self.models = {
             key: HuggingFaceModelConfig(**value) if value["type"] == "huggingface" else ModelsConfig(**value)
             for key, value in self._config_data.get("models", {}).items()
@@ -65,6 +102,15 @@ class Config:
     def get_all_datasets(self) -> Dict[str, DatasetConfig]:
         return self.datasets
 
+    def get_results_config(self, run_name: str) -> Optional[ResultsRunConfig]:
+        return self.results.get(run_name)
+
+    def get_all_results(self) -> Dict[str, ResultsRunConfig]:
+        return self.results
+
+    def get_model_config(self, model_name: str) -> Optional[ModelsConfig]:
+        return self.models.get(model_name)
+
     def validate_dataset_paths(self) -> List[str]:
         valid_paths = []
         invalid_paths = []
@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -35,6 +35,7 @@ class DatasetSamplesResponse(BaseModel):
     page_size: int
     has_next: bool
     has_prev: bool
+    facets: Optional[Dict[str, int]] = None
 
 
 class DatasetBrowseRequest(BaseModel):
@@ -43,6 +44,7 @@ class DatasetBrowseRequest(BaseModel):
     page_size: int = Field(default=20, ge=1, le=100)
     category: Optional[str] = None
     search_query: Optional[str] = None
+    search_mode: Literal["exact", "prefix", "substring"] = "substring"
 
 
 class DatasetStatsResponse(BaseModel):
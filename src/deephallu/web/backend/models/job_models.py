@@ -0,0 +1,57 @@
+from typing import List, Optional, Dict, Any, Literal
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+
+class GenerationOptions(BaseModel):
+    max_new_tokens: int = Field(default=1000, ge=1, le=4096)
+    top_k: int = Field(default=5, ge=1, le=50)
+    do_sample: bool = False
+    temperature: float = Field(default=1.0, gt=0.0)
+    save_attentions: bool = False
+    limit: Optional[int] = Field(default=None, ge=1, description="Only process the first N selected samples")
+
+
+class JobCreateRequest(BaseModel):
+    model: str
+    dataset: str
+    categories: Optional[List[str]] = None
+    options: GenerationOptions = Field(default_factory=GenerationOptions)
+
+
+class JobInfo(BaseModel):
+    id: str
+    status: Literal["queued", "running", "completed", "failed", "cancelled"]
+    model: str
+    dataset: str
+    categories: Optional[List[str]] = None
+    options: Dict[str, Any]
+    output_dir: str
+    total: int
+    completed: int
+    failed: int
+    generated_tokens: int
+    cancel_requested: bool
+    worker: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    updated_at: datetime
+    samples_per_second: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+    eta_seconds: Optional[float] = None
+
+
+class JobListResponse(BaseModel):
+    jobs: List[JobInfo]
+    total_count: int
+
+
+class JobResultsResponse(BaseModel):
+    job_id: str
+    status: str
+    results: List[Dict[str, Any]]
+    total_count: int
+    offset: int
+    limit: int
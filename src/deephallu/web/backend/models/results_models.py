@@ -0,0 +1,60 @@
+from typing import List, Optional, Dict, Any, Literal
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+
+class ResultsRunInfo(BaseModel):
+    name: str
+    title: str
+    description: str
+    path: str
+    total_samples: Optional[int] = None
+    categories: Optional[List[str]] = None
+    columns: Optional[List[str]] = None
+    has_steps: bool = False
+    loaded_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class ResultsRunListResponse(BaseModel):
+    runs: List[ResultsRunInfo]
+    total_count: int
+
+
+class ResultsQueryRequest(BaseModel):
+    run_name: str
+    page: int = Field(default=1, ge=1)
+    page_size: int = Field(default=20, ge=1, le=100)
+    category: Optional[str] = None
+    correctness: Optional[Literal["correct", "hallucinated", "unknown"]] = None
+    min_entropy: Optional[float] = None
+    max_entropy: Optional[float] = None
+    sort: Optional[Literal["avg_entropy", "-avg_entropy"]] = None
+
+
+class ResultSamplesResponse(BaseModel):
+    samples: List[Dict[str, Any]]
+    total_count: int
+    page: int
+    page_size: int
+    has_next: bool
+    has_prev: bool
+
+
+class StepDetail(BaseModel):
+    step: int
+    entropy: Optional[float] = None
+    top_k_tokens: Optional[List[Optional[str]]] = None
+    top_k_probs: Optional[List[float]] = None
+    top_k_token_ids: Optional[List[int]] = None
+
+
+class SampleStepsResponse(BaseModel):
+    run_name: str
+    sample_id: str
+    steps: List[StepDetail]
+
+
+class ResultsMetricsResponse(BaseModel):
+    run_name: str
+    metrics: List[Dict[str, Any]]
@@ -1,190 +1,177 @@
-import json
-import os
-from pathlib import Path
-from typing import List, Optional, Dict, Any, Tuple
-from PIL import Image
+import asyncio
+import hashlib
+from typing import Any, Callable, Dict, List, Optional
 
+from pydantic import BaseModel
+
+from ..core.cache import ResponseCache, create_cache
 from ..core.config import config
 from ..models.dataset_models import (
     DatasetInfo, DatasetSample, DatasetSamplesResponse,
     DatasetStatsResponse, DatasetBrowseRequest
 )
+from .sample_index import SampleIndex, SampleIndexRegistry
+from ..utils.concurrency import BlockingExecutor, SingleFlight
 
 
 class DatasetService:
-    def __init__(self):
+    def __init__(self, max_workers: int = 4, cache: Optional[ResponseCache] = None):
         self.config = config
+        self.indexes = SampleIndexRegistry(self.config)
+        # Responses are cached under keys that include the index version, so a rebuild invalidates them
+        self.cache = cache if cache is not None else create_cache(self.config.cache)
+        # Blocking filesystem work runs in a bounded pool; identical concurrent calls share one execution
+        self.executor = BlockingExecutor(max_workers=max_workers)
+        self.single_flight = SingleFlight()
+        self.index_status: Dict[str, Dict[str, Any]] = {
+            name: {"status": "pending"} for name in self.config.get_all_datasets()
+        }
+        self._warm_up_task: Optional[asyncio.Task] = None
+
+    async def call(self, fn: Callable, *args) -> Any:
+        """Run a blocking service method in the worker pool, sharing in-flight calls with the same arguments"""
+        key = (fn.__name__,) + tuple(arg.model_dump_json() if isinstance(arg, BaseModel) else arg for arg in args)
+        return await self.single_flight.do(key, lambda: self.executor.run(fn, *args))
+
+    def build_index(self, dataset_name: str) -> SampleIndex:
+        self.index_status[dataset_name] = {"status": "building"}
+        try:
+            index = self.get_index(dataset_name)
+        except Exception as e:
+            self.index_status[dataset_name] = {"status": "error", "error": str(e)}
+            raise
+        self.index_status[dataset_name] = {"status": "ready", "total_samples": len(index)}
+        return index
+
+    async def warm_up(self):
+        """Build the sample indexes of all datasets in the background (started with the app)"""
+        for name in self.config.get_all_datasets():
+            try:
+                await self.call(self.build_index, name)
+            except Exception:
+                continue
+
+    def start_warm_up(self) -> asyncio.Task:
+        if self._warm_up_task is None or self._warm_up_task.done():
+            self._warm_up_task = asyncio.create_task(self.warm_up())
+        return self._warm_up_task
+
+    def readiness(self) -> Dict[str, Any]:
+        ready = all(status["status"] == "ready" for status in self.index_status.values())
+        return {"ready": ready, "datasets": self.index_status}
+
+    def get_index(self, dataset_name: str) -> SampleIndex:
+        return self.indexes.get(dataset_name)
+
+    def reload(self, dataset_name: Optional[str] = None) -> List[str]:
+        """Rebuild the sample index of one dataset (or of all datasets)"""
+        names = self.indexes.reload(dataset_name)
+        for name in names:
+            self.index_status[name] = {"status": "ready", "total_samples": len(self.indexes.cached(name))}
+        return names
+
+    def get_categories(self, dataset_name: str) -> List[str]:
+        dataset_config = self.config.get_dataset_config(dataset_name)
+        if not dataset_config:
+            raise ValueError(f"Dataset '{dataset_name}' not found")
+        if dataset_config.categories:
+            return dataset_config.categories
+        return sorted(self.get_index(dataset_name).category_counts)
 
     def get_all_datasets(self) -> List[DatasetInfo]:
+        indexes = {}
+        for name in self.config.get_all_datasets():
+            try:
+                indexes[name] = self.get_index(name)
+            except Exception:
+                indexes[name] = None
+        versions = ",".join(f"{name}={index.version if index else 'none'}" for name, index in indexes.items())
+        key = self.cache.key("datasets", hashlib.sha1(versions.encode("utf-8")).hexdigest()[:16])
+        data = self.cache.get_or_compute(
+            key, lambda: [info.model_dump(mode="json") for info in self._list_datasets(indexes)]
+        )
+        return [DatasetInfo.model_validate(info) for info in data]
+
+    def _list_datasets(self, indexes: Dict[str, Optional[SampleIndex]]) -> List[DatasetInfo]:
         datasets = []
         for name, dataset_config in self.config.get_all_datasets().items():
-            # Count total samples
-            total_samples = self._count_dataset_samples(name, dataset_config.path)
+            index = indexes.get(name)
 
             dataset_info = DatasetInfo(
                 name=dataset_config.name,
                 type=dataset_config.type,
                 description=dataset_config.description,
                 path=dataset_config.path,
-                categories=dataset_config.categories,
-                total_samples=total_samples
+                categories=dataset_config.categories or (sorted(index.category_counts) if index else None) or None,
+                total_samples=len(index) if index else 0,
+                last_updated=index.built_at if index else None
             )
             datasets.append(dataset_info)
         return datasets
 
     def browse_dataset(self, request: DatasetBrowseRequest) -> DatasetSamplesResponse:
-        dataset_config = self.config.get_dataset_config(request.dataset_name)
-        if not dataset_config:
-            raise ValueError(f"Dataset '{request.dataset_name}' not found")
-
-        # Load dataset samples based on type
-        all_samples = self._load_dataset_samples(request.dataset_name, dataset_config)
-
-        # Filter by category if specified
-        if request.category and dataset_config.categories:
-            all_samples = [s for s in all_samples if s.category == request.category]
-
-        # Filter by search query if specified
-        if request.search_query:
-            query_lower = request.search_query.lower()
-            all_samples = [
-                s for s in all_samples
-                if (s.question and query_lower in s.question.lower()) or
-                   (s.image_name and query_lower in s.image_name.lower())
-            ]
-
-        # Pagination
-        total_count = len(all_samples)
+        index = self.get_index(request.dataset_name)
+        query_hash = hashlib.sha1(request.model_dump_json().encode("utf-8")).hexdigest()[:16]
+        key = self.cache.key(request.dataset_name, index.version, "browse", query_hash)
+        data = self.cache.get_or_compute(key, lambda: self._browse(index, request).model_dump(mode="json"))
+        return DatasetSamplesResponse.model_validate(data)
+
+    def _browse(self, index: SampleIndex, request: DatasetBrowseRequest) -> DatasetSamplesResponse:
         start_idx = (request.page - 1) * request.page_size
         end_idx = start_idx + request.page_size
-        samples = all_samples[start_idx:end_idx]
+
+        if request.search_query and request.search_query.strip():
+            # Ranked full-text search; facets count the matches per category before the category filter
+            rows, total_count, facets = index.search.search(
+                request.search_query, category=request.category,
+                offset=start_idx, limit=request.page_size, mode=request.search_mode
+            )
+        else:
+            # Filter by category if specified
+            rows = index.rows_for_category(request.category)
+            total_count = len(rows)
+            rows = rows[start_idx:end_idx]
+            facets = dict(index.category_counts)
 
         return DatasetSamplesResponse(
-            samples=samples,
+            samples=index.samples(rows),
             total_count=total_count,
             page=request.page,
             page_size=request.page_size,
             has_next=end_idx < total_count,
-            has_prev=request.page > 1
+            has_prev=request.page > 1,
+            facets=facets or None
         )
 
     def get_dataset_stats(self, dataset_name: str) -> DatasetStatsResponse:
-        dataset_config = self.config.get_dataset_config(dataset_name)
-        if not dataset_config:
-            raise ValueError(f"Dataset '{dataset_name}' not found")
+        index = self.get_index(dataset_name)
+        key = self.cache.key(dataset_name, index.version, "stats")
+        data = self.cache.get_or_compute(key, lambda: self._dataset_stats(dataset_name, index).model_dump(mode="json"))
+        return DatasetStatsResponse.model_validate(data)
 
-        samples = self._load_dataset_samples(dataset_name, dataset_config)
-        total_samples = len(samples)
+    def _dataset_stats(self, dataset_name: str, index: SampleIndex) -> DatasetStatsResponse:
+        categories = dict(index.category_counts)
 
-        # Calculate category distribution
-        categories = {}
-        if dataset_config.categories:
-            for sample in samples:
-                category = sample.category or "unknown"
-                categories[category] = categories.get(category, 0) + 1
+        # Samples without a category are reported as "unknown"
+        uncategorized = len(index) - sum(categories.values())
+        if categories and uncategorized:
+            categories["unknown"] = uncategorized
 
         return DatasetStatsResponse(
             dataset_name=dataset_name,
-            total_samples=total_samples,
+            total_samples=len(index),
             categories=categories if categories else None
         )
 
-    def _count_dataset_samples(self, dataset_name: str, dataset_path: str) -> int:
-        try:
-            samples = self._load_dataset_samples(dataset_name,
-                                               self.config.get_dataset_config(dataset_name))
-            return len(samples)
-        except Exception:
-            return 0
-
-    def _load_dataset_samples(self, dataset_name: str, dataset_config) -> List[DatasetSample]:
-        dataset_type = dataset_config.type
-        dataset_path = Path(dataset_config.path)
-
-        if dataset_type == "mme":
-            return self._load_mme_samples(dataset_path)
-        elif dataset_type == "vqa":
-            return self._load_vqa_samples(dataset_path)
-        else:
-            # Generic loader for other dataset types
-            return self._load_generic_samples(dataset_path)
-
-    def _load_mme_samples(self, dataset_path: Path) -> List[DatasetSample]:
-        samples = []
-
-        # MME dataset structure: MME_Benchmark/[category]/images/ and questions
-        for category_dir in dataset_path.iterdir():
-            if not category_dir.is_dir():
-                continue
-
-            category_name = category_dir.name
-            images_dir = category_dir / "images"
-            questions_file = category_dir / "questions_answers_YN" / f"{category_name}.txt"
-
-            if not images_dir.exists() or not questions_file.exists():
-                continue
-
-            # Load questions and answers
-            qa_data = {}
-            try:
-                with open(questions_file, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        parts = line.strip().split('\t')
-                        if len(parts) >= 3:
-                            image_name = parts[0]
-                            question = parts[1]
-                            answer = parts[2]
-                            qa_data[image_name] = {"question": question, "answer": answer}
-            except Exception:
-                continue
-
-            # Create samples for each image
-            for image_file in images_dir.glob("*"):
-                if image_file.suffix.lower() in ['.jpg', '.jpeg', '.png', '.bmp']:
-                    image_name = image_file.name
-                    qa_info = qa_data.get(image_name, {})
-
-                    sample = DatasetSample(
-                        id=f"{category_name}_{image_name}",
-                        image_name=image_name,
-                        image_path=str(image_file),
-                        category=category_name,
-                        question=qa_info.get("question"),
-                        answer=qa_info.get("answer"),
-                        metadata={"dataset_type": "mme"}
-                    )
-                    samples.append(sample)
-
-        return samples
-
-    def _load_vqa_samples(self, dataset_path: Path) -> List[DatasetSample]:
-        # Placeholder for VQA dataset loader
-        return []
-
-    def _load_generic_samples(self, dataset_path: Path) -> List[DatasetSample]:
-        samples = []
-
-        # Generic loader: look for images and try to find associated JSON metadata
-        for image_file in dataset_path.rglob("*"):
-            if image_file.suffix.lower() in ['.jpg', '.jpeg', '.png', '.bmp']:
-                sample = DatasetSample(
-                    id=str(image_file.relative_to(dataset_path)),
-                    image_name=image_file.name,
-                    image_path=str(image_file),
-                    metadata={"dataset_type": "generic"}
-                )
-                samples.append(sample)
-
-        return samples
+    def get_sample(self, dataset_name: str, sample_id: str) -> Optional[DatasetSample]:
+        """Get a single sample by id"""
+        return self.get_index(dataset_name).get(sample_id)
 
     def get_image(self, dataset_name: str, sample_id: str) -> Optional[str]:
         """Get image path for a specific sample"""
-        dataset_config = self.config.get_dataset_config(dataset_name)
-        if not dataset_config:
+        if not self.config.get_dataset_config(dataset_name):
             return None
 
-        samples = self._load_dataset_samples(dataset_name, dataset_config)
-        for sample in samples:
-            if sample.id == sample_id:
-                return sample.image_path
-        return None
\ No newline at end of file
+        index = self.get_index(dataset_name)
+        row = index.row_of(sample_id)
+        return index.columns["image_path"][row] if row is not None else None
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from PIL import Image
+
+from ..core.config import config
+from .model_registry import ModelRegistry
+
+# Sentinel put on the event queue when the generation thread exits
+_END = object()
+
+
+class GenerationService:
+    """Token-by-token generation streamed from a background thread.
+
+    Each stream runs ``inference.stream.stream_generate`` in its own thread and hands
+    the per-token events to the event loop through an asyncio queue. Cancelling a
+    stream (client disconnect or ``cancel``) sets its stop event; the generation
+    thread finishes the current forward pass, releases the KV cache and exits.
+    """
+
+    def __init__(self):
+        self.config = config
+        self.models = ModelRegistry(self.config, self.config.generation.device, self.config.generation.max_loaded_models)
+        self._slots = threading.BoundedSemaphore(self.config.generation.max_concurrent)
+        self._active: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def active_streams(self) -> Dict[str, bool]:
+        with self._lock:
+            return {stream_id: event.is_set() for stream_id, event in self._active.items()}
+
+    def cancel(self, stream_id: str) -> bool:
+        with self._lock:
+            stop_event = self._active.get(stream_id)
+        if stop_event is None:
+            return False
+        stop_event.set()
+        return True
+
+    def _generate(self, emit, stop_event: threading.Event, model_key: str, image_path: str, question: str,
+                  max_new_tokens: int, top_k: int, image_attention: bool):
+        # Runs in the generation thread; emit() is thread-safe
+        with self._slots:
+            if stop_event.is_set():
+                return
+            from deephallu.inference.stream import stream_generate
+            processor, model = self.models.get(model_key)
+            with Image.open(image_path) as image:
+                image = image.convert("RGB")
+            started = time.perf_counter()
+            steps = stream_generate(model, processor, image, question, max_new_tokens=max_new_tokens,
+                                    top_k=top_k, image_attention=image_attention, stop_event=stop_event)
+            try:
+                for step in steps:
+                    emit("token", step)
+                    if "finish_reason" in step:
+                        emit("done", {
+                            "finish_reason": step["finish_reason"],
+                            "generated_text": step["generated_text"],
+                            "avg_entropy": step["avg_entropy"],
+                            "num_tokens": step["step"] + 1,
+                            "tokens_per_second": (step["step"] + 1) / (time.perf_counter() - started),
+                        })
+            finally:
+                # Frees the KV cache at once, also when the loop was left early
+                steps.close()
+
+    async def stream(self, model_key: str, image_path: str, question: str, max_new_tokens: int = 512,
+                     top_k: int = 5, image_attention: bool = False,
+                     stream_id: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """(event type, data) pairs: ``start``, one ``token`` per generated token, then ``done`` or ``error``"""
+        if self.config.get_model_config(model_key) is None:
+            raise ValueError(f"Model '{model_key}' not found")
+        max_new_tokens = min(max_new_tokens, self.config.generation.max_new_tokens)
+        stream_id = stream_id or uuid.uuid4().hex[:12]
+        stop_event = threading.Event()
+        with self._lock:
+            self._active[stream_id] = stop_event
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def emit(event_type: str, data: Any):
+            loop.call_soon_threadsafe(queue.put_nowait, (event_type, data))
+
+        def run():
+            try:
+                self._generate(emit, stop_event, model_key, image_path, question, max_new_tokens, top_k, image_attention)
+            except Exception as e:
+                emit("error", {"detail": f"{type(e).__name__}: {e}"})
+            finally:
+                emit(_END, None)
+
+        thread = threading.Thread(target=run, name=f"generate-{stream_id}", daemon=True)
+        try:
+            yield "start", {"stream_id": stream_id, "model": model_key, "question": question,
+                            "max_new_tokens": max_new_tokens}
+            thread.start()
+            while True:
+                event_type, data = await queue.get()
+                if event_type is _END:
+                    break
+                yield event_type, data
+        finally:
+            # Client went away or the stream ended: stop generating after the current step
+            stop_event.set()
+            with self._lock:
+                self._active.pop(stream_id, None)
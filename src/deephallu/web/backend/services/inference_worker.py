@@ -0,0 +1,196 @@
+"""
+Worker process for the inference job queue.
+
+Claims queued jobs from the SQLite queue, runs ``inference.infer.infer_sample`` on
+every selected dataset sample and appends the rows to ``results.csv`` and
+``step_details.csv`` in the job directory as it goes, so partial results can be
+read while the job runs. Loaded models stay in memory between jobs.
+
+Usage:
+    python -m deephallu.web.backend.services.inference_worker --device cuda
+"""
+
+import argparse
+import os
+import os.path as osp
+import signal
+import socket
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Set
+
+import pandas as pd
+from PIL import Image
+
+from ..core.config import Config, config as default_config
+from .job_queue import JobQueue, CANCELLED, COMPLETED, FAILED, QUEUED
+from .model_registry import ModelRegistry
+from .sample_index import build_sample_index
+
+
+def _append_csv(path: str, rows: List[Dict[str, Any]]):
+    if rows:
+        pd.DataFrame(rows).to_csv(path, mode="a", header=not osp.exists(path), index=False)
+
+
+def _finished_sample_ids(results_path: str) -> Set[str]:
+    """Samples already written by an earlier (interrupted) run of the job"""
+    if not osp.exists(results_path):
+        return set()
+    return set(pd.read_csv(results_path, usecols=["sample_id"], dtype={"sample_id": str})["sample_id"])
+
+
+def _drop_unfinished_steps(step_details_path: str, finished: Set[str]):
+    """Remove step rows of a sample that was interrupted before its result was written"""
+    if not osp.exists(step_details_path):
+        return
+    steps = pd.read_csv(step_details_path, dtype={"sample_id": str}, keep_default_na=False)
+    kept = steps[steps["sample_id"].isin(finished)]
+    if len(kept) < len(steps):
+        kept.to_csv(step_details_path, index=False)
+
+
+class InferenceWorker:
+    def __init__(self, queue: JobQueue, config: Config = default_config, device: str = "cuda",
+                 max_loaded_models: int = 1, poll_interval: float = 1.0, heartbeat_interval: float = 30.0,
+                 name: Optional[str] = None):
+        self.queue = queue
+        self.config = config
+        self.models = ModelRegistry(config, device, max_loaded_models)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_forever(self):
+        last_requeue = None
+        while not self._stop.is_set():
+            # Jobs left running by a worker that died are picked up again, checked once per heartbeat interval
+            if last_requeue is None or time.monotonic() - last_requeue >= self.heartbeat_interval:
+                self.queue.requeue_stale(stale_after=self.heartbeat_interval * 4)
+                last_requeue = time.monotonic()
+            if not self.run_once():
+                self._stop.wait(self.poll_interval)
+
+    def run_once(self) -> bool:
+        """Process the next queued job, False if the queue is empty"""
+        job = self.queue.claim(self.name)
+        if job is None:
+            return False
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job["id"], done), daemon=True)
+        heartbeat.start()
+        try:
+            status = self.process(job)
+            if status == QUEUED:
+                self.queue.release(job["id"])
+            else:
+                self.queue.finish(job["id"], status)
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.finish(job["id"], FAILED, error=f"{type(e).__name__}: {e}")
+        finally:
+            done.set()
+        return True
+
+    def _heartbeat(self, job_id: str, done: threading.Event):
+        while not done.wait(self.heartbeat_interval):
+            self.queue.heartbeat(job_id)
+
+    def select_samples(self, job: Dict[str, Any]):
+        dataset_config = self.config.get_dataset_config(job["dataset"])
+        if dataset_config is None:
+            raise ValueError(f"Dataset '{job['dataset']}' not found")
+        index = build_sample_index(job["dataset"], dataset_config)
+        if job["categories"]:
+            rows = [row for category in job["categories"] for row in index.rows_for_category(category).tolist()]
+        else:
+            rows = list(range(len(index)))
+        limit = job["options"].get("limit")
+        return index, rows[:limit] if limit else rows
+
+    def process(self, job: Dict[str, Any]) -> str:
+        options = job["options"]
+        top_k = options.get("top_k", 5)
+        save_attentions = options.get("save_attentions", False)
+        output_dir = job["output_dir"]
+        os.makedirs(output_dir, exist_ok=True)
+        results_path = osp.join(output_dir, "results.csv")
+        step_details_path = osp.join(output_dir, "step_details.csv")
+
+        index, rows = self.select_samples(job)
+        finished = _finished_sample_ids(results_path)
+        _drop_unfinished_steps(step_details_path, finished)
+        self.queue.start(job["id"], total=len(rows), completed=sum(index.columns["id"][row] in finished for row in rows))
+        processor, model = self.models.get(job["model"])
+        from deephallu.inference.infer import flatten_steps, infer_sample, save_attention
+
+        for row in rows:
+            if self._stop.is_set():
+                # Worker shutdown: another worker resumes the job from results.csv
+                return QUEUED
+            if self.queue.cancel_requested(job["id"]):
+                return CANCELLED
+            sample = {name: index.columns[name][row] for name in ("id", "image_name", "image_path", "category", "question", "answer")}
+            if sample["id"] in finished:
+                continue
+            summary = {"sample_id": sample["id"], "category": sample["category"]}
+            started = time.perf_counter()
+            try:
+                with Image.open(sample["image_path"]) as image:
+                    output = infer_sample(
+                        model, processor, image.convert("RGB"), sample["question"], top_k=top_k,
+                        max_new_tokens=options.get("max_new_tokens", 1000), do_sample=options.get("do_sample", False),
+                        temperature=options.get("temperature", 1.0), save_attentions=save_attentions
+                    )
+            except Exception as e:
+                self.queue.record_sample(job["id"], summary, error=f"{type(e).__name__}: {e}")
+                continue
+            if save_attentions:
+                save_attention(output_dir, sample["id"], output["attention"])
+            _append_csv(step_details_path, flatten_steps(sample["id"], sample["category"], output["steps"], top_k))
+            result = {
+                "sample_id": sample["id"],
+                "image_name": sample["image_name"],
+                "image_path": sample["image_path"],
+                "category": sample["category"],
+                "question": sample["question"],
+                "answer": sample["answer"],
+                "generated_text": output["generated_text"],
+                "avg_entropy": output["avg_entropy"],
+            }
+            # results.csv last: a sample listed there is complete when the job resumes
+            _append_csv(results_path, [result])
+            self.queue.record_sample(
+                job["id"],
+                {**summary, "generated_text": output["generated_text"], "avg_entropy": output["avg_entropy"],
+                 "num_generated_tokens": output["num_generated_tokens"], "seconds": time.perf_counter() - started},
+                generated_tokens=output["num_generated_tokens"]
+            )
+        return COMPLETED
+
+
+def main(args):
+    config = Config(args.config) if args.config else default_config
+    queue = JobQueue(config.jobs.db_path, config.jobs.output_dir)
+    worker = InferenceWorker(
+        queue, config, device=args.device or config.jobs.device,
+        max_loaded_models=config.jobs.max_loaded_models, poll_interval=config.jobs.poll_interval
+    )
+    # Stop after the current sample; the interrupted job goes back to the queue
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    print(f"Worker {worker.name} polling {config.jobs.db_path}")
+    worker.run_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default=None, help="Path of config.yaml, defaults to the backend config")
+    parser.add_argument("--device", type=str, default=None, help="Device for the models, defaults to jobs.device of the config")
+    args = parser.parse_args()
+    main(args)
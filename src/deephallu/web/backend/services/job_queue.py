@@ -0,0 +1,225 @@
+import json
+import os
+import os.path as osp
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+TERMINAL_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    model TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    categories TEXT,
+    options TEXT NOT NULL,
+    output_dir TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    generated_tokens INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq);
+"""
+
+
+class JobQueue:
+    """Persistent FIFO of inference jobs in a local SQLite database.
+
+    The API process enqueues and reads jobs; worker processes claim them. Every state
+    change also appends a row to ``job_events``, whose autoincrement ``seq`` is the
+    SSE event id, so a reconnecting client resumes with ``Last-Event-ID``.
+    Connections are opened per operation, which keeps the queue safe to share between
+    threads and processes (WAL mode lets readers proceed while a worker writes).
+    """
+
+    def __init__(self, db_path: str, output_dir: str):
+        self.db_path = db_path
+        self.output_dir = output_dir
+        os.makedirs(osp.dirname(osp.abspath(db_path)), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _event(conn: sqlite3.Connection, job_id: str, event_type: str, data: Dict[str, Any]):
+        conn.execute(
+            "INSERT INTO job_events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, event_type, json.dumps(data), time.time())
+        )
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["categories"] = json.loads(job["categories"]) if job["categories"] else None
+        job["options"] = json.loads(job["options"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def _status_event(self, conn: sqlite3.Connection, job_id: str):
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        job = self._to_dict(row)
+        self._event(conn, job_id, "status", {
+            key: job[key] for key in ("status", "total", "completed", "failed", "generated_tokens", "error",
+                                      "started_at", "finished_at")
+        })
+
+    def submit(self, model: str, dataset: str, categories: Optional[List[str]] = None,
+               options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, model, dataset, categories, options, output_dir, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, model, dataset, json.dumps(categories) if categories else None,
+                 json.dumps(options or {}), osp.join(self.output_dir, job_id), now, now)
+            )
+            self._status_event(conn, job_id)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            if status:
+                rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                                    (status, limit)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running and return it"""
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            row = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started_at = COALESCE(started_at, ?), updated_at = ? WHERE id = ?",
+                (RUNNING, worker, now, now, row["id"])
+            )
+            self._status_event(conn, row["id"])
+        return self.get(row["id"])
+
+    def start(self, job_id: str, total: int, completed: int = 0):
+        """Set the sample count of a claimed job; ``completed`` counts samples finished before a requeue"""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET total = ?, completed = ?, failed = 0, updated_at = ? WHERE id = ?",
+                         (total, completed, time.time(), job_id))
+            self._status_event(conn, job_id)
+
+    def record_sample(self, job_id: str, sample: Dict[str, Any], generated_tokens: int = 0, error: Optional[str] = None):
+        """Count one processed sample and publish it as a ``sample`` event (``sample_error`` on failure)"""
+        column = "failed" if error else "completed"
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {column} = {column} + 1, generated_tokens = generated_tokens + ?, updated_at = ? WHERE id = ?",
+                (generated_tokens, time.time(), job_id)
+            )
+            row = conn.execute("SELECT completed, failed, total FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            self._event(conn, job_id, "sample_error" if error else "sample",
+                        {**sample, **dict(row), **({"error": error} if error else {})})
+
+    def heartbeat(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+                         (status, error, now, now, job_id))
+            self._status_event(conn, job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job immediately; a running job stops after its current sample"""
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row["status"] == QUEUED:
+                conn.execute("UPDATE jobs SET status = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+                             (CANCELLED, now, now, job_id))
+                self._status_event(conn, job_id)
+            elif row["status"] == RUNNING:
+                conn.execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ?", (now, job_id))
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def release(self, job_id: str) -> bool:
+        """Put a running job back in the queue, keeping its place; False if the job was not running"""
+        with self._connect() as conn:
+            released = conn.execute("UPDATE jobs SET status = ?, worker = NULL, updated_at = ? WHERE id = ? AND status = ?",
+                                    (QUEUED, time.time(), job_id, RUNNING)).rowcount > 0
+            if released:
+                self._status_event(conn, job_id)
+        return released
+
+    def requeue_stale(self, stale_after: float) -> int:
+        """Requeue running jobs without a heartbeat for ``stale_after`` seconds (their worker died)"""
+        cutoff = time.time() - stale_after
+        with self._connect(immediate=True) as conn:
+            ids = [row["id"] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND updated_at < ?", (RUNNING, cutoff)).fetchall()]
+            for job_id in ids:
+                conn.execute("UPDATE jobs SET status = ?, worker = NULL, updated_at = ? WHERE id = ?",
+                             (QUEUED, time.time(), job_id))
+                self._status_event(conn, job_id)
+        return len(ids)
+
+    def events(self, job_id: str, after: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, type, data, created_at FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after, limit)
+            ).fetchall()
+        return [{"id": row["seq"], "type": row["type"], "data": json.loads(row["data"]), "created_at": row["created_at"]}
+                for row in rows]
@@ -0,0 +1,78 @@
+import math
+import os.path as osp
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from ..core.config import config
+from ..models.job_models import JobCreateRequest, JobInfo, JobResultsResponse
+from .job_queue import JobQueue, RUNNING, TERMINAL_STATUSES
+from ..utils.concurrency import BlockingExecutor
+
+
+class JobService:
+    def __init__(self, max_workers: int = 2):
+        self.config = config
+        self.queue = JobQueue(self.config.jobs.db_path, self.config.jobs.output_dir)
+        self.executor = BlockingExecutor(max_workers=max_workers, thread_name_prefix="jobs-db")
+
+    async def call(self, fn: Callable, *args) -> Any:
+        """Run a blocking (SQLite / CSV) method in the worker pool"""
+        return await self.executor.run(fn, *args)
+
+    @staticmethod
+    def _job_info(job: Dict[str, Any]) -> JobInfo:
+        info = JobInfo(**job)
+        if job["started_at"] and job["completed"]:
+            elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+            if elapsed > 0:
+                info.samples_per_second = job["completed"] / elapsed
+                info.tokens_per_second = job["generated_tokens"] / elapsed
+                if job["status"] == RUNNING:
+                    remaining = job["total"] - job["completed"] - job["failed"]
+                    info.eta_seconds = max(remaining, 0) / info.samples_per_second
+        return info
+
+    def submit(self, request: JobCreateRequest) -> JobInfo:
+        if not self.config.get_model_config(request.model):
+            raise ValueError(f"Model '{request.model}' not found")
+        if not self.config.get_dataset_config(request.dataset):
+            raise ValueError(f"Dataset '{request.dataset}' not found")
+        job = self.queue.submit(request.model, request.dataset, request.categories, request.options.model_dump())
+        return self._job_info(job)
+
+    def get_job(self, job_id: str) -> Optional[JobInfo]:
+        job = self.queue.get(job_id)
+        return self._job_info(job) if job is not None else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[JobInfo]:
+        return [self._job_info(job) for job in self.queue.list(status, limit)]
+
+    def cancel(self, job_id: str) -> Optional[JobInfo]:
+        job = self.queue.cancel(job_id)
+        return self._job_info(job) if job is not None else None
+
+    def get_results(self, job_id: str, offset: int = 0, limit: int = 100) -> Optional[JobResultsResponse]:
+        """Rows of results.csv written so far (the worker appends one row per finished sample)"""
+        job = self.queue.get(job_id)
+        if job is None:
+            return None
+        results_path = osp.join(job["output_dir"], "results.csv")
+        records, total_count = [], 0
+        if osp.exists(results_path):
+            results = pd.read_csv(results_path, dtype={"sample_id": str})
+            total_count = len(results)
+            records = [
+                {key: (None if isinstance(value, float) and math.isnan(value) else value) for key, value in record.items()}
+                for record in results.iloc[offset:offset + limit].to_dict(orient="records")
+            ]
+        return JobResultsResponse(job_id=job_id, status=job["status"], results=records,
+                                  total_count=total_count, offset=offset, limit=limit)
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        return self.queue.events(job_id, after)
+
+    def is_finished(self, job_id: str) -> bool:
+        job = self.queue.get(job_id)
+        return job is None or job["status"] in TERMINAL_STATUSES
@@ -0,0 +1,47 @@
+import threading
+from typing import Any, List, Tuple
+
+from deephallu.utils.lru import LRUCache
+
+from ..core.config import Config
+
+
+class ModelRegistry:
+    """Loaded (processor, model) pairs by config key, least recently used evicted beyond ``max_loaded``.
+
+    Loading is serialized by a lock, so concurrent requests for the same model load it once.
+    torch and transformers are imported on first load; processes that never load a
+    model (the API without streaming, the tests) do not need them.
+    """
+
+    def __init__(self, config: Config, device: str, max_loaded: int = 1):
+        self.config = config
+        self.device = device
+        self.max_loaded = max_loaded
+        self._models: LRUCache[str, Tuple[Any, Any]] = LRUCache()
+        self._lock = threading.Lock()
+
+    def get(self, model_key: str) -> Tuple[Any, Any]:
+        with self._lock:
+            if model_key in self._models:
+                return self._models.get(model_key)
+            model_config = self.config.get_model_config(model_key)
+            if model_config is None:
+                raise ValueError(f"Model '{model_key}' not found")
+            from deephallu.inference.infer import load_model
+            # Free the memory of evicted models before loading the next one
+            while len(self._models) >= self.max_loaded:
+                self._models.popitem()
+                self._empty_device_cache()
+            models = load_model(model_config.architecture, model_config.model_name, self.device)
+            self._models.put(model_key, models)
+            return models
+
+    @staticmethod
+    def _empty_device_cache():
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def loaded(self) -> List[str]:
+        return self._models.keys()
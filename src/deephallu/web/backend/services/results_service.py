@@ -0,0 +1,100 @@
+import math
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from deephallu.analytics.metrics import compute_metrics
+
+from ..core.config import config
+from ..models.results_models import (
+    ResultsRunInfo, ResultsQueryRequest, ResultSamplesResponse,
+    SampleStepsResponse, ResultsMetricsResponse, StepDetail
+)
+from .results_store import ResultsRun, ResultsStore
+from ..utils.concurrency import BlockingExecutor, SingleFlight
+
+
+class ResultsService:
+    def __init__(self, max_workers: int = 2):
+        self.config = config
+        self.store = ResultsStore(self.config)
+        self.executor = BlockingExecutor(max_workers=max_workers, thread_name_prefix="results-io")
+        self.single_flight = SingleFlight()
+
+    async def call(self, fn: Callable, *args) -> Any:
+        """Run a blocking service method in the worker pool, sharing in-flight calls with the same arguments"""
+        key = (fn.__name__,) + tuple(arg.model_dump_json() if isinstance(arg, BaseModel) else arg for arg in args)
+        return await self.single_flight.do(key, lambda: self.executor.run(fn, *args))
+
+    def get_run(self, run_name: str) -> ResultsRun:
+        return self.store.get(run_name)
+
+    def reload(self, run_name: str) -> ResultsRunInfo:
+        """Re-convert the CSV files of a run"""
+        self.store.get(run_name, force=True)
+        return self._run_info(run_name)
+
+    def _run_info(self, run_name: str) -> ResultsRunInfo:
+        run_config = self.config.get_results_config(run_name)
+        info = ResultsRunInfo(name=run_name, title=run_config.name, description=run_config.description, path=run_config.path)
+        try:
+            run = self.get_run(run_name)
+        except Exception as e:
+            info.error = str(e)
+            return info
+        info.total_samples = len(run)
+        info.categories = run.categories()
+        info.columns = run.columns
+        info.has_steps = run.has_steps
+        info.loaded_at = run.loaded_at
+        return info
+
+    def get_all_runs(self) -> List[ResultsRunInfo]:
+        return [self._run_info(name) for name in self.config.get_all_results()]
+
+    def query_samples(self, request: ResultsQueryRequest) -> ResultSamplesResponse:
+        run = self.get_run(request.run_name)
+        rows = run.filter_rows(
+            category=request.category, correctness=request.correctness,
+            min_entropy=request.min_entropy, max_entropy=request.max_entropy, sort=request.sort
+        )
+
+        # Pagination; only the rows of the page are decoded
+        total_count = len(rows)
+        start_idx = (request.page - 1) * request.page_size
+        end_idx = start_idx + request.page_size
+
+        return ResultSamplesResponse(
+            samples=run.records(rows[start_idx:end_idx]),
+            total_count=total_count,
+            page=request.page,
+            page_size=request.page_size,
+            has_next=end_idx < total_count,
+            has_prev=request.page > 1
+        )
+
+    def get_sample(self, run_name: str, sample_id: str) -> Optional[Dict[str, Any]]:
+        run = self.get_run(run_name)
+        row = run.row_of(sample_id)
+        return run.records([row])[0] if row is not None else None
+
+    def get_sample_steps(self, run_name: str, sample_id: str) -> Optional[SampleStepsResponse]:
+        run = self.get_run(run_name)
+        row = run.row_of(sample_id)
+        if row is None:
+            return None
+        return SampleStepsResponse(
+            run_name=run_name,
+            sample_id=sample_id,
+            steps=[StepDetail(**step) for step in run.steps(row)]
+        )
+
+    def get_metrics(self, run_name: str) -> ResultsMetricsResponse:
+        """Per-category metrics (category "overall" for the whole run), computed with analytics.metrics"""
+        run = self.get_run(run_name)
+        metrics = compute_metrics(run.metrics_frame().assign(run=run_name))
+        records = [
+            {key: (None if isinstance(value, float) and math.isnan(value) else value) for key, value in record.items()}
+            for record in metrics.drop(columns=["run"]).to_dict(orient="records")
+        ]
+        return ResultsMetricsResponse(run_name=run_name, metrics=records)
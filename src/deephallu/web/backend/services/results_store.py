@@ -0,0 +1,436 @@
+import json
+import os
+import os.path as osp
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+COLUMNAR_DIR = ".columnar"
+STORE_FORMAT_VERSION = 1
+RESULTS_FILE = "results.csv"
+STEP_DETAILS_FILE = "step_details.csv"
+
+# results.csv columns stored as categorical codes
+CATEGORICAL_COLUMNS = ("category",)
+# Integer label columns; missing values are stored as -1
+LABEL_COLUMNS = ("judgment", "answer_code", "generated_text_code")
+TOP_K_PATTERN = re.compile(r"^top(\d+)_(token|prob|token_id)$")
+CORRECTNESS = {"correct": 1, "hallucinated": 0}
+
+
+class StringColumn:
+    """Variable-length strings stored as one UTF-8 byte buffer plus offsets (both memory-mappable)"""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray, nulls: Optional[np.ndarray] = None):
+        self.offsets = offsets
+        self.data = data
+        self.nulls = nulls
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def take(self, rows: Sequence[int]) -> List[Optional[str]]:
+        return [self[int(i)] for i in rows]
+
+    def tolist(self) -> List[Optional[str]]:
+        return self.take(range(len(self)))
+
+
+class _ColumnWriter:
+    """Appends chunks of one column to raw binary files in a store directory"""
+
+    def __init__(self, store_dir: str, name: str, kind: str, dtype=None, width: int = 1):
+        self.store_dir, self.name, self.kind = store_dir, name, kind
+        self.dtype = np.dtype(dtype) if dtype is not None else None
+        self.width = width
+        self.length = 0
+        self.has_nulls = False
+        if kind == "string":
+            self._offsets = open(self._path("offsets"), "wb")
+            self._data = open(self._path("data"), "wb")
+            self._nulls = open(self._path("nulls"), "wb")
+            self._bytes = 0
+            np.zeros(1, dtype=np.int64).tofile(self._offsets)
+        else:
+            self._values = open(self._path("values"), "wb")
+
+    def _path(self, part: str) -> str:
+        return osp.join(self.store_dir, f"{self.name}.{part}")
+
+    def append(self, values):
+        if self.kind == "string":
+            values = pd.Series(values, dtype=object)
+            nulls = values.isna().to_numpy()
+            encoded = [b"" if null else str(v).encode("utf-8") for v, null in zip(values, nulls)]
+            lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+            (self._bytes + np.cumsum(lengths)).tofile(self._offsets)
+            self._data.write(b"".join(encoded))
+            self._bytes += int(lengths.sum())
+            nulls.astype(np.bool_).tofile(self._nulls)
+            self.has_nulls |= bool(nulls.any())
+            self.length += len(encoded)
+        else:
+            values = np.ascontiguousarray(values, dtype=self.dtype)
+            values.tofile(self._values)
+            self.length += len(values) // self.width if self.width > 1 and values.ndim == 1 else len(values)
+
+    def close(self) -> Dict[str, Any]:
+        if self.kind == "string":
+            for f in (self._offsets, self._data, self._nulls):
+                f.close()
+            if not self.has_nulls:
+                os.remove(self._path("nulls"))
+            return {"kind": "string", "length": self.length, "nulls": self.has_nulls}
+        self._values.close()
+        return {"kind": self.kind, "length": self.length, "dtype": self.dtype.str, "width": self.width}
+
+
+def _memmap(path: str, dtype, shape) -> np.ndarray:
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _source_signature(run_dir: str) -> Dict[str, Any]:
+    signature = {}
+    for name in (RESULTS_FILE, STEP_DETAILS_FILE):
+        path = osp.join(run_dir, name)
+        if osp.exists(path):
+            st = os.stat(path)
+            signature[name] = [st.st_mtime_ns, st.st_size]
+    return signature
+
+
+def _label_values(series: pd.Series) -> np.ndarray:
+    return pd.to_numeric(series, errors="coerce").fillna(-1).astype(np.int8).to_numpy()
+
+
+def convert_run(run_dir: str, store_dir: Optional[str] = None, chunksize: int = 500_000) -> str:
+    """
+    Convert results.csv / step_details.csv of a run into a memory-mappable columnar store.
+
+    Sample columns are stored one file per column. Step rows are grouped by sample
+    (CSR layout): ``step_offsets[i]:step_offsets[i + 1]`` are the steps of sample row i.
+    """
+    store_dir = store_dir or osp.join(run_dir, COLUMNAR_DIR)
+    tmp_dir = f"{store_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    signature = _source_signature(run_dir)
+
+    results = pd.read_csv(osp.join(run_dir, RESULTS_FILE), dtype={"sample_id": str})
+    meta: Dict[str, Any] = {"version": STORE_FORMAT_VERSION, "sources": signature,
+                            "num_samples": len(results), "columns": {}, "categories": {}}
+    for column in results.columns:
+        if column in CATEGORICAL_COLUMNS:
+            codes, categories = pd.factorize(results[column].fillna("unknown").astype(str))
+            writer = _ColumnWriter(tmp_dir, column, "categorical", np.int32)
+            writer.append(codes)
+            meta["categories"][column] = categories.tolist()
+        elif column in LABEL_COLUMNS:
+            writer = _ColumnWriter(tmp_dir, column, "numeric", np.int8)
+            writer.append(_label_values(results[column]))
+        elif pd.api.types.is_numeric_dtype(results[column]):
+            writer = _ColumnWriter(tmp_dir, column, "numeric", np.float64)
+            writer.append(results[column].to_numpy(dtype=np.float64))
+        else:
+            writer = _ColumnWriter(tmp_dir, column, "string")
+            writer.append(results[column])
+        meta["columns"][column] = writer.close()
+
+    step_details_path = osp.join(run_dir, STEP_DETAILS_FILE)
+    if osp.exists(step_details_path):
+        meta["steps"] = _convert_steps(step_details_path, tmp_dir, results["sample_id"], chunksize)
+
+    with open(osp.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    return store_dir
+
+
+def _convert_steps(step_details_path: str, store_dir: str, sample_ids: pd.Series, chunksize: int) -> Dict[str, Any]:
+    header = pd.read_csv(step_details_path, nrows=0).columns
+    top_k = max([int(m.group(1)) for m in map(TOP_K_PATTERN.match, header) if m] or [0])
+    sample_rows = pd.Series(np.arange(len(sample_ids), dtype=np.int64), index=sample_ids.to_numpy())
+    sample_rows = sample_rows[~sample_rows.index.duplicated()]
+
+    writers = {
+        "sample_row": _ColumnWriter(store_dir, "step.sample_row", "numeric", np.int32),
+        "step": _ColumnWriter(store_dir, "step.step", "numeric", np.int32),
+        "entropy": _ColumnWriter(store_dir, "step.entropy", "numeric", np.float32),
+    }
+    if top_k:
+        writers["top_k_probs"] = _ColumnWriter(store_dir, "step.top_k_probs", "numeric", np.float32, width=top_k)
+        writers["top_k_token_ids"] = _ColumnWriter(store_dir, "step.top_k_token_ids", "numeric", np.int32, width=top_k)
+        writers["top_k_tokens"] = _ColumnWriter(store_dir, "step.top_k_tokens", "string")
+
+    token_columns = [f"top{k}_token" for k in range(1, top_k + 1)]
+    dropped = 0
+    for chunk in pd.read_csv(step_details_path, dtype={"sample_id": str, **{c: str for c in token_columns}},
+                             keep_default_na=False, na_values={"entropy": [""]}, chunksize=chunksize):
+        rows = chunk["sample_id"].map(sample_rows)
+        known = rows.notna().to_numpy()
+        dropped += int((~known).sum())
+        chunk, rows = chunk[known], rows[known]
+        writers["sample_row"].append(rows.to_numpy(dtype=np.int32))
+        writers["step"].append(chunk["step"].to_numpy(dtype=np.int32))
+        writers["entropy"].append(pd.to_numeric(chunk["entropy"], errors="coerce").to_numpy(dtype=np.float32))
+        if top_k:
+            # Row-major (step, k) layout; columns missing from the file are stored as NaN / -1 / null
+            probs = chunk.reindex(columns=[f"top{k}_prob" for k in range(1, top_k + 1)])
+            token_ids = chunk.reindex(columns=[f"top{k}_token_id" for k in range(1, top_k + 1)])
+            writers["top_k_probs"].append(probs.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float32).ravel())
+            writers["top_k_token_ids"].append(token_ids.apply(pd.to_numeric, errors="coerce").fillna(-1).to_numpy(dtype=np.int32).ravel())
+            writers["top_k_tokens"].append(chunk.reindex(columns=token_columns).to_numpy(dtype=object).ravel())
+
+    columns = {name: writer.close() for name, writer in writers.items()}
+    num_steps = columns["sample_row"]["length"]
+    # step_details.csv is written sample by sample; only reorder if it is not
+    sample_row = np.fromfile(osp.join(store_dir, "step.sample_row.values"), dtype=np.int32)
+    step = np.fromfile(osp.join(store_dir, "step.step.values"), dtype=np.int32)
+    order = np.lexsort((step, sample_row))
+    if not np.array_equal(order, np.arange(num_steps)):
+        _reorder_steps(store_dir, columns, order, top_k)
+        sample_row = sample_row[order]
+    offsets = np.searchsorted(sample_row, np.arange(len(sample_ids) + 1)).astype(np.int64)
+    offsets.tofile(osp.join(store_dir, "step.offsets.values"))
+    return {"num_steps": num_steps, "top_k": top_k, "dropped": dropped, "columns": columns}
+
+
+def _reorder_steps(store_dir: str, columns: Dict[str, Dict[str, Any]], order: np.ndarray, top_k: int):
+    for name, info in columns.items():
+        prefix = osp.join(store_dir, f"step.{name}")
+        if info["kind"] == "string":
+            values = _open_string(prefix, info).tolist()
+            values = np.array(values, dtype=object).reshape(-1, top_k)[order].ravel()
+            for part in ("offsets", "data", "nulls"):
+                if osp.exists(f"{prefix}.{part}"):
+                    os.remove(f"{prefix}.{part}")
+            writer = _ColumnWriter(store_dir, f"step.{name}", "string")
+            writer.append(values)
+            columns[name] = writer.close()
+        else:
+            values = np.fromfile(f"{prefix}.values", dtype=info["dtype"]).reshape(len(order), -1)
+            values[order].tofile(f"{prefix}.values")
+
+
+def _open_string(prefix: str, info: Dict[str, Any]) -> StringColumn:
+    offsets = _memmap(f"{prefix}.offsets", np.int64, (info["length"] + 1,))
+    data = np.memmap(f"{prefix}.data", dtype=np.uint8, mode="r") if os.path.getsize(f"{prefix}.data") else np.empty(0, np.uint8)
+    nulls = _memmap(f"{prefix}.nulls", np.bool_, (info["length"],)) if info.get("nulls") else None
+    return StringColumn(offsets, data, nulls)
+
+
+def _open_column(prefix: str, info: Dict[str, Any]):
+    if info["kind"] == "string":
+        return _open_string(prefix, info)
+    width = info.get("width", 1)
+    shape = (info["length"], width) if width > 1 else (info["length"],)
+    return _memmap(f"{prefix}.values", np.dtype(info["dtype"]), shape)
+
+
+class ResultsRun:
+    """Read-only view of a converted run; columns are memory-mapped on first access"""
+
+    def __init__(self, name: str, run_dir: str, store_dir: str):
+        self.name = name
+        self.run_dir = run_dir
+        self.store_dir = store_dir
+        with open(osp.join(store_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.loaded_at = datetime.now()
+        self._columns: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._id_to_row: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self.meta["num_samples"]
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.meta["columns"])
+
+    @property
+    def has_steps(self) -> bool:
+        return "steps" in self.meta
+
+    def column(self, name: str):
+        if name not in self._columns:
+            with self._lock:
+                if name not in self._columns:
+                    if name.startswith("step."):
+                        info = self.meta["steps"]["columns"].get(name[len("step."):]) if name != "step.offsets" else \
+                            {"kind": "numeric", "dtype": "<i8", "length": len(self) + 1}
+                    else:
+                        info = self.meta["columns"].get(name)
+                    if info is None:
+                        raise KeyError(f"Column '{name}' not found in run '{self.name}'")
+                    self._columns[name] = _open_column(osp.join(self.store_dir, name), info)
+        return self._columns[name]
+
+    def categories(self, column: str = "category") -> List[str]:
+        return self.meta["categories"].get(column, [])
+
+    def category_values(self, rows: np.ndarray, column: str = "category") -> List[str]:
+        names = np.array(self.categories(column), dtype=object)
+        return names[np.asarray(self.column(column))[rows]].tolist()
+
+    def row_of(self, sample_id: str) -> Optional[int]:
+        if self._id_to_row is None:
+            ids = self.column("sample_id").tolist()
+            self._id_to_row = {sample_id: row for row, sample_id in reversed(list(enumerate(ids)))}
+        return self._id_to_row.get(sample_id)
+
+    def filter_rows(self, category: Optional[str] = None, correctness: Optional[str] = None,
+                    min_entropy: Optional[float] = None, max_entropy: Optional[float] = None,
+                    sort: Optional[str] = None) -> np.ndarray:
+        """Sample rows matching all filters; only the filtered columns are mapped"""
+        mask = np.ones(len(self), dtype=bool)
+        if category is not None:
+            categories = self.categories()
+            if category not in categories:
+                return np.empty(0, dtype=np.int64)
+            mask &= np.asarray(self.column("category")) == categories.index(category)
+        if correctness is not None:
+            if "judgment" not in self.meta["columns"]:
+                raise ValueError(f"Run '{self.name}' has no judgments")
+            judgment = np.asarray(self.column("judgment"))
+            if correctness == "unknown":
+                mask &= ~np.isin(judgment, list(CORRECTNESS.values()))
+            else:
+                mask &= judgment == CORRECTNESS[correctness]
+        if min_entropy is not None or max_entropy is not None:
+            entropy = np.asarray(self.column("avg_entropy"))
+            if min_entropy is not None:
+                mask &= entropy >= min_entropy
+            if max_entropy is not None:
+                mask &= entropy <= max_entropy
+        rows = np.flatnonzero(mask)
+        if sort:
+            descending = sort.startswith("-")
+            values = np.asarray(self.column(sort.lstrip("-")))[rows]
+            if values.dtype.kind not in "biuf":
+                raise ValueError(f"Cannot sort by non-numeric column '{sort.lstrip('-')}'")
+            # NaN last in both directions
+            keys = np.where(np.isnan(values), np.inf, -values if descending else values) if values.dtype.kind == "f" \
+                else (-values if descending else values)
+            rows = rows[np.argsort(keys, kind="stable")]
+        return rows
+
+    def records(self, rows: np.ndarray, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        columns = columns or self.columns
+        data = {}
+        for name in columns:
+            info = self.meta["columns"][name]
+            if info["kind"] == "string":
+                data[name] = self.column(name).take(rows)
+            elif info["kind"] == "categorical":
+                data[name] = self.category_values(rows, name)
+            else:
+                values = np.asarray(self.column(name))[rows]
+                if values.dtype.kind == "f":
+                    data[name] = [None if np.isnan(v) else float(v) for v in values]
+                else:
+                    data[name] = values.tolist()
+        return [dict(zip(data, values)) for values in zip(*data.values())] if data else [{} for _ in rows]
+
+    def steps(self, row: int) -> List[Dict[str, Any]]:
+        """Step-level entropy and top-k series of one sample"""
+        if not self.has_steps:
+            return []
+        offsets = self.column("step.offsets")
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        steps = np.asarray(self.column("step.step")[start:end]).tolist()
+        entropy = np.asarray(self.column("step.entropy")[start:end], dtype=np.float64)
+        series = [{"step": step, "entropy": None if np.isnan(e) else float(e)} for step, e in zip(steps, entropy)]
+        top_k = self.meta["steps"]["top_k"]
+        if top_k:
+            probs = np.asarray(self.column("step.top_k_probs")[start:end], dtype=np.float64).reshape(-1, top_k).tolist()
+            ids = np.asarray(self.column("step.top_k_token_ids")[start:end]).reshape(-1, top_k).tolist()
+            tokens = self.column("step.top_k_tokens").take(range(start * top_k, end * top_k))
+            for i, item in enumerate(series):
+                item["top_k_tokens"] = tokens[i * top_k:(i + 1) * top_k]
+                item["top_k_probs"] = probs[i]
+                item["top_k_token_ids"] = ids[i]
+        return series
+
+    def metrics_frame(self) -> pd.DataFrame:
+        """Columns needed by analytics.metrics.compute_metrics; unjudged runs get -1 codes"""
+        rows = np.arange(len(self))
+        frame = pd.DataFrame({
+            "category": self.category_values(rows) if "category" in self.meta["columns"] else ["unknown"] * len(self),
+            "avg_entropy": np.asarray(self.column("avg_entropy")) if "avg_entropy" in self.meta["columns"] else np.nan,
+        })
+        for column in LABEL_COLUMNS:
+            if column in self.meta["columns"]:
+                frame[column] = np.asarray(self.column(column)).astype(np.int64)
+            elif column == "answer_code" and "answer" in self.meta["columns"]:
+                answers = pd.Series(self.column("answer").tolist(), dtype=object)
+                frame[column] = (answers.astype(str).str.lower() == "yes").astype(np.int64)
+            else:
+                frame[column] = -1
+        return frame
+
+
+class ResultsStore:
+    """Opens configured runs, converting them to the columnar format when the CSV files change"""
+
+    def __init__(self, config, check_interval: float = 5.0):
+        self.config = config
+        self.check_interval = check_interval
+        self._runs: Dict[str, ResultsRun] = {}
+        self._last_checked: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def _lock_for(self, run_name: str) -> threading.Lock:
+        with self._registry_lock:
+            return self._locks.setdefault(run_name, threading.Lock())
+
+    def _is_fresh(self, run: ResultsRun) -> bool:
+        return run.meta.get("version") == STORE_FORMAT_VERSION and run.meta.get("sources") == _source_signature(run.run_dir)
+
+    def get(self, run_name: str, force: bool = False) -> ResultsRun:
+        run_config = self.config.get_results_config(run_name)
+        if not run_config:
+            raise ValueError(f"Results run '{run_name}' not found")
+
+        run = self._runs.get(run_name)
+        now = time.monotonic()
+        if run is not None and not force:
+            if now - self._last_checked.get(run_name, 0.0) < self.check_interval:
+                return run
+            self._last_checked[run_name] = now
+            if self._is_fresh(run):
+                return run
+
+        with self._lock_for(run_name):
+            current = self._runs.get(run_name)
+            if current is not None and current is not run and not force:
+                return current
+            run_dir = run_config.path
+            if not osp.exists(osp.join(run_dir, RESULTS_FILE)):
+                raise ValueError(f"No {RESULTS_FILE} in '{run_dir}' for run '{run_name}'")
+            store_dir = osp.join(run_dir, COLUMNAR_DIR)
+            run = ResultsRun(run_name, run_dir, store_dir) if osp.exists(osp.join(store_dir, "meta.json")) else None
+            if force or run is None or not self._is_fresh(run):
+                convert_run(run_dir, store_dir)
+                run = ResultsRun(run_name, run_dir, store_dir)
+            self._runs[run_name] = run
+            self._last_checked[run_name] = time.monotonic()
+            return run
+
+    def cached(self, run_name: str) -> Optional[ResultsRun]:
+        return self._runs.get(run_name)
@@ -0,0 +1,322 @@
+import hashlib
+import json
+import os
+import os.path as osp
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..models.dataset_models import DatasetSample
+from .search_index import SearchIndex
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+# Files that, when present in the dataset root, describe its content; their mtime is part of the signature
+MANIFEST_FILES = ("manifest.json", "preprocessed.json")
+
+HERE = osp.dirname(osp.abspath(__file__))
+INDEX_CACHE_DIR = osp.join(osp.dirname(HERE), "cache", "sample_index")
+INDEX_FORMAT_VERSION = 1
+
+
+class SampleIndex:
+    """Columnar in-memory index of the samples of one dataset.
+
+    Samples are stored as parallel column arrays instead of pydantic objects;
+    ``DatasetSample`` instances are only created for the rows that are returned.
+    """
+
+    COLUMNS = ("id", "image_name", "image_path", "category", "question", "answer")
+
+    def __init__(self, dataset_name: str, columns: Dict[str, List[Optional[str]]],
+                 metadata: Optional[Dict[str, Any]] = None, signature: Optional[Tuple] = None):
+        self.dataset_name = dataset_name
+        self.columns = {name: np.asarray(columns.get(name, []), dtype=object) for name in self.COLUMNS}
+        self.metadata = metadata or {}
+        self.signature = signature
+        self.built_at = datetime.now()
+        self.id_to_row = {sample_id: row for row, sample_id in enumerate(self.columns["id"])}
+
+        # Precomputed category -> row indices and counts
+        categories = self.columns["category"]
+        self.category_rows: Dict[str, np.ndarray] = {}
+        if len(categories):
+            keys = np.array([category if category is not None else "" for category in categories], dtype=object)
+            unique, inverse = np.unique(keys, return_inverse=True)
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.cumsum(np.bincount(inverse, minlength=len(unique)))[:-1]
+            for category, rows in zip(unique, np.split(order, bounds)):
+                if category:
+                    self.category_rows[category] = rows
+        self.category_counts = {category: len(rows) for category, rows in self.category_rows.items()}
+
+        # Full-text search over questions, answers and image names
+        self.search = SearchIndex(self.columns, categories)
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    @property
+    def version(self) -> str:
+        """Changes whenever the index is rebuilt; used to version cache keys"""
+        return hashlib.sha1(f"{self.signature!r}{self.built_at.isoformat()}".encode("utf-8")).hexdigest()[:12]
+
+    def __contains__(self, sample_id: str) -> bool:
+        return sample_id in self.id_to_row
+
+    def row_of(self, sample_id: str) -> Optional[int]:
+        return self.id_to_row.get(sample_id)
+
+    def rows_for_category(self, category: Optional[str]) -> np.ndarray:
+        if category is None:
+            return np.arange(len(self))
+        return self.category_rows.get(category, np.empty(0, dtype=np.int64))
+
+    def sample(self, row: int) -> DatasetSample:
+        return DatasetSample(
+            **{name: self.columns[name][row] for name in self.COLUMNS},
+            metadata=dict(self.metadata)
+        )
+
+    def samples(self, rows: Iterable[int]) -> List[DatasetSample]:
+        return [self.sample(int(row)) for row in rows]
+
+    def get(self, sample_id: str) -> Optional[DatasetSample]:
+        row = self.row_of(sample_id)
+        return self.sample(row) if row is not None else None
+
+    def save(self, path: str):
+        """Write the index to disk so a restarted server does not rescan the dataset"""
+        os.makedirs(osp.dirname(path), exist_ok=True)
+        data = {
+            "version": INDEX_FORMAT_VERSION,
+            "dataset_name": self.dataset_name,
+            "signature": self.signature,
+            "metadata": self.metadata,
+            "built_at": self.built_at.isoformat(),
+            "columns": {name: self.columns[name].tolist() for name in self.COLUMNS},
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SampleIndex"]:
+        """Read an index written by ``save``; returns None if it is missing or unreadable"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            return None
+        index = cls(data["dataset_name"], data["columns"], metadata=data["metadata"],
+                    signature=_freeze(data["signature"]))
+        index.built_at = datetime.fromisoformat(data["built_at"])
+        return index
+
+
+def _freeze(value):
+    # JSON turns the signature tuples into lists
+    return tuple(_freeze(v) for v in value) if isinstance(value, (list, tuple)) else value
+
+
+def dataset_signature(dataset_type: str, dataset_path: Path) -> Tuple:
+    """Cheap fingerprint of a dataset directory used to detect changes.
+
+    Directory mtimes change whenever entries are added, removed or renamed, so
+    stat'ing the directories (and QA/manifest files) is enough; individual image
+    files are never touched.
+    """
+    def stat(path: Path):
+        try:
+            st = path.stat()
+            return (str(path), st.st_mtime_ns, st.st_size if path.is_file() else 0)
+        except OSError:
+            return (str(path), None, None)
+
+    entries = [stat(dataset_path)] + [stat(dataset_path / name) for name in MANIFEST_FILES]
+    if not dataset_path.is_dir():
+        return tuple(entries)
+    if dataset_type == "mme":
+        for category_dir in sorted(p for p in dataset_path.iterdir() if p.is_dir()):
+            entries.append(stat(category_dir))
+            entries.append(stat(category_dir / "images"))
+            entries.append(stat(category_dir / "questions_answers_YN" / f"{category_dir.name}.txt"))
+    else:
+        for root, dirs, _ in os.walk(dataset_path):
+            dirs.sort()
+            entries.extend(stat(Path(root) / d) for d in dirs)
+    return tuple(entries)
+
+
+def _empty_columns() -> Dict[str, List[Optional[str]]]:
+    return {name: [] for name in SampleIndex.COLUMNS}
+
+
+def load_mme_columns(dataset_path: Path) -> Dict[str, List[Optional[str]]]:
+    columns = _empty_columns()
+
+    # MME dataset structure: MME_Benchmark/[category]/images/ and questions
+    for category_dir in sorted(dataset_path.iterdir()):
+        if not category_dir.is_dir():
+            continue
+
+        category_name = category_dir.name
+        images_dir = category_dir / "images"
+        questions_file = category_dir / "questions_answers_YN" / f"{category_name}.txt"
+
+        if not images_dir.exists() or not questions_file.exists():
+            continue
+
+        # Load questions and answers
+        qa_data = {}
+        try:
+            with open(questions_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.strip().split('\t')
+                    if len(parts) >= 3:
+                        qa_data[parts[0]] = (parts[1], parts[2])
+        except Exception:
+            continue
+
+        # One sample for each image
+        with os.scandir(images_dir) as entries:
+            image_names = sorted(entry.name for entry in entries
+                                 if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS)
+        for image_name in image_names:
+            question, answer = qa_data.get(image_name, (None, None))
+            columns["id"].append(f"{category_name}_{image_name}")
+            columns["image_name"].append(image_name)
+            columns["image_path"].append(str(images_dir / image_name))
+            columns["category"].append(category_name)
+            columns["question"].append(question)
+            columns["answer"].append(answer)
+
+    return columns
+
+
+def load_generic_columns(dataset_path: Path) -> Dict[str, List[Optional[str]]]:
+    columns = _empty_columns()
+
+    # Generic loader: every image below the dataset root is a sample
+    for root, dirs, files in os.walk(dataset_path):
+        dirs.sort()
+        for file_name in sorted(files):
+            if os.path.splitext(file_name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            image_path = Path(root) / file_name
+            columns["id"].append(str(image_path.relative_to(dataset_path)))
+            columns["image_name"].append(file_name)
+            columns["image_path"].append(str(image_path))
+            columns["category"].append(None)
+            columns["question"].append(None)
+            columns["answer"].append(None)
+
+    return columns
+
+
+def build_sample_index(dataset_name: str, dataset_config) -> SampleIndex:
+    dataset_type = dataset_config.type
+    dataset_path = Path(dataset_config.path)
+    signature = dataset_signature(dataset_type, dataset_path)
+
+    if not dataset_path.is_dir():
+        columns = _empty_columns()
+    elif dataset_type == "mme":
+        columns = load_mme_columns(dataset_path)
+    elif dataset_type == "vqa":
+        # Placeholder for VQA dataset loader
+        columns = _empty_columns()
+    else:
+        columns = load_generic_columns(dataset_path)
+
+    metadata = {"dataset_type": dataset_type if dataset_type in ("mme", "vqa") else "generic"}
+    return SampleIndex(dataset_name, columns, metadata=metadata, signature=signature)
+
+
+class SampleIndexRegistry:
+    """Builds sample indexes on first use and keeps them until the dataset changes.
+
+    The filesystem signature is re-checked at most every ``check_interval``
+    seconds, so repeated requests are served from memory without touching the disk.
+    Built indexes are also persisted to ``cache_dir`` and reused after a restart
+    as long as the dataset signature still matches.
+    """
+
+    def __init__(self, config, check_interval: float = 5.0, cache_dir: Optional[str] = INDEX_CACHE_DIR):
+        self.config = config
+        self.check_interval = check_interval
+        self.cache_dir = cache_dir
+        self._indexes: Dict[str, SampleIndex] = {}
+        self._last_checked: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def _lock_for(self, dataset_name: str) -> threading.Lock:
+        with self._registry_lock:
+            return self._locks.setdefault(dataset_name, threading.Lock())
+
+    def _is_stale(self, dataset_name: str, index: SampleIndex, dataset_config) -> bool:
+        now = time.monotonic()
+        if now - self._last_checked.get(dataset_name, 0.0) < self.check_interval:
+            return False
+        self._last_checked[dataset_name] = now
+        return index.signature != dataset_signature(dataset_config.type, Path(dataset_config.path))
+
+    def _cache_path(self, dataset_name: str) -> Optional[str]:
+        return osp.join(self.cache_dir, f"{dataset_name}.json") if self.cache_dir else None
+
+    def _load_or_build(self, dataset_name: str, dataset_config, use_cache: bool = True) -> SampleIndex:
+        cache_path = self._cache_path(dataset_name)
+        if use_cache and cache_path:
+            index = SampleIndex.load(cache_path)
+            if index is not None and index.signature == dataset_signature(dataset_config.type, Path(dataset_config.path)):
+                return index
+
+        index = build_sample_index(dataset_name, dataset_config)
+        if cache_path:
+            try:
+                index.save(cache_path)
+            except OSError:
+                pass
+        return index
+
+    def get(self, dataset_name: str) -> SampleIndex:
+        dataset_config = self.config.get_dataset_config(dataset_name)
+        if not dataset_config:
+            raise ValueError(f"Dataset '{dataset_name}' not found")
+
+        index = self._indexes.get(dataset_name)
+        if index is not None and not self._is_stale(dataset_name, index, dataset_config):
+            return index
+
+        with self._lock_for(dataset_name):
+            # Another request may have rebuilt the index while we were waiting
+            current = self._indexes.get(dataset_name)
+            if current is not None and current is not index:
+                return current
+            # The persisted index is only useful on a cold start; a stale in-memory index means the files changed
+            index = self._load_or_build(dataset_name, dataset_config, use_cache=index is None)
+            self._indexes[dataset_name] = index
+            self._last_checked[dataset_name] = time.monotonic()
+            return index
+
+    def reload(self, dataset_name: Optional[str] = None) -> List[str]:
+        """Rebuild indexes from the filesystem (all datasets when ``dataset_name`` is None), bypassing the persisted copies."""
+        names = [dataset_name] if dataset_name else list(self.config.get_all_datasets())
+        for name in names:
+            if not self.config.get_dataset_config(name):
+                raise ValueError(f"Dataset '{name}' not found")
+        for name in names:
+            with self._lock_for(name):
+                self._indexes[name] = self._load_or_build(name, self.config.get_dataset_config(name), use_cache=False)
+                self._last_checked[name] = time.monotonic()
+        return names
+
+    def cached(self, dataset_name: str) -> Optional[SampleIndex]:
+        return self._indexes.get(dataset_name)
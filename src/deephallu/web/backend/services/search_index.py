@@ -0,0 +1,179 @@
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Fields that are searched and how much a match in each field counts
+FIELD_WEIGHTS = {"image_name": 2.0, "question": 1.0, "answer": 0.5}
+# How much a query term counts depending on how it matches an indexed token
+MATCH_WEIGHTS = {"exact": 1.0, "prefix": 0.6, "substring": 0.3}
+SEARCH_MODES = ("exact", "prefix", "substring")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def trigrams(token: str) -> List[str]:
+    return [token[i:i + 3] for i in range(len(token) - 2)]
+
+
+class SearchIndex:
+    """Token/trigram inverted index over the text columns of a sample index.
+
+    Every distinct token gets a posting list of (row, field weight) pairs. Prefix
+    queries are resolved on the sorted vocabulary and substring queries through a
+    trigram index over the vocabulary, so a query only touches the posting lists of
+    the tokens it matches instead of every sample.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], categories: Optional[np.ndarray] = None):
+        fields = [field for field in FIELD_WEIGHTS if field in columns]
+        self.num_rows = len(columns[fields[0]]) if fields else 0
+
+        # token -> {row: best field weight}
+        postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for field in fields:
+            weight = FIELD_WEIGHTS[field]
+            for row, text in enumerate(columns[field]):
+                for token in tokenize(text):
+                    posting = postings[token]
+                    if posting.get(row, 0.0) < weight:
+                        posting[row] = weight
+
+        # Token ids follow the sorted vocabulary so that a prefix maps to a contiguous id range
+        self.vocabulary: List[str] = sorted(postings)
+        self.token_ids = {token: i for i, token in enumerate(self.vocabulary)}
+        self.posting_rows: List[np.ndarray] = []
+        self.posting_weights: List[np.ndarray] = []
+        for token in self.vocabulary:
+            posting = postings[token]
+            rows = np.fromiter(posting.keys(), dtype=np.int64, count=len(posting))
+            weights = np.fromiter(posting.values(), dtype=np.float64, count=len(posting))
+            order = np.argsort(rows)
+            self.posting_rows.append(rows[order])
+            self.posting_weights.append(weights[order])
+        self.idf = np.array([math.log(1.0 + self.num_rows / len(rows)) for rows in self.posting_rows])
+
+        trigram_tokens: Dict[str, List[int]] = defaultdict(list)
+        for token_id, token in enumerate(self.vocabulary):
+            for trigram in set(trigrams(token)):
+                trigram_tokens[trigram].append(token_id)
+        self.trigram_index = {trigram: np.array(ids, dtype=np.int64) for trigram, ids in trigram_tokens.items()}
+
+        # Category codes for facet counts and filtering
+        if categories is None:
+            categories = np.full(self.num_rows, None, dtype=object)
+        keys = np.array([category or "" for category in categories], dtype=object)
+        if len(keys):
+            self.category_names, self.category_codes = np.unique(keys, return_inverse=True)
+        else:
+            self.category_names, self.category_codes = np.array([], dtype=object), np.empty(0, dtype=np.int64)
+
+    def _matching_tokens(self, term: str, mode: str) -> List[Tuple[int, float]]:
+        """Token ids matched by a query term, with the weight of the match kind"""
+        matches = {}
+        if term in self.token_ids:
+            matches[self.token_ids[term]] = MATCH_WEIGHTS["exact"]
+        if mode in ("prefix", "substring"):
+            start = bisect_left(self.vocabulary, term)
+            for token_id in range(start, len(self.vocabulary)):
+                if not self.vocabulary[token_id].startswith(term):
+                    break
+                matches.setdefault(token_id, MATCH_WEIGHTS["prefix"])
+        if mode == "substring":
+            if len(term) >= 3:
+                candidates = None
+                for trigram in set(trigrams(term)):
+                    ids = self.trigram_index.get(trigram)
+                    if ids is None:
+                        candidates = np.empty(0, dtype=np.int64)
+                        break
+                    candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+                candidates = candidates.tolist()
+            else:
+                # Too short for trigrams; the vocabulary is much smaller than the number of samples
+                candidates = range(len(self.vocabulary))
+            for token_id in candidates:
+                if term in self.vocabulary[token_id]:
+                    matches.setdefault(token_id, MATCH_WEIGHTS["substring"])
+        return list(matches.items())
+
+    def _term_scores(self, term: str, mode: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows matching a single term and their best score for it"""
+        matches = self._matching_tokens(term, mode)
+        if not matches:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        rows = np.concatenate([self.posting_rows[token_id] for token_id, _ in matches])
+        scores = np.concatenate([self.posting_weights[token_id] * (weight * self.idf[token_id])
+                                 for token_id, weight in matches])
+        if len(matches) == 1:
+            return rows, scores
+        order = np.argsort(rows, kind="stable")
+        rows, scores = rows[order], scores[order]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        return rows[starts], np.maximum.reduceat(scores, starts)
+
+    def match(self, query: str, mode: str = "substring") -> Tuple[np.ndarray, np.ndarray]:
+        """Rows matching every term of the query and their relevance scores"""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        rows, scores = None, None
+        # Start with the most selective term so the intersections stay small
+        for term_rows, term_scores in sorted((self._term_scores(term, mode) for term in terms), key=lambda x: len(x[0])):
+            if rows is None:
+                rows, scores = term_rows, term_scores
+            else:
+                rows, left, right = np.intersect1d(rows, term_rows, assume_unique=True, return_indices=True)
+                scores = scores[left] + term_scores[right]
+            if not len(rows):
+                break
+        return rows, scores
+
+    def facets(self, rows: np.ndarray) -> Dict[str, int]:
+        counts = np.bincount(self.category_codes[rows], minlength=len(self.category_names))
+        return {name: int(count) for name, count in zip(self.category_names, counts) if name and count}
+
+    def search(self, query: str, category: Optional[str] = None, offset: int = 0, limit: int = 20,
+               mode: str = "substring") -> Tuple[np.ndarray, int, Dict[str, int]]:
+        """
+        Ranked search with category facets.
+
+        Returns the rows of the requested page, the total number of matches (after the
+        category filter) and the per-category match counts (before the category filter).
+        """
+        rows, scores = self.match(query, mode)
+        facets = self.facets(rows)
+        if category is not None:
+            keep = self.category_codes[rows] == self._category_code(category)
+            rows, scores = rows[keep], scores[keep]
+
+        total = len(rows)
+        end = min(offset + limit, total)
+        if offset >= end:
+            return np.empty(0, dtype=np.int64), total, facets
+        # Only the top `end` matches need to be ordered: highest score first, then by row.
+        # Rows are ascending, so ties at the cut-off score keep the lowest rows.
+        if end < total:
+            threshold = np.partition(scores, total - end)[total - end]
+            above = scores > threshold
+            tied = np.flatnonzero(scores == threshold)[:end - int(above.sum())]
+            top = np.concatenate([np.flatnonzero(above), tied])
+            rows, scores = rows[top], scores[top]
+        order = np.lexsort((rows, -scores))
+        return rows[order[offset:end]], total, facets
+
+    def _category_code(self, category: str) -> int:
+        code = np.searchsorted(self.category_names, category)
+        if code < len(self.category_names) and self.category_names[code] == category:
+            return int(code)
+        return -1
+
@@ -0,0 +1,215 @@
+import hashlib
+import io
+import json
+import os
+import os.path as osp
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from deephallu.models.llava_next_t2p_mapper import Token2PatchMapper, TokenType, TOKEN_LAYOUT_DTYPE
+from deephallu.models.t2p_heatmap import AttentionHeatmapRenderer
+from deephallu.models.t2p_layout_cache import read_image_size
+from deephallu.utils.lru import LRUCache
+
+from ..utils.concurrency import BlockingExecutor, SingleFlight
+
+HERE = osp.dirname(osp.abspath(__file__))
+T2P_CACHE_DIR = osp.join(osp.dirname(HERE), "cache", "t2p")
+# Bump when the rendering changes so that old overlays are not reused
+RENDER_VERSION = 1
+TOKEN_TYPES = {"high_res": TokenType.HIGH_RESOLUTION_FEATURES, "base": TokenType.BASE_IMAGE_FEATURES}
+BLOCK_COLORS = ['red', 'blue', 'green', 'yellow', 'purple', 'orange', 'cyan', 'magenta']
+
+
+class ContentAddressedStore:
+    """Rendered files stored under the hash of their content.
+
+    ``refs/<input key>`` records which blob a given set of render inputs produced, so
+    a repeated request is answered without rendering, and identical renders from
+    different inputs share one blob. The content hash doubles as the ETag.
+    """
+
+    def __init__(self, root: str, suffix: str = ".png"):
+        self.root = root
+        self.suffix = suffix
+        os.makedirs(osp.join(root, "refs"), exist_ok=True)
+        os.makedirs(osp.join(root, "blobs"), exist_ok=True)
+
+    def blob_path(self, digest: str) -> str:
+        return osp.join(self.root, "blobs", digest + self.suffix)
+
+    def lookup(self, input_key: str) -> Optional[str]:
+        try:
+            with open(osp.join(self.root, "refs", input_key)) as f:
+                digest = f.read().strip()
+        except OSError:
+            return None
+        return digest if osp.exists(self.blob_path(digest)) else None
+
+    def put(self, input_key: str, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not osp.exists(path):
+            _atomic_write(path, data)
+        _atomic_write(osp.join(self.root, "refs", input_key), digest.encode("ascii"))
+        return digest
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _file_signature(path: str) -> Tuple[str, int, int]:
+    st = os.stat(path)
+    return osp.abspath(path), st.st_mtime_ns, st.st_size
+
+
+def _output_size(image_size: Tuple[int, int], max_size: int) -> Tuple[int, int]:
+    """(height, width) that fits into max_size x max_size with the aspect ratio of the image"""
+    height, width = image_size
+    scale = min(1.0, max_size / max(height, width))
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+
+class T2PService:
+    """
+    Token layouts and overlay images for the web frontend.
+
+    Layouts depend only on the image size, so they (and their JSON encoding) are
+    memoized by size; heatmap renderers are memoized by (size, token type, output size)
+    so that stepping through the generated tokens of a sample only scatters and blends
+    one attention vector per request.
+    """
+
+    def __init__(self, geometry: Optional[str] = None, cache_dir: str = T2P_CACHE_DIR, max_overlay_size: int = 1024,
+                 max_workers: int = 4):
+        self.mapper = Token2PatchMapper.from_geometry(geometry, layout_cache_dir=osp.join(cache_dir, "layouts"))
+        self.max_overlay_size = max_overlay_size
+        self.overlays = ContentAddressedStore(osp.join(cache_dir, "overlays"))
+        self._image_sizes = LRUCache(max_entries=16384)
+        self._layout_json = LRUCache(max_entries=256)
+        self._renderers = LRUCache(max_entries=64)
+        self._base_images = LRUCache(max_entries=32)
+        self.executor = BlockingExecutor(max_workers=max_workers, thread_name_prefix="t2p")
+        self.single_flight = SingleFlight()
+
+    async def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking method in the worker pool; identical concurrent requests render once"""
+        key = (fn.__name__,) + args + tuple(sorted(kwargs.items()))
+        return await self.single_flight.do(key, lambda: self.executor.run(fn, *args, **kwargs))
+
+    @staticmethod
+    def attention_file(run_dir: str, sample_id: str) -> Optional[str]:
+        """attentions/<sample_id>.npy written by ``infer.py --save_attentions``, None if absent"""
+        root = osp.realpath(osp.join(run_dir, "attentions"))
+        path = osp.realpath(osp.join(root, f"{sample_id}.npy"))
+        if not path.startswith(root + os.sep) or not osp.isfile(path):
+            return None
+        return path
+
+    def image_size(self, image_path: str) -> Tuple[int, int]:
+        """(height, width) of an image; only the file header is read"""
+        return self._image_sizes.get_or_create(_file_signature(image_path), lambda: read_image_size(image_path))
+
+    def layout(self, image_path: str) -> np.ndarray:
+        return self.mapper.layout_cache.get(self.image_size(image_path))
+
+    def layout_json(self, image_path: str) -> bytes:
+        """Token layout as compact JSON: one array per field, one element per image token"""
+        size = self.image_size(image_path)
+
+        def encode():
+            layout = self.mapper.layout_cache.get(size)
+            payload = {
+                "image_size": list(size),
+                "geometry_key": self.mapper.geometry_key,
+                "num_tokens": len(layout),
+                "token_types": {token_type.name: token_type.value for token_type in TokenType},
+                **{name: layout[name].tolist() for name in TOKEN_LAYOUT_DTYPE.names},
+            }
+            return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        return self._layout_json.get_or_create(size, encode)
+
+    def layout_etag(self, image_path: str) -> str:
+        size = self.image_size(image_path)
+        return f'"{self.mapper.geometry_key}-{size[0]}x{size[1]}"'
+
+    def _base_image(self, image_path: str, output_size: Tuple[int, int]) -> Image.Image:
+        def load():
+            with Image.open(image_path) as image:
+                image.draft("RGB", (output_size[1], output_size[0]))
+                return image.convert("RGB").resize((output_size[1], output_size[0]), Image.BILINEAR)
+        return self._base_images.get_or_create(_file_signature(image_path) + output_size, load)
+
+    def _renderer(self, size: Tuple[int, int], token_type: TokenType, output_size: Tuple[int, int]) -> AttentionHeatmapRenderer:
+        return self._renderers.get_or_create(
+            (self.mapper.geometry_key, size, token_type, output_size),
+            lambda: AttentionHeatmapRenderer(self.mapper.layout_cache.get(size), size, token_type, output_size)
+        )
+
+    def _render_layout(self, image_path: str, token_type: TokenType, output_size: Tuple[int, int]) -> Image.Image:
+        image = self._base_image(image_path, output_size).copy()
+        size = self.image_size(image_path)
+        layout = self.mapper.layout_cache.get(size)
+        tokens = layout[layout['token_type'] == token_type.value]
+        scale_y, scale_x = output_size[0] / size[0], output_size[1] / size[1]
+        draw = ImageDraw.Draw(image)
+        for block_id, x1, y1, x2, y2 in zip(tokens['block_id'].tolist(), tokens['x1'].tolist(), tokens['y1'].tolist(),
+                                            tokens['x2'].tolist(), tokens['y2'].tolist()):
+            draw.rectangle([x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y],
+                           outline=BLOCK_COLORS[block_id % len(BLOCK_COLORS)], width=1)
+        return image
+
+    def _render_attention(self, image_path: str, attention_path: str, step: int, layer: int, token_type: TokenType,
+                          output_size: Tuple[int, int], normalize: str, alpha: float) -> Image.Image:
+        attentions = np.load(attention_path, mmap_mode="r")
+        num_steps, num_layers, num_tokens = attentions.shape
+        if not -num_steps <= step < num_steps:
+            raise IndexError(f"Step {step} out of range, the sample has {num_steps} steps")
+        if not -num_layers <= layer < num_layers:
+            raise IndexError(f"Layer {layer} out of range, the model has {num_layers} layers")
+        size = self.image_size(image_path)
+        renderer = self._renderer(size, token_type, output_size)
+        if num_tokens < int(renderer.index.token_grid.max()) + 1:
+            raise ValueError(f"Attention has {num_tokens} image tokens, the layout of a {size[0]}x{size[1]} image needs more")
+        attention = np.asarray(attentions[step, layer], dtype=np.float32)
+        heat = renderer.heatmaps(attention, normalize=normalize)
+        return Image.fromarray(renderer.blend(self._base_image(image_path, output_size), heat, alpha)[0])
+
+    def overlay(self, image_path: str, kind: str = "layout", token_type: str = "high_res",
+                attention_path: Optional[str] = None, step: int = 0, layer: int = -1,
+                max_size: int = 512, normalize: str = "step", alpha: float = 0.5) -> Tuple[str, str]:
+        """
+        Render (or fetch from the cache) an overlay PNG
+        Returns:
+            (content hash, file path)
+        """
+        if token_type not in TOKEN_TYPES:
+            raise ValueError(f"Unknown token type '{token_type}', expected one of {list(TOKEN_TYPES)}")
+        if kind == "attention" and not attention_path:
+            raise ValueError("Attention overlays need an attention file")
+        output_size = _output_size(self.image_size(image_path), min(max_size, self.max_overlay_size))
+
+        inputs = [RENDER_VERSION, kind, self.mapper.geometry_key, _file_signature(image_path), token_type, output_size]
+        if kind == "attention":
+            inputs += [_file_signature(attention_path), step, layer, normalize, alpha]
+        elif kind != "layout":
+            raise ValueError(f"Unknown overlay kind '{kind}', expected 'layout' or 'attention'")
+        input_key = hashlib.sha1(json.dumps(inputs).encode("utf-8")).hexdigest()
+        digest = self.overlays.lookup(input_key)
+        if digest is None:
+            if kind == "layout":
+                image = self._render_layout(image_path, TOKEN_TYPES[token_type], output_size)
+            else:
+                image = self._render_attention(image_path, attention_path, step, layer, TOKEN_TYPES[token_type],
+                                               output_size, normalize, alpha)
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", compress_level=3)
+            digest = self.overlays.put(input_key, buffer.getvalue())
+        return digest, self.overlays.blob_path(digest)
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import os.path as osp
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from deephallu.utils.lru import LRUCache
+
+HERE = osp.dirname(osp.abspath(__file__))
+THUMBNAIL_CACHE_DIR = osp.join(osp.dirname(HERE), "cache", "thumbnails")
+
+# Output format -> (PIL format, file extension, media type)
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "png": ("PNG", ".png", "image/png"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+}
+FORMAT_ALIASES = {"jpg": "jpeg"}
+MAX_DIMENSION = 4096
+
+
+def guess_media_type(path: str) -> str:
+    media_type, _ = mimetypes.guess_type(path)
+    return media_type or "application/octet-stream"
+
+
+def normalize_format(fmt: Optional[str], source_path: str) -> str:
+    """Requested output format, or the source format if it can be written, else JPEG"""
+    if fmt:
+        fmt = FORMAT_ALIASES.get(fmt.lower(), fmt.lower())
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format '{fmt}', expected one of {list(IMAGE_FORMATS)}")
+        return fmt
+    ext = osp.splitext(source_path)[1].lower().lstrip(".")
+    ext = FORMAT_ALIASES.get(ext, ext)
+    return ext if ext in IMAGE_FORMATS else "jpeg"
+
+
+def source_etag(stat: os.stat_result, *variant) -> str:
+    digest = hashlib.sha1(repr((stat.st_mtime_ns, stat.st_size) + variant).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def validator_headers(stat: os.stat_result, etag: str, max_age: int) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": f"public, max-age={max_age}",
+    }
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def is_not_modified(request_headers, etag: str, stat: Optional[os.stat_result] = None) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since (If-None-Match takes precedence, RFC 9110)"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if stat is None:
+        return False
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have a resolution of one second
+        return int(stat.st_mtime) <= since
+    return False
+
+
+def render_thumbnail(source_path: str, target_path: str, width: Optional[int], height: Optional[int], fmt: str):
+    pil_format = IMAGE_FORMATS[fmt][0]
+    with Image.open(source_path) as image:
+        image.draft("RGB", (width or MAX_DIMENSION, height or MAX_DIMENSION))  # Fast DCT scaling for JPEG sources
+        # Keep the aspect ratio; a missing side is unconstrained. Images are never upscaled.
+        image.thumbnail((width or MAX_DIMENSION, height or MAX_DIMENSION), Image.Resampling.LANCZOS)
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        tmp_path = f"{target_path}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, format=pil_format, quality=85, optimize=True)
+    os.replace(tmp_path, target_path)
+
+
+class ThumbnailService:
+    """Resized images generated in a thread pool and kept in a size-bounded LRU disk cache.
+
+    Cache entries are keyed by the source file (path, mtime, size) and the requested
+    size and format, so a changed source image never serves a stale thumbnail.
+    Recency is kept in memory and mirrored to the file mtimes, so the LRU order
+    survives a restart.
+    """
+
+    def __init__(self, cache_dir: str = THUMBNAIL_CACHE_DIR, max_cache_bytes: int = 512 * 1024 * 1024,
+                 max_workers: int = 4):
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        # File name -> size; evicted thumbnails are deleted from the disk
+        self._entries: LRUCache[str, int] = LRUCache(max_weight=max_cache_bytes, weigh=lambda size: size,
+                                                     on_evict=self._remove)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self._load_cache()
+
+    def _load_cache(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    os.remove(entry.path)
+                elif entry.is_file():
+                    st = entry.stat()
+                    entries.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._entries.put(name, size)
+
+    def _remove(self, name: str, size: int):
+        try:
+            os.remove(osp.join(self.cache_dir, name))
+        except OSError:
+            pass
+
+    def _touch(self, name: str) -> bool:
+        if self._entries.get(name) is None:
+            return False
+        try:
+            os.utime(osp.join(self.cache_dir, name))
+        except OSError:
+            self._entries.pop(name)
+            return False
+        return True
+
+    def _add(self, name: str):
+        self._entries.put(name, os.path.getsize(osp.join(self.cache_dir, name)))
+
+    def cache_name(self, source_path: str, stat: os.stat_result, width: Optional[int], height: Optional[int], fmt: str) -> str:
+        key = hashlib.sha1(repr((osp.abspath(source_path), stat.st_mtime_ns, stat.st_size, width, height, fmt)).encode("utf-8"))
+        return key.hexdigest() + IMAGE_FORMATS[fmt][1]
+
+    def _generate(self, source_path: str, name: str, width: Optional[int], height: Optional[int], fmt: str) -> str:
+        target_path = osp.join(self.cache_dir, name)
+        render_thumbnail(source_path, target_path, width, height, fmt)
+        self._add(name)
+        return target_path
+
+    def get_thumbnail_future(self, source_path: str, width: Optional[int], height: Optional[int],
+                             fmt: Optional[str] = None) -> Tuple[Future, str]:
+        """Path of the cached thumbnail (as a future) and its media type"""
+        fmt = normalize_format(fmt, source_path)
+        stat = os.stat(source_path)
+        name = self.cache_name(source_path, stat, width, height, fmt)
+        media_type = IMAGE_FORMATS[fmt][2]
+
+        if self._touch(name):
+            future = Future()
+            future.set_result(osp.join(self.cache_dir, name))
+            return future, media_type
+
+        # Concurrent requests for the same thumbnail share one rendering job
+        with self._lock:
+            future = self._pending.get(name)
+            if future is None:
+                future = self.executor.submit(self._generate, source_path, name, width, height, fmt)
+                self._pending[name] = future
+                future.add_done_callback(lambda _: self._pending.pop(name, None))
+        return future, media_type
+
+    async def get_thumbnail(self, source_path: str, width: Optional[int], height: Optional[int],
+                            fmt: Optional[str] = None) -> Tuple[str, str]:
+        future, media_type = self.get_thumbnail_future(source_path, width, height, fmt)
+        return await asyncio.wrap_future(future), media_type
+
+    def cache_stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self._entries.weight, "max_bytes": self.max_cache_bytes}
@@ -0,0 +1,125 @@
+"""
+Benchmark of sample/image lookups by id in the web backend.
+
+Builds a synthetic MME-style dataset and reports p50/p99 latency of
+``GET /api/datasets/{name}/samples/{id}/image`` and ``GET /api/datasets/{name}/samples/{id}``
+for the previous implementation (full directory scan and linear search on every
+request) and for the sample index.
+
+Usage:
+    python -m deephallu.web.backend.utils.benchmark_lookup --categories 14 --images_per_category 2000 --requests 200
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from ..core.config import DatasetConfig
+from ..services.sample_index import load_mme_columns
+
+DATASET_NAME = "benchmark"
+
+
+def make_mme_dataset(root: Path, categories: int, images_per_category: int) -> List[str]:
+    sample_ids = []
+    for c in range(categories):
+        category = f"category_{c:02d}"
+        images_dir = root / category / "images"
+        qa_dir = root / category / "questions_answers_YN"
+        images_dir.mkdir(parents=True)
+        qa_dir.mkdir(parents=True)
+        with open(qa_dir / f"{category}.txt", "w", encoding="utf-8") as f:
+            for i in range(images_per_category):
+                image_name = f"{i:06d}.jpg"
+                (images_dir / image_name).touch()
+                f.write(f"{image_name}\tIs there an object {i} in the image?\tYes\n")
+                sample_ids.append(f"{category}_{image_name}")
+    return sample_ids
+
+
+def legacy_get_image(dataset_path: Path, sample_id: str) -> Optional[str]:
+    # Previous DatasetService.get_image: reload every sample, then scan for the id
+    columns = load_mme_columns(dataset_path)
+    for row, candidate in enumerate(columns["id"]):
+        if candidate == sample_id:
+            return columns["image_path"][row]
+    return None
+
+
+def measure(fn: Callable[[str], object], sample_ids: List[str]) -> Dict[str, float]:
+    latencies = []
+    for sample_id in sample_ids:
+        start = time.perf_counter()
+        fn(sample_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies = np.asarray(latencies)
+    return {"p50": float(np.percentile(latencies, 50)), "p99": float(np.percentile(latencies, 99)),
+            "mean": float(latencies.mean())}
+
+
+def run_benchmark(categories: int, images_per_category: int, requests: int, legacy_requests: int, seed: int = 0):
+    from fastapi.testclient import TestClient
+
+    from ..api.datasets import dataset_service
+    from ..app import app
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset_path = Path(tmp_dir) / "MME_Benchmark"
+        sample_ids = make_mme_dataset(dataset_path, categories, images_per_category)
+        print(f"Dataset: {len(sample_ids)} samples in {categories} categories")
+
+        dataset_service.config.datasets[DATASET_NAME] = DatasetConfig(
+            name="Benchmark", path=str(dataset_path), type="mme", description="Synthetic lookup benchmark"
+        )
+        dataset_service.indexes.cache_dir = str(Path(tmp_dir) / "index_cache")
+        rng = random.Random(seed)
+        client = TestClient(app)
+
+        try:
+            results = {}
+            results["legacy scan (service)"] = measure(
+                lambda sample_id: legacy_get_image(dataset_path, sample_id),
+                rng.choices(sample_ids, k=legacy_requests))
+
+            start = time.perf_counter()
+            dataset_service.get_index(DATASET_NAME)
+            print(f"Index build: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+            dataset_service.indexes._indexes.pop(DATASET_NAME)
+            start = time.perf_counter()
+            dataset_service.get_index(DATASET_NAME)
+            print(f"Index load from disk: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+            results["index (service)"] = measure(
+                lambda sample_id: dataset_service.get_image(DATASET_NAME, sample_id),
+                rng.choices(sample_ids, k=requests))
+            results["GET samples/{id}/image"] = measure(
+                lambda sample_id: client.get(f"/api/datasets/{DATASET_NAME}/samples/{sample_id}/image"),
+                rng.choices(sample_ids, k=requests))
+            results["GET samples/{id}"] = measure(
+                lambda sample_id: client.get(f"/api/datasets/{DATASET_NAME}/samples/{sample_id}"),
+                rng.choices(sample_ids, k=requests))
+        finally:
+            dataset_service.config.datasets.pop(DATASET_NAME, None)
+            dataset_service.indexes._indexes.pop(DATASET_NAME, None)
+
+    print(f"{'lookup':<28}{'p50 (ms)':>12}{'p99 (ms)':>12}{'mean (ms)':>12}")
+    for name, stats in results.items():
+        print(f"{name:<28}{stats['p50']:>12.3f}{stats['p99']:>12.3f}{stats['mean']:>12.3f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--categories", type=int, default=14)
+    parser.add_argument("--images_per_category", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=200, help="Number of lookups for the indexed implementation")
+    parser.add_argument("--legacy_requests", type=int, default=20, help="Number of lookups for the legacy full scan")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.categories, args.images_per_category, args.requests, args.legacy_requests, args.seed)
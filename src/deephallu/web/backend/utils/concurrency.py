@@ -0,0 +1,48 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class BlockingExecutor:
+    """Bounded thread pool for blocking filesystem work called from async routes.
+
+    The pool size caps how many scans or file reads run at once, so a burst of
+    requests cannot exhaust the default executor shared with the rest of the app.
+    """
+
+    def __init__(self, max_workers: int = 4, thread_name_prefix: str = "blocking-io"):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight computation.
+
+    The first caller starts the computation; callers arriving before it finishes
+    await the same result (or exception). Nothing is cached after completion.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so that one cancelled client does not cancel the work for the others
+        return await asyncio.shield(future)
+
+    def inflight(self, key: Optional[Hashable] = None) -> Any:
+        return key in self._inflight if key is not None else len(self._inflight)
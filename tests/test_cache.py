@@ -0,0 +1,334 @@
+import re
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from deephallu.web.backend.core.cache import (
+    CacheBackend, MemoryCache, RedisCache, RedisError, ResponseCache, create_cache
+)
+from deephallu.web.backend.core.config import CacheConfig
+
+
+def bulk(value):
+    data = value.encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+def encode_array(items):
+    return b"*%d\r\n" % len(items) + b"".join(item if isinstance(item, bytes) else bulk(item) for item in items)
+
+
+def glob_to_regex(pattern):
+    """Redis glob (``*``, ``?``, ``[...]``, backslash escapes) as a regex"""
+    parts, idx = [], 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        if char == "\\" and idx + 1 < len(pattern):
+            parts.append(re.escape(pattern[idx + 1]))
+            idx += 1
+        elif char == "*":
+            parts.append(".*")
+        elif char == "?":
+            parts.append(".")
+        elif char == "[":
+            end = pattern.index("]", idx)
+            parts.append(pattern[idx:end + 1])
+            idx = end
+        else:
+            parts.append(re.escape(char))
+        idx += 1
+    return re.compile("".join(parts), re.S)
+
+
+class FakeRedisServer:
+    """In-process server speaking enough RESP for RedisCache (PING/AUTH/SELECT/GET/SET EX/DEL/SCAN/FLUSHDB)"""
+
+    def __init__(self, password=None, port=0):
+        self.password = password
+        self.databases = {}
+        self.commands = []
+        self.clock_offset = 0.0
+        self.connections = []
+        self.lock = threading.Lock()
+        self.port = port
+        self.server = None
+
+    def now(self):
+        return time.monotonic() + self.clock_offset
+
+    def advance(self, seconds):
+        """Move the server clock forward instead of sleeping for TTLs"""
+        self.clock_offset += seconds
+
+    def execute(self, state, args):
+        command = args[0].upper()
+        with self.lock:
+            self.commands.append(args)
+            if self.password and not state["authenticated"] and command != "AUTH":
+                return b"-NOAUTH Authentication required.\r\n"
+            store = self.databases.setdefault(state["db"], {})
+            if command == "PING":
+                return b"+PONG\r\n"
+            if command == "AUTH":
+                if args[1] != self.password:
+                    return b"-WRONGPASS invalid password\r\n"
+                state["authenticated"] = True
+                return b"+OK\r\n"
+            if command == "SELECT":
+                state["db"] = int(args[1])
+                return b"+OK\r\n"
+            if command == "GET":
+                entry = store.get(args[1])
+                if entry is not None and entry[1] is not None and entry[1] <= self.now():
+                    del store[args[1]]
+                    entry = None
+                if entry is None:
+                    return b"$-1\r\n"
+                data = entry[0].encode("utf-8")
+                return b"$%d\r\n%s\r\n" % (len(data), data)
+            if command == "SET":
+                expires_at = self.now() + int(args[4]) if len(args) > 4 and args[3].upper() == "EX" else None
+                store[args[1]] = (args[2], expires_at)
+                return b"+OK\r\n"
+            if command == "DEL":
+                return b":%d\r\n" % sum(store.pop(key, None) is not None for key in args[1:])
+            if command == "SCAN":
+                # The cursor is an offset into the sorted keys; COUNT keys are examined per call
+                options = dict(zip([arg.upper() for arg in args[2::2]], args[3::2]))
+                keys = sorted(store)
+                start, count = int(args[1]), int(options.get("COUNT", 10))
+                pattern = glob_to_regex(options.get("MATCH", "*"))
+                matched = [key for key in keys[start:start + count] if pattern.fullmatch(key)]
+                cursor = start + count if start + count < len(keys) else 0
+                return encode_array([str(cursor), encode_array(matched)])
+            if command == "FLUSHDB":
+                store.clear()
+                return b"+OK\r\n"
+            return b"-ERR unknown command '%s'\r\n" % command.encode()
+
+    def start(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with fake.lock:
+                    fake.connections.append(self.connection)
+                state = {"db": 0, "authenticated": False}
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    args = []
+                    for _ in range(int(line[1:])):
+                        length = int(self.rfile.readline()[1:])
+                        args.append(self.rfile.read(length + 2)[:-2].decode("utf-8"))
+                    self.wfile.write(fake.execute(state, args))
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def drop_connections(self):
+        """Close all client connections from the server side, like a Redis restart or idle timeout"""
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.drop_connections()
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.port}"
+
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedisServer().start()
+    yield server
+    server.stop()
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+    class GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+
+def test_redis_get_set_delete_clear(redis_server):
+    cache = RedisCache(redis_server.url, default_ttl=None)
+    assert cache.ping()
+    assert cache.get("missing") is None
+    cache.set("key", '{"value": "äöü"}')
+    assert cache.get("key") == '{"value": "äöü"}'
+    assert redis_server.commands[-2] == ["SET", "key", '{"value": "äöü"}']
+    cache.delete("key")
+    assert cache.get("key") is None
+    cache.set("ns:a", "1")
+    cache.set("ns:b", "2")
+    cache.set("other:a", "3")
+    cache.clear(prefix="ns:")
+    assert cache.get("ns:a") is None and cache.get("ns:b") is None
+    # Keys outside the namespace survive; only a bare clear() flushes the database
+    assert cache.get("other:a") == "3"
+    cache.clear()
+    assert cache.get("other:a") is None
+
+
+def test_redis_clear_keeps_other_namespaces(redis_server):
+    cache = RedisCache(redis_server.url, default_ttl=None)
+    responses = ResponseCache(cache, namespace="deephallu")
+    for idx in range(25):
+        responses.set(responses.key("samples", idx), {"idx": idx})
+    cache.set("other-app:session", "keep")
+    cache.set("deephallu-v2:samples", "keep")
+    cache.set("deephallux", "keep")
+    # Glob characters in the namespace are matched literally
+    starred = ResponseCache(cache, namespace="dh*")
+    starred.set(starred.key("a"), 1)
+    cache.set("dhx:a", "keep")
+
+    responses.clear()
+    assert all(cache.get(f"deephallu:samples:{idx}") is None for idx in range(25))
+    assert not any(args[0] == "FLUSHDB" for args in redis_server.commands)
+    assert cache.get("other-app:session") == cache.get("deephallu-v2:samples") == cache.get("deephallux") == "keep"
+    starred.clear()
+    assert starred.get(starred.key("a")) is None and cache.get("dhx:a") == "keep"
+
+    cache.clear(prefix="deephallu", batch_size=2)
+    assert cache.get("deephallu-v2:samples") is None and cache.get("deephallux") is None
+    assert cache.get("other-app:session") == "keep"
+
+
+def test_memory_cache_clear_prefix():
+    cache = MemoryCache(default_ttl=None)
+    responses = ResponseCache(cache, namespace="ns")
+    responses.set(responses.key("a"), 1)
+    cache.set("other:a", "keep")
+    responses.clear()
+    assert responses.get(responses.key("a")) is None
+    assert cache.get("other:a") == "keep"
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_redis_ttl(redis_server):
+    cache = RedisCache(redis_server.url, default_ttl=60)
+    cache.set("default", "x")
+    cache.set("short", "y", ttl=5)
+    assert redis_server.commands[-2] == ["SET", "default", "x", "EX", "60"]
+    assert redis_server.commands[-1] == ["SET", "short", "y", "EX", "5"]
+    redis_server.advance(10)
+    assert cache.get("short") is None
+    assert cache.get("default") == "x"
+    redis_server.advance(60)
+    assert cache.get("default") is None
+
+
+def test_redis_auth_and_db():
+    server = FakeRedisServer(password="secret").start()
+    try:
+        cache = RedisCache(f"redis://:secret@127.0.0.1:{server.port}/2", default_ttl=None)
+        cache.set("key", "value")
+        assert server.databases[2] == {"key": ("value", None)}
+        assert server.commands[:2] == [["AUTH", "secret"], ["SELECT", "2"]]
+        with pytest.raises(RedisError, match="WRONGPASS"):
+            RedisCache(f"redis://:wrong@127.0.0.1:{server.port}").get("key")
+    finally:
+        server.stop()
+
+
+def test_redis_reconnects_after_dropped_connection(redis_server):
+    cache = RedisCache(redis_server.url, default_ttl=None)
+    cache.set("key", "value")
+    redis_server.drop_connections()
+    # The stale connection is replaced transparently
+    assert cache.get("key") == "value"
+    assert len(redis_server.connections) == 1
+
+
+def test_redis_server_down_and_back(redis_server):
+    cache = RedisCache(redis_server.url, default_ttl=None, timeout=0.5)
+    responses = ResponseCache(cache, namespace="test")
+    responses.set(responses.key("a"), {"a": 1})
+    port = redis_server.port
+    redis_server.stop()
+
+    with pytest.raises(RedisError):
+        cache.get("test:a")
+    # ResponseCache degrades to misses while the server is down
+    assert responses.get(responses.key("a")) is None
+    responses.set(responses.key("b"), {"b": 2})
+    assert responses.get_or_compute(responses.key("c"), lambda: [1, 2, 3]) == [1, 2, 3]
+
+    restarted = FakeRedisServer(port=port).start()
+    try:
+        responses.set(responses.key("a"), {"a": 1})
+        assert responses.get(responses.key("a")) == {"a": 1}
+    finally:
+        restarted.stop()
+    stats = responses.stats()
+    assert stats["errors"] == 4
+    assert (stats["hits"], stats["misses"], stats["sets"]) == (1, 2, 2)
+
+
+def test_response_cache_stats_over_redis(redis_server):
+    responses = ResponseCache(RedisCache(redis_server.url), namespace="deephallu", default_ttl=30)
+    key = responses.key("samples", "MME", 1)
+    assert key == "deephallu:samples:MME:1"
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"items": [1, 2], "total": 2}
+
+    assert responses.get_or_compute(key, compute) == {"items": [1, 2], "total": 2}
+    assert responses.get_or_compute(key, compute) == {"items": [1, 2], "total": 2}
+    assert len(calls) == 1
+    assert redis_server.commands[-2][-2:] == ["EX", "30"]
+    stats = responses.stats()
+    assert (stats["hits"], stats["misses"], stats["sets"], stats["errors"]) == (1, 1, 1, 0)
+    assert stats["hit_rate"] == 0.5
+    assert stats["backend"] == "RedisCache"
+
+
+def test_memory_cache_ttl_and_lru(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = MemoryCache(max_entries=2, default_ttl=10)
+    cache.set("a", "1")
+    cache.set("b", "2", ttl=100)
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    # "b" was least recently used
+    assert cache.get("b") is None and len(cache) == 2
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+
+def test_create_cache():
+    assert isinstance(create_cache(CacheConfig(backend="memory")).backend, MemoryCache)
+    redis = create_cache(CacheConfig(backend="redis", redis_url="redis://example:6390/1")).backend
+    assert (redis.host, redis.port, redis.db) == ("example", 6390, 1)
+    with pytest.raises(ValueError):
+        create_cache(CacheConfig(backend="memcached"))
@@ -0,0 +1,142 @@
+import json
+
+import pandas as pd
+import pytest
+
+from deephallu.analytics.chair import ChairIndex, ObjectMatcher, compute_chair
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return ObjectMatcher()
+
+
+@pytest.fixture
+def coco(tmp_path):
+    """Synthetic instances/captions files in the COCO layout"""
+    instances = {
+        "images": [{"id": image_id} for image_id in (1, 2, 3, 4)],
+        "categories": [
+            {"id": 1, "name": "person"}, {"id": 18, "name": "dog"}, {"id": 58, "name": "hot dog"},
+            {"id": 67, "name": "dining table"}, {"id": 17, "name": "cat"},
+        ],
+        "annotations": [
+            {"id": 10, "image_id": 1, "category_id": 18},
+            {"id": 11, "image_id": 1, "category_id": 18},
+            {"id": 12, "image_id": 1, "category_id": 1},
+            {"id": 13, "image_id": 2, "category_id": 58},
+            {"id": 14, "image_id": 2, "category_id": 67},
+        ],
+    }
+    # Image 3 has no instance annotations; its objects come from the reference captions only
+    captions = {
+        "images": [{"id": image_id} for image_id in (1, 2, 3, 4)],
+        "annotations": [
+            {"id": 20, "image_id": 3, "caption": "A kitten sleeping on a sofa."},
+            {"id": 21, "image_id": 3, "caption": "Dogma is a word, not an object."},
+        ],
+    }
+    instances_path = tmp_path / "instances_val2014.json"
+    captions_path = tmp_path / "captions_val2014.json"
+    instances_path.write_text(json.dumps(instances))
+    captions_path.write_text(json.dumps(captions))
+    return str(instances_path), str(captions_path)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Two dogs and a puppy", [("dogs", "dog"), ("puppy", "dog")]),
+    ("Three people, two men and some children", [("people", "person"), ("men", "person"), ("children", "person")]),
+    ("mice, knives and buses", [("mice", "mouse"), ("knives", "knife"), ("buses", "bus")]),
+    ("two babies and some puppies", [("babies", "person"), ("puppies", "dog")]),
+    ("A hot dog next to a dog", [("hot dog", "hot dog"), ("dog", "dog")]),
+    ("Hot-dogs and a hot  dog", [("hot dogs", "hot dog"), ("hot dog", "hot dog")]),
+    ("a baby bird on a bench", [("baby bird", "bird"), ("bench", "bench")]),
+    ("a hot dog stand", []),
+    ("dogma, dogmatic underdogs and a hotdog", []),
+    ("A Stop Sign by a FIRE HYDRANT.", [("stop sign", "stop sign"), ("fire hydrant", "fire hydrant")]),
+])
+def test_matcher_find(matcher, text, expected):
+    assert matcher.find(text) == expected
+
+
+def test_find_all_matches_find(matcher):
+    texts = ["Two dogs and a hot dog.", "", "dogma", "A man on a motor bike with a cat.", "People"]
+    table = matcher.find_all(texts)
+    for text_idx, text in enumerate(texts):
+        rows = table[table["text_idx"] == text_idx]
+        assert list(zip(rows["word"], rows["category"])) == matcher.find(text)
+
+
+def test_index_from_coco(coco):
+    index = ChairIndex.from_coco(*coco)
+    assert len(index) == 4
+    assert index.get(1) == frozenset({"dog", "person"})
+    assert index.get(2) == frozenset({"hot dog", "dining table"})
+    assert index.get(3) == frozenset({"cat", "couch"})
+    assert index.get(4) == frozenset()
+    assert 99 not in index and index.get(99) == frozenset()
+    # Without captions only the instance annotations count
+    assert ChairIndex.from_coco(coco[0]).get(3) == frozenset()
+
+
+def test_index_save_and_load_or_build(coco, tmp_path):
+    index_path = str(tmp_path / "chair_index.json")
+    built = ChairIndex.load_or_build(index_path, *coco)
+    loaded = ChairIndex.load(index_path)
+    assert loaded.objects == built.objects
+    assert ChairIndex.load_or_build(index_path, *coco).objects == built.objects
+
+
+def test_compute_chair(coco, matcher):
+    index = ChairIndex.from_coco(*coco)
+    captions = pd.DataFrame({
+        "image_id": [1, 1, 2, 3, 4, 1, 99],
+        "caption": [
+            "Two dogs and a man playing in the park.",
+            "A puppy catches a frisbee in front of a dogma poster.",
+            "Hot dogs on a table next to a sleeping dog.",
+            "Cats on a couch.",
+            "An empty street with two buses.",
+            "Dogmatic underdogs.",
+            "A bird.",
+        ],
+    })
+    summary, per_caption = compute_chair(captions, index, matcher)
+
+    assert per_caption["mentioned"].tolist() == [
+        ["dog", "person"], ["dog", "frisbee"], ["dining table", "dog", "hot dog"], ["cat", "couch"], ["bus"], [], ["bird"],
+    ]
+    assert per_caption["hallucinated"].tolist() == [[], ["frisbee"], ["dog"], [], ["bus"], [], ["bird"]]
+    assert per_caption["num_mentioned"].tolist() == [2, 2, 3, 2, 1, 0, 1]
+    assert per_caption["num_hallucinated"].tolist() == [0, 1, 1, 0, 1, 0, 1]
+    assert summary["num_captions"] == 7
+    assert summary["num_mentioned"] == 11
+    assert summary["num_hallucinated"] == 4
+    assert summary["chair_i"] == pytest.approx(4 / 11)
+    assert summary["chair_s"] == pytest.approx(4 / 7)
+    # Ground-truth objects per caption: 2 + 2 + 2 + 2 + 0 + 2 + 0, of which 7 are mentioned
+    assert summary["recall"] == pytest.approx(7 / 10)
+    assert summary["missing_images"] == 1
+
+
+def test_compute_chair_counts_each_object_once_per_caption(coco, matcher):
+    index = ChairIndex.from_coco(*coco)
+    captions = pd.DataFrame({"image_id": [4], "text": ["A cat, another cat and three kittens."]})
+    summary, per_caption = compute_chair(captions, index, matcher, caption_col="text")
+    assert per_caption["mentioned"].tolist() == [["cat"]]
+    assert (summary["num_mentioned"], summary["num_hallucinated"]) == (1, 1)
+    assert (summary["chair_i"], summary["chair_s"], summary["recall"]) == (1.0, 1.0, 0.0)
+
+
+def test_compute_chair_empty(coco, matcher):
+    summary, per_caption = compute_chair(pd.DataFrame({"image_id": [], "caption": []}), ChairIndex.from_coco(*coco), matcher)
+    assert summary["chair_i"] == summary["chair_s"] == 0.0
+    assert len(per_caption) == 0
+
+
+def test_compute_chair_without_any_object(coco, matcher):
+    captions = pd.DataFrame({"image_id": [1, 2], "caption": ["Nothing to see here.", "Dogma."]})
+    summary, per_caption = compute_chair(captions, ChairIndex.from_coco(*coco), matcher)
+    assert per_caption["mentioned"].tolist() == [[], []]
+    assert per_caption["hallucinated"].tolist() == [[], []]
+    assert (summary["num_mentioned"], summary["chair_i"], summary["chair_s"], summary["recall"]) == (0, 0.0, 0.0, 0.0)
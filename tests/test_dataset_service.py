@@ -0,0 +1,266 @@
+import asyncio
+import threading
+
+import pytest
+import yaml
+
+from deephallu.web.backend.core.cache import MemoryCache, ResponseCache
+from deephallu.web.backend.core.config import Config
+from deephallu.web.backend.models.dataset_models import DatasetBrowseRequest
+from deephallu.web.backend.services import sample_index as sample_index_module
+from deephallu.web.backend.services.dataset_service import DatasetService
+from deephallu.web.backend.services.sample_index import SampleIndexRegistry
+from deephallu.web.backend.utils.benchmark_lookup import make_mme_dataset
+from deephallu.web.backend.utils.concurrency import SingleFlight
+
+CATEGORIES = ["category_00", "category_01", "category_02"]
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    root = tmp_path / "MME_Benchmark"
+    sample_ids = make_mme_dataset(root, categories=3, images_per_category=5)
+    (tmp_path / "flat" / "sub").mkdir(parents=True)
+    (tmp_path / "flat" / "a.png").touch()
+    (tmp_path / "flat" / "sub" / "b.jpg").touch()
+    (tmp_path / "flat" / "notes.txt").touch()
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump({
+        "datasets": {
+            "mme": {"name": "MME", "path": str(root), "type": "mme", "description": "synthetic"},
+            "flat": {"name": "Flat", "path": str(tmp_path / "flat"), "type": "images", "description": "generic"},
+            "missing": {"name": "Missing", "path": str(tmp_path / "nope"), "type": "mme", "description": "no files"},
+        },
+        "models": {},
+    }))
+    return Config(str(config_path)), root, sample_ids
+
+
+def add_image(root, category, image_name):
+    (root / category / "images" / image_name).touch()
+    with open(root / category / "questions_answers_YN" / f"{category}.txt", "a", encoding="utf-8") as f:
+        f.write(f"{image_name}\tIs there a dog in the image?\tNo\n")
+
+
+def make_service(config, tmp_path):
+    service = DatasetService(max_workers=2, cache=ResponseCache(MemoryCache()))
+    service.config = config
+    service.indexes = SampleIndexRegistry(config, check_interval=0.0, cache_dir=str(tmp_path / "index_cache"))
+    service.index_status = {name: {"status": "pending"} for name in config.get_all_datasets()}
+    return service
+
+
+def test_index_columns(dataset, tmp_path):
+    config, root, sample_ids = dataset
+    registry = SampleIndexRegistry(config, cache_dir=None)
+    index = registry.get("mme")
+    assert len(index) == 15
+    assert list(index.columns["id"]) == sample_ids
+    assert index.category_counts == {category: 5 for category in CATEGORIES}
+    sample = index.get("category_01_000003.jpg")
+    assert sample.image_path == str(root / "category_01" / "images" / "000003.jpg")
+    assert (sample.question, sample.answer) == ("Is there an object 3 in the image?", "Yes")
+    assert index.get("category_01_999999.jpg") is None
+
+    flat = registry.get("flat")
+    assert list(flat.columns["id"]) == ["a.png", "sub/b.jpg"]
+    assert flat.metadata == {"dataset_type": "generic"}
+    assert len(registry.get("missing")) == 0
+    with pytest.raises(ValueError, match="not found"):
+        registry.get("unknown")
+
+
+def test_rebuilds_when_signature_changes(dataset, tmp_path):
+    config, root, _ = dataset
+    registry = SampleIndexRegistry(config, check_interval=0.0, cache_dir=None)
+    index = registry.get("mme")
+    assert registry.get("mme") is index
+
+    add_image(root, "category_01", "000100.jpg")
+    rebuilt = registry.get("mme")
+    assert rebuilt is not index and len(rebuilt) == 16
+    assert rebuilt.get("category_01_000100.jpg").answer == "No"
+    assert rebuilt.version != index.version
+
+    # Removing an image changes the directory mtime as well
+    (root / "category_02" / "images" / "000000.jpg").unlink()
+    assert len(registry.get("mme")) == 15
+
+    # Within check_interval the filesystem is not looked at
+    lazy = SampleIndexRegistry(config, check_interval=3600.0, cache_dir=None)
+    cached = lazy.get("mme")
+    add_image(root, "category_00", "000200.jpg")
+    assert lazy.get("mme") is cached
+    assert lazy.reload("mme") == ["mme"]
+    assert len(lazy.cached("mme")) == 16
+
+
+def test_persisted_index_is_reused_until_dataset_changes(dataset, tmp_path, monkeypatch):
+    config, root, _ = dataset
+    cache_dir = str(tmp_path / "index_cache")
+    built = SampleIndexRegistry(config, cache_dir=cache_dir).get("mme")
+
+    def fail(*args):
+        raise AssertionError("index was rebuilt")
+
+    real_build = sample_index_module.build_sample_index
+    monkeypatch.setattr(sample_index_module, "build_sample_index", fail)
+    loaded = SampleIndexRegistry(config, cache_dir=cache_dir).get("mme")
+    assert loaded.signature == built.signature
+    assert loaded.built_at == built.built_at and loaded.version == built.version
+    assert list(loaded.columns["id"]) == list(built.columns["id"])
+
+    add_image(root, "category_00", "000100.jpg")
+    monkeypatch.setattr(sample_index_module, "build_sample_index", real_build)
+    assert len(SampleIndexRegistry(config, cache_dir=cache_dir).get("mme")) == 16
+
+
+def test_single_flight_shares_one_computation():
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value * 2
+
+    async def failing():
+        calls.append("fail")
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.do("k", lambda: compute(1)))
+        second = asyncio.ensure_future(flight.do("k", lambda: compute(2)))
+        other = asyncio.ensure_future(flight.do("other", lambda: compute(3)))
+        await asyncio.sleep(0)
+        assert flight.inflight("k") and flight.inflight() == 2
+        assert await asyncio.gather(first, second, other) == [2, 2, 6]
+        assert flight.inflight() == 0
+
+        # A cancelled caller does not cancel the shared work
+        cancelled = asyncio.ensure_future(flight.do("k", lambda: compute(4)))
+        waiting = asyncio.ensure_future(flight.do("k", lambda: compute(5)))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        assert await waiting == 8
+
+        # Exceptions reach every caller
+        results = await asyncio.gather(flight.do("e", failing), flight.do("e", failing), return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError, ValueError]
+
+    asyncio.run(main())
+    assert calls == [1, 3, 4, "fail"]
+
+
+def test_service_call_shares_identical_requests(dataset, tmp_path, monkeypatch):
+    config, _, _ = dataset
+    service = make_service(config, tmp_path)
+    release = threading.Event()
+    calls = []
+    browse = service.browse_dataset
+
+    def slow_browse(request):
+        calls.append(request.page)
+        release.wait(5)
+        return browse(request)
+
+    slow_browse.__name__ = "browse_dataset"
+
+    async def main():
+        same = [asyncio.ensure_future(service.call(slow_browse, DatasetBrowseRequest(dataset_name="mme", page=1)))
+                for _ in range(3)]
+        page2 = asyncio.ensure_future(service.call(slow_browse, DatasetBrowseRequest(dataset_name="mme", page=2, page_size=10)))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*same, page2)
+
+    responses = asyncio.run(main())
+    assert sorted(calls) == [1, 2]
+    assert [response.total_count for response in responses] == [15] * 4
+    assert [len(response.samples) for response in responses] == [15, 15, 15, 5]
+
+
+def test_browse_and_facets(dataset, tmp_path):
+    config, root, sample_ids = dataset
+    service = make_service(config, tmp_path)
+
+    page = service.browse_dataset(DatasetBrowseRequest(dataset_name="mme", page=2, page_size=4))
+    assert [sample.id for sample in page.samples] == sample_ids[4:8]
+    assert (page.total_count, page.has_next, page.has_prev) == (15, True, True)
+    assert page.facets == {category: 5 for category in CATEGORIES}
+    assert page.samples[0].metadata == {"dataset_type": "mme"}
+
+    filtered = service.browse_dataset(DatasetBrowseRequest(dataset_name="mme", category="category_02", page_size=3, page=2))
+    assert [sample.id for sample in filtered.samples] == sample_ids[13:15]
+    assert (filtered.total_count, filtered.has_next) == (5, False)
+
+    # Search facets count the matches per category before the category filter
+    search = service.browse_dataset(DatasetBrowseRequest(dataset_name="mme", search_query="object 3", category="category_01"))
+    assert [sample.id for sample in search.samples] == ["category_01_000003.jpg"]
+    assert search.total_count == 1
+    assert search.facets == {category: 1 for category in CATEGORIES}
+    empty = service.browse_dataset(DatasetBrowseRequest(dataset_name="mme", search_query="giraffe"))
+    assert (empty.samples, empty.total_count, empty.facets) == ([], 0, None)
+
+    stats = service.get_dataset_stats("mme")
+    assert (stats.total_samples, stats.categories) == (15, {category: 5 for category in CATEGORIES})
+    assert service.get_categories("mme") == CATEGORIES
+    assert {info.name: info.total_samples for info in service.get_all_datasets()} == {"MME": 15, "Flat": 2, "Missing": 0}
+
+    # Cached responses are keyed by the index version, so a changed dataset is visible at once
+    add_image(root, "category_02", "000100.jpg")
+    assert service.browse_dataset(DatasetBrowseRequest(dataset_name="mme")).total_count == 16
+    assert service.get_dataset_stats("mme").categories["category_02"] == 6
+
+
+@pytest.fixture
+def client(dataset, tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from deephallu.web.backend.api import datasets as datasets_api
+
+    config, _, _ = dataset
+    service = make_service(config, tmp_path)
+    for name in ("config", "indexes", "cache", "index_status"):
+        monkeypatch.setattr(datasets_api.dataset_service, name, getattr(service, name))
+    app = FastAPI()
+    app.include_router(datasets_api.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_api_samples(client, dataset):
+    _, _, sample_ids = dataset
+    response = client.get("/api/datasets/mme/samples", params={"page": 3, "page_size": 6})
+    assert response.status_code == 200
+    body = response.json()
+    assert [sample["id"] for sample in body["samples"]] == sample_ids[12:]
+    assert (body["total_count"], body["page"], body["has_next"], body["has_prev"]) == (15, 3, False, True)
+    assert body["facets"] == {category: 5 for category in CATEGORIES}
+
+    body = client.get("/api/datasets/mme/samples", params={"category": "category_00", "page_size": 2}).json()
+    assert [sample["id"] for sample in body["samples"]] == sample_ids[:2]
+    assert body["total_count"] == 5 and body["has_next"]
+
+    body = client.get("/api/datasets/mme/samples", params={"search_query": "00000", "search_mode": "prefix", "page_size": 100}).json()
+    assert body["total_count"] == 15
+    body = client.get("/api/datasets/mme/samples", params={"search_query": "0004", "search_mode": "exact"}).json()
+    assert body["total_count"] == 0
+    body = client.get("/api/datasets/mme/samples", params={"search_query": "0004", "search_mode": "substring"}).json()
+    assert sorted(sample["id"] for sample in body["samples"]) == [f"{category}_000004.jpg" for category in CATEGORIES]
+
+    assert client.get("/api/datasets/mme/stats").json()["total_samples"] == 15
+
+
+def test_api_errors(client):
+    response = client.get("/api/datasets/unknown/samples")
+    assert response.status_code == 404
+    assert "not found" in response.json()["detail"]
+    assert client.get("/api/datasets/unknown/stats").status_code == 404
+    assert client.get("/api/datasets/mme/samples", params={"page": 0}).status_code == 422
+    assert client.get("/api/datasets/mme/samples", params={"page_size": 101}).status_code == 422
+    assert client.get("/api/datasets/mme/samples", params={"search_mode": "regex"}).status_code == 422
+    # A page past the end is empty rather than an error
+    body = client.get("/api/datasets/mme/samples", params={"page": 5}).json()
+    assert body["samples"] == [] and body["total_count"] == 15
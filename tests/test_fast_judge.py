@@ -0,0 +1,89 @@
+import pandas as pd
+
+from deephallu.analytics.fast_judge import (
+    HEDGED_CONFIDENCE, STRONG_CONFIDENCE, WEAK_CONFIDENCE, calibrate, classify_answers, fast_judge,
+    worst_group_agreement
+)
+
+CASES = [
+    # (question, generated_text, label, confidence)
+    ("Is there a dog in the image? Please answer yes or no.", "Yes, there is a dog.", 1, STRONG_CONFIDENCE),
+    ("Is there a dog in the image? Please answer yes or no.", "**No.** There is only a cat.", 0, STRONG_CONFIDENCE),
+    ("Is there a dog in the image? Please answer yes or no.", "Yes there is a dog.", 1, WEAK_CONFIDENCE),
+    ("Is there a dog in the image? Please answer yes or no.", "Yes and no, it is hard to tell.", -1, 0.0),
+    ("Is there a dog in the image? Please answer yes or no.", "The image shows a dog.", -1, 0.0),
+    # Attribution to someone else than asked
+    ("Is this artwork created by donatello? Please answer yes or no.",
+     "Yes, the artwork is the bell tower of the Florence Cathedral, designed by Filippo Brunelleschi.", 1, HEDGED_CONFIDENCE),
+    ("Is this movie directed by desmond davis? Please answer yes or no.",
+     "Yes, this image is from the movie \"The Passion of the Christ,\" which was directed by Mel Gibson.", 1, HEDGED_CONFIDENCE),
+    ("Is this artwork created by donatello? Please answer yes or no.",
+     "Yes, this bronze David was created by Donatello.", 1, STRONG_CONFIDENCE),
+    ("Is this artwork displayed in musée du louvre, paris? Please answer yes or no.",
+     "Yes, it is displayed in the Musee du Louvre in Paris.", 1, STRONG_CONFIDENCE),
+    # Re-identified as another entity
+    ("Is this a photo of Visingsborg? Please answer yes or no.",
+     "Yes, this is a photo of Visingsborg, also known as Kronborg Castle, located in Denmark.", 1, HEDGED_CONFIDENCE),
+    # "No" followed by the asked value without a negation
+    ("Is the answer to the arithmetic question in the image 36? Please answer yes or no.",
+     "No, the answer to the arithmetic question in the image is 36.", -1, 0.0),
+    ("Is the phone number in the picture \"0137 556 6363\"? Please answer yes or no.",
+     "No, the phone number in the picture is \"0137 556 6363\".", -1, 0.0),
+    ("Is the answer to the arithmetic question in the image 36? Please answer yes or no.",
+     "No, the answer is not 36, it is 63.", 0, STRONG_CONFIDENCE),
+    ("Is the answer to the arithmetic question in the image 36? Please answer yes or no.",
+     "No, the answer is 360.", 0, STRONG_CONFIDENCE),
+]
+
+
+def test_classify_answers_with_questions():
+    questions = pd.Series([case[0] for case in CASES])
+    texts = pd.Series([case[1] for case in CASES])
+    classified = classify_answers(texts, questions)
+    for (question, text, label, confidence), row in zip(CASES, classified.itertuples()):
+        assert (row.label, row.confidence) == (label, confidence), text
+
+
+def test_classify_answers_without_questions_only_reads_the_answer():
+    texts = pd.Series([case[1] for case in CASES])
+    classified = classify_answers(texts)
+    assert classified.loc[5, "confidence"] == STRONG_CONFIDENCE
+    assert classified.loc[10, "label"] == 0
+
+
+def test_fast_judge_and_calibrate():
+    results = pd.DataFrame({
+        "question": [case[0] for case in CASES],
+        "generated_text": [case[1] for case in CASES],
+        "answer": ["Yes"] * len(CASES),
+    })
+    judged = fast_judge(results)
+    assert judged["decided"].tolist() == [confidence >= STRONG_CONFIDENCE for _, _, _, confidence in CASES]
+    assert judged.loc[judged["decided"], "judgment"].tolist() == [1, 0, 1, 1, 0, 0]
+    results["generated_text_code"] = judged["label"].where(judged["label"] != -1, 1)
+    table = calibrate(results)
+    assert table.loc[STRONG_CONFIDENCE, "samples"] == 6
+    assert table.loc[HEDGED_CONFIDENCE, "agreement"] == 1.0
+
+
+def test_calibrate_by_category_and_worst_group():
+    texts = ["Yes, there is a dog."] * 10 + ["No, there is no dog."] * 6 + ["Yes there is."] * 2
+    results = pd.DataFrame({
+        "question": ["Is there a dog in the image? Please answer yes or no."] * len(texts),
+        "generated_text": texts,
+        "category": ["existence"] * 10 + ["count"] * 6 + ["count"] * 2,
+        # Two disagreements among the "count" strong answers, one in "existence"
+        "generated_text_code": [1] * 9 + [0] + [0] * 4 + [1, 1] + [1, 0],
+    })
+    table = calibrate(results, by="category")
+    assert table.index.names == ["confidence", "category"]
+    assert table.loc[(STRONG_CONFIDENCE, "existence")].tolist() == [10, 0.9]
+    assert table.loc[(STRONG_CONFIDENCE, "count")].tolist() == [6, 4 / 6]
+    assert calibrate(results).loc[STRONG_CONFIDENCE, "agreement"] == 13 / 16
+
+    worst = worst_group_agreement(table)
+    assert worst.loc[STRONG_CONFIDENCE, "group"] == "count"
+    assert worst.loc[STRONG_CONFIDENCE, "agreement"] == 4 / 6
+    # The two weak answers are below min_samples
+    assert WEAK_CONFIDENCE not in worst.index
+    assert worst_group_agreement(table, min_samples=1).loc[WEAK_CONFIDENCE, "agreement"] == 0.5
@@ -0,0 +1,190 @@
+import asyncio
+import sys
+import threading
+import time
+import types
+
+import pytest
+import yaml
+from PIL import Image
+
+from deephallu.web.backend.core.config import Config
+from deephallu.web.backend.services import generation_service as generation_module
+from deephallu.web.backend.services.generation_service import GenerationService
+
+TIMEOUT = 10
+
+
+class FakeGenerator:
+    """Stands in for inference.stream.stream_generate; the question selects the behaviour"""
+
+    def __init__(self):
+        self.stop_events = []
+        self.closed = threading.Event()
+
+    def __call__(self, model, processor, image, question, max_new_tokens=512, top_k=5, image_attention=False,
+                 stop_event=None):
+        self.stop_events.append(stop_event)
+        assert (model, processor) == ("model", "processor") and image.mode == "RGB"
+        try:
+            for i in range(max_new_tokens):
+                if question == "error" and i == 2:
+                    raise RuntimeError("CUDA out of memory")
+                step = {"step": i, "token": f"t{i}", "text": f"t{i} "}
+                finish_reason = None
+                if question.startswith("eos:") and i + 1 == int(question[4:]):
+                    finish_reason = "eos"
+                elif i + 1 == max_new_tokens:
+                    finish_reason = "length"
+                elif stop_event.is_set():
+                    finish_reason = "cancelled"
+                if finish_reason:
+                    step.update(finish_reason=finish_reason, generated_text=" ".join(f"t{j}" for j in range(i + 1)),
+                                avg_entropy=0.5)
+                    yield step
+                    return
+                yield step
+                if question == "forever":
+                    time.sleep(0.005)
+        finally:
+            self.closed.set()
+
+
+class FakeModels:
+    def get(self, model_key):
+        return "processor", "model"
+
+
+@pytest.fixture
+def fake_stream(monkeypatch):
+    fake = FakeGenerator()
+    module = types.ModuleType("deephallu.inference.stream")
+    module.stream_generate = fake
+    monkeypatch.setitem(sys.modules, "deephallu.inference.stream", module)
+    return fake
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch, fake_stream):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump({
+        "datasets": {},
+        "models": {"tiny": {"name": "Tiny", "type": "local", "description": "test", "model_name": "tiny"}},
+        "generation": {"device": "cpu", "max_concurrent": 1, "max_new_tokens": 1000},
+    }))
+    monkeypatch.setattr(generation_module, "config", Config(str(config_path)))
+    service = GenerationService()
+    service.models = FakeModels()
+    return service
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = tmp_path / "image.png"
+    Image.new("RGB", (8, 8), "red").save(path)
+    return str(path)
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, TIMEOUT))
+
+
+def slot_is_free(service):
+    if not service._slots.acquire(timeout=TIMEOUT):
+        return False
+    service._slots.release()
+    return True
+
+
+def test_done_event(service, image_path):
+    events = run(collect(service.stream("tiny", image_path, "eos:3", max_new_tokens=5000, stream_id="s1")))
+    assert [event_type for event_type, _ in events] == ["start", "token", "token", "token", "done"]
+    assert events[0][1] == {"stream_id": "s1", "model": "tiny", "question": "eos:3", "max_new_tokens": 1000}
+    assert [data["text"] for event_type, data in events if event_type == "token"] == ["t0 ", "t1 ", "t2 "]
+    done = events[-1][1]
+    assert (done["finish_reason"], done["generated_text"], done["num_tokens"]) == ("eos", "t0 t1 t2", 3)
+    assert done["tokens_per_second"] > 0
+    assert service.active_streams() == {}
+    assert slot_is_free(service)
+
+    events = run(collect(service.stream("tiny", image_path, "forever", max_new_tokens=2)))
+    assert events[-1][1]["finish_reason"] == "length"
+
+
+def test_error_event(service, fake_stream, image_path):
+    events = run(collect(service.stream("tiny", image_path, "error")))
+    assert [event_type for event_type, _ in events] == ["start", "token", "token", "error"]
+    assert events[-1][1] == {"detail": "RuntimeError: CUDA out of memory"}
+    assert fake_stream.closed.is_set()
+    assert service.active_streams() == {}
+    assert slot_is_free(service)
+
+    events = run(collect(service.stream("tiny", image_path + ".missing", "eos:1")))
+    assert [event_type for event_type, _ in events] == ["start", "error"]
+    assert events[-1][1]["detail"].startswith("FileNotFoundError")
+    assert slot_is_free(service)
+
+
+def test_unknown_model(service, image_path):
+    with pytest.raises(ValueError, match="not found"):
+        run(collect(service.stream("missing", image_path, "eos:1")))
+    assert service.active_streams() == {}
+
+
+def test_cancel_stops_generation_and_frees_the_slot(service, fake_stream, image_path):
+    async def main():
+        events = service.stream("tiny", image_path, "forever", stream_id="s1")
+        received = [await events.__anext__(), await events.__anext__()]
+        assert service.active_streams() == {"s1": False}
+        assert service.cancel("s1") is True
+        assert service.active_streams() == {"s1": True}
+        received += [event async for event in events]
+        return received
+
+    events = run(main())
+    assert fake_stream.stop_events[0].is_set()
+    assert events[-2][1]["finish_reason"] == "cancelled"
+    assert events[-1][0] == "done" and events[-1][1]["finish_reason"] == "cancelled"
+    assert fake_stream.closed.wait(TIMEOUT)
+    assert service.active_streams() == {}
+    assert service.cancel("s1") is False
+    assert slot_is_free(service)
+
+
+def test_disconnect_stops_generation_and_frees_the_slot(service, fake_stream, image_path):
+    async def main():
+        events = service.stream("tiny", image_path, "forever", stream_id="s1")
+        assert (await events.__anext__())[0] == "start"
+        assert (await events.__anext__())[0] == "token"
+        # The client went away: the response closes the event generator
+        await events.aclose()
+        assert service.active_streams() == {}
+        assert fake_stream.stop_events[0].is_set()
+        # The generation thread leaves after the current step, so the next stream gets the slot
+        return await collect(service.stream("tiny", image_path, "eos:1"))
+
+    events = run(main())
+    assert fake_stream.closed.is_set()
+    assert [event_type for event_type, _ in events] == ["start", "token", "done"]
+    assert slot_is_free(service)
+
+
+def test_waiting_stream_cancelled_before_it_gets_the_slot(service, fake_stream, image_path):
+    async def main():
+        first = service.stream("tiny", image_path, "forever", stream_id="first")
+        await first.__anext__()
+        await first.__anext__()
+        second = service.stream("tiny", image_path, "eos:1", stream_id="second")
+        assert (await second.__anext__())[0] == "start"
+        # Cancelled while the first stream still holds the slot: it never starts generating
+        service.cancel("second")
+        await first.aclose()
+        return await collect(second)
+
+    assert run(main()) == []
+    assert len(fake_stream.stop_events) == 1
+    assert slot_is_free(service)
@@ -0,0 +1,394 @@
+import inspect
+import os.path as osp
+import re
+import sqlite3
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from PIL import Image
+
+from deephallu.web.backend.core.config import Config
+from deephallu.web.backend.services.inference_worker import InferenceWorker
+from deephallu.web.backend.services.job_queue import (
+    CANCELLED, COMPLETED, FAILED, QUEUED, RUNNING, JobQueue
+)
+
+QUESTIONS = {
+    "a.jpg": ("Is there a red square in the image? Please answer yes or no.", "Yes"),
+    "b.png": ("Is there a blue square in the image? Please answer yes or no.", "No"),
+    "c.jpg": ("Is the image mostly green? Please answer yes or no.", "Yes"),
+}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), str(tmp_path / "jobs"))
+
+
+def event_types(queue, job_id, after=0):
+    return [event["type"] for event in queue.events(job_id, after=after)]
+
+
+# ---------------------------------------------------------------- queue
+
+
+def test_submit_claim_record_finish(queue):
+    job = queue.submit("llava_next", "mme", categories=["color"], options={"top_k": 3})
+    assert job["status"] == QUEUED
+    assert job["categories"] == ["color"] and job["options"] == {"top_k": 3}
+    assert job["output_dir"] == osp.join(queue.output_dir, job["id"])
+
+    claimed = queue.claim("worker-1")
+    assert claimed["id"] == job["id"]
+    assert (claimed["status"], claimed["worker"]) == (RUNNING, "worker-1")
+    assert claimed["started_at"] is not None
+    assert queue.claim("worker-2") is None
+
+    queue.start(job["id"], total=3)
+    queue.record_sample(job["id"], {"sample_id": "color_a.jpg"}, generated_tokens=5)
+    queue.record_sample(job["id"], {"sample_id": "color_b.png"}, error="OSError: broken image")
+    queue.record_sample(job["id"], {"sample_id": "color_c.jpg"}, generated_tokens=7)
+    queue.finish(job["id"], COMPLETED)
+
+    job = queue.get(job["id"])
+    assert (job["status"], job["total"], job["completed"], job["failed"], job["generated_tokens"]) == (COMPLETED, 3, 2, 1, 12)
+    assert job["finished_at"] is not None
+    events = queue.events(job["id"])
+    assert [event["type"] for event in events] == ["status", "status", "status", "sample", "sample_error", "sample", "status"]
+    assert [event["id"] for event in events] == sorted(event["id"] for event in events)
+    assert events[4]["data"] == {"sample_id": "color_b.png", "completed": 1, "failed": 1, "total": 3,
+                                 "error": "OSError: broken image"}
+    assert events[-1]["data"]["status"] == COMPLETED
+    # Resuming the event stream after an id
+    assert event_types(queue, job["id"], after=events[3]["id"]) == ["sample_error", "sample", "status"]
+    assert queue.events(job["id"], limit=2) == events[:2]
+
+
+def test_claim_is_fifo_and_list_filters(queue):
+    first = queue.submit("m", "mme")
+    second = queue.submit("m", "mme")
+    assert queue.claim("w")["id"] == first["id"]
+    assert [job["id"] for job in queue.list(status=QUEUED)] == [second["id"]]
+    assert {job["id"] for job in queue.list()} == {first["id"], second["id"]}
+    assert queue.get("missing") is None
+
+
+def test_cancel(queue):
+    queued = queue.submit("m", "mme")
+    running = queue.submit("m", "mme")
+    assert queue.cancel("missing") is None
+
+    assert queue.claim("w")["id"] == queued["id"]
+    queue.release(queued["id"])
+    # The released job keeps its place before the other queued job
+    assert queue.claim("w")["id"] == queued["id"]
+
+    cancelled = queue.cancel(running["id"])
+    assert cancelled["status"] == CANCELLED and cancelled["finished_at"] is not None
+    assert event_types(queue, running["id"])[-1] == "status"
+
+    job = queue.cancel(queued["id"])
+    assert job["status"] == RUNNING and job["cancel_requested"]
+    assert queue.cancel_requested(queued["id"])
+    assert not queue.cancel_requested(running["id"])
+    queue.finish(queued["id"], CANCELLED)
+    assert queue.get(queued["id"])["status"] == CANCELLED
+
+
+def test_release_only_running_jobs(queue):
+    job = queue.submit("m", "mme")
+    before = len(queue.events(job["id"]))
+    assert queue.release(job["id"]) is False
+    assert len(queue.events(job["id"])) == before
+
+    queue.claim("w")
+    assert queue.release(job["id"]) is True
+    job = queue.get(job["id"])
+    assert (job["status"], job["worker"]) == (QUEUED, None)
+    assert queue.events(job["id"])[-1]["data"]["status"] == QUEUED
+    assert queue.release(job["id"]) is False
+    assert queue.events(job["id"])[-1]["data"]["status"] == QUEUED
+
+
+def test_requeue_stale_and_resume(queue):
+    job = queue.submit("m", "mme")
+    started_at = queue.claim("dead-worker")["started_at"]
+    queue.start(job["id"], total=4)
+    queue.record_sample(job["id"], {"sample_id": "1"}, generated_tokens=3)
+    queue.record_sample(job["id"], {"sample_id": "2"}, error="boom")
+
+    assert queue.requeue_stale(stale_after=60) == 0
+    queue.heartbeat(job["id"])
+    with sqlite3.connect(queue.db_path) as conn:
+        conn.execute("UPDATE jobs SET updated_at = updated_at - 120 WHERE id = ?", (job["id"],))
+    assert queue.requeue_stale(stale_after=60) == 1
+    assert queue.get(job["id"])["status"] == QUEUED
+
+    # Another worker resumes: started_at is kept, counts restart from the finished samples
+    resumed = queue.claim("worker-2")
+    assert (resumed["worker"], resumed["started_at"]) == ("worker-2", started_at)
+    queue.start(job["id"], total=4, completed=1)
+    job = queue.get(job["id"])
+    assert (job["completed"], job["failed"], job["total"]) == (1, 0, 4)
+
+
+def test_finish_failed_records_error(queue):
+    job = queue.submit("m", "mme")
+    queue.claim("w")
+    queue.finish(job["id"], FAILED, error="ValueError: Dataset 'x' not found")
+    job = queue.get(job["id"])
+    assert (job["status"], job["error"]) == (FAILED, "ValueError: Dataset 'x' not found")
+    assert queue.events(job["id"])[-1]["data"]["error"] == job["error"]
+
+
+# ---------------------------------------------------------------- worker
+
+
+def make_mme(root):
+    """Tiny MME layout: <category>/images and <category>/questions_answers_YN/<category>.txt"""
+    images_dir = root / "color" / "images"
+    qa_dir = root / "color" / "questions_answers_YN"
+    images_dir.mkdir(parents=True)
+    qa_dir.mkdir()
+    rng = np.random.default_rng(0)
+    for (name, _), size in zip(QUESTIONS.items(), [(40, 30), (30, 60), (50, 50)]):
+        Image.fromarray(rng.integers(0, 255, size=size + (3,), dtype=np.uint8)).save(images_dir / name)
+    (qa_dir / "color.txt").write_text("".join(f"{name}\t{question}\t{answer}\n" for name, (question, answer) in QUESTIONS.items()))
+    return root
+
+
+def make_config(tmp_path, model_name):
+    data = {
+        "datasets": {"mme": {"name": "MME", "path": str(make_mme(tmp_path / "mme")), "type": "mme", "description": ""}},
+        "models": {"tiny": {"name": "Tiny", "type": "local", "description": "", "model_name": model_name}},
+        "jobs": {"db_path": str(tmp_path / "jobs.sqlite3"), "output_dir": str(tmp_path / "jobs"), "device": "cpu"},
+    }
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump(data))
+    return Config(str(config_path))
+
+
+class RecordingQueue(JobQueue):
+    """Snapshots the CSV files of the job every time a sample is recorded"""
+
+    def __init__(self, *args, on_sample=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_sample = on_sample
+        self.snapshots = []
+
+    def record_sample(self, job_id, sample, generated_tokens=0, error=None):
+        output_dir = self.get(job_id)["output_dir"]
+        self.snapshots.append({
+            name: len(pd.read_csv(osp.join(output_dir, name))) if osp.exists(osp.join(output_dir, name)) else 0
+            for name in ("results.csv", "step_details.csv")
+        })
+        super().record_sample(job_id, sample, generated_tokens, error)
+        if self.on_sample is not None:
+            self.on_sample(self, job_id)
+
+
+@pytest.fixture
+def fake_infer(monkeypatch):
+    """Stand-in for deephallu.inference.infer (which needs torch): three steps per sample"""
+    module = types.ModuleType("deephallu.inference.infer")
+    module.loaded = []
+
+    def load_model(model, model_name, device):
+        module.loaded.append((model, model_name, device))
+        return "processor", "model"
+
+    def infer_sample(model, processor, image, question, top_k=5, max_new_tokens=1000, do_sample=False,
+                     temperature=1.0, save_attentions=False):
+        if "blue" in question:
+            raise RuntimeError("generation failed")
+        steps = [{"step": i, "entropy": 0.5, "top_k_tokens": ["yes"] * top_k, "top_k_probs": [0.9] * top_k,
+                  "top_k_token_ids": [1] * top_k} for i in range(3)]
+        return {"generated_text": "Yes", "num_generated_tokens": 3, "avg_entropy": 0.5, "steps": steps, "attention": None}
+
+    def flatten_steps(sample_id, category, steps, top_k):
+        return [{"sample_id": sample_id, "category": category, "step": step["step"], "entropy": step["entropy"]}
+                for step in steps]
+
+    module.load_model, module.infer_sample, module.flatten_steps = load_model, infer_sample, flatten_steps
+    module.save_attention = lambda output_dir, sample_id, attention: None
+    monkeypatch.setitem(sys.modules, "deephallu.inference.infer", module)
+    return module
+
+
+def test_worker_appends_results_per_sample(tmp_path, fake_infer):
+    config = make_config(tmp_path, "tiny-model")
+    queue = RecordingQueue(config.jobs.db_path, config.jobs.output_dir)
+    job = queue.submit("tiny", "mme", categories=["color"], options={"top_k": 2})
+    worker = InferenceWorker(queue, config, device="cpu", heartbeat_interval=0.05)
+    assert worker.run_once() is True
+    assert worker.run_once() is False
+
+    job = queue.get(job["id"])
+    assert (job["status"], job["total"], job["completed"], job["failed"], job["generated_tokens"]) == (COMPLETED, 3, 2, 1, 6)
+    assert fake_infer.loaded == [("llava-next", "tiny-model", "cpu")]
+    # Rows are on disk before each sample is reported; failed samples write nothing
+    assert queue.snapshots == [
+        {"results.csv": 1, "step_details.csv": 3},
+        {"results.csv": 1, "step_details.csv": 3},
+        {"results.csv": 2, "step_details.csv": 6},
+    ]
+    results = pd.read_csv(osp.join(job["output_dir"], "results.csv"))
+    assert results["sample_id"].tolist() == ["color_a.jpg", "color_c.jpg"]
+    assert results["answer"].tolist() == ["Yes", "Yes"]
+
+
+def test_worker_cancel_and_resume(tmp_path, fake_infer):
+    config = make_config(tmp_path, "tiny-model")
+    worker = None
+
+    def stop_after_first(queue, job_id):
+        if len(queue.snapshots) == 1:
+            worker.stop()
+
+    queue = RecordingQueue(config.jobs.db_path, config.jobs.output_dir, on_sample=stop_after_first)
+    job = queue.submit("tiny", "mme")
+    worker = InferenceWorker(queue, config, device="cpu", heartbeat_interval=0.05)
+    worker.run_once()
+    # Worker shutdown puts the job back in the queue with the finished sample kept
+    job = queue.get(job["id"])
+    assert (job["status"], job["completed"]) == (QUEUED, 1)
+    # A half-written sample (steps without a result row) is dropped when the job resumes
+    step_details_path = osp.join(job["output_dir"], "step_details.csv")
+    pd.DataFrame([{"sample_id": "color_c.jpg", "category": "color", "step": 0, "entropy": 0.1}]).to_csv(
+        step_details_path, mode="a", header=False, index=False)
+
+    queue.on_sample = None
+    worker = InferenceWorker(queue, config, device="cpu", heartbeat_interval=0.05)
+    assert worker.run_once() is True
+    job = queue.get(job["id"])
+    assert (job["status"], job["completed"], job["failed"]) == (COMPLETED, 2, 1)
+    assert pd.read_csv(osp.join(job["output_dir"], "results.csv"))["sample_id"].tolist() == ["color_a.jpg", "color_c.jpg"]
+    steps = pd.read_csv(step_details_path)
+    assert steps.groupby("sample_id").size().to_dict() == {"color_a.jpg": 3, "color_c.jpg": 3}
+
+    cancelled = queue.submit("tiny", "mme")
+
+    def cancel_after_first(queue, job_id):
+        queue.cancel(job_id)
+
+    queue.on_sample = cancel_after_first
+    worker.run_once()
+    cancelled = queue.get(cancelled["id"])
+    assert (cancelled["status"], cancelled["completed"]) == (CANCELLED, 1)
+
+
+def test_worker_fails_unknown_dataset(tmp_path, fake_infer):
+    config = make_config(tmp_path, "tiny-model")
+    queue = JobQueue(config.jobs.db_path, config.jobs.output_dir)
+    job = queue.submit("tiny", "missing")
+    InferenceWorker(queue, config, device="cpu").run_once()
+    job = queue.get(job["id"])
+    assert job["status"] == FAILED and "Dataset 'missing' not found" in job["error"]
+
+
+def test_run_forever_requeues_stale_jobs(tmp_path, fake_infer):
+    config = make_config(tmp_path, "tiny-model")
+    queue = JobQueue(config.jobs.db_path, config.jobs.output_dir)
+    # Claimed by a worker that died a minute ago, before the polling worker starts
+    job = queue.submit("tiny", "mme")
+    assert queue.claim("dead-worker")["id"] == job["id"]
+    with sqlite3.connect(queue.db_path) as conn:
+        conn.execute("UPDATE jobs SET updated_at = updated_at - 60 WHERE id = ?", (job["id"],))
+    worker = InferenceWorker(queue, config, device="cpu", poll_interval=0.01, heartbeat_interval=0.05)
+    thread = threading.Thread(target=worker.run_forever, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 10
+        while queue.get(job["id"])["status"] != COMPLETED and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        worker.stop()
+        thread.join(10)
+    job = queue.get(job["id"])
+    assert job["status"] == COMPLETED and job["worker"] == worker.name
+    statuses = [event["data"]["status"] for event in queue.events(job["id"]) if event["type"] == "status"]
+    assert statuses[:3] == [QUEUED, RUNNING, QUEUED]
+
+
+# ---------------------------------------------------------------- tiny LLaVA-NeXT
+
+CHAT_TEMPLATE = (
+    "{% for message in messages %}{{ message['role'].upper() }}: "
+    "{% for item in message['content'] %}{% if item['type'] == 'image' %}<image>\n"
+    "{% elif item['type'] == 'text' %}{{ item['text'] }}{% endif %}{% endfor %}\n{% endfor %}"
+    "{% if add_generation_prompt %}ASSISTANT:{% endif %}"
+)
+
+
+def save_tiny_llava_next(path):
+    """Random-init LLaVA-NeXT with a word-level tokenizer, small enough to generate on the CPU"""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    tokenizers = pytest.importorskip("tokenizers")
+
+    specials = ["<unk>", "<s>", "</s>", "<pad>", "<image>"]
+    words = ["USER", "ASSISTANT", ":", "Yes", "No", ","] + sorted({
+        token for question, _ in QUESTIONS.values() for token in re.findall(r"\w+|[^\w\s]+", question)})
+    vocab = {token: idx for idx, token in enumerate(specials + words)}
+    backend = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=backend, unk_token="<unk>", bos_token="<s>", eos_token="</s>", pad_token="<pad>",
+        additional_special_tokens=["<image>"])
+
+    pinpoints = [[28, 56], [56, 28], [56, 56]]
+    image_processor = transformers.LlavaNextImageProcessor(
+        size={"shortest_edge": 28}, crop_size={"height": 28, "width": 28}, image_grid_pinpoints=pinpoints)
+    processor_kwargs = {"patch_size": 14, "vision_feature_select_strategy": "default", "chat_template": CHAT_TEMPLATE}
+    if "num_additional_image_tokens" in inspect.signature(transformers.LlavaNextProcessor.__init__).parameters:
+        # CLIP prepends a CLS token, which the "default" strategy drops again
+        processor_kwargs["num_additional_image_tokens"] = 1
+    processor = transformers.LlavaNextProcessor(image_processor=image_processor, tokenizer=tokenizer, **processor_kwargs)
+
+    torch.manual_seed(0)
+    model_config = transformers.LlavaNextConfig(
+        vision_config=transformers.CLIPVisionConfig(
+            hidden_size=16, intermediate_size=32, num_hidden_layers=2, num_attention_heads=2,
+            image_size=28, patch_size=14, projection_dim=16),
+        text_config=transformers.LlamaConfig(
+            vocab_size=len(vocab), hidden_size=16, intermediate_size=32, num_hidden_layers=1, num_attention_heads=2,
+            num_key_value_heads=2, max_position_embeddings=256, bos_token_id=1, eos_token_id=2, pad_token_id=3),
+        image_token_index=vocab["<image>"], image_grid_pinpoints=pinpoints,
+        vision_feature_select_strategy="default", vision_feature_layer=-1,
+    )
+    model = transformers.LlavaNextForConditionalGeneration(model_config)
+    model.generation_config.eos_token_id = 2
+    model.generation_config.pad_token_id = 3
+    model.save_pretrained(path)
+    processor.save_pretrained(path)
+
+
+def test_worker_with_tiny_llava_next(tmp_path):
+    model_dir = tmp_path / "tiny-llava-next"
+    save_tiny_llava_next(str(model_dir))
+    config = make_config(tmp_path, str(model_dir))
+    queue = RecordingQueue(config.jobs.db_path, config.jobs.output_dir)
+    top_k = 3
+    job = queue.submit("tiny", "mme", categories=["color"], options={"top_k": top_k, "max_new_tokens": 4})
+    worker = InferenceWorker(queue, config, device="cpu", heartbeat_interval=0.5)
+    assert worker.run_once() is True
+
+    job = queue.get(job["id"])
+    assert (job["status"], job["total"], job["completed"], job["failed"]) == (COMPLETED, 3, 3, 0), job["error"]
+    results = pd.read_csv(osp.join(job["output_dir"], "results.csv"), keep_default_na=False)
+    steps = pd.read_csv(osp.join(job["output_dir"], "step_details.csv"), keep_default_na=False)
+    assert results["sample_id"].tolist() == [f"color_{name}" for name in QUESTIONS]
+    num_steps = steps.groupby("sample_id").size()
+    assert ((num_steps >= 1) & (num_steps <= 4)).all()
+    # Each sample was appended to both files before it was reported
+    assert [snapshot["results.csv"] for snapshot in queue.snapshots] == [1, 2, 3]
+    assert [snapshot["step_details.csv"] for snapshot in queue.snapshots] == num_steps.loc[results["sample_id"]].cumsum().tolist()
+    assert {f"top{k}_token_id" for k in range(1, top_k + 1)} <= set(steps.columns)
+    assert np.isfinite(results["avg_entropy"]).all()
+    assert job["generated_tokens"] == int(num_steps.sum())
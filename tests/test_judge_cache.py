@@ -0,0 +1,114 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from deephallu.analytics.judge_cache import JudgeCache, make_cache_key
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def sample(i):
+    return {"question": f"Is there a cat {i}?", "answer": "yes", "generated_text": f"Yes, there is a cat {i}."}
+
+
+def run_cli(db, *args):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    return subprocess.run(
+        [sys.executable, "-m", "deephallu.analytics.judge_cache", "--db", str(db), *args],
+        capture_output=True, text=True, env=env, timeout=60,
+    )
+
+
+def test_key_ignores_case_and_whitespace():
+    a = make_cache_key("Is there a  cat?", "Yes", " yes\n", "m", "v1")
+    b = make_cache_key("is there a cat?", "yes", "YES", "m", "v1")
+    assert a == b
+    assert a != make_cache_key("is there a cat?", "yes", "YES", "m", "v2")
+    assert a != make_cache_key("is there a cat?", "yes", "YES", "other", "v1")
+
+
+def test_get_put_and_counters(tmp_path):
+    with JudgeCache(str(tmp_path / "cache.sqlite"), model="m", template_version="v1") as cache:
+        samples = [sample(i) for i in range(4)]
+        assert cache.get_many(samples) == [None] * 4
+        # failed requests (None) are not cached
+        cache.put_many(samples, ["1", None, "0", "1"])
+        assert cache.get_many(samples + [samples[0]]) == ["1", None, "0", "1", "1"]
+        cache.put("Is there a cat 1?", "YES", "yes,  there is a cat 1.", "0")
+        assert cache.get(**samples[1]) == "0"
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (5, 5)
+        assert stats["hit_rate"] == pytest.approx(0.5)
+        assert stats["entries"] == {"m@v1": 4}
+
+
+def test_persistent_and_shared_between_connections(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    with JudgeCache(db, model="m", template_version="v1") as writer, JudgeCache(db, model="m", template_version="v1") as reader:
+        writer.put(**sample(0), response="1")
+        assert reader.get(**sample(0)) == "1"
+    with JudgeCache(db, model="m", template_version="v1") as cache:
+        assert cache.get(**sample(0)) == "1"
+    # a new prompt template or judge model does not see the old verdicts
+    with JudgeCache(db, model="m", template_version="v2") as cache:
+        assert cache.get(**sample(0)) is None
+    with JudgeCache(db, model="other", template_version="v1") as cache:
+        assert cache.get(**sample(0)) is None
+
+
+def test_counters_are_exact_under_concurrency(tmp_path):
+    with JudgeCache(str(tmp_path / "cache.sqlite"), model="m", template_version="v1") as cache:
+        samples = [sample(i) for i in range(10)]
+        cache.put_many(samples[:5], ["1"] * 5)
+        start = threading.Barrier(8)
+
+        def worker():
+            start.wait()
+            for _ in range(50):
+                cache.get_many(samples)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert (cache.hits, cache.misses) == (8 * 50 * 5, 8 * 50 * 5)
+
+
+def test_invalidate(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    for model, version in [("a", "v1"), ("a", "v2"), ("b", "v1")]:
+        with JudgeCache(db, model=model, template_version=version) as cache:
+            cache.put_many([sample(i) for i in range(3)], ["1"] * 3)
+    with JudgeCache(db) as cache:
+        assert cache.invalidate(model="a", template_version="v1") == 3
+        assert cache.stats()["entries"] == {"a@v2": 3, "b@v1": 3}
+        assert cache.invalidate(template_version="v1") == 3
+        assert cache.invalidate(model="a") == 3
+        assert cache.stats()["entries"] == {}
+
+
+def test_cli_stats_and_invalidate(tmp_path):
+    db = tmp_path / "cache.sqlite"
+    for model in ["a", "b"]:
+        with JudgeCache(str(db), model=model, template_version="v1") as cache:
+            cache.put_many([sample(i) for i in range(2 if model == "a" else 3)], ["1"] * 3)
+
+    result = run_cli(db, "--stats")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines() == ["a@v1: 2", "b@v1: 3"]
+
+    result = run_cli(db, "--invalidate")
+    assert result.returncode != 0
+    assert "--all" in result.stderr
+
+    result = run_cli(db, "--invalidate", "--model", "a", "--stats")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines() == ["Deleted 2 cached verdicts", "b@v1: 3"]
+
+    result = run_cli(db, "--invalidate", "--all")
+    assert result.stdout.splitlines() == ["Deleted 3 cached verdicts"]
+    assert run_cli(db, "--stats").stdout == ""
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from deephallu.analytics.judge import AsyncJudgeClient, judge_samples
+
+
+class StubJudgeServer:
+    """Ollama-compatible /api/chat stub on localhost; ``script`` decides each response"""
+
+    def __init__(self, script):
+        self.script = script
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.requests.append((self.path, body))
+                    call = len(stub.requests)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    status, content = stub.script(stub, call, self.path)
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+                payload = json.dumps({"message": {"role": "assistant", "content": content}}).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except OSError:
+                    # The client timed out and closed the connection
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path="/api/chat"):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+CORRECT = "<judgment>Correct</judgment>"
+
+
+def judge_one(client):
+    return asyncio.run(client.judge("Is there a dog?", "Yes", "Yes, there is a dog."))
+
+
+@pytest.fixture(autouse=True)
+def no_proxy(monkeypatch):
+    for name in ("HTTP_PROXY", "http_proxy", "HTTPS_PROXY", "https_proxy", "ALL_PROXY", "all_proxy"):
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_retries_server_error_then_succeeds():
+    def script(stub, call, path):
+        return (500, "") if call == 1 else (200, CORRECT)
+
+    with StubJudgeServer(script) as stub:
+        with AsyncJudgeClient(url=stub.url(), max_retries=3, backoff_base=0.05) as client:
+            started = time.perf_counter()
+            assert judge_one(client) == CORRECT
+            elapsed = time.perf_counter() - started
+    assert len(stub.requests) == 2
+    # Backoff of the first retry is drawn from [backoff_base / 2, backoff_base]
+    assert elapsed >= 0.025
+
+
+def test_gives_up_after_max_retries():
+    with StubJudgeServer(lambda stub, call, path: (503, "")) as stub:
+        with AsyncJudgeClient(url=stub.url(), max_retries=2, backoff_base=0.01) as client:
+            assert judge_one(client) is None
+    assert len(stub.requests) == 3
+
+
+def test_client_errors_are_not_retried():
+    with StubJudgeServer(lambda stub, call, path: (400, "")) as stub:
+        with AsyncJudgeClient(url=stub.url(), max_retries=3, backoff_base=0.01) as client:
+            assert judge_one(client) is None
+    assert len(stub.requests) == 1
+
+
+def test_hanging_server_times_out():
+    def script(stub, call, path):
+        if call == 1:
+            stub.release.wait(10)
+        return 200, CORRECT
+
+    with StubJudgeServer(script) as stub:
+        with AsyncJudgeClient(url=stub.url(), timeout=0.3, max_retries=1, backoff_base=0.01) as client:
+            started = time.perf_counter()
+            assert judge_one(client) == CORRECT
+            assert time.perf_counter() - started < 5
+    assert len(stub.requests) == 2
+
+
+def test_hanging_server_exhausts_retries():
+    def script(stub, call, path):
+        stub.release.wait(10)
+        return 200, CORRECT
+
+    with StubJudgeServer(script) as stub:
+        with AsyncJudgeClient(url=stub.url(), timeout=0.2, max_retries=1, backoff_base=0.01) as client:
+            started = time.perf_counter()
+            assert judge_one(client) is None
+            assert time.perf_counter() - started < 5
+
+
+def test_max_in_flight_requests():
+    def script(stub, call, path):
+        time.sleep(0.05)
+        return 200, f"response {call}"
+
+    samples = [{"question": f"q{i}", "answer": "Yes", "generated_text": "Yes"} for i in range(24)]
+    with StubJudgeServer(script) as stub:
+        with AsyncJudgeClient(url=stub.url(), max_concurrency=3) as client:
+            responses = asyncio.run(client.judge_many(samples, report_every=100))
+    assert len(stub.requests) == len(samples)
+    assert all(response is not None for response in responses)
+    assert 1 < stub.max_in_flight <= 3
+    # Responses are returned in sample order, whatever order they completed in
+    questions = [body["messages"][0]["content"] for _, body in stub.requests]
+    for sample, response in zip(samples, responses):
+        call = int(response.split()[-1])
+        assert f"Question: {sample['question']}\n" in questions[call - 1]
+
+
+def test_configurable_url_and_model():
+    def script(stub, call, path):
+        return (200, CORRECT) if path == "/v1/judge/chat" else (404, "")
+
+    samples = [{"question": "q", "answer": "No", "generated_text": "No"}] * 2
+    with StubJudgeServer(script) as stub:
+        results = []
+        responses = judge_samples(samples, on_result=lambda index, response: results.append(index),
+                                  url=stub.url("/v1/judge/chat"), model="stub-judge", max_concurrency=2)
+    assert responses == [CORRECT, CORRECT]
+    assert sorted(results) == [0, 1]
+    assert [path for path, _ in stub.requests] == ["/v1/judge/chat"] * 2
+    assert all(body["model"] == "stub-judge" and body["stream"] is False for _, body in stub.requests)
@@ -0,0 +1,64 @@
+import threading
+
+from deephallu.utils.lru import LRUCache
+
+
+def test_max_entries_evicts_least_recently_used():
+    evicted = []
+    cache = LRUCache(max_entries=2, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    assert cache.put("c", 3) == [("b", 2)]
+    assert evicted == [("b", 2)]
+    assert cache.keys() == ["a", "c"]
+    assert "b" not in cache and cache.get("b", "missing") == "missing"
+    # peek does not change the order
+    assert cache.peek("a") == 1
+    cache.put("d", 4)
+    assert cache.keys() == ["c", "d"]
+
+
+def test_max_weight():
+    cache = LRUCache(max_weight=10, weigh=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    cache.put("a", "xx")
+    assert cache.weight == 6
+    cache.put("c", "xxxxxx")
+    assert cache.keys() == ["a", "c"] and cache.weight == 8
+    # A value heavier than the limit replaces everything but is kept
+    cache.put("d", "x" * 20)
+    assert cache.keys() == ["d"] and cache.weight == 20
+    assert cache.pop("d") == "x" * 20 and cache.weight == 0
+
+
+def test_pop_and_popitem_do_not_call_on_evict():
+    evicted = []
+    cache = LRUCache(on_evict=lambda key, value: evicted.append(key))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.popitem() == ("a", 1)
+    assert cache.pop("b") == 2 and cache.pop("b") is None
+    assert evicted == [] and len(cache) == 0
+
+
+def test_get_or_create():
+    calls = []
+    cache = LRUCache(max_entries=8)
+
+    def create(key):
+        calls.append(key)
+        return key * 2
+
+    threads = [threading.Thread(target=lambda i=i: cache.get_or_create(i % 4, lambda: create(i % 4))) for i in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(cache.keys()) == [0, 1, 2, 3]
+    assert all(cache.get(key) == key * 2 for key in range(4))
+    calls.clear()
+    assert cache.get_or_create(1, lambda: create(1)) == 2 and calls == []
+    cache.clear()
+    assert len(cache) == 0 and cache.weight == 0
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from deephallu.analytics import metrics as metrics_module
+from deephallu.analytics.metrics import OVERALL, compute_metrics, entropy_box_stats, load_metrics
+
+LABELS = {"correct": "correct", "hallucinated": "hallucinated"}
+
+
+def make_results(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    answer = rng.integers(0, 2, n)
+    generated = np.where(rng.random(n) < 0.8, answer, 1 - answer)
+    # heavy tail so that every group has points beyond the whiskers
+    entropy = rng.lognormal(0.0, 0.8, n)
+    entropy[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame({
+        "category": rng.choice(["color", "count", "OCR"], n),
+        "answer_code": answer,
+        "generated_text_code": generated,
+        "judgment": (generated == answer).astype(int),
+        "avg_entropy": entropy,
+    })
+
+
+def reference_stats(results, category):
+    """What plt.boxplot would compute from the raw entropies"""
+    cbook = pytest.importorskip("matplotlib.cbook")
+    sub = results if category == OVERALL else results[results["category"] == category]
+    data = [sub.loc[sub["judgment"] == judgment, "avg_entropy"].dropna().to_numpy() for judgment in (1, 0)]
+    return cbook.boxplot_stats(data)
+
+
+def assert_box_stats_match(row, results, category):
+    stats = entropy_box_stats(row, LABELS)
+    for ours, ref in zip(stats, reference_stats(results, category)):
+        for key in ("med", "q1", "q3", "whislo", "whishi", "mean"):
+            assert ours[key] == pytest.approx(ref[key])
+        np.testing.assert_allclose(sorted(ours["fliers"]), np.sort(ref["fliers"]))
+
+
+def test_entropy_box_stats_match_matplotlib():
+    results = make_results()
+    table = compute_metrics(results)
+    for _, row in table.iterrows():
+        assert_box_stats_match(row, results, row["category"])
+    overall = table[table["category"] == OVERALL].iloc[0]
+    assert all(len(box["fliers"]) > 0 for box in entropy_box_stats(overall, LABELS))
+
+
+def test_fliers_survive_csv_cache(tmp_path):
+    results = make_results(seed=1)
+    path = tmp_path / "run" / "results.csv"
+    path.parent.mkdir()
+    results.to_csv(path, index=False)
+    first = load_metrics([str(path)], cache_dir=str(tmp_path / "cache"))
+    cached = load_metrics([str(path)], cache_dir=str(tmp_path / "cache"))
+    for (_, a), (_, b) in zip(first.iterrows(), cached.iterrows()):
+        for x, y in zip(entropy_box_stats(a, LABELS), entropy_box_stats(b, LABELS)):
+            assert x["fliers"] == y["fliers"]
+    for _, row in cached.iterrows():
+        assert_box_stats_match(row, results, row["category"])
+
+
+def test_fliers_are_capped(monkeypatch):
+    monkeypatch.setattr(metrics_module, "MAX_FLIERS", 5)
+    results = make_results(n=2000, seed=2)
+    table = compute_metrics(results)
+    overall = table[table["category"] == OVERALL].iloc[0]
+    ref = reference_stats(results, OVERALL)
+    for box, full in zip(entropy_box_stats(overall, LABELS), ref):
+        assert len(full["fliers"]) > 5
+        assert len(box["fliers"]) == 5
+        # the extremes are always kept
+        assert box["fliers"][0] == pytest.approx(np.min(full["fliers"]))
+        assert box["fliers"][-1] == pytest.approx(np.max(full["fliers"]))
+
+
+def test_group_without_outliers_has_no_fliers():
+    results = pd.DataFrame({
+        "category": ["a"] * 6,
+        "answer_code": [1] * 6,
+        "generated_text_code": [1, 1, 1, 0, 0, 0],
+        "judgment": [1, 1, 1, 0, 0, 0],
+        "avg_entropy": [0.1, 0.2, 0.3, 0.4, 0.5, 0.6],
+    })
+    row = compute_metrics(results).iloc[0]
+    assert [box["fliers"] for box in entropy_box_stats(row, LABELS)] == [[], []]
@@ -0,0 +1,110 @@
+import json
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from deephallu.analytics.mme_score import _bootstrap_scores, attach_image_names, image_table, mme_scores, score_table
+
+
+def mme_rows(category, outcomes, start=0):
+    """Two questions per image (yes first, then no); outcomes are (first correct, second correct) per image"""
+    rows = []
+    for image, (first, second) in enumerate(outcomes):
+        for question, (answer, correct) in enumerate([(1, first), (0, second)]):
+            rows.append({
+                "sample_id": start + 2 * image + question, "category": category, "image_name": f"{category}_{image}.jpg",
+                "answer": "Yes" if answer else "No", "answer_code": answer,
+                "generated_text_code": answer if correct else 1 - answer,
+            })
+    return rows
+
+
+@pytest.fixture
+def results():
+    # existence: acc 3/6, acc+ 1/3; count: everything correct; code_reasoning: acc 2/4, acc+ 0
+    rows = mme_rows("existence", [(True, True), (True, False), (False, False)])
+    rows += mme_rows("count", [(True, True), (True, True)], start=100)
+    rows += mme_rows("code_reasoning", [(True, False), (False, True)], start=200)
+    return pd.DataFrame(rows)
+
+
+def test_acc_and_acc_plus(results):
+    scores = mme_scores(results, n_bootstrap=0).set_index("category")
+    assert scores.loc["existence", ["n_images", "n_questions"]].tolist() == [3, 6]
+    assert scores.loc["existence", "acc"] == pytest.approx(50.0)
+    assert scores.loc["existence", "acc_plus"] == pytest.approx(100 / 3)
+    assert scores.loc["existence", "score"] == pytest.approx(50 + 100 / 3)
+    assert scores.loc["count", "score"] == 200.0
+    assert (scores.loc["code_reasoning", "acc"], scores.loc["code_reasoning", "acc_plus"]) == (50.0, 0.0)
+    assert scores.loc["perception", "score"] == pytest.approx(250 + 100 / 3)
+    assert scores.loc["cognition", "score"] == 50.0
+    assert scores.loc["total", "score"] == pytest.approx(300 + 100 / 3)
+    assert scores.loc["total", "n_images"] == 7
+    assert scores["score_low"].isna().all()
+
+
+def test_bootstrap_matches_loop(results):
+    results = results.assign(run="a")
+    images = image_table(results)
+    group_keys = ["run", "category"]
+    n_bootstrap, seed = 50, 3
+    samples = _bootstrap_scores(images, group_keys, n_bootstrap, seed)
+
+    # Same uniform draws, resampled group by group in a loop
+    images = images.sort_values(group_keys, kind="stable").reset_index(drop=True)
+    uniform = np.random.default_rng(seed).random((n_bootstrap, len(images)))
+    expected = []
+    for _, group in images.groupby(group_keys, sort=False):
+        rows = []
+        for b in range(n_bootstrap):
+            picked = group.iloc[(uniform[b, group.index] * len(group)).astype(int)]
+            rows.append((picked["n_correct"].sum() / picked["n_questions"].sum() + picked["all_correct"].mean()) * 100)
+        expected.append(rows)
+    np.testing.assert_allclose(samples, np.array(expected))
+
+
+def test_bootstrap_intervals(results):
+    scores = mme_scores(results, n_bootstrap=200, seed=0).set_index("category")
+    # All images of count are fully correct, so every resample scores 200
+    assert scores.loc["count", ["score_low", "score_high"]].tolist() == [200.0, 200.0]
+    assert (scores["score_low"] <= scores["score"] + 1e-9).all() and (scores["score"] <= scores["score_high"] + 1e-9).all()
+    again = mme_scores(results, n_bootstrap=200, seed=0).set_index("category")
+    pd.testing.assert_frame_equal(scores, again)
+
+
+def test_multiple_runs(results):
+    both = pd.concat([results.assign(run="a"), results.assign(run="b", generated_text_code=results["answer_code"])])
+    table = score_table(mme_scores(both, n_bootstrap=0))
+    assert table.loc["a", "existence"] == pytest.approx(50 + 100 / 3)
+    assert table.loc["b", "total"] == 600.0
+
+
+def test_pairing_from_preprocessed_json(results, tmp_path):
+    path = tmp_path / "preprocessed.json"
+    path.write_text(json.dumps([{"id": int(row.sample_id), "image_name": row.image_name} for row in results.itertuples()]))
+    shuffled = results.drop(columns="image_name").sample(frac=1.0, random_state=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        scores = mme_scores(shuffled, n_bootstrap=0, preprocessed_path=str(path)).set_index("category")
+    assert scores.loc["existence", "acc_plus"] == pytest.approx(100 / 3)
+
+
+def test_fallback_pairing_warns(results):
+    without_names = results.drop(columns="image_name").sample(frac=1.0, random_state=1)
+    with pytest.warns(UserWarning, match="pairing questions by sample_id order") as record:
+        scores = mme_scores(without_names, n_bootstrap=0, preprocessed_path=None).set_index("category")
+    assert "likely wrong" not in str(record[0].message)
+    # Image-major sample ids pair correctly
+    assert scores.loc["existence", "acc_plus"] == pytest.approx(100 / 3)
+    with pytest.warns(UserWarning, match=r"preprocessed.json \(not found\)"):
+        assert attach_image_names(without_names, None)["image_name"].str.startswith("pair_").all()
+
+
+def test_fallback_pairing_detects_wrong_order(results):
+    # Question-major ids: all yes questions of a category first, so the pairs mix images
+    reordered = results.drop(columns="image_name").sort_values(["category", "answer_code"], ascending=[True, False])
+    reordered["sample_id"] = np.arange(len(reordered))
+    with pytest.warns(UserWarning, match="pairs do not have one yes and one no answer"):
+        mme_scores(reordered, n_bootstrap=0, preprocessed_path=None)
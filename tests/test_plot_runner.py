@@ -0,0 +1,97 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from deephallu.analytics import plot_runner
+from deephallu.analytics.metrics import compute_metrics
+
+FIGURES = ["entropy", "confusion_matrix"]
+
+
+def make_metrics(seed=0):
+    rng = np.random.default_rng(seed)
+    n = 200
+    answer = rng.integers(0, 2, n)
+    generated = np.where(rng.random(n) < 0.8, answer, 1 - answer)
+    results = pd.DataFrame({
+        "category": rng.choice(["color", "count", "OCR"], n),
+        "answer_code": answer,
+        "generated_text_code": generated,
+        "judgment": (generated == answer).astype(int),
+        "avg_entropy": rng.gamma(2.0, 0.3, n),
+    })
+    return compute_metrics(results)
+
+
+def test_import_without_matplotlib():
+    """plot and plot_runner import fine when matplotlib is missing; only rendering needs it"""
+    code = (
+        "import sys; sys.modules['matplotlib'] = None\n"
+        "from deephallu.analytics import plot, plot_runner\n"
+        "assert 'entropy' in plot.FIGURES\n"
+        "try:\n"
+        "    plot._pyplot()\n"
+        "except ImportError:\n"
+        "    print('ok')\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True).stdout
+    assert output.strip() == "ok"
+
+
+def test_import_does_not_load_matplotlib():
+    code = "import sys\nfrom deephallu.analytics import plot, plot_runner\nprint('matplotlib' in sys.modules)\n"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True).stdout.strip() == "False"
+
+
+def test_figure_hash():
+    metrics = make_metrics()
+    base = plot_runner.figure_hash("entropy", metrics, ["png"], code_hash="x")
+    assert plot_runner.figure_hash("entropy", metrics.copy(), ["png"], code_hash="x") == base
+    # Float noise below the CSV precision does not change the hash
+    noisy = metrics.assign(accuracy=metrics["accuracy"] + 1e-15)
+    assert plot_runner.figure_hash("entropy", noisy, ["png"], code_hash="x") == base
+    assert plot_runner.figure_hash("entropy", make_metrics(seed=1), ["png"], code_hash="x") != base
+    assert plot_runner.figure_hash("entropy", metrics, ["pdf"], code_hash="x") != base
+    assert plot_runner.figure_hash("entropy", metrics, ["png"], run="other", code_hash="x") != base
+    assert plot_runner.figure_hash("entropy", metrics, ["png"], code_hash="y") != base
+
+
+def test_second_render_skips_unchanged(tmp_path, capsys):
+    pytest.importorskip("matplotlib")
+    metrics = make_metrics()
+    output_dir = str(tmp_path / "figures")
+    first = plot_runner.render_figures(metrics, FIGURES, formats=["png", "svg"], output_dir=output_dir, num_workers=2)
+    assert sorted(first) == sorted(FIGURES)
+    files = [path for paths in first.values() for path in paths]
+    assert len(files) == 4 and all(os.path.getsize(path) > 0 for path in files)
+    manifest = json.loads((tmp_path / "figures" / plot_runner.MANIFEST_NAME).read_text())
+    assert sorted(manifest) == sorted(FIGURES)
+    mtimes = {path: os.stat(path).st_mtime_ns for path in files}
+    assert "Rendering 2 figures, 0 unchanged" in capsys.readouterr().out
+
+    second = plot_runner.render_figures(metrics, FIGURES, formats=["png", "svg"], output_dir=output_dir)
+    assert second == first
+    assert "Rendering 0 figures, 2 unchanged" in capsys.readouterr().out
+    assert {path: os.stat(path).st_mtime_ns for path in files} == mtimes
+
+    # A deleted output or different metrics re-render only the affected figure
+    os.remove(first["entropy"][0])
+    plot_runner.render_figures(metrics, FIGURES, formats=["png", "svg"], output_dir=output_dir)
+    assert "Rendering 1 figures, 1 unchanged" in capsys.readouterr().out
+    assert os.path.exists(first["entropy"][0])
+    plot_runner.render_figures(make_metrics(seed=1), ["entropy"], formats=["png", "svg"], output_dir=output_dir)
+    assert "Rendering 1 figures, 0 unchanged" in capsys.readouterr().out
+    plot_runner.render_figures(make_metrics(seed=1), ["entropy"], formats=["png", "svg"], output_dir=output_dir, force=True)
+    assert "Rendering 1 figures, 0 unchanged" in capsys.readouterr().out
+
+
+def test_unknown_figure(tmp_path):
+    with pytest.raises(ValueError, match="Unknown figures"):
+        plot_runner.render_figures(make_metrics(), ["nope"], output_dir=str(tmp_path))
@@ -0,0 +1,223 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from deephallu.web.backend.core.config import Config
+from deephallu.web.backend.services.results_store import ResultsRun, ResultsStore, convert_run
+
+TOP_K = 3
+
+
+def make_run(run_dir, seed=0):
+    """Synthetic results.csv and a shuffled step_details.csv; returns (results, steps) as written"""
+    rng = np.random.default_rng(seed)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    num_samples = 12
+    results = pd.DataFrame({
+        "sample_id": [f"{'color' if i % 2 else 'count'}_{i:03d}.jpg" for i in range(num_samples)],
+        "category": ["color" if i % 2 else "count" for i in range(num_samples)],
+        "question": [f"Is there object {i}? Please answer yes or no." for i in range(num_samples)],
+        "answer": ["Yes" if i % 3 else "No" for i in range(num_samples)],
+        "generated_text": ["Yes" if i % 4 else "No" for i in range(num_samples)],
+        "avg_entropy": rng.random(num_samples),
+        "judgment": [1, 0, 1, None, 1, 0, 0, 1, None, 1, 1, 0],
+    })
+    results.loc[5, "avg_entropy"] = np.nan
+    results.to_csv(run_dir / "results.csv", index=False)
+
+    rows = []
+    for sample_id in results["sample_id"]:
+        if sample_id == "count_004.jpg":
+            # A sample without any generated step
+            continue
+        for step in range(int(rng.integers(1, 6))):
+            row = {"sample_id": sample_id, "category": sample_id.split("_")[0], "step": step, "entropy": float(rng.random())}
+            for k in range(1, TOP_K + 1):
+                row[f"top{k}_token"] = str(rng.choice(["Yes", "No", "NA", "", "ä", "null", " the"]))
+                row[f"top{k}_prob"] = float(rng.random())
+                row[f"top{k}_token_id"] = int(rng.integers(0, 32000))
+            rows.append(row)
+    # Rows of a sample that is not in results.csv are dropped
+    rows.append({"sample_id": "unknown.jpg", "category": "color", "step": 0, "entropy": 0.1,
+                 **{f"top{k}_token": "x" for k in range(1, TOP_K + 1)},
+                 **{f"top{k}_prob": 0.1 for k in range(1, TOP_K + 1)},
+                 **{f"top{k}_token_id": 1 for k in range(1, TOP_K + 1)}})
+    steps = pd.DataFrame(rows)
+    steps.iloc[3, steps.columns.get_loc("entropy")] = np.nan
+    steps.sample(frac=1.0, random_state=seed).to_csv(run_dir / "step_details.csv", index=False)
+    return results, steps
+
+
+def expected_steps(steps, sample_id):
+    rows = steps[steps["sample_id"] == sample_id].sort_values("step")
+    series = []
+    for _, row in rows.iterrows():
+        series.append({
+            "step": int(row["step"]),
+            "entropy": None if math.isnan(row["entropy"]) else pytest.approx(row["entropy"], rel=1e-6),
+            "top_k_tokens": [row[f"top{k}_token"] for k in range(1, TOP_K + 1)],
+            "top_k_probs": [pytest.approx(row[f"top{k}_prob"], rel=1e-6) for k in range(1, TOP_K + 1)],
+            "top_k_token_ids": [int(row[f"top{k}_token_id"]) for k in range(1, TOP_K + 1)],
+        })
+    return series
+
+
+@pytest.mark.parametrize("chunksize", [500_000, 7, 1])
+def test_convert_shuffled_steps(tmp_path, chunksize):
+    results, steps = make_run(tmp_path / "run")
+    store_dir = convert_run(str(tmp_path / "run"), chunksize=chunksize)
+    run = ResultsRun("run", str(tmp_path / "run"), store_dir)
+
+    assert len(run) == len(results)
+    assert run.meta["steps"]["num_steps"] == len(steps) - 1
+    assert run.meta["steps"]["dropped"] == 1
+    assert run.meta["steps"]["top_k"] == TOP_K
+    offsets = np.asarray(run.column("step.offsets"))
+    assert offsets[0] == 0 and offsets[-1] == len(steps) - 1 and (np.diff(offsets) >= 0).all()
+    for row, sample_id in enumerate(results["sample_id"]):
+        assert run.row_of(sample_id) == row
+        assert run.steps(row) == expected_steps(steps, sample_id), sample_id
+    assert run.steps(run.row_of("count_004.jpg")) == []
+    assert run.row_of("unknown.jpg") is None
+
+
+def test_chunked_and_single_pass_stores_are_identical(tmp_path):
+    make_run(tmp_path / "run")
+    single = ResultsRun("a", str(tmp_path / "run"), convert_run(str(tmp_path / "run"), str(tmp_path / "single")))
+    chunked = ResultsRun("b", str(tmp_path / "run"), convert_run(str(tmp_path / "run"), str(tmp_path / "chunked"), chunksize=5))
+    for name in ("step.offsets", "step.step", "step.entropy", "step.top_k_probs", "step.top_k_token_ids"):
+        np.testing.assert_array_equal(np.asarray(single.column(name)), np.asarray(chunked.column(name)))
+    assert single.column("step.top_k_tokens").tolist() == chunked.column("step.top_k_tokens").tolist()
+
+
+def test_tokens_keep_na_and_empty_strings(tmp_path):
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    pd.DataFrame({"sample_id": ["a"], "category": ["x"], "avg_entropy": [0.5]}).to_csv(run_dir / "results.csv", index=False)
+    # top2_token is missing from the file; its tokens are stored as nulls
+    (run_dir / "step_details.csv").write_text(
+        "sample_id,step,entropy,top1_token,top1_prob,top1_token_id,top2_prob,top2_token_id\n"
+        "a,1,,NA,0.5,7,0.25,\n"
+        "a,0,0.3,,0.9,3,0.1,4\n"
+    )
+    run = ResultsRun("run", str(run_dir), convert_run(str(run_dir)))
+    assert run.meta["steps"]["columns"]["top_k_tokens"]["nulls"]
+    assert run.steps(0) == [
+        {"step": 0, "entropy": pytest.approx(0.3), "top_k_tokens": ["", None],
+         "top_k_probs": [pytest.approx(0.9), pytest.approx(0.1)], "top_k_token_ids": [3, 4]},
+        {"step": 1, "entropy": None, "top_k_tokens": ["NA", None],
+         "top_k_probs": [0.5, 0.25], "top_k_token_ids": [7, -1]},
+    ]
+
+
+def test_filters_and_sort(tmp_path):
+    results, _ = make_run(tmp_path / "run")
+    run = ResultsRun("run", str(tmp_path / "run"), convert_run(str(tmp_path / "run")))
+    judgment = results["judgment"]
+
+    assert run.filter_rows(correctness="correct").tolist() == results.index[judgment == 1].tolist()
+    assert run.filter_rows(correctness="hallucinated").tolist() == results.index[judgment == 0].tolist()
+    assert run.filter_rows(correctness="unknown").tolist() == results.index[judgment.isna()].tolist()
+    assert run.filter_rows(category="color", correctness="correct").tolist() == \
+        results.index[(judgment == 1) & (results["category"] == "color")].tolist()
+    assert run.filter_rows(category="missing").tolist() == []
+    assert run.filter_rows(min_entropy=0.2, max_entropy=0.8).tolist() == \
+        results.index[results["avg_entropy"].between(0.2, 0.8)].tolist()
+
+    ascending = run.filter_rows(sort="avg_entropy")
+    descending = run.filter_rows(sort="-avg_entropy")
+    valid = results["avg_entropy"].notna()
+    assert ascending.tolist() == results[valid].sort_values("avg_entropy").index.tolist() + [5]
+    assert descending.tolist() == results[valid].sort_values("avg_entropy", ascending=False).index.tolist() + [5]
+    with pytest.raises(ValueError):
+        run.filter_rows(sort="question")
+
+    record = run.records(np.array([5]))[0]
+    assert record["avg_entropy"] is None and record["judgment"] == 0 and record["category"] == "color"
+    assert run.records(np.array([3]))[0]["judgment"] == -1
+
+
+def test_metrics_frame(tmp_path):
+    results, _ = make_run(tmp_path / "run")
+    run = ResultsRun("run", str(tmp_path / "run"), convert_run(str(tmp_path / "run")))
+    frame = run.metrics_frame()
+    assert frame["category"].tolist() == results["category"].tolist()
+    assert frame["judgment"].tolist() == results["judgment"].fillna(-1).astype(int).tolist()
+    # answer_code is derived from the answer text; the generated text is not parsed
+    assert frame["answer_code"].tolist() == (results["answer"] == "Yes").astype(int).tolist()
+    assert (frame["generated_text_code"] == -1).all()
+
+
+def write_config(tmp_path, run_dir):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump({
+        "datasets": {}, "models": {},
+        "results": {
+            "run": {"name": "Run", "path": str(run_dir)},
+            "empty": {"name": "Empty", "path": str(tmp_path / "empty")},
+        },
+    }))
+    return Config(str(config_path))
+
+
+def test_store_reconverts_changed_csv(tmp_path):
+    results, _ = make_run(tmp_path / "run")
+    store = ResultsStore(write_config(tmp_path, tmp_path / "run"), check_interval=0.0)
+    run = store.get("run")
+    assert store.get("run") is run
+    results.iloc[:5].to_csv(tmp_path / "run" / "results.csv", index=False)
+    changed = store.get("run")
+    assert changed is not run and len(changed) == 5
+    # Steps of samples no longer in results.csv are dropped on conversion
+    assert changed.meta["steps"]["num_steps"] == int(np.asarray(changed.column("step.offsets"))[-1])
+    with pytest.raises(ValueError, match="not found"):
+        store.get("missing")
+    with pytest.raises(ValueError, match="No results.csv"):
+        store.get("empty")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from deephallu.web.backend.api import results as results_api
+
+    make_run(tmp_path / "run")
+    config = write_config(tmp_path, tmp_path / "run")
+    monkeypatch.setattr(results_api.results_service, "config", config)
+    monkeypatch.setattr(results_api.results_service, "store", ResultsStore(config))
+    app = FastAPI()
+    app.include_router(results_api.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_api_samples(client):
+    response = client.get("/api/results/run/samples", params={"page_size": 3, "correctness": "correct", "sort": "-avg_entropy"})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["total_count"], body["page"], body["has_next"], body["has_prev"]) == (6, 1, True, False)
+    entropies = [sample["avg_entropy"] for sample in body["samples"]]
+    assert entropies == sorted(entropies, reverse=True)
+    assert all(sample["judgment"] == 1 for sample in body["samples"])
+
+    page = client.get("/api/results/run/samples", params={"page": 2, "page_size": 5, "category": "count"}).json()
+    assert [sample["sample_id"] for sample in page["samples"]] == ["count_010.jpg"]
+    assert page["has_prev"] and not page["has_next"]
+
+    steps = client.get("/api/results/run/samples/count_004.jpg/steps").json()
+    assert steps == {"run_name": "run", "sample_id": "count_004.jpg", "steps": []}
+    assert client.get("/api/results/run/samples/color_001.jpg").json()["category"] == "color"
+    assert client.get("/api/results/run/metrics").json()["metrics"][0]["category"] == "overall"
+
+
+def test_api_not_found(client):
+    assert client.get("/api/results/missing/samples").status_code == 404
+    assert client.get("/api/results/empty/samples").status_code == 404
+    assert client.get("/api/results/run/samples/nope.jpg").status_code == 404
+    assert client.get("/api/results/run/samples/nope.jpg/steps").status_code == 404
+    assert client.get("/api/results/missing/metrics").status_code == 404
+    assert client.get("/api/results/run/samples", params={"correctness": "maybe"}).status_code == 422
@@ -0,0 +1,148 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from deephallu.analytics.risk import (
+    ANSWER_FEATURES, LogisticRiskModel, answer_features, cross_validate, fit_risk_model, position_baseline,
+    roc_auc, score_run, token_features
+)
+
+
+def make_steps(num_samples=60, seed=0):
+    """Synthetic step_details rows in shuffled order, lengths 1..12 with runs of low margins"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for sample in range(num_samples):
+        for step in range(int(rng.integers(1, 13))):
+            top1 = rng.uniform(0.3, 1.0) if rng.random() < 0.6 else rng.uniform(0.3, 0.55)
+            rows.append({"sample_id": f"s{sample:03d}", "step": step, "entropy": rng.gamma(1.5, 0.5),
+                         "top1_prob": top1, "top2_prob": rng.uniform(0, 1 - top1)})
+    return pd.DataFrame(rows).sample(frac=1.0, random_state=seed, ignore_index=True)
+
+
+def reference_answer_features(steps, window, low_margin, spike_threshold):
+    """Per-sample loop over the same definitions as the vectorized implementation"""
+    mean, std = {}, {}
+    for position, group in steps.groupby("step"):
+        mean[position] = group["entropy"].mean()
+        std[position] = group["entropy"].std(ddof=0)
+    rows = {}
+    for sample_id, group in steps.groupby("sample_id"):
+        group = group.sort_values("step")
+        entropy = group["entropy"].tolist()
+        margin = (group["top1_prob"] - group["top2_prob"]).tolist()
+        z = [(e - mean[s]) / max(std[s], 1e-6) for e, s in zip(entropy, group["step"])]
+        n = len(entropy)
+        if n < window:
+            max_window = sum(entropy) / n
+        else:
+            max_window = max(sum(entropy[i:i + window]) / window for i in range(n - window + 1))
+        longest = current = 0
+        for value in margin:
+            current = current + 1 if value < low_margin else 0
+            longest = max(longest, current)
+        rows[sample_id] = {
+            "log_num_tokens": np.log1p(n),
+            "mean_entropy": np.mean(entropy),
+            "max_entropy": max(entropy),
+            "std_entropy": np.std(entropy),
+            "mean_margin": np.mean(margin),
+            "min_margin": min(margin),
+            "spike_rate": np.mean([value > spike_threshold for value in z]),
+            "mean_position_z": np.mean(z),
+            "max_position_z": max(z),
+            "max_window_entropy": max_window,
+            "longest_low_margin_run": float(longest),
+        }
+    return pd.DataFrame.from_dict(rows, orient="index")[ANSWER_FEATURES]
+
+
+@pytest.mark.parametrize("window, low_margin, spike_threshold", [(5, 0.2, 2.0), (1, 0.5, 0.5), (3, 0.0, 1.0), (20, 1.1, 3.0)])
+def test_answer_features_match_loop(window, low_margin, spike_threshold):
+    steps = make_steps()
+    tokens = token_features(steps, spike_threshold=spike_threshold)
+    assert tokens[["sample_id", "step"]].equals(tokens.sort_values(["sample_id", "step"])[["sample_id", "step"]])
+    answers = answer_features(tokens, window, low_margin)
+    expected = reference_answer_features(steps, window, low_margin, spike_threshold)
+    assert answers.columns.tolist() == ANSWER_FEATURES
+    assert answers.index.tolist() == expected.index.tolist()
+    np.testing.assert_allclose(answers.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+def test_token_features():
+    steps = pd.DataFrame({"sample_id": ["b", "a", "a"], "step": [0, 1, 0], "entropy": [1.0, 2.0, 3.0], "top1_prob": [0.9, 0.6, 0.5]})
+    tokens = token_features(steps)
+    assert list(zip(tokens["sample_id"], tokens["step"])) == [("a", 0), ("a", 1), ("b", 0)]
+    # Without top2_prob the margin is top1_prob
+    assert tokens["margin"].tolist() == [0.5, 0.6, 0.9]
+    # Step 0 has entropies 3 and 1: mean 2, std 1
+    assert tokens["position_z"].tolist()[::2] == [1.0, -1.0]
+    mean, std = position_baseline(np.array([0, 0, 5, 300]), np.array([1.0, 3.0, 2.0, 4.0]), max_step=8)
+    assert (mean[0], std[0], mean[5], mean[8]) == (2.0, 1.0, 2.0, 4.0)
+
+
+def test_irls_reaches_penalized_optimum():
+    rng = np.random.default_rng(1)
+    features = pd.DataFrame(rng.normal(size=(400, 3)) * [1.0, 5.0, 0.1] + [0.0, 10.0, -2.0], columns=["a", "b", "c"])
+    logits = 0.5 + 1.5 * (features["a"] - 0.0) - 0.3 * (features["b"] - 10.0) / 5.0
+    labels = (rng.random(400) < 1 / (1 + np.exp(-logits))).astype(float)
+    for l2 in (0.0, 1.0, 25.0):
+        model = LogisticRiskModel(["a", "b", "c"], l2=l2).fit(features, labels)
+        x = model._design(features)
+        p = model.predict_proba(features)
+        penalty = np.r_[0.0, np.full(3, l2)]
+        # Stationary point of the penalized log-likelihood; the intercept is not penalized
+        np.testing.assert_allclose(x.T @ (p - labels) + penalty * model.weights, 0.0, atol=1e-6)
+        assert p.mean() == pytest.approx(labels.mean(), abs=1e-6)
+
+    # Compare with plain gradient descent on the same objective
+    model = LogisticRiskModel(["a", "b", "c"], l2=1.0).fit(features, labels)
+    x = model._design(features)
+    weights = np.zeros(4)
+    for _ in range(20000):
+        p = 1 / (1 + np.exp(-(x @ weights)))
+        weights -= 0.002 * (x.T @ (p - labels) + np.r_[0.0, np.ones(3)] * weights)
+    np.testing.assert_allclose(model.weights, weights, atol=1e-4)
+    assert model.coefficients().index.tolist() == ["intercept", "a", "b", "c"]
+
+
+def test_model_round_trip_and_unfitted(tmp_path):
+    steps = make_steps(40)
+    _, answers, _ = score_run(steps)
+    labels = (answers["mean_entropy"] > answers["mean_entropy"].median()).to_numpy(dtype=float)
+    model = LogisticRiskModel().fit(answers, labels)
+    model.baseline = position_baseline(steps["step"].to_numpy(), steps["entropy"].to_numpy())
+    path = tmp_path / "risk_model.json"
+    model.save(str(path))
+    loaded = LogisticRiskModel.load(str(path))
+    np.testing.assert_allclose(loaded.predict_proba(answers), model.predict_proba(answers))
+    assert json.loads(path.read_text())["feature_names"] == ANSWER_FEATURES
+    _, scored, timing = score_run(steps, loaded)
+    np.testing.assert_allclose(scored["risk"], model.predict_proba(answers))
+    assert timing["samples_per_second"] > 0
+    with pytest.raises(RuntimeError):
+        LogisticRiskModel().predict_proba(answers)
+
+
+def test_roc_auc():
+    assert roc_auc(np.array([0, 0, 1, 1]), np.array([0.1, 0.2, 0.3, 0.4])) == 1.0
+    assert roc_auc(np.array([1, 1, 0, 0]), np.array([0.1, 0.2, 0.3, 0.4])) == 0.0
+    assert roc_auc(np.array([0, 1]), np.array([0.5, 0.5])) == 0.5
+    assert np.isnan(roc_auc(np.array([1, 1]), np.array([0.1, 0.2])))
+
+
+def test_fit_risk_model_returns_cross_validation():
+    steps = make_steps(120, seed=2)
+    _, answers, _ = score_run(steps)
+    judgment = np.where(answers["mean_entropy"] > answers["mean_entropy"].median(), 0, 1)
+    judgment[:5] = -1
+    results = pd.DataFrame({"sample_id": answers.index, "judgment": judgment})
+    model, labeled, evaluation = fit_risk_model(steps, results)
+    assert len(labeled) == len(answers) - 5
+    assert set(evaluation) == {"fold_auc", "auc", "baseline_auc"} and len(evaluation["fold_auc"]) == 5
+    # The label is a threshold on mean_entropy, so the baseline separates it perfectly
+    assert evaluation["baseline_auc"] == 1.0 and evaluation["auc"] > 0.9
+    assert model.baseline is not None
+    assert cross_validate(labeled, labeled["hallucinated"].to_numpy(), num_folds=3)["auc"] > 0.9
@@ -0,0 +1,135 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from deephallu.web.backend.services.search_index import (
+    FIELD_WEIGHTS, MATCH_WEIGHTS, SEARCH_MODES, SearchIndex, tokenize,
+)
+
+WORDS = ["cat", "cats", "catalog", "dog", "hotdog", "red", "bred", "redder", "a", "is", "there", "the", "1", "12", "123"]
+CATEGORIES = ["color", "count", "OCR", None]
+
+
+def make_columns(n=300, seed=0):
+    rng = random.Random(f"search-index-{seed}")
+    columns = {
+        "image_name": [f"{rng.choice(WORDS)}_{i:04d}.jpg" for i in range(n)],
+        "question": [" ".join(rng.choices(WORDS, k=rng.randint(0, 6))) + "?" for _ in range(n)],
+        "answer": [rng.choice(["Yes", "No", None, "Red cat"]) for _ in range(n)],
+    }
+    categories = [rng.choice(CATEGORIES) for _ in range(n)]
+    return {name: np.asarray(values, dtype=object) for name, values in columns.items()}, np.asarray(categories, dtype=object)
+
+
+def matches(term, token, mode):
+    if token == term:
+        return MATCH_WEIGHTS["exact"]
+    if mode in ("prefix", "substring") and token.startswith(term):
+        return MATCH_WEIGHTS["prefix"]
+    if mode == "substring" and term in token:
+        return MATCH_WEIGHTS["substring"]
+    return 0.0
+
+
+def reference_scores(columns, query, mode):
+    """Row -> score by scanning every token of every row"""
+    n = len(columns["question"])
+    row_tokens = [{} for _ in range(n)]  # token -> best field weight
+    for field, weight in FIELD_WEIGHTS.items():
+        for row, text in enumerate(columns[field]):
+            for token in tokenize(text):
+                row_tokens[row][token] = max(row_tokens[row].get(token, 0.0), weight)
+    document_frequency = {}
+    for tokens in row_tokens:
+        for token in tokens:
+            document_frequency[token] = document_frequency.get(token, 0) + 1
+
+    scores = {}
+    terms = list(dict.fromkeys(tokenize(query)))
+    for row, tokens in enumerate(row_tokens):
+        total = 0.0
+        for term in terms:
+            best = max((field_weight * matches(term, token, mode) * math.log(1.0 + n / document_frequency[token])
+                        for token, field_weight in tokens.items()), default=0.0)
+            if best == 0.0:
+                break
+            total += best
+        else:
+            if terms:
+                scores[row] = total
+    return scores
+
+
+def ranked(scores):
+    return sorted(scores, key=lambda row: (-scores[row], row))
+
+
+QUERIES = ["cat", "CAT", "ca", "at", "dog", "og", "red cat", "cat red", "there is a cat", "12", "2", "1 cat",
+           "jpg", "0012", "catalog dog", "zebra", "cat zebra", "", "?!"]
+
+
+@pytest.mark.parametrize("mode", SEARCH_MODES)
+def test_match_equals_brute_force(mode):
+    columns, categories = make_columns()
+    index = SearchIndex(columns, categories)
+    for query in QUERIES:
+        expected = reference_scores(columns, query, mode)
+        rows, scores = index.match(query, mode)
+        assert rows.tolist() == sorted(expected), (query, mode)
+        np.testing.assert_allclose(scores, [expected[row] for row in rows.tolist()])
+
+
+def test_modes():
+    columns = {
+        "image_name": np.asarray(["a.jpg", "b.jpg", "c.jpg"], dtype=object),
+        "question": np.asarray(["Is there a cat?", "Is there a catalog?", "Is there a bobcat?"], dtype=object),
+        "answer": np.asarray(["Yes", "No", "Yes"], dtype=object),
+    }
+    index = SearchIndex(columns)
+    assert index.match("cat", "exact")[0].tolist() == [0]
+    assert index.match("cat", "prefix")[0].tolist() == [0, 1]
+    assert index.match("cat", "substring")[0].tolist() == [0, 1, 2]
+    # Exact matches score above prefix matches, which score above substring matches
+    rows, total, _ = index.search("cat")
+    assert rows.tolist() == [0, 1, 2] and total == 3
+    # Every term has to match (AND)
+    assert index.match("cat yes", "substring")[0].tolist() == [0, 2]
+    assert index.match("bobcat no", "substring")[0].tolist() == []
+    with pytest.raises(ValueError, match="Unknown search mode"):
+        index.match("cat", "regex")
+
+
+def test_search_pages_follow_the_full_ranking():
+    columns, categories = make_columns(seed=1)
+    index = SearchIndex(columns, categories)
+    for query in ["cat", "red", "12 the", "a"]:
+        full = ranked(reference_scores(columns, query, "substring"))
+        for offset, limit in [(0, 1), (0, 7), (3, 10), (len(full) - 2, 5), (len(full), 5), (0, 10 ** 6)]:
+            rows, total, _ = index.search(query, offset=offset, limit=limit)
+            assert total == len(full)
+            assert rows.tolist() == full[offset:offset + limit], (query, offset, limit)
+
+
+def test_search_category_filter_and_facets():
+    columns, categories = make_columns(seed=2)
+    index = SearchIndex(columns, categories)
+    full = ranked(reference_scores(columns, "cat", "prefix"))
+    facets = {}
+    for row in full:
+        if categories[row]:
+            facets[categories[row]] = facets.get(categories[row], 0) + 1
+
+    rows, total, found_facets = index.search("cat", category="count", limit=1000, mode="prefix")
+    assert found_facets == facets
+    assert rows.tolist() == [row for row in full if categories[row] == "count"]
+    assert total == facets["count"]
+    rows, total, _ = index.search("cat", category="unknown", mode="prefix")
+    assert (rows.tolist(), total) == ([], 0)
+
+
+def test_empty_index():
+    index = SearchIndex({name: np.asarray([], dtype=object) for name in FIELD_WEIGHTS})
+    rows, total, facets = index.search("cat")
+    assert (rows.tolist(), total, facets) == ([], 0, {})
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from deephallu.analytics.step_stats import (
+    ENTROPY_RANGE, StepStatsAccumulator, aggregate_file, aggregate_files, merge_moments, chunk_moments
+)
+
+
+def make_run(run_dir, seed=0, num_samples=40):
+    rng = np.random.default_rng(seed)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    categories = ["color", "count", "OCR"]
+    results = pd.DataFrame({
+        "sample_id": np.arange(num_samples),
+        "category": [categories[i % 3] for i in range(num_samples)],
+        "judgment": rng.choice([0, 1, -1], size=num_samples, p=[0.3, 0.6, 0.1]),
+    })
+    results.to_csv(run_dir / "results.csv", index=False)
+    rows = []
+    for sample in results.itertuples():
+        for step in range(int(rng.integers(1, 15))):
+            rows.append({"sample_id": sample.sample_id, "category": sample.category, "step": step,
+                         "entropy": float(rng.gamma(1.2, 0.8)), "top1_prob": float(rng.uniform(0.2, 1.0))})
+    steps = pd.DataFrame(rows)
+    # Values outside the histogram range land in the border bins
+    steps.loc[3, "entropy"] = ENTROPY_RANGE[1] + 5.0
+    steps.loc[7, "entropy"] = np.nan
+    steps.to_csv(run_dir / "step_details.csv", index=False)
+    return results, steps
+
+
+def assert_same_stats(a, b):
+    for table_a, table_b in [(a.entropy_summary(), b.entropy_summary()), (a.entropy_by_step(), b.entropy_by_step())]:
+        pd.testing.assert_frame_equal(table_a, table_b, check_exact=False, rtol=1e-9, atol=1e-12)
+    pd.testing.assert_frame_equal(a.top1_distribution(), b.top1_distribution())
+    # Histograms are integer counts and must be identical
+    pd.testing.assert_frame_equal(a.entropy_histogram.sort_index(), b.entropy_histogram.sort_index())
+
+
+@pytest.mark.parametrize("chunksize", [3, 50])
+def test_chunked_equals_single_chunk(tmp_path, chunksize):
+    make_run(tmp_path / "run")
+    single = aggregate_file(str(tmp_path / "run" / "step_details.csv"), run="run")
+    chunked = aggregate_file(str(tmp_path / "run" / "step_details.csv"), run="run", chunksize=chunksize)
+    assert single.num_rows == chunked.num_rows
+    assert_same_stats(single, chunked)
+
+
+def test_summary_matches_pandas(tmp_path):
+    results, steps = make_run(tmp_path / "run")
+    stats = aggregate_file(str(tmp_path / "run" / "step_details.csv"), run="run", chunksize=13)
+    steps = steps.dropna(subset=["entropy"])
+    correctness = results.set_index("sample_id")["judgment"].map({1: "correct", 0: "hallucinated"}).fillna("unknown")
+    steps = steps.assign(correctness=steps["sample_id"].map(correctness))
+    expected = steps.groupby(["category", "correctness"])["entropy"].agg(["count", "mean", "std", "min", "max"])
+    overall = steps.groupby("correctness")["entropy"].agg(["count", "mean", "std", "min", "max"])
+
+    summary = stats.entropy_summary().set_index(["category", "correctness"])
+    assert (summary["run"] == "run").all()
+    for key, row in expected.iterrows():
+        np.testing.assert_allclose(summary.loc[key, ["count", "mean", "std", "min", "max"]].to_numpy(dtype=float), row.to_numpy(dtype=float))
+    for key, row in overall.iterrows():
+        np.testing.assert_allclose(summary.loc[("overall", key), ["count", "mean", "std", "min", "max"]].to_numpy(dtype=float), row.to_numpy(dtype=float))
+    # Percentiles from the 0.01-wide bins are within about one bin of the exact ones
+    median = steps.groupby(["category", "correctness"])["entropy"].median()
+    assert np.abs(summary.loc[median.index, "p50"] - median).max() < 0.05
+
+    by_step = stats.entropy_by_step().set_index(["step", "correctness"])
+    step_expected = steps.groupby(["step", "correctness"])["entropy"].agg(["count", "mean"])
+    np.testing.assert_allclose(by_step.loc[step_expected.index, "mean"], step_expected["mean"])
+
+
+def test_merge_files_and_processes(tmp_path):
+    make_run(tmp_path / "a", seed=1)
+    make_run(tmp_path / "b", seed=2)
+    paths = [str(tmp_path / "a" / "step_details.csv"), str(tmp_path / "b" / "step_details.csv")]
+    sequential = aggregate_files(paths, num_workers=1, chunksize=40)
+    parallel = aggregate_files(paths, num_workers=2)
+    assert_same_stats(sequential, parallel)
+    assert set(sequential.entropy_summary()["run"]) == {"a", "b"}
+
+    # Merging is order independent
+    a = aggregate_file(paths[0], run="a", chunksize=30)
+    b = aggregate_file(paths[1], run="b", chunksize=45)
+    reversed_merge = aggregate_file(paths[1], run="b").merge(aggregate_file(paths[0], run="a"))
+    assert_same_stats(a.merge(b), reversed_merge)
+    with pytest.raises(ValueError):
+        StepStatsAccumulator(max_step=10).merge(StepStatsAccumulator(max_step=20))
+
+
+def test_merge_moments_is_exact():
+    rng = np.random.default_rng(0)
+    values = pd.Series(rng.normal(3.0, 2.0, size=1000))
+    keys = [pd.Series(rng.integers(0, 4, size=1000))]
+    merged = None
+    for start in range(0, 1000, 37):
+        part = values.iloc[start:start + 37]
+        merged = merge_moments(merged, chunk_moments(part, [keys[0].iloc[start:start + 37]]))
+    direct = chunk_moments(values, keys)
+    pd.testing.assert_frame_equal(merged.sort_index(), direct.sort_index(), check_dtype=False, check_names=False)
@@ -0,0 +1,98 @@
+import importlib.util
+import random
+import sys
+import types
+
+import pytest
+
+import deephallu.inference
+
+SPECIAL = {0: "</s>"}
+
+
+class ByteTokenizer:
+    """One token per UTF-8 byte (ids 1..256), so multi-byte characters span several tokens"""
+
+    def encode(self, text):
+        return [byte + 1 for byte in text.encode("utf-8")]
+
+    def decode(self, token_ids, skip_special_tokens=False):
+        pieces, data = [], bytearray()
+        for token_id in token_ids:
+            if token_id in SPECIAL:
+                if not skip_special_tokens:
+                    pieces.append(data.decode("utf-8", errors="replace") + SPECIAL[token_id])
+                    data = bytearray()
+            else:
+                data.append(token_id - 1)
+        return "".join(pieces) + data.decode("utf-8", errors="replace")
+
+
+@pytest.fixture
+def stream_module(monkeypatch):
+    """inference/stream.py loaded with the model code (and torch, if missing) stubbed out"""
+    try:
+        import torch  # noqa: F401
+    except ImportError:
+        monkeypatch.setitem(sys.modules, "torch", types.ModuleType("torch"))
+    infer = types.ModuleType("deephallu.inference.infer")
+    infer.analyze_step = infer.load_model = None
+    monkeypatch.setitem(sys.modules, "deephallu.inference.infer", infer)
+    path = deephallu.inference.__path__[0] + "/stream.py"
+    spec = importlib.util.spec_from_file_location("stream_under_test", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def decode_incrementally(decoder, token_ids):
+    deltas = [decoder.put(token_id) for token_id in token_ids]
+    return deltas, decoder.flush()
+
+
+def test_emits_complete_words(stream_module):
+    tokenizer = ByteTokenizer()
+    decoder = stream_module.IncrementalDecoder(tokenizer)
+    deltas, tail = decode_incrementally(decoder, tokenizer.encode("Yes, there is a cat"))
+    assert [delta for delta in deltas if delta] == ["Yes, ", "there ", "is ", "a "]
+    assert tail == "cat"
+    assert decoder.flush() == ""
+
+
+def test_waits_for_complete_characters(stream_module):
+    tokenizer = ByteTokenizer()
+    decoder = stream_module.IncrementalDecoder(tokenizer)
+    token_ids = tokenizer.encode("猫 ")
+    assert len(token_ids) == 4
+    # The first two bytes of the character decode to a replacement character: nothing is emitted yet
+    assert [decoder.put(token_id) for token_id in token_ids] == ["", "", "", "猫 "]
+
+
+def test_newline_resets_the_cache(stream_module):
+    tokenizer = ByteTokenizer()
+    decoder = stream_module.IncrementalDecoder(tokenizer)
+    deltas = [decoder.put(token_id) for token_id in tokenizer.encode("one two\nthree")]
+    assert [delta for delta in deltas if delta] == ["one ", "two\n"]
+    assert decoder.token_cache == tokenizer.encode("three")
+    assert decoder.flush() == "three"
+
+
+def test_special_tokens_are_skipped(stream_module):
+    tokenizer = ByteTokenizer()
+    decoder = stream_module.IncrementalDecoder(tokenizer)
+    deltas, tail = decode_incrementally(decoder, tokenizer.encode("no ") + [0] + tokenizer.encode("yes"))
+    assert "".join(deltas) + tail == "no yes"
+
+
+def test_deltas_concatenate_to_the_full_text(stream_module):
+    tokenizer = ByteTokenizer()
+    rng = random.Random("incremental-decoder")
+    words = ["a", "cat", "猫", "café", "🙂", "naïve", "x\n", "  ", "\n", "Ünïcödé", "Yes,"]
+    for _ in range(200):
+        text = "".join(rng.choice(words) + rng.choice(["", " "]) for _ in range(rng.randint(0, 12)))
+        decoder = stream_module.IncrementalDecoder(tokenizer)
+        deltas, tail = decode_incrementally(decoder, tokenizer.encode(text))
+        assert "".join(deltas) + tail == text
+        assert not any("�" in delta for delta in deltas)
+        # Text is only released up to a space or a newline
+        assert all(delta[-1] in " \n" for delta in deltas if delta)
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from deephallu.models.llava_next_t2p_mapper import PatchGeometry, Token2PatchMapper, TokenType
+from deephallu.models.t2p_heatmap import AttentionHeatmapRenderer, render_attention_overlays
+
+TOKEN_OFFSET = 5
+
+
+@pytest.fixture(scope="module")
+def mapper():
+    return Token2PatchMapper.from_geometry(PatchGeometry())
+
+
+def painted_heatmaps(layout, image_size, token_type, attention, token_offset, normalize):
+    """Reference: normalize the token values and paint each patch bbox, one token at a time"""
+    height, width = image_size
+    tokens = layout[layout["token_type"] == token_type.value]
+    heat = np.zeros((len(attention), height, width), dtype=np.float32)
+    for step, values in enumerate(np.asarray(attention, dtype=np.float32)):
+        token_values = values[token_offset + tokens["token_idx"]]
+        if normalize == "step":
+            low, high = token_values.min(), token_values.max()
+        elif normalize == "global":
+            all_values = np.asarray(attention, dtype=np.float32)[:, token_offset + tokens["token_idx"]]
+            low, high = all_values.min(), all_values.max()
+        else:
+            low, high = 0.0, 1.0
+        scale = high - low if high > low else 1.0
+        for token, value in zip(tokens, token_values):
+            heat[step, token["y1"]:token["y2"], token["x1"]:token["x2"]] = np.clip((value - low) / scale, 0.0, 1.0)
+    return heat
+
+
+@pytest.mark.parametrize("size", [(480, 640), (333, 1000), (97, 113), (672, 336)])
+@pytest.mark.parametrize("token_type", [TokenType.BASE_IMAGE_FEATURES, TokenType.HIGH_RESOLUTION_FEATURES])
+@pytest.mark.parametrize("normalize", ["step", "global", "none"])
+def test_heatmaps_match_painted_patches(mapper, size, token_type, normalize):
+    layout = mapper.compute_layout(size)
+    attention = np.random.default_rng(0).random((3, TOKEN_OFFSET + len(layout) + 4)).astype(np.float32)
+    renderer = AttentionHeatmapRenderer(layout, size, token_type)
+    heat = renderer.heatmaps(attention, TOKEN_OFFSET, normalize)
+    assert heat.shape == (3,) + size
+    np.testing.assert_allclose(heat, painted_heatmaps(layout, size, token_type, attention, TOKEN_OFFSET, normalize), atol=1e-6)
+
+
+def test_grid_values_and_single_step(mapper):
+    layout = mapper.compute_layout((480, 640))
+    attention = np.arange(len(layout) + TOKEN_OFFSET, dtype=np.float32)
+    renderer = AttentionHeatmapRenderer(layout, (480, 640), TokenType.BASE_IMAGE_FEATURES)
+    grid = renderer.token_grid_values(attention, TOKEN_OFFSET)
+    base = layout[layout["token_type"] == TokenType.BASE_IMAGE_FEATURES.value]
+    assert grid.shape == (1, base["patch_row"].max() + 1, base["patch_col"].max() + 1)
+    assert (grid[0, base["patch_row"], base["patch_col"]] == TOKEN_OFFSET + base["token_idx"]).all()
+
+
+def test_empty_cells_are_not_painted(mapper):
+    size = (480, 640)
+    layout = mapper.compute_layout(size)
+    high_res = layout["token_type"] == TokenType.HIGH_RESOLUTION_FEATURES.value
+    dropped = layout[np.flatnonzero(high_res)[7]]
+    sparse = np.delete(layout, np.flatnonzero(high_res)[7])
+    renderer = AttentionHeatmapRenderer(sparse, size)
+    assert (renderer.index.token_grid == -1).sum() == 1
+
+    attention = np.random.default_rng(1).random((2, TOKEN_OFFSET + len(layout))).astype(np.float32)
+    # The element before the image tokens must not leak into the empty cell or the normalization
+    attention[:, TOKEN_OFFSET - 1] = 1000.0
+    grid = renderer.token_grid_values(attention, TOKEN_OFFSET)
+    assert np.isnan(grid[:, dropped["patch_row"], dropped["patch_col"]]).all()
+    assert np.isfinite(grid).sum() == grid.size - 2
+
+    heat = renderer.heatmaps(attention, TOKEN_OFFSET)
+    expected = painted_heatmaps(sparse, size, TokenType.HIGH_RESOLUTION_FEATURES, attention, TOKEN_OFFSET, "step")
+    np.testing.assert_allclose(heat, expected, atol=1e-6)
+    assert (heat[:, dropped["y1"]:dropped["y2"], dropped["x1"]:dropped["x2"]] == 0).all()
+    assert heat.max() == pytest.approx(1.0)
+
+    image = Image.new("RGB", (size[1], size[0]), (10, 20, 30))
+    frames = renderer.blend(image, heat)
+    # Pixels of the empty cell keep the image colour
+    assert (frames[:, dropped["y1"]:dropped["y2"], dropped["x1"]:dropped["x2"]] == (10, 20, 30)).all()
+
+
+def test_render_outputs(mapper, tmp_path):
+    size = (120, 200)
+    layout = mapper.compute_layout(size)
+    image = Image.new("RGB", (size[1], size[0]), (128, 128, 128))
+    attention = np.random.default_rng(2).random((4, len(layout))).astype(np.float32)
+    renderer = AttentionHeatmapRenderer(layout, size, output_size=(60, 100))
+    frames = renderer.render(image, attention)
+    assert len(frames) == 4 and frames[0].size == (100, 60)
+    assert renderer.render_strip(image, attention, num_cols=3).size == (300, 120)
+    renderer.render_animation(image, attention, str(tmp_path / "steps.gif"))
+    assert (tmp_path / "steps.gif").exists()
+    high_res, base = render_attention_overlays(image, layout, attention)
+    assert len(high_res) == len(base) == 4
@@ -0,0 +1,160 @@
+import random
+import sys
+import types
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from deephallu.models.llava_next_t2p_mapper import (
+    PatchGeometry, Token2PatchMapper, TokenPosition, TokenType, TOKEN_LAYOUT_DTYPE
+)
+
+
+def legacy_map_tokens_to_patches(mapper: Token2PatchMapper, original_size: tuple) -> List[TokenPosition]:
+    """Frozen copy of the per-token loop that compute_layout replaced (prints removed)"""
+    original_height, original_width = original_size
+    positions = []
+    token_idx = 0 if mapper.vision_feature_select_strategy == "default" else 1
+    num_patches_height_base = mapper.block_size[0] // mapper.patch_size
+    num_patches_width_base = mapper.block_size[1] // mapper.patch_size
+    base_num_patches = num_patches_height_base * num_patches_width_base
+    for patch_id in range(base_num_patches):
+        row = patch_id // num_patches_width_base
+        col = patch_id % num_patches_width_base
+        patch_h = original_height / num_patches_height_base
+        patch_w = original_width / num_patches_width_base
+        x1 = int(col * patch_w)
+        y1 = int(row * patch_h)
+        x2 = int((col + 1) * patch_w)
+        y2 = int((row + 1) * patch_h)
+        positions.append(TokenPosition(token_idx=token_idx, block_id=0, patch_bbox=(x1, y1, x2, y2),
+                                       patch_row=row, patch_col=col, token_type=TokenType.BASE_IMAGE_FEATURES))
+        token_idx += 1
+
+    best_resolution = mapper.select_best_resolution(original_size, mapper.image_grid_pinpoints)
+    num_patch_height = best_resolution[0] // mapper.block_size[0]
+    num_patch_width = best_resolution[1] // mapper.block_size[1]
+    patches_per_block_h = mapper.block_size[0] // mapper.patch_size
+    patches_per_block_w = mapper.block_size[1] // mapper.patch_size
+    total_patches_h = num_patch_height * patches_per_block_h
+    total_patches_w = num_patch_width * patches_per_block_w
+    (unpad_top, unpad_left, unpad_bottom, unpad_right) = mapper.unpad_image_get_valid_region(
+        original_size, (total_patches_h * mapper.patch_size, total_patches_w * mapper.patch_size)
+    )
+    valid_patch_top = unpad_top // mapper.patch_size
+    valid_patch_left = unpad_left // mapper.patch_size
+    valid_patch_bottom = unpad_bottom // mapper.patch_size
+    valid_patch_right = unpad_right // mapper.patch_size
+    effective_patches_h = valid_patch_bottom - valid_patch_top
+    effective_patches_w = valid_patch_right - valid_patch_left
+    patch_height_in_original = original_height / effective_patches_h
+    patch_width_in_original = original_width / effective_patches_w
+    for row_idx in range(effective_patches_h):
+        for col_idx in range(effective_patches_w):
+            global_patch_row = valid_patch_top + row_idx
+            global_patch_col = valid_patch_left + col_idx
+            block_row = global_patch_row // patches_per_block_h
+            block_col = global_patch_col // patches_per_block_w
+            block_id = 1 + block_row * num_patch_width + block_col
+            y1 = int(row_idx * patch_height_in_original)
+            y2 = int((row_idx + 1) * patch_height_in_original)
+            x1 = int(col_idx * patch_width_in_original)
+            x2 = int((col_idx + 1) * patch_width_in_original)
+            x1 = max(0, min(x1, original_width))
+            y1 = max(0, min(y1, original_height))
+            x2 = max(0, min(x2, original_width))
+            y2 = max(0, min(y2, original_height))
+            positions.append(TokenPosition(token_idx=token_idx, block_id=block_id, patch_bbox=(x1, y1, x2, y2),
+                                           patch_row=row_idx, patch_col=col_idx,
+                                           token_type=TokenType.HIGH_RESOLUTION_FEATURES))
+            token_idx += 1
+        positions.append(TokenPosition(token_idx=token_idx, block_id=block_id, patch_bbox=(-1, -1, -1, -1),
+                                       patch_row=row_idx, patch_col=-1, token_type=TokenType.NEWLINE))
+        token_idx += 1
+    return positions
+
+
+def random_sizes(n: int, seed: int = 0) -> List[Tuple[int, int]]:
+    rng = random.Random(seed)
+    sizes = [(rng.randint(64, 2048), rng.randint(64, 2048)) for _ in range(n)]
+    # Square, extreme aspect ratios and exact pinpoint resolutions
+    return sizes + [(336, 336), (672, 336), (336, 672), (1008, 336), (336, 1008), (480, 640), (100, 2000), (2000, 100)]
+
+
+@pytest.fixture(params=["default", "full"])
+def mapper(request):
+    return Token2PatchMapper.from_geometry(PatchGeometry(vision_feature_select_strategy=request.param))
+
+
+def test_compute_layout_matches_legacy(mapper):
+    for size in random_sizes(300):
+        expected = legacy_map_tokens_to_patches(mapper, size)
+        layout = mapper.compute_layout(size)
+        assert layout.dtype == TOKEN_LAYOUT_DTYPE
+        assert mapper.layout_to_positions(layout) == expected, size
+        assert mapper.map_tokens_to_patches(size) == expected, size
+
+
+def test_compute_layout_matches_legacy_other_geometry():
+    mapper = Token2PatchMapper.from_geometry({
+        "patch_size": 16, "block_size": [384, 384],
+        "image_grid_pinpoints": [[384, 768], [768, 384], [768, 768], [1152, 384], [384, 1152]],
+    })
+    for size in random_sizes(100, seed=1):
+        assert mapper.map_tokens_to_patches(size) == legacy_map_tokens_to_patches(mapper, size), size
+
+
+def test_compute_layouts_equals_compute_layout(mapper):
+    sizes = random_sizes(50, seed=2)
+    sizes = sizes + sizes[:10] + [(float(h), float(w)) for h, w in sizes[:5]]
+    layouts = mapper.compute_layouts(sizes)
+    assert len(layouts) == len(sizes)
+    for size, layout in zip(sizes, layouts):
+        np.testing.assert_array_equal(layout, mapper.compute_layout((int(size[0]), int(size[1]))))
+    # Repeated sizes share one array
+    assert layouts[0] is layouts[len(sizes) - 15]
+
+
+def test_get_token_layout_and_mapping(mapper):
+    image = Image.new("RGB", (640, 480))
+    expected = legacy_map_tokens_to_patches(mapper, (480, 640))
+    np.testing.assert_array_equal(mapper.get_token_layout(image), mapper.compute_layout((480, 640)))
+    assert mapper.get_token_mapping(image) == expected
+
+
+def test_mapper_from_stubbed_processor(monkeypatch):
+    """Without a geometry the mapper reads it from LlavaNextProcessor; transformers is stubbed"""
+    class FakeImageProcessor:
+        size = {"shortest_edge": 336}
+        image_grid_pinpoints = [[336, 672], [672, 336], [672, 672], [1008, 336], [336, 1008]]
+
+    class FakeProcessor:
+        patch_size = 14
+        vision_feature_select_strategy = "full"
+        image_processor = FakeImageProcessor()
+
+        @classmethod
+        def from_pretrained(cls, model_name):
+            return cls()
+
+    monkeypatch.setitem(sys.modules, "transformers", types.SimpleNamespace(LlavaNextProcessor=FakeProcessor))
+    mapper = Token2PatchMapper("stub/model")
+    assert mapper.geometry == PatchGeometry(vision_feature_select_strategy="full")
+    for size in random_sizes(20, seed=3):
+        assert mapper.map_tokens_to_patches(size) == legacy_map_tokens_to_patches(mapper, size)
+
+
+def test_layout_cache_counters_are_consistent_under_threads(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from deephallu.models.t2p_layout_cache import LayoutCache
+
+    mapper = Token2PatchMapper.from_geometry(PatchGeometry())
+    cache = LayoutCache(mapper.compute_layout, "test", max_entries=4, cache_dir=str(tmp_path))
+    sizes = random_sizes(12, seed=4) * 20
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(cache.get, sizes))
+    stats = cache.stats()
+    assert stats["hits"] + stats["disk_hits"] + stats["misses"] == len(sizes)
+    assert stats["entries"] == 4
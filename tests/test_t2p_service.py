@@ -0,0 +1,178 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+import yaml
+from PIL import Image
+
+from deephallu.web.backend.core.cache import MemoryCache, ResponseCache
+from deephallu.web.backend.core.config import Config
+from deephallu.web.backend.services.sample_index import SampleIndexRegistry
+from deephallu.web.backend.services.t2p_service import ContentAddressedStore, T2PService
+from deephallu.web.backend.utils.benchmark_lookup import make_mme_dataset
+
+
+def test_content_addressed_store(tmp_path):
+    store = ContentAddressedStore(str(tmp_path / "store"))
+    assert store.lookup("missing") is None
+
+    digest = store.put("inputs-a", b"png bytes")
+    assert digest == hashlib.sha256(b"png bytes").hexdigest()
+    assert store.lookup("inputs-a") == digest
+    with open(store.blob_path(digest), "rb") as f:
+        assert f.read() == b"png bytes"
+
+    # Identical renders from different inputs share one blob
+    assert store.put("inputs-b", b"png bytes") == digest
+    assert os.listdir(tmp_path / "store" / "blobs") == [digest + ".png"]
+    assert sorted(os.listdir(tmp_path / "store" / "refs")) == ["inputs-a", "inputs-b"]
+
+    # A ref is re-pointed when its inputs render differently
+    other = store.put("inputs-b", b"other bytes")
+    assert other != digest and store.lookup("inputs-b") == other and store.lookup("inputs-a") == digest
+
+    # A ref whose blob is gone is a miss
+    os.remove(store.blob_path(digest))
+    assert store.lookup("inputs-a") is None
+    assert not [name for name in os.listdir(tmp_path / "store" / "blobs") if name.endswith(".tmp")]
+
+
+def test_attention_file_rejects_paths_outside_the_run(tmp_path):
+    run_dir = tmp_path / "run"
+    (run_dir / "attentions" / "nested").mkdir(parents=True)
+    (tmp_path / "run" / "attentions_evil").mkdir()
+    for path in ["attentions/color_001.jpg.npy", "attentions/nested/a.npy", "secret.npy", "attentions_evil/x.npy"]:
+        (run_dir / path).write_bytes(b"")
+    (tmp_path / "outside.npy").write_bytes(b"")
+    os.symlink(tmp_path / "outside.npy", run_dir / "attentions" / "link.npy")
+
+    attention_file = T2PService.attention_file
+    assert attention_file(str(run_dir), "color_001.jpg") == os.path.realpath(run_dir / "attentions" / "color_001.jpg.npy")
+    assert attention_file(str(run_dir), "nested/a") == os.path.realpath(run_dir / "attentions" / "nested" / "a.npy")
+    assert attention_file(str(run_dir), "missing") is None
+    for sample_id in ["../secret", "../../outside", "nested/../../secret", "../attentions_evil/x",
+                      str(tmp_path / "outside"), "link", ""]:
+        assert attention_file(str(run_dir), sample_id) is None, sample_id
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    pixels = np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    path = tmp_path / "image.png"
+    Image.fromarray(pixels).save(path)
+    return str(path)
+
+
+def test_overlay_is_rendered_once_per_input(tmp_path, image_path, monkeypatch):
+    service = T2PService(cache_dir=str(tmp_path / "cache"))
+    digest, path = service.overlay(image_path, kind="layout", max_size=40)
+    with Image.open(path) as image:
+        assert image.size == (40, 30)
+    base_digest, _ = service.overlay(image_path, kind="layout", token_type="base", max_size=40)
+    assert base_digest != digest
+
+    def fail(*args):
+        raise AssertionError("overlay was rendered again")
+
+    # A restarted service finds the overlay through the stored ref
+    restarted = T2PService(cache_dir=str(tmp_path / "cache"))
+    monkeypatch.setattr(restarted, "_render_layout", fail)
+    assert restarted.overlay(image_path, kind="layout", max_size=40) == (digest, path)
+
+    # A changed source image is rendered again
+    Image.new("RGB", (80, 60), "white").save(image_path)
+    os.utime(image_path, ns=(1, 1))
+    assert service.overlay(image_path, kind="layout", max_size=40)[0] != digest
+
+    with pytest.raises(ValueError, match="Unknown token type"):
+        service.overlay(image_path, token_type="low_res")
+    with pytest.raises(ValueError, match="Unknown overlay kind"):
+        service.overlay(image_path, kind="mask")
+    with pytest.raises(ValueError, match="need an attention file"):
+        service.overlay(image_path, kind="attention")
+
+
+def test_attention_overlay(tmp_path, image_path):
+    service = T2PService(cache_dir=str(tmp_path / "cache"))
+    num_tokens = len(service.layout(image_path))
+    attention_path = str(tmp_path / "attention.npy")
+    np.save(attention_path, np.random.default_rng(1).random((2, 3, num_tokens), dtype=np.float32))
+
+    first, _ = service.overlay(image_path, kind="attention", attention_path=attention_path, step=0, max_size=40)
+    assert service.overlay(image_path, kind="attention", attention_path=attention_path, step=0, max_size=40)[0] == first
+    assert service.overlay(image_path, kind="attention", attention_path=attention_path, step=-1, max_size=40)[0] != first
+    with pytest.raises(IndexError, match="Step 2 out of range"):
+        service.overlay(image_path, kind="attention", attention_path=attention_path, step=2)
+    with pytest.raises(IndexError, match="Layer -4 out of range"):
+        service.overlay(image_path, kind="attention", attention_path=attention_path, layer=-4)
+
+    np.save(attention_path, np.zeros((1, 1, 10), dtype=np.float32))
+    with pytest.raises(ValueError, match="needs more"):
+        service.overlay(image_path, kind="attention", attention_path=attention_path)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from deephallu.web.backend.api import datasets as datasets_api
+    from deephallu.web.backend.api import t2p as t2p_api
+
+    root = tmp_path / "MME_Benchmark"
+    sample_ids = make_mme_dataset(root, categories=1, images_per_category=2)
+    for i, sample_id in enumerate(sample_ids):
+        image_name = sample_id.split("_", 2)[-1]
+        Image.new("RGB", (80 + 20 * i, 60), "gray").save(root / "category_00" / "images" / image_name, format="JPEG")
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump({
+        "datasets": {"mme": {"name": "MME", "path": str(root), "type": "mme", "description": "synthetic"}},
+        "models": {},
+    }))
+    config = Config(str(config_path))
+    monkeypatch.setattr(datasets_api.dataset_service, "config", config)
+    monkeypatch.setattr(datasets_api.dataset_service, "indexes", SampleIndexRegistry(config, cache_dir=None))
+    monkeypatch.setattr(datasets_api.dataset_service, "cache", ResponseCache(MemoryCache()))
+    monkeypatch.setattr(t2p_api, "t2p_service", T2PService(cache_dir=str(tmp_path / "t2p")))
+    app = FastAPI()
+    app.include_router(t2p_api.router)
+    with TestClient(app) as client:
+        yield client, sample_ids
+
+
+def test_api_overlay_etag(client):
+    client, sample_ids = client
+    url = f"/api/t2p/datasets/mme/samples/{sample_ids[0]}/overlay.png"
+    response = client.get(url, params={"size": 64})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "public, max-age=3600"
+
+    for if_none_match in [etag, f"W/{etag}", f'"other", {etag}', "*"]:
+        cached = client.get(url, params={"size": 64}, headers={"If-None-Match": if_none_match})
+        assert cached.status_code == 304 and cached.content == b""
+        assert cached.headers["etag"] == etag
+    assert client.get(url, params={"size": 64}, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    # Every variant has its own ETag
+    assert client.get(url, params={"size": 32}).headers["etag"] != etag
+    assert client.get(url, params={"size": 64, "token_type": "base"}).headers["etag"] != etag
+    other = f"/api/t2p/datasets/mme/samples/{sample_ids[1]}/overlay.png"
+    assert client.get(other, params={"size": 64}).headers["etag"] != etag
+
+
+def test_api_layout_etag(client):
+    client, sample_ids = client
+    url = f"/api/t2p/datasets/mme/samples/{sample_ids[0]}/layout"
+    response = client.get(url)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["image_size"] == [60, 80] and body["num_tokens"] == len(body["token_idx"])
+    cached = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304 and cached.content == b""
+    assert client.get(f"/api/t2p/datasets/mme/samples/{sample_ids[1]}/layout").headers["etag"] != response.headers["etag"]
+
+    assert client.get("/api/t2p/datasets/mme/samples/nope.jpg/layout").status_code == 404
+    assert client.get("/api/t2p/datasets/unknown/samples/x/overlay.png").status_code == 404
+    assert client.get(f"/api/t2p/datasets/mme/samples/{sample_ids[0]}/overlay.png", params={"size": 8}).status_code == 422
@@ -0,0 +1,129 @@
+import random
+
+import numpy as np
+import pytest
+
+from deephallu.models.llava_next_t2p_mapper import PatchGeometry, Token2PatchMapper, TokenType
+from deephallu.models.t2p_spatial_index import TokenSpatialIndex
+
+SPATIAL_TYPES = [TokenType.BASE_IMAGE_FEATURES, TokenType.HIGH_RESOLUTION_FEATURES]
+
+
+def token_boxes(layout, token_type):
+    """(token_idx, x1, y1, x2, y2) of every token of one type as plain Python tuples"""
+    tokens = layout[layout["token_type"] == token_type.value]
+    return list(zip(*(tokens[name].tolist() for name in ("token_idx", "x1", "y1", "x2", "y2"))))
+
+
+def brute_force_box(tokens, box):
+    """(token_idx, overlap fraction) of every patch with a positive overlap, by scanning all tokens"""
+    x1, y1, x2, y2 = box
+    hits = {}
+    for token_idx, tx1, ty1, tx2, ty2 in tokens:
+        inter_w = min(tx2, x2) - max(tx1, x1)
+        inter_h = min(ty2, y2) - max(ty1, y1)
+        if inter_w > 0 and inter_h > 0:
+            hits[token_idx] = inter_w * inter_h / ((tx2 - tx1) * (ty2 - ty1))
+    return hits
+
+
+def brute_force_point(tokens, x, y):
+    for token_idx, x1, y1, x2, y2 in tokens:
+        if x1 <= x < x2 and y1 <= y < y2:
+            return token_idx
+    return -1
+
+
+def random_boxes(rng, height, width, n):
+    boxes = []
+    for _ in range(n):
+        # Boxes partly outside the image, degenerate and sub-patch boxes included
+        xa, xb = sorted(rng.uniform(-0.2 * width, 1.2 * width) for _ in range(2))
+        ya, yb = sorted(rng.uniform(-0.2 * height, 1.2 * height) for _ in range(2))
+        if rng.random() < 0.2:
+            xb = xa + rng.uniform(0, 5)
+        if rng.random() < 0.1:
+            xa, ya, xb, yb = round(xa), round(ya), round(xa), round(yb)
+        boxes.append((xa, ya, xb, yb))
+    return np.array(boxes)
+
+
+@pytest.fixture(scope="module")
+def mapper():
+    return Token2PatchMapper.from_geometry(PatchGeometry())
+
+
+# Non-pinpoint sizes (odd aspect ratios, small and very large images) and two pinpoint resolutions
+SIZES = [(480, 640), (333, 1000), (1000, 333), (97, 113), (1999, 1501), (336, 672), (672, 672)]
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("token_type", SPATIAL_TYPES)
+def test_query_boxes_matches_brute_force(mapper, size, token_type):
+    rng = random.Random(f"boxes{size}{token_type.value}")
+    layout = mapper.compute_layout(size)
+    index = TokenSpatialIndex(layout, token_type)
+    boxes = random_boxes(rng, size[0], size[1], 40)
+    offsets, token_indices, fractions = index.query_boxes(boxes)
+    tokens = token_boxes(layout, token_type)
+    assert offsets[0] == 0 and offsets[-1] == len(token_indices) == len(fractions)
+    assert (np.diff(offsets) >= 0).all()
+    for box_id, box in enumerate(boxes):
+        start, end = offsets[box_id], offsets[box_id + 1]
+        found = dict(zip(token_indices[start:end].tolist(), fractions[start:end].tolist()))
+        assert len(found) == end - start
+        expected = brute_force_box(tokens, box)
+        assert found.keys() == expected.keys(), box
+        for token_idx, fraction in expected.items():
+            assert found[token_idx] == pytest.approx(fraction), (box, token_idx)
+
+    # Single queries and COCO (x, y, w, h) boxes give the same answer
+    box = boxes[0]
+    tokens, _ = index.query_box(tuple(box))
+    np.testing.assert_array_equal(tokens, token_indices[offsets[0]:offsets[1]])
+    xywh = np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1)
+    np.testing.assert_array_equal(index.query_boxes(xywh, box_format="xywh")[1], token_indices)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("token_type", SPATIAL_TYPES)
+def test_query_points_matches_brute_force(mapper, size, token_type):
+    rng = random.Random(f"points{size}{token_type.value}")
+    height, width = size
+    layout = mapper.compute_layout(size)
+    index = TokenSpatialIndex(layout, token_type)
+    tokens = layout[layout["token_type"] == token_type.value]
+    points = [(rng.uniform(-5, width + 5), rng.uniform(-5, height + 5)) for _ in range(200)]
+    # Patch corners and the image border are the edge cases of the half-open intervals
+    points += [(int(token["x1"]), int(token["y1"])) for token in tokens[::7]]
+    points += [(int(token["x2"]), int(token["y2"])) for token in tokens[::11]]
+    points += [(0, 0), (width - 1, height - 1), (width, 0), (0, height), (-0.5, 3)]
+    result = index.query_points(np.array(points, dtype=np.float64))
+    boxes = token_boxes(layout, token_type)
+    expected = [brute_force_point(boxes, x, y) for x, y in points]
+    assert result.tolist() == expected
+    assert index.query_point(*points[0]) == expected[0]
+
+
+def test_box_scores_matches_brute_force(mapper):
+    rng = random.Random(5)
+    size = (333, 1000)
+    layout = mapper.compute_layout(size)
+    index = TokenSpatialIndex(layout)
+    values = np.random.default_rng(0).random((3, len(layout)))
+    boxes = random_boxes(rng, *size, 20)
+    scores = index.box_scores(values, boxes)
+    averages = index.box_scores(values, boxes, normalize=True)
+    assert scores.shape == averages.shape == (3, len(boxes))
+    tokens = token_boxes(layout, TokenType.HIGH_RESOLUTION_FEATURES)
+    for box_id, box in enumerate(boxes):
+        hits = brute_force_box(tokens, box)
+        expected = sum(values[:, token_idx] * fraction for token_idx, fraction in hits.items()) if hits else np.zeros(3)
+        np.testing.assert_allclose(scores[:, box_id], expected)
+        weight = sum(hits.values())
+        np.testing.assert_allclose(averages[:, box_id], expected / weight if weight else 0.0)
+
+
+def test_newline_tokens_are_rejected(mapper):
+    with pytest.raises(ValueError):
+        TokenSpatialIndex(mapper.compute_layout((480, 640)), TokenType.NEWLINE)
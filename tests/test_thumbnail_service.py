@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from email.utils import formatdate
+
+import numpy as np
+import pytest
+from PIL import Image
+from starlette.datastructures import Headers
+
+from deephallu.web.backend.services import thumbnail_service as thumbnail_module
+from deephallu.web.backend.services.thumbnail_service import ThumbnailService, is_not_modified, source_etag
+
+WIDTHS = [64, 48, 32]
+
+
+@pytest.fixture
+def source(tmp_path):
+    # Noise so that each thumbnail has a distinct, non-trivial size
+    pixels = np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    path = tmp_path / "image.png"
+    Image.fromarray(pixels).save(path)
+    return str(path)
+
+
+def make_service(cache_dir, max_cache_bytes=10 ** 9):
+    return ThumbnailService(cache_dir=str(cache_dir), max_cache_bytes=max_cache_bytes, max_workers=2)
+
+
+def render(service, source, width):
+    future, media_type = service.get_thumbnail_future(source, width, None, "png")
+    assert media_type == "image/png"
+    return future.result(timeout=30)
+
+
+def thumbnail_sizes(tmp_path, source):
+    """Sizes of the rendered thumbnails, measured in a scratch cache"""
+    service = make_service(tmp_path / "scratch")
+    sizes = [os.path.getsize(render(service, source, width)) for width in WIDTHS]
+    service.executor.shutdown()
+    return sizes
+
+
+def test_eviction_by_bytes_deletes_least_recently_used(tmp_path, source):
+    sizes = thumbnail_sizes(tmp_path, source)
+    service = make_service(tmp_path / "cache", max_cache_bytes=sum(sizes) - 1)
+    a, b = render(service, source, WIDTHS[0]), render(service, source, WIDTHS[1])
+    # A cache hit makes ``a`` the most recently used entry
+    assert render(service, source, WIDTHS[0]) == a
+    c = render(service, source, WIDTHS[2])
+
+    assert os.path.exists(a) and os.path.exists(c)
+    assert not os.path.exists(b)
+    assert service.cache_stats() == {"entries": 2, "bytes": sizes[0] + sizes[2], "max_bytes": sum(sizes) - 1}
+    assert sorted(os.listdir(tmp_path / "cache")) == sorted([os.path.basename(a), os.path.basename(c)])
+    with Image.open(c) as image:
+        assert image.size == (32, 24)
+
+
+def test_lru_order_restored_from_mtimes(tmp_path, source, monkeypatch):
+    sizes = thumbnail_sizes(tmp_path, source)
+    cache_dir = tmp_path / "cache"
+    service = make_service(cache_dir)
+    a, b, c = [render(service, source, width) for width in WIDTHS]
+    os.utime(a, (1000, 1000))
+    os.utime(b, (2000, 2000))
+    os.utime(c, (3000, 3000))
+    # A hit is mirrored to the file mtime: ``a`` becomes the newest
+    assert render(service, source, WIDTHS[0]) == a
+    assert os.stat(a).st_mtime > 3000
+    service.executor.shutdown()
+    (cache_dir / "leftover.png.123.tmp").write_bytes(b"partial")
+
+    restarted = make_service(cache_dir, max_cache_bytes=sum(sizes) - 1)
+    # Loaded oldest first (b, c, a), so ``b`` is the one evicted and deleted
+    assert restarted._entries.keys() == [os.path.basename(c), os.path.basename(a)]
+    assert not os.path.exists(b)
+    assert not (cache_dir / "leftover.png.123.tmp").exists()
+
+    def fail(*args):
+        raise AssertionError("cached thumbnail was rendered again")
+
+    monkeypatch.setattr(thumbnail_module, "render_thumbnail", fail)
+    assert render(restarted, source, WIDTHS[0]) == a
+    assert render(restarted, source, WIDTHS[2]) == c
+
+
+def test_concurrent_requests_share_one_render(tmp_path, source, monkeypatch):
+    release = threading.Event()
+    calls = []
+    real_render = thumbnail_module.render_thumbnail
+
+    def slow_render(*args):
+        calls.append(args)
+        assert release.wait(10)
+        real_render(*args)
+
+    monkeypatch.setattr(thumbnail_module, "render_thumbnail", slow_render)
+    service = make_service(tmp_path / "cache")
+    first, _ = service.get_thumbnail_future(source, 40, None, "png")
+    second, _ = service.get_thumbnail_future(source, 40, None, "png")
+    other, _ = service.get_thumbnail_future(source, 40, None, "jpeg")
+    assert first is second
+    assert other is not first
+    assert len(service._pending) == 2
+
+    release.set()
+    path = first.result(timeout=30)
+    assert second.result() == path and other.result(timeout=30).endswith(".jpg")
+    assert len(calls) == 2
+    deadline = time.monotonic() + 5
+    while service._pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert service._pending == {}
+    # Later requests are served from the cache without rendering
+    assert render(service, source, 40) == path
+    assert len(calls) == 2
+
+
+def test_changed_source_gets_a_new_thumbnail(tmp_path, source):
+    service = make_service(tmp_path / "cache")
+    before = render(service, source, 32)
+    Image.new("RGB", (80, 40), "red").save(source)
+    after = render(service, source, 32)
+    assert after != before
+    with Image.open(after) as image:
+        assert image.size == (32, 16)
+
+
+def test_is_not_modified(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"data")
+    os.utime(path, (1_700_000_000.5, 1_700_000_000.5))
+    stat = os.stat(path)
+    etag = source_etag(stat, 32, None, "png")
+    other = source_etag(stat, 64, None, "png")
+    modified = formatdate(1_700_000_000, usegmt=True)
+    earlier = formatdate(1_699_999_999, usegmt=True)
+
+    assert not is_not_modified(Headers({}), etag, stat)
+    # If-None-Match: exact, weak, lists and the wildcard
+    assert is_not_modified(Headers({"If-None-Match": etag}), etag, stat)
+    assert is_not_modified(Headers({"If-None-Match": f"{other}, W/{etag}"}), etag, stat)
+    assert is_not_modified(Headers({"If-None-Match": "*"}), etag, stat)
+    assert not is_not_modified(Headers({"If-None-Match": other}), etag, stat)
+    # If-None-Match takes precedence over If-Modified-Since
+    assert not is_not_modified(Headers({"If-None-Match": other, "If-Modified-Since": modified}), etag, stat)
+    # If-Modified-Since has one-second resolution
+    assert is_not_modified(Headers({"If-Modified-Since": modified}), etag, stat)
+    assert not is_not_modified(Headers({"If-Modified-Since": earlier}), etag, stat)
+    assert not is_not_modified(Headers({"If-Modified-Since": "not a date"}), etag, stat)
+    assert not is_not_modified(Headers({"If-Modified-Since": modified}), etag, None)
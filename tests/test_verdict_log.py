@@ -0,0 +1,57 @@
+import json
+
+from deephallu.analytics.verdict_log import VerdictLog, load_verdicts
+
+
+def test_append_flush_and_load(tmp_path):
+    path = str(tmp_path / "judgments.jsonl")
+    with VerdictLog(path, flush_every=2) as log:
+        log.append("a", 1, "fast")
+        assert load_verdicts(path) == {}
+        log.append("b", 0, "llm")
+        assert set(load_verdicts(path)) == {"a", "b"}
+        log.append("a", 0, "cache")
+    verdicts = load_verdicts(path)
+    assert verdicts["a"] == {"sample_id": "a", "judgment": 0, "source": "cache"}
+    # Without resume the log starts over
+    VerdictLog(path).close()
+    assert load_verdicts(path) == {}
+
+
+def test_resume_after_truncated_final_line(tmp_path):
+    path = tmp_path / "judgments.jsonl"
+    with VerdictLog(str(path), flush_every=1) as log:
+        log.append("a", 1, "fast")
+        log.append("b", 0, "llm")
+    # Crash in the middle of writing the last line
+    data = path.read_bytes()
+    path.write_bytes(data[:-7])
+    assert set(load_verdicts(str(path))) == {"a"}
+
+    with VerdictLog(str(path), flush_every=1, resume=True) as log:
+        log.append("b", 0, "llm")
+        log.append("c", 1, "fast")
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["sample_id"] for line in lines] == ["a", "b", "c"]
+    assert {key: record["judgment"] for key, record in load_verdicts(str(path)).items()} == {"a": 1, "b": 0, "c": 1}
+
+
+def test_resume_keeps_complete_log(tmp_path):
+    path = tmp_path / "judgments.jsonl"
+    with VerdictLog(str(path)) as log:
+        log.append("a", 1, "fast")
+    with VerdictLog(str(path), resume=True) as log:
+        log.append("b", 1, "fast")
+    assert set(load_verdicts(str(path))) == {"a", "b"}
+    # A log that is only a partial line is emptied
+    path.write_text('{"sample_id": "x"')
+    VerdictLog(str(path), resume=True).close()
+    assert path.read_bytes() == b""
+
+
+def test_resume_scans_back_over_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(VerdictLog._drop_partial_line, "__defaults__", (16,))
+    path = tmp_path / "judgments.jsonl"
+    path.write_text('{"sample_id": "a", "judgment": 1, "source": "fast"}\n' + '{"sample_id": "' + "x" * 200)
+    VerdictLog(str(path), resume=True).close()
+    assert path.read_text().count("\n") == 1 and path.read_text().endswith("\n")